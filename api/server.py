@@ -1,24 +1,28 @@
 """FastAPI server for multi-agent orchestration."""
 
 import os
+import re
 import sys
 import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from config.settings import get_env_source, get_provider_status, get_available_providers
+from config.settings import BASE_DIR, get_env_source, get_provider_status, get_available_providers
 from core.agent_runtime import AgentRuntime
+from core.budget import ChainBudget
+from core.db_pool import close_pools, get_pool
 from core.logging_utils import get_metrics, read_logs
 from core.memory_engine import MemoryEngine
 from core.session_manager import get_session_manager
@@ -55,8 +59,10 @@ async def lifespan(app: FastAPI):
 
     yield  # Application runs here
 
-    # Shutdown logic (if needed in future)
-    # print("🛑 Server shutting down...")
+    # Shutdown logic: persist queued logs / memory rows before exiting
+    if runtime.persistence is not None:
+        runtime.persistence.close()
+    close_pools()
 
 
 # Initialize FastAPI with lifespan
@@ -101,11 +107,27 @@ class AskRequest(BaseModel):
     session_id: Optional[str] = None  # v0.11.0: Session tracking
 
 
+class BudgetRequest(BaseModel):
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_seconds: Optional[float] = None
+
+
 class ChainRequest(BaseModel):
     prompt: str
     stages: Optional[List[str]] = None
     mock_mode: Optional[bool] = None
     session_id: Optional[str] = None  # v0.11.0: Session tracking
+    budget: Optional[BudgetRequest] = None  # Token/cost/time budget for the chain
+    trace: Optional[bool] = None  # Record tracing spans (summary in last result's metadata["trace"])
+    speculative: Optional[int] = None  # Concurrent builder candidates scored by critics (0/1 = off)
+    compression_mode: Optional[Literal["llm", "extractive", "auto"]] = None  # Inter-stage compression method
+
+
+class ChainEstimateRequest(BaseModel):
+    prompt: str
+    stages: Optional[List[str]] = None
+    simulations: int = Field(2000, ge=100, le=20000)  # Simulated runs behind the intervals
 
 
 class RunResultResponse(BaseModel):
@@ -124,6 +146,7 @@ class RunResultResponse(BaseModel):
     original_model: Optional[str] = None  # If fallback was used
     fallback_reason: Optional[str] = None  # Why fallback was triggered
     fallback_used: bool = False
+    metadata: Optional[Dict[str, Any]] = None  # Chain annotations (e.g. budget consumption)
 
 
 # API endpoints
@@ -217,11 +240,17 @@ async def chain(request: ChainRequest):
             )
         # If no session_id provided, system works in stateless mode (backward compatible)
 
-        results = runtime.chain(
+        # Worker thread: concurrent requests overlap, so identical ones can be coalesced
+        results = await run_in_threadpool(
+            runtime.chain,
             prompt=request.prompt,
             stages=request.stages,
             mock_mode=request.mock_mode,
             session_id=session_id,  # v0.11.0
+            budget=ChainBudget.from_dict(request.budget.model_dump()) if request.budget else None,
+            trace=request.trace,
+            speculative=request.speculative,
+            compression_mode=request.compression_mode,
         )
 
         # Check for errors
@@ -239,6 +268,32 @@ async def chain(request: ChainRequest):
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
 
+@app.post("/chain/estimate")
+async def chain_estimate(request: ChainEstimateRequest):
+    """
+    Dry-run estimate of a chain (no LLM calls).
+
+    Args:
+        request: Prompt, optional stages and number of simulations
+
+    Returns:
+        Critical-path latency, tokens and cost (mean, p50 and 90% interval),
+        per-stage breakdown, expected refinement rounds and per-agent history
+    """
+    if not request.prompt.strip():
+        raise HTTPException(status_code=422, detail="Prompt cannot be empty")
+    invalid = [s for s in request.stages or [] if s not in runtime.config["agents"]]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Unknown agent(s): {', '.join(invalid)}")
+
+    try:
+        return await run_in_threadpool(
+            runtime.estimate_chain, request.prompt, request.stages, request.simulations
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+
 @app.get("/logs")
 async def logs(limit: int = 20):
     """
@@ -277,8 +332,6 @@ async def metrics():
 
 def get_memory_health():
     """Get memory system health information."""
-    import sqlite3
-
     try:
         # Database path
         db_path = Path("data/MEMORY/conversations.db")
@@ -290,30 +343,28 @@ def get_memory_health():
                 "error": "Database file not found",
             }
 
-        # Connect directly to database
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
-        # Total conversations
-        total = cursor.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        # Shared connection pool (same read connection per worker thread as the memory backend)
+        pool = get_pool(db_path)
+        with pool.reader() as conn:
+            # Total conversations
+            total = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
 
-        # Last conversation timestamp
-        last_conv = cursor.execute(
-            "SELECT timestamp FROM conversations ORDER BY timestamp DESC LIMIT 1"
-        ).fetchone()
-        last_timestamp = last_conv[0] if last_conv else None
+            # Last conversation timestamp
+            last_conv = conn.execute(
+                "SELECT timestamp FROM conversations ORDER BY timestamp DESC LIMIT 1"
+            ).fetchone()
+            last_timestamp = last_conv[0] if last_conv else None
 
         # Database size
         db_size_mb = db_path.stat().st_size / (1024 * 1024)
 
-        conn.close()
-
         return {
             "enabled": True,
             "database_connected": True,
             "total_conversations": total,
             "database_size_mb": round(db_size_mb, 2),
             "last_conversation": last_timestamp,
+            "connection_pool": pool.stats(),
         }
     except Exception as e:
         return {
@@ -426,11 +477,45 @@ async def health():
         "total_available": len(available_providers),
 
         "memory": memory_health,
+        "persistence": runtime.persistence.stats() if runtime.persistence is not None else {"mode": "sync"},
+        "coalescing": runtime.chain_coalescer.stats() if runtime.chain_coalescer is not None else None,
         "system": system_metrics,
         "stats_24h": stats_24h,
     }
 
 
+@app.get("/router/stats")
+async def router_stats():
+    """
+    Routing statistics for agent="auto" requests.
+
+    Returns:
+        Decisions per source (cache, local, llm, default) and decision cache hit/miss stats
+    """
+    return runtime.router_stats()
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Download an exported chain trace.
+
+    Args:
+        trace_id: Trace ID from a result's metadata["trace"]["trace_id"]
+
+    Returns:
+        Chrome trace-event JSON (open in https://ui.perfetto.dev)
+    """
+    if not re.fullmatch(r"[0-9a-f]{16}", trace_id):
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+
+    export_dir = runtime.config.get("tracing", {}).get("export_dir", "data/TRACES")
+    path = BASE_DIR / export_dir / f"{trace_id}.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return FileResponse(path, media_type="application/json")
+
+
 # Memory API endpoints
 @app.get("/memory/search")
 async def memory_search(
@@ -442,8 +527,11 @@ async def memory_search(
     """
     Search conversations by keyword.
 
+    Full-text search ranked by BM25; each result has a ``score`` and a
+    highlighted ``snippet``.
+
     Args:
-        q: Search query
+        q: Search query ("exact phrase", prefix*, all words must match)
         agent: Filter by agent (optional)
         model: Filter by model (optional)
         limit: Maximum results (1-100)
@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 # Base paths
 BASE_DIR = Path(__file__).parent.parent
 CONFIG_DIR = BASE_DIR / "config"
+AGENTS_CONFIG_PATH = CONFIG_DIR / "agents.yaml"
 DATA_DIR = BASE_DIR / "data"
 CONVERSATIONS_DIR = DATA_DIR / "CONVERSATIONS"
 
@@ -149,8 +150,7 @@ def get_env_source() -> str:
 
 def load_agents_config() -> Dict[str, Any]:
     """Load agents configuration from YAML."""
-    config_path = CONFIG_DIR / "agents.yaml"
-    with open(config_path, "r", encoding="utf-8") as f:
+    with open(AGENTS_CONFIG_PATH, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 
@@ -284,5 +284,11 @@ def count_tokens(text: str) -> int:
         except ImportError:
             # Fallback to old heuristic if tiktoken not installed
             return len(text) // 4
+        except Exception:
+            # Encoding file can't be downloaded (offline host): don't retry on every call
+            _tiktoken_encoding = False
+
+    if _tiktoken_encoding is False:
+        return len(text) // 4
 
     return len(_tiktoken_encoding.encode(text))
@@ -1,14 +1,30 @@
 """Agent runtime orchestration."""
 
-from dataclasses import dataclass
+import copy
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from config.settings import load_agents_config, load_memory_config
+from config.settings import AGENTS_CONFIG_PATH, BASE_DIR, count_tokens, load_agents_config, load_memory_config
+from core.budget import BudgetScheduler, ChainBudget
+from core.chain_estimator import MIN_SAMPLES, ChainEstimator
 from core.llm_connector import LLMConnector, LLMResponse
-from core.logging_utils import write_json
+from core.local_router import ROUTED_TAG, LocalRouter, load_or_train_local_router
+from core.router_cache import RouterCache, config_fingerprint
+from core.single_flight import SingleFlight, chain_request_key
+from core.logging_utils import new_log_path, write_json
 from core.memory_engine import MemoryEngine
+from core.patching import PATCH_INSTRUCTIONS, PatchError, apply_edit_blocks, parse_edit_blocks
+from core.persistence_queue import get_persistence_queue
+from core.text_classifier import issue_header_lines, uppercase_keyword_lines
+from core.tracing import Trace, annotate, bind_context, current_trace, span, traced, tracing_requested
 from core.context_aggregator import ContextAggregator
+from core.context_packer import ContextPacker, ContextSection, model_context_window
+from core.critic_panel import build_panel_system, panel_instructions, parse_panel_response, split_usage
+from core.embedding_engine import get_embedding_engine
+from core.extractive_compressor import DEFAULT_CUE_KEYWORDS, ExtractiveCompressor
 
 
 @dataclass
@@ -31,6 +47,8 @@ class RunResult:
     fallback_reason: Optional[str] = None  # Why fallback was triggered
     fallback_used: bool = False  # Whether fallback was triggered
     injected_context_tokens: int = 0  # Tokens from memory context injection
+    metadata: Optional[Dict[str, Any]] = None  # Chain-level annotations (budget, ...)
+    memory_record: Optional[Dict[str, Any]] = field(default=None, repr=False)  # Unstored row (persist=False)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
@@ -50,6 +68,7 @@ class RunResult:
             "original_model": self.original_model,
             "fallback_reason": self.fallback_reason,
             "fallback_used": self.fallback_used,
+            "metadata": self.metadata,
         }
 
 
@@ -62,6 +81,15 @@ class AgentRuntime:
         self.connector = LLMConnector(retry_count=1)
         self._memory = None  # Lazy initialization
         self._context_aggregator = None  # Lazy initialization
+        self._local_router = None  # Lazy initialization (False = unavailable)
+        self._router_cache = None  # Lazy initialization
+        self._chain_coalescer = None  # Lazy initialization
+        self._extractive_compressor = None  # Lazy initialization
+        self._compression_latency_ms: Optional[float] = None  # EWMA of LLM compression calls
+        self._agents_config_mtime = None
+        self._route_counts: Dict[str, int] = {}
+        self._route_lock = threading.Lock()
+        self.persistence = get_persistence_queue()  # None = synchronous persistence
 
     @property
     def memory(self) -> MemoryEngine:
@@ -77,7 +105,86 @@ class AgentRuntime:
             self._context_aggregator = ContextAggregator()
         return self._context_aggregator
 
-    def _compress_semantic(self, text: str, max_tokens: int = 500) -> str:
+    @property
+    def local_router(self) -> Optional[LocalRouter]:
+        """Lazy load (or train) the local embedding router, if enabled."""
+        local_config = self.config.get("routing", {}).get("local", {})
+        if not local_config.get("enabled", False):
+            return None
+
+        if self._local_router is None:
+            try:
+                self._local_router = load_or_train_local_router(local_config, memory=self.memory)
+            except Exception as e:
+                # Embedding model unavailable: keep using the LLM router
+                import sys
+                print(f"⚠️  Local router unavailable: {e}", file=sys.stderr)
+                self._local_router = False
+
+        return self._local_router or None
+
+    @property
+    def extractive_compressor(self) -> ExtractiveCompressor:
+        """Lazy initialization of the local extractive compressor."""
+        if self._extractive_compressor is None:
+            extractive_config = self.config.get("compression", {}).get("extractive", {})
+            self._extractive_compressor = ExtractiveCompressor(
+                embedding_engine=get_embedding_engine() if extractive_config.get("use_embeddings", True) else None,
+                cue_keywords=extractive_config.get("cue_keywords", DEFAULT_CUE_KEYWORDS),
+                centrality_weight=extractive_config.get("centrality_weight", 0.6),
+                salience_weight=extractive_config.get("salience_weight", 0.4),
+            )
+        return self._extractive_compressor
+
+    def _resolve_compression_mode(
+        self,
+        mode: Optional[str] = None,
+        scheduler: Optional[BudgetScheduler] = None,
+    ) -> str:
+        """
+        Compression method for one call: "llm" or "extractive".
+
+        "auto" picks extractive when the expected LLM compression latency (EWMA
+        of recent calls, or compression.expected_llm_ms before the first call)
+        exceeds compression.latency_budget_ms or the chain's remaining time.
+        """
+        compression_config = self.config.get("compression", {})
+        mode = mode or compression_config.get("mode", "llm")
+        if mode != "auto":
+            return mode
+
+        expected_ms = self._compression_latency_ms
+        if expected_ms is None:
+            expected_ms = compression_config.get("expected_llm_ms", 3000)
+        budget_ms = compression_config.get("latency_budget_ms", 2000)
+        if scheduler:
+            remaining_seconds = scheduler.remaining()["seconds"]
+            if remaining_seconds is not None:
+                budget_ms = min(budget_ms, remaining_seconds * 1000)
+        return "extractive" if expected_ms > budget_ms else "llm"
+
+    def _record_compression_latency(self, duration_ms: float) -> None:
+        """Update the LLM compression latency estimate used by auto mode."""
+        if self._compression_latency_ms is None:
+            self._compression_latency_ms = duration_ms
+        else:
+            self._compression_latency_ms = 0.7 * self._compression_latency_ms + 0.3 * duration_ms
+
+    def _compress_extractive(self, text: str, max_tokens: int) -> str:
+        """Local extractive compression; truncation if token counting is unavailable."""
+        try:
+            return self.extractive_compressor.compress(text, max_tokens=max_tokens)
+        except Exception:
+            return self._intelligent_truncate(text, max_tokens * 4)
+
+    @traced("compression")
+    def _compress_semantic(
+        self,
+        text: str,
+        max_tokens: int = 500,
+        scheduler: Optional[BudgetScheduler] = None,
+        mode: Optional[str] = None,
+    ) -> str:
         """
         Extract semantic essence using structured JSON compression.
 
@@ -90,10 +197,28 @@ class AgentRuntime:
         Args:
             text: Full output to compress
             max_tokens: Target token count (default: 500)
+            scheduler: Optional chain budget scheduler (truncates instead of
+                       calling the LLM when the budget can't afford it)
+            mode: "llm", "extractive" or "auto" (default: compression.mode).
+                  Extractive ranks sentences and code blocks locally (no LLM
+                  call); auto uses it when the LLM call would be too slow, and
+                  instead of truncation when the LLM call fails
 
         Returns:
-            Structured JSON summary as string
+            Structured JSON summary (llm) or selected original text (extractive)
         """
+        requested_mode = mode or self.config.get("compression", {}).get("mode", "llm")
+        if self._resolve_compression_mode(requested_mode, scheduler) == "extractive":
+            return self._compress_extractive(text, max_tokens)
+
+        def fallback() -> str:
+            if requested_mode == "auto":
+                return self._compress_extractive(text, max_tokens)
+            return self._intelligent_truncate(text, max_tokens * 4)  # 4 chars ≈ 1 token
+
+        if scheduler and not scheduler.allow_compression():
+            return fallback()
+
         compression_prompt = f"""Summarize this output into structured JSON (max {max_tokens} tokens):
 
 REQUIRED JSON STRUCTURE:
@@ -129,14 +254,130 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                 max_tokens=max_tokens,
             )
 
+            if scheduler:
+                scheduler.record_call(
+                    "compression",
+                    response.model,
+                    response.prompt_tokens,
+                    response.completion_tokens,
+                    response.duration_ms,
+                )
+
             if response.error or not response.text:
-                # Fallback to intelligent truncation if compression fails
-                return self._intelligent_truncate(text, max_tokens * 4)  # 4 chars ≈ 1 token
+                # Fallback to intelligent truncation (auto: extractive) if compression fails
+                return fallback()
 
+            self._record_compression_latency(response.duration_ms)
             return response.text
         except Exception:
-            # Fallback to intelligent truncation on any error
-            return self._intelligent_truncate(text, max_tokens * 4)
+            # Fallback to intelligent truncation (auto: extractive) on any error
+            return fallback()
+
+    def _stage_input_budget(self, agents: List[str], prompt: str) -> int:
+        """
+        Tokens available for prior-stage outputs in the next prompt.
+
+        Smallest input window across the agents' models and fallbacks, minus
+        their max_tokens, system prompt, the user prompt and
+        context_packing.reserve_tokens; capped at context_packing.max_input_tokens.
+        """
+        packing_config = self.config.get("context_packing", {})
+        overrides = packing_config.get("context_windows", {})
+        available = []
+        for name in agents:
+            agent_config = self.config["agents"].get(name, {})
+            models = [agent_config.get("model")] + agent_config.get("fallback_order", [])
+            window = min(model_context_window(model, overrides) for model in models if model)
+            available.append(window - agent_config.get("max_tokens", 1500) - count_tokens(agent_config.get("system", "")))
+
+        budget = min(available) - packing_config.get("reserve_tokens", 1000) - count_tokens(prompt)
+        return max(min(budget, packing_config.get("max_input_tokens", 12000)), 0)
+
+    def _pack_handoff(
+        self,
+        agents: List[str],
+        prompt: str,
+        sections: List[ContextSection],
+        scheduler: Optional[BudgetScheduler] = None,
+        compression_mode: Optional[str] = None,
+    ) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Fit prior-stage outputs into the next agent's token budget.
+
+        Args:
+            agents: Agent(s) receiving the prompt (smallest budget wins)
+            prompt: Original user prompt (part of the next prompt)
+            sections: Prior-stage outputs with importance weights
+            scheduler: Optional chain budget scheduler (for compression calls)
+            compression_mode: Optional compression mode override
+
+        Returns:
+            Tuple of (text per section, packing report)
+        """
+        packer = ContextPacker(
+            compress=lambda text, target: self._compress_semantic(
+                text, max_tokens=target, scheduler=scheduler, mode=compression_mode
+            ),
+        )
+        texts, report = packer.pack(sections, self._stage_input_budget(agents, prompt))
+        for k, section in enumerate(sections):
+            if section.name in report["compressed"]:
+                texts[k] = f"{texts[k]}\n\n[Note: Above is compressed to fit the context budget. Full output: {len(section.text)} chars]"
+        return texts, report
+
+    def _handoff_text(
+        self,
+        text: str,
+        agents: List[str],
+        prompt: str,
+        legacy_threshold: int,
+        scheduler: Optional[BudgetScheduler] = None,
+        compression_mode: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        A prior-stage output as it goes into the next agent's prompt.
+
+        With context_packing enabled it is compressed only if it doesn't fit the
+        agents' token budget; otherwise outputs over legacy_threshold characters
+        are compressed to 500 tokens.
+        """
+        if not self.config.get("context_packing", {}).get("enabled", False):
+            if len(text) > legacy_threshold:
+                compressed = self._compress_semantic(text, max_tokens=500, scheduler=scheduler, mode=compression_mode)
+                return f"{compressed}\n\n[Note: Above is structured summary preserving all key decisions and specs]"
+            return text
+
+        texts, pack_report = self._pack_handoff(
+            agents, prompt, [ContextSection("output", text)], scheduler, compression_mode
+        )
+        if report is not None:
+            report.update(pack_report)
+        return texts[0]
+
+    def _handoff_sections(self, results: List[RunResult]) -> List[ContextSection]:
+        """
+        Prior-stage outputs weighted by importance for packing.
+
+        Weights come from context_packing.weights (by agent); the latest output
+        of each agent (final builder version, final critique) is multiplied by
+        context_packing.latest_weight so superseded iterations shrink first.
+        """
+        packing_config = self.config.get("context_packing", {})
+        weights = packing_config.get("weights", {})
+        latest_weight = packing_config.get("latest_weight", 2.0)
+
+        latest: Dict[str, int] = {}
+        for k, result in enumerate(results):
+            latest[result.agent] = k
+        return [
+            ContextSection(
+                name=f"{result.agent}@{k + 1}",
+                text=result.response,
+                weight=weights.get(result.agent, 1.0) * (latest_weight if latest[result.agent] == k else 1.0),
+            )
+            for k, result in enumerate(results)
+        ]
 
     def _intelligent_truncate(self, text: str, max_chars: int) -> str:
         """
@@ -176,8 +417,6 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         Returns:
             Formatted string of critical issues, or None if no critical issues found
         """
-        import re
-
         if not critique_text:
             return None
 
@@ -195,14 +434,16 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         current_block = []
         in_critical_section = False
 
-        for i, line in enumerate(lines):
-            line_upper = line.upper()
+        # One pass over the whole text for keywords and issue headers
+        critical_line_ids = uppercase_keyword_lines(critique_text, critical_keywords)
+        issue_line_ids = issue_header_lines(critique_text)
 
+        for i, line in enumerate(lines):
             # Check if line contains critical keywords
-            has_critical = any(keyword in line_upper for keyword in critical_keywords)
+            has_critical = i in critical_line_ids
 
             # Check for issue patterns with severity
-            issue_pattern = re.match(r'^\s*(?:Issue|Problem)\s+\d+:', line, re.IGNORECASE)
+            issue_pattern = i in issue_line_ids
 
             if has_critical or issue_pattern:
                 in_critical_section = True
@@ -224,9 +465,8 @@ ORIGINAL OUTPUT TO SUMMARIZE:
 
         # If no structured blocks found, fall back to line-by-line extraction
         if not issue_blocks:
-            for line in lines:
-                line_upper = line.upper()
-                if any(keyword in line_upper for keyword in critical_keywords):
+            for i, line in enumerate(lines):
+                if i in critical_line_ids:
                     critical_lines.append(line.strip())
 
             if critical_lines:
@@ -277,12 +517,17 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         # Case 4: Fewer issues - PROGRESS (continue)
         return (False, f"Progress detected ({previous_issue_count} → {current_issue_count} issues) - continuing")
 
-    def _merge_critic_consensus(self, critic_results: List[tuple[str, str]]) -> str:
+    def _merge_critic_consensus(
+        self,
+        critic_results: List[tuple[str, str]],
+        missing: Optional[List[str]] = None,
+    ) -> str:
         """
         Merge feedback from multiple critics into weighted consensus.
 
         Args:
             critic_results: List of (critic_name, response) tuples
+            missing: Critics that were not waited for (quorum/deadline)
 
         Returns:
             Merged consensus feedback with weighted prioritization
@@ -325,6 +570,9 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             issue_count = len(issues)
             consensus_parts.append(f"- {critic_name}: {issue_count} issues found")
 
+        if missing:
+            consensus_parts.append(f"Missing critics (not waited for): {', '.join(missing)}")
+
         return '\n'.join(consensus_parts)
 
     def _select_relevant_critics(self, prompt: str, builder_response: str) -> List[str]:
@@ -342,12 +590,42 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         Returns:
             List of selected critic names (e.g., ["security-critic", "code-quality-critic"])
         """
+        if not self.config.get("dynamic_selection", {}).get("enabled", False):
+            return self._score_critics(prompt, builder_response)[0]
+
+        selected_critics, critic_scores, used_fallback = self._score_critics(prompt, builder_response)
+        if used_fallback:
+            fallback = self.config["dynamic_selection"].get("fallback_critics", ["code-quality-critic"])
+            print(f"⚠️  No keywords matched - using fallback critics: {', '.join(fallback)}")
+
+        # Log selection with scores
+        print(f"🎯 Dynamic critic selection (keyword-based):")
+        for critic in selected_critics:
+            score = critic_scores.get(critic, 0)
+            print(f"   ✓ {critic} (relevance score: {score})")
+
+        skipped = [c for c in critic_scores.keys() if c not in selected_critics]
+        if skipped:
+            print(f"   ✗ Skipped: {', '.join(skipped)} (not relevant)")
+
+        return selected_critics
+
+    def _score_critics(self, prompt: str, builder_response: str) -> Tuple[List[str], Dict[str, int], bool]:
+        """
+        Keyword scoring behind _select_relevant_critics, without logging.
+
+        Also used by estimate_chain, whose dry runs must not print.
+
+        Returns:
+            (selected critic names, relevance score per critic, whether no keyword matched
+            and the fallback critics were used)
+        """
         dynamic_config = self.config.get("dynamic_selection", {})
 
         # If dynamic selection disabled, return all critics
         if not dynamic_config.get("enabled", False):
             multi_critic_config = self.config.get("multi_critic", {})
-            return multi_critic_config.get("critics", [])
+            return list(multi_critic_config.get("critics", [])), {}, False
 
         # Combine prompt and builder response for analysis
         combined_text = f"{prompt}\n{builder_response}".lower()
@@ -372,10 +650,9 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         max_critics = dynamic_config.get("max_critics", 3)
 
         # If no critics selected, use fallback
-        if len(selected_critics) == 0:
-            fallback = dynamic_config.get("fallback_critics", ["code-quality-critic"])
-            selected_critics = fallback
-            print(f"⚠️  No keywords matched - using fallback critics: {', '.join(fallback)}")
+        used_fallback = len(selected_critics) == 0
+        if used_fallback:
+            selected_critics = list(dynamic_config.get("fallback_critics", ["code-quality-critic"]))
 
         # Enforce min_critics
         if len(selected_critics) < min_critics:
@@ -394,30 +671,48 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             selected_with_scores.sort(key=lambda x: x[1], reverse=True)
             selected_critics = [c for c, _ in selected_with_scores[:max_critics]]
 
-        # Log selection with scores
-        print(f"🎯 Dynamic critic selection (keyword-based):")
-        for critic in selected_critics:
-            score = critic_scores.get(critic, 0)
-            print(f"   ✓ {critic} (relevance score: {score})")
-
-        skipped = [c for c in critic_scores.keys() if c not in selected_critics]
-        if skipped:
-            print(f"   ✗ Skipped: {', '.join(skipped)} (not relevant)")
+        return selected_critics, critic_scores, used_fallback
 
-        return selected_critics
-
-    def _run_multi_critic(self, builder_response: str, original_prompt: str) -> tuple[str, List[RunResult]]:
+    @traced("multi_critic")
+    def _run_multi_critic(
+        self,
+        builder_response: str,
+        original_prompt: str,
+        scheduler: Optional[BudgetScheduler] = None,
+        mock_mode: Optional[bool] = None,
+        session_id: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None,
+        compression_mode: Optional[str] = None,
+    ) -> tuple[str, List[RunResult]]:
         """
         Run multiple specialized critics in parallel and merge consensus.
 
+        With multi_critic.quorum enabled, the consensus is built as soon as a
+        quorum of critics (min_critics finished and min_weight_fraction of the
+        selected critics' consensus weight) is in, plus a short grace period, or
+        when deadline_seconds passes. Stragglers are cancelled if they haven't
+        started, otherwise detached: their results are ignored (they still log
+        and store to memory when they finish). Only successful reviews count
+        toward the quorum; if failures leave it unmet (or no critic succeeds),
+        no consensus is returned and the caller falls back to the single critic.
+
         Args:
             builder_response: The builder's output to critique
             original_prompt: Original user prompt for context
+            scheduler: Optional chain budget scheduler (caps number of critics)
+            mock_mode: Optional mock mode override passed to each critic
+            session_id: Optional session ID passed to each critic
+            report: Optional dict filled with the quorum outcome
+                    (completed, failed, missing critics and stop reason)
+            compression_mode: Optional compression mode for the builder output
 
         Returns:
-            Tuple of (consensus_feedback, list of critic RunResults)
+            Tuple of (consensus_feedback, list of critic RunResults). The
+            consensus is empty when multi-critic failed (failed calls are still
+            returned for usage accounting)
         """
         import concurrent.futures
+        import time
 
         # Load multi-critic config
         multi_critic_config = self.config.get("multi_critic", {})
@@ -428,54 +723,242 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         # DYNAMIC CRITIC SELECTION (v0.10.0)
         # Select relevant critics based on prompt content
         critic_names = self._select_relevant_critics(original_prompt, builder_response)
+        if scheduler:
+            critic_names = scheduler.plan_critics(critic_names)
         parallel = multi_critic_config.get("parallel_execution", True)
 
-        print(f"🔍 Running {len(critic_names)} specialized critics in parallel...\n")
+        quorum_config = multi_critic_config.get("quorum", {})
+        quorum_enabled = quorum_config.get("enabled", False)
+        deadline_seconds = quorum_config.get("deadline_seconds") if quorum_enabled else None
+        grace_seconds = quorum_config.get("grace_seconds", 2.0)
+        weights = multi_critic_config.get("consensus", {}).get("weights", {})
+        total_weight = sum(weights.get(name, 1.0) for name in critic_names)
+
+        def quorum_reached(completed: List[str]) -> bool:
+            if not quorum_enabled or not completed:
+                return False
+            min_critics = min(quorum_config.get("min_critics", len(critic_names)), len(critic_names))
+            weight = sum(weights.get(name, 1.0) for name in completed)
+            return (
+                len(completed) >= min_critics
+                and weight >= quorum_config.get("min_weight_fraction", 0.0) * total_weight
+            )
 
         # Prepare critic context
-        compression_threshold = 1200
-        response_text = builder_response
-        if len(response_text) > compression_threshold:
-            compressed = self._compress_semantic(response_text, max_tokens=500)
-            response_text = f"{compressed}\n\n[Note: Above is structured summary preserving all key decisions and specs]"
+        response_text = self._handoff_text(
+            builder_response, critic_names, original_prompt, 1200, scheduler, compression_mode
+        )
 
         critic_context = f"Original request: {original_prompt}\n\nBuilder output:\n{response_text}\n\nYour task as critic:"
 
         # Run critics
         critic_results = []
         run_results = []
+        failed = []
+        stop_reason = "all"
+        started = time.monotonic()
+        execution = self._critic_execution_mode(critic_names)
+        separate = critic_names
+
+        if execution == "combined":
+            # One request answering as every persona; critics it didn't answer for run separately
+            print(f"🔍 Running {len(critic_names)} critic personas in one call...\n")
+            for result in self._run_critic_panel(critic_names, critic_context, mock_mode, session_id):
+                critic_results.append((result.agent, result.response))
+                run_results.append(result)
+                print(f"✅ {result.agent} complete ({result.total_tokens} tokens)")
+            separate = [name for name in critic_names if name not in {name for name, _ in critic_results}]
+            if separate:
+                print(f"↪️  No panel review from {', '.join(separate)}; running separately")
+        elif parallel:
+            print(f"🔍 Running {len(critic_names)} specialized critics in parallel...\n")
+
+        if not separate:
+            missing = []
+        elif parallel:
+            # Parallel execution using ThreadPoolExecutor; not a `with` block so
+            # that stragglers can be detached instead of waited for
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(separate))
+            future_to_critic = {
+                executor.submit(bind_context(self.run), critic_name, critic_context, None, mock_mode, session_id): critic_name
+                for critic_name in separate
+            }
+            pending = set(future_to_critic)
+            deadline = started + deadline_seconds if deadline_seconds else None
+            quorum_at = None
 
-        if parallel:
-            # Parallel execution using ThreadPoolExecutor
-            with concurrent.futures.ThreadPoolExecutor(max_workers=len(critic_names)) as executor:
-                future_to_critic = {
-                    executor.submit(self.run, critic_name, critic_context): critic_name
-                    for critic_name in critic_names
-                }
-
-                for future in concurrent.futures.as_completed(future_to_critic):
-                    critic_name = future_to_critic[future]
-                    try:
-                        result = future.result()
-                        critic_results.append((critic_name, result.response))
+            try:
+                while pending:
+                    now = time.monotonic()
+                    if quorum_at is None and quorum_reached([name for name, _ in critic_results]):
+                        quorum_at = now
+                    limits = []
+                    if deadline is not None:
+                        limits.append((deadline - now, "deadline"))
+                    if quorum_at is not None:
+                        limits.append((quorum_at + grace_seconds - now, "quorum"))
+                    timeout, reason = min(limits) if limits else (None, None)
+
+                    if timeout is not None and timeout <= 0:
+                        if critic_results:
+                            stop_reason = reason
+                            break
+                        # Deadline passed with no usable feedback: take the first critic that finishes
+                        deadline = None
+                        quorum_config = {**quorum_config, "min_critics": 1, "min_weight_fraction": 0.0}
+                        grace_seconds = 0.0
+                        continue
+
+                    done, pending = concurrent.futures.wait(
+                        pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        critic_name = future_to_critic[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            failed.append(critic_name)
+                            print(f"❌ {critic_name} failed: {e}")
+                            continue
                         run_results.append(result)
+                        if result.error:
+                            failed.append(critic_name)
+                            print(f"❌ {critic_name} failed: {result.error}")
+                            continue
+                        critic_results.append((critic_name, result.response))
                         print(f"✅ {critic_name} complete ({result.total_tokens} tokens)")
-                    except Exception as e:
-                        print(f"❌ {critic_name} failed: {e}")
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+            missing = [future_to_critic[future] for future in pending]
         else:
-            # Sequential execution
-            for critic_name in critic_names:
+            # Sequential execution (deadline stops starting further critics)
+            missing = []
+            for critic_name in separate:
+                if deadline_seconds and critic_results and time.monotonic() - started >= deadline_seconds:
+                    missing.append(critic_name)
+                    stop_reason = "deadline"
+                    continue
                 print(f"🔍 Running {critic_name}...")
-                result = self.run(critic_name, critic_context, session_id=session_id)
-                critic_results.append((critic_name, result.response))
+                result = self.run(critic_name, critic_context, None, mock_mode, session_id)
                 run_results.append(result)
+                if result.error:
+                    failed.append(critic_name)
+                    print(f"❌ {critic_name} failed: {result.error}")
+                    continue
+                critic_results.append((critic_name, result.response))
                 print(f"✅ {critic_name} complete ({result.total_tokens} tokens)")
 
+        if missing:
+            print(f"⏱️  Consensus without {', '.join(missing)} ({stop_reason} reached)")
+
+        # Failed critics don't vote: without a quorum of successful reviews there is no consensus
+        succeeded = [name for name, _ in critic_results]
+        if not succeeded or (failed and stop_reason == "all" and quorum_enabled and not quorum_reached(succeeded)):
+            stop_reason = "failed"
+            print(f"❌ Multi-critic failed ({len(failed)} of {len(critic_names)} critics failed)")
+
+        if report is not None:
+            report.update({
+                "completed": succeeded,
+                "failed": failed,
+                "missing": missing,
+                "reason": stop_reason,
+                "waited_ms": round((time.monotonic() - started) * 1000, 1),
+                "execution": execution,
+            })
+
+        if stop_reason == "failed":
+            return ("", run_results)
+
         # Merge consensus
-        consensus = self._merge_critic_consensus(critic_results)
+        consensus = self._merge_critic_consensus(critic_results, missing=missing)
 
         return (consensus, run_results)
 
+    def _critic_execution_mode(self, critic_names: List[str]) -> str:
+        """
+        How the selected critics run: "separate" calls or one "combined" panel call.
+
+        multi_critic.execution.mode "auto" combines when the LLM connector is
+        under load: at least auto_in_flight_threshold calls in progress, or a
+        critic's provider limit can't take one call per critic right now.
+        """
+        execution_config = self.config.get("multi_critic", {}).get("execution", {})
+        mode = execution_config.get("mode", "separate")
+        if len(critic_names) < 2 or mode not in ("combined", "auto"):
+            return "separate"
+        if mode == "combined":
+            return "combined"
+
+        if self.connector.in_flight() >= execution_config.get("auto_in_flight_threshold", 6):
+            return "combined"
+        for name in critic_names:
+            provider = self.connector._extract_provider(self.config["agents"][name]["model"])
+            limit = self.connector.provider_limit(provider)
+            if limit is not None and self.connector.in_flight(provider) + len(critic_names) > limit:
+                return "combined"
+        return "separate"
+
+    def _run_critic_panel(
+        self,
+        critic_names: List[str],
+        critic_context: str,
+        mock_mode: Optional[bool] = None,
+        session_id: Optional[str] = None,
+    ) -> List[RunResult]:
+        """
+        One call answering as every critic persona, split into per-critic results.
+
+        The call uses the model, fallbacks and max_tokens of
+        multi_critic.execution.combined_agent. Token usage is split across the
+        critics (prompt evenly, completion by review length); each result's
+        metadata["critic_panel"] holds the combined call's totals.
+
+        Args:
+            critic_names: Selected critics
+            critic_context: Critic prompt (original request + builder output)
+            mock_mode: Optional mock mode override
+            session_id: Optional session ID
+
+        Returns:
+            RunResults for the critics whose section could be parsed (empty if the call failed)
+        """
+        panel_agent = self.config["multi_critic"].get("execution", {}).get("combined_agent", "critic")
+        personas = {name: self.config["agents"][name]["system"] for name in critic_names}
+        combined = self.run(
+            agent=panel_agent,
+            prompt=f"{critic_context}\n\n{panel_instructions(critic_names)}",
+            mock_mode=mock_mode,
+            session_id=session_id,
+            system=build_panel_system(personas),
+        )
+        if combined.error:
+            return []
+
+        sections = parse_panel_response(combined.response, critic_names)
+        names = [name for name in critic_names if name in sections]
+        prompt_tokens = split_usage(combined.prompt_tokens, [1.0] * len(names))
+        completion_tokens = split_usage(combined.completion_tokens, [len(sections[name]) for name in names])
+        panel_info = {
+            "agent": panel_agent,
+            "critics": names,
+            "prompt_tokens": combined.prompt_tokens,
+            "completion_tokens": combined.completion_tokens,
+            "total_tokens": combined.total_tokens,
+        }
+        return [
+            replace(
+                combined,
+                agent=name,
+                response=sections[name],
+                prompt_tokens=p_tokens,
+                completion_tokens=c_tokens,
+                total_tokens=p_tokens + c_tokens,
+                metadata={**(combined.metadata or {}), "critic_panel": panel_info},
+            )
+            for name, p_tokens, c_tokens in zip(names, prompt_tokens, completion_tokens)
+        ]
+
     def route(self, prompt: str) -> str:
         """
         Route prompt to appropriate agent with fallback support.
@@ -486,9 +969,60 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         Returns:
             Agent name (builder, critic, or closer)
         """
+        return self._route_with_source(prompt)[0]
+
+    @traced("router.route")
+    def _route_with_source(self, prompt: str) -> Tuple[str, str]:
+        """
+        Route prompt: decision cache, then local embedding router, then LLM router.
+
+        The local decision is used only when its confidence reaches
+        routing.local.confidence_threshold. Failed or invalid LLM routing
+        defaults to builder and is not cached.
+
+        Returns:
+            Tuple of (agent name, source: "cache", "local", "llm" or "default")
+        """
+        cache = self.router_cache
+        if cache is not None:
+            self._refresh_router_config()
+            cached = cache.get(prompt)
+            if cached:
+                self._count_route("cache")
+                return (cached["agent"], "cache")
+
+        agent, source = None, "llm"
+        router = self.local_router
+        if router is not None:
+            threshold = self.config["routing"]["local"].get("confidence_threshold", 0.6)
+            try:
+                label, confidence = router.predict(prompt)
+                if label and confidence >= threshold:
+                    agent, source = label, "local"
+            except Exception as e:
+                import sys
+                print(f"⚠️  Local routing failed: {e}", file=sys.stderr)
+
+        if agent is None:
+            agent = self._route_llm(prompt)
+        if agent is None:
+            agent, source = "builder", "default"  # Default fallback
+        elif cache is not None:
+            cache.put(prompt, agent, source)
+
+        self._count_route(source)
+        return (agent, source)
+
+    def _route_llm(self, prompt: str) -> Optional[str]:
+        """
+        Route prompt with an LLM call (router agent).
+
+        Returns:
+            Agent name, or None if the router is missing, failed or answered invalidly
+        """
         router_config = self.config["agents"].get("router")
         if not router_config:
-            return "builder"  # Default fallback
+            return None
 
         # Get fallback order for router
         fallback_order = router_config.get("fallback_order", [])
@@ -502,9 +1036,9 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             fallback_order=fallback_order,
         )
 
-        # If router call failed completely, default to builder
+        # If router call failed completely, let caller default to builder
         if response.error:
-            return "builder"
+            return None
 
         # Extract agent name from response
         agent = response.text.strip().lower()
@@ -512,10 +1046,78 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         # Validate agent name
         valid_agents = ["builder", "critic", "closer"]
         if agent not in valid_agents:
-            return "builder"  # Default fallback
+            return None
 
         return agent
 
+    @property
+    def router_cache(self) -> Optional[RouterCache]:
+        """Lazy initialization of the routing decision cache, if enabled."""
+        cache_config = self.config.get("routing", {}).get("cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+
+        if self._router_cache is None:
+            self._router_cache = RouterCache(
+                max_entries=cache_config.get("max_entries", 1000),
+                ttl_seconds=cache_config.get("ttl_seconds", 3600),
+                similarity_threshold=cache_config.get("similarity_threshold"),
+            )
+            self._router_cache.check_fingerprint(config_fingerprint(self.config))
+            self._agents_config_mtime = self._get_agents_config_mtime()
+        return self._router_cache
+
+    @staticmethod
+    def _get_agents_config_mtime() -> Optional[float]:
+        try:
+            return AGENTS_CONFIG_PATH.stat().st_mtime
+        except OSError:
+            return None
+
+    def _refresh_router_config(self) -> None:
+        """
+        Reload router settings if agents.yaml changed on disk.
+
+        Only the router agent and routing section are hot-reloaded; when they
+        differ, cached decisions and the local router model are discarded.
+        """
+        mtime = self._get_agents_config_mtime()
+        if mtime is None or mtime == self._agents_config_mtime:
+            return
+        self._agents_config_mtime = mtime
+
+        try:
+            fresh = load_agents_config()
+        except Exception as e:
+            import sys
+            print(f"⚠️  Failed to reload agents config: {e}", file=sys.stderr)
+            return
+
+        if self._router_cache.check_fingerprint(config_fingerprint(fresh)):
+            self.config["agents"]["router"] = fresh.get("agents", {}).get("router")
+            self.config["routing"] = fresh.get("routing", {})
+            self._local_router = None
+
+    def _count_route(self, source: str) -> None:
+        with self._route_lock:
+            self._route_counts[source] = self._route_counts.get(source, 0) + 1
+
+    def router_stats(self) -> Dict[str, Any]:
+        """
+        Routing statistics since startup.
+
+        Returns:
+            Dict with decisions per source and cache stats (None if cache disabled)
+        """
+        cache = self.router_cache
+        with self._route_lock:
+            decisions = dict(self._route_counts)
+        return {
+            "decisions": decisions,
+            "total": sum(decisions.values()),
+            "cache": cache.stats() if cache is not None else None,
+        }
+
     def run(
         self,
         agent: str,
@@ -523,6 +1125,9 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         override_model: Optional[str] = None,
         mock_mode: Optional[bool] = None,
         session_id: Optional[str] = None,
+        temperature: Optional[float] = None,
+        system: Optional[str] = None,
+        persist: bool = True,
     ) -> RunResult:
         """
         Run agent with prompt and fallback support.
@@ -533,13 +1138,41 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             override_model: Optional model override
             mock_mode: Optional mock mode override (defaults to LLM_MOCK env var)
             session_id: Optional session ID for conversation tracking (v0.11.0+)
+            temperature: Optional sampling temperature override (default: agent config)
+            system: Optional system prompt override (default: agent config)
+            persist: Store the conversation to memory. False keeps the row in
+                     result.memory_record for store_result() (drafts that may be discarded)
 
         Returns:
             RunResult with response and metadata
         """
+        with self._trace_scope("agent.run") as trace:
+            with span("agent.run", agent=agent):
+                result = self._run_agent(
+                    agent, prompt, override_model, mock_mode, session_id, temperature, system, persist
+                )
+        if trace is not None:
+            self._finish_trace(trace, result)
+        return result
+
+    def _run_agent(
+        self,
+        agent: str,
+        prompt: str,
+        override_model: Optional[str],
+        mock_mode: Optional[bool],
+        session_id: Optional[str],
+        temperature: Optional[float] = None,
+        system: Optional[str] = None,
+        persist: bool = True,
+    ) -> RunResult:
+        """Execute one agent call (see run())."""
         # Handle auto-routing
+        tags = []
         if agent == "auto":
-            agent = self.route(prompt)
+            agent, route_source = self._route_with_source(prompt)
+            tags = [ROUTED_TAG, f"router:{route_source}"]
+        annotate(agent=agent, label=f"run {agent}")
 
         # Get agent config
         agent_config = self.config["agents"].get(agent)
@@ -555,7 +1188,8 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             fallback_order = agent_config.get("fallback_order", [])
 
         # Memory context injection (v0.11.0: Dual-context model)
-        system_prompt = agent_config["system"]
+        base_system = system if system is not None else agent_config["system"]
+        system_prompt = base_system
         injected_context_tokens = 0
         context_metadata = {}
 
@@ -564,6 +1198,11 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                 # Get agent-specific memory config
                 agent_memory_config = agent_config.get("memory", {})
 
+                # Previous turns of this session may still be queued for storage
+                if session_id and self.persistence is not None:
+                    with span("persistence.wait_session"):
+                        self.persistence.wait_for_session(session_id)
+
                 # Use ContextAggregator for dual-context retrieval
                 context_text, context_metadata = self.context_aggregator.get_full_context(
                     prompt=prompt,
@@ -574,7 +1213,7 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                 # Inject context if available
                 if context_text:
                     # Inject into system prompt
-                    system_prompt = f"{agent_config['system']}\n\n{context_text}"
+                    system_prompt = f"{base_system}\n\n{context_text}"
 
                     # Total tokens from metadata
                     injected_context_tokens = context_metadata.get('total_context_tokens', 0)
@@ -589,11 +1228,12 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             model=model,
             system=system_prompt,
             user=prompt,
-            temperature=agent_config.get("temperature", 0.2),
+            temperature=temperature if temperature is not None else agent_config.get("temperature", 0.2),
             max_tokens=agent_config.get("max_tokens", 1500),
             fallback_order=fallback_order,
             mock_mode=mock_mode,
         )
+        annotate(model=llm_response.model, total_tokens=llm_response.total_tokens)
 
         # Create log record
         timestamp = datetime.now(timezone.utc).isoformat()
@@ -620,41 +1260,46 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         else:
             log_record["fallback_used"] = False
 
-        # Write log
-        log_file = write_json(log_record)
+        # Write log (write-behind unless persistence is synchronous)
+        if self.persistence is not None:
+            log_file = new_log_path(agent)
+            with span("persistence.enqueue", kind="log"):
+                self.persistence.submit_log(log_record, log_file)
+        else:
+            with span("log.write"):
+                log_file = write_json(log_record)
 
         # Auto-store conversation to memory (if agent has memory enabled)
+        conversation = None
         if agent_config.get("memory_enabled", False) and not llm_response.error:
-            try:
-                self.memory.store_conversation(
-                    prompt=prompt,
-                    response=llm_response.text,
-                    agent=agent,
-                    model=llm_response.model,
-                    provider=llm_response.provider,
-                    session_id=session_id,  # v0.11.0: Pass session_id as parameter
-                    metadata={
-                        "duration_ms": llm_response.duration_ms,
-                        "prompt_tokens": llm_response.prompt_tokens,
-                        "completion_tokens": llm_response.completion_tokens,
-                        "total_tokens": llm_response.total_tokens,
-                        "estimated_cost_usd": llm_response.estimated_cost,
-                        "fallback_used": llm_response.original_model is not None,
-                        "original_model": llm_response.original_model,
-                        "fallback_reason": llm_response.fallback_reason,
-                        "injected_context_tokens": injected_context_tokens,
-                        # v0.11.0: Add context metadata
-                        "session_context_tokens": context_metadata.get('session_context_tokens', 0),
-                        "knowledge_context_tokens": context_metadata.get('knowledge_context_tokens', 0),
-                        "session_messages": context_metadata.get('session_messages', 0),
-                        "knowledge_messages": context_metadata.get('knowledge_messages', 0),
-                    },
-                )
-            except Exception as e:
-                # If memory storage fails, continue (graceful degradation)
-                # Log the error for debugging
-                import sys
-                print(f"⚠️  Memory storage failed: {e}", file=sys.stderr)
+            conversation = {
+                "prompt": prompt,
+                "response": llm_response.text,
+                "agent": agent,
+                "model": llm_response.model,
+                "provider": llm_response.provider,
+                "session_id": session_id,  # v0.11.0: Pass session_id as parameter
+                "metadata": {
+                    "duration_ms": llm_response.duration_ms,
+                    "prompt_tokens": llm_response.prompt_tokens,
+                    "completion_tokens": llm_response.completion_tokens,
+                    "total_tokens": llm_response.total_tokens,
+                    "estimated_cost_usd": llm_response.estimated_cost,
+                    "fallback_used": llm_response.original_model is not None,
+                    "original_model": llm_response.original_model,
+                    "fallback_reason": llm_response.fallback_reason,
+                    "injected_context_tokens": injected_context_tokens,
+                    # v0.11.0: Add context metadata
+                    "session_context_tokens": context_metadata.get('session_context_tokens', 0),
+                    "knowledge_context_tokens": context_metadata.get('knowledge_context_tokens', 0),
+                    "session_messages": context_metadata.get('session_messages', 0),
+                    "knowledge_messages": context_metadata.get('knowledge_messages', 0),
+                    "tags": tags,
+                },
+            }
+            if persist:
+                self._store_memory(conversation)
+                conversation = None
 
         # Create result
         result = RunResult(
@@ -674,10 +1319,38 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             fallback_reason=llm_response.fallback_reason,
             fallback_used=llm_response.original_model is not None,
             injected_context_tokens=injected_context_tokens,
+            memory_record=conversation,
         )
 
         return result
 
+    def _store_memory(self, conversation: Dict[str, Any]) -> None:
+        """Store (or queue) one memory row; failures are logged, not raised."""
+        try:
+            if self.persistence is not None:
+                with span("persistence.enqueue", kind="memory"):
+                    self.persistence.submit_memory(conversation)
+            else:
+                self.memory.store_conversation(**conversation)
+        except Exception as e:
+            # If memory storage fails, continue (graceful degradation)
+            # Log the error for debugging
+            import sys
+            print(f"⚠️  Memory storage failed: {e}", file=sys.stderr)
+
+    def store_result(self, result: RunResult, **overrides: Any) -> None:
+        """
+        Store the memory row of a run made with persist=False.
+
+        Args:
+            result: Result holding the unstored row (no-op if there is none)
+            **overrides: Row fields to replace (e.g. prompt, response)
+        """
+        if result.memory_record is None:
+            return
+        self._store_memory({**result.memory_record, **overrides})
+        result.memory_record = None
+
     def chain(
         self,
         prompt: str,
@@ -686,6 +1359,11 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         enable_refinement: Optional[bool] = None,
         mock_mode: Optional[bool] = None,
         session_id: Optional[str] = None,
+        budget: Optional[ChainBudget] = None,
+        trace: Optional[bool] = None,
+        speculative: Optional[int] = None,
+        compression_mode: Optional[str] = None,
+        coalesce: Optional[bool] = None,
     ) -> List[RunResult]:
         """
         Execute multi-agent chain with optional single-iteration refinement.
@@ -697,13 +1375,161 @@ ORIGINAL OUTPUT TO SUMMARIZE:
             enable_refinement: If True, allows builder to refine based on critical issues (default: from config)
             mock_mode: Optional mock mode override (defaults to LLM_MOCK env var)
             session_id: Optional session ID for conversation tracking (v0.11.0+)
+            budget: Optional token/cost/time budget. Optional work (extra critics,
+                    refinement iterations, LLM compression) is scheduled to fit it;
+                    each stage result reports its consumption in metadata["budget"]
+            trace: Record tracing spans for this chain (default: tracing.enabled in
+                   agents.yaml or TRACE env var). The span summary is attached to
+                   the last result's metadata["trace"]
+            speculative: Number of concurrent builder candidates scored by critics
+                         (0/1 = iterative refinement; default: speculative section
+                         of agents.yaml). The best candidate gets at most
+                         speculative.max_refinement_passes refinement passes
+            compression_mode: How long outputs are compressed between stages:
+                              "llm", "extractive" (local, no LLM call) or "auto"
+                              (default: compression.mode in agents.yaml)
+            coalesce: Share results with identical session-less chains (default:
+                      coalescing.enabled in agents.yaml; False always executes)
 
         Returns:
-            List of RunResults from each stage
+            List of RunResults from each stage. With coalescing, session-less
+            duplicates of a chain that is running (or just finished) share its
+            results; their last result carries metadata["coalesced"]
+        """
+        coalescer = self.chain_coalescer if session_id is None and coalesce is not False else None
+        if coalescer is None:
+            return self._traced_chain(
+                prompt, stages, progress_callback, enable_refinement, mock_mode, session_id, budget, trace,
+                speculative, compression_mode,
+            )
+
+        key = chain_request_key(
+            prompt,
+            stages or ["builder", "critic", "closer"],
+            enable_refinement,
+            mock_mode,
+            budget.to_dict() if budget is not None else None,
+            speculative,
+            compression_mode,
+        )
+        results, source = coalescer.do(
+            key,
+            lambda: self._traced_chain(
+                prompt, stages, progress_callback, enable_refinement, mock_mode, session_id, budget, trace,
+                speculative, compression_mode,
+            ),
+            cacheable=lambda rs: bool(rs) and not any(r.error for r in rs),
+        )
+        if source == "executed":
+            return results
+
+        # Duplicates get their own copies (callers may annotate results)
+        shared = copy.deepcopy(results)
+        if shared:
+            self._attach_metadata(shared[-1], "coalesced", {"source": source, "key": key[:16]})
+        return shared
+
+    def estimate_chain(
+        self,
+        prompt: str,
+        stages: Optional[List[str]] = None,
+        simulations: int = 2000,
+    ) -> Dict[str, Any]:
+        """
+        Dry-run estimate of a chain's latency, tokens and cost (no LLM calls).
+
+        Uses each agent's recent conversations (token and latency distributions,
+        fallback and error rates) and the share of recent critiques with
+        critical issues as the refinement trigger rate. Agents without enough
+        history fall back to agents.yaml defaults with a wide spread.
+
+        Args:
+            prompt: Prompt the chain would run (selects the specialized critics)
+            stages: Chain stages (default: builder, critic, closer)
+            simulations: Number of simulated runs
+
+        Returns:
+            Estimate dict: latency_ms (critical path), tokens and cost_usd as
+            mean/p50/p5/p95, per-stage breakdown, refinement and agent profiles
         """
         if stages is None:
             stages = ["builder", "critic", "closer"]
 
+        critic_names: List[str] = []
+        if "critic" in stages and self.config.get("multi_critic", {}).get("enabled", False):
+            critic_names = self._score_critics(prompt, "")[0]  # Same selection, no log output
+
+        try:
+            samples = self.memory.get_agent_samples()
+            critiques = self.memory.get_recent_responses(["critic", *critic_names])
+        except Exception:
+            samples, critiques = {}, []
+
+        refinement_rate = None
+        if len(critiques) >= MIN_SAMPLES:
+            min_issues = self.config.get("refinement", {}).get("min_critical_issues", 1)
+            refinement_rate = sum(self._count_critical_issues(c) >= min_issues for c in critiques) / len(critiques)
+
+        estimate = ChainEstimator(self.config, samples, refinement_rate, simulations).estimate(stages, critic_names)
+        estimate["prompt_tokens"] = count_tokens(prompt)
+        return estimate
+
+    @property
+    def chain_coalescer(self) -> Optional[SingleFlight]:
+        """Lazy initialization of chain request coalescing, if enabled."""
+        coalescing_config = self.config.get("coalescing", {})
+        if not coalescing_config.get("enabled", False):
+            return None
+
+        if self._chain_coalescer is None:
+            with self._route_lock:
+                if self._chain_coalescer is None:
+                    self._chain_coalescer = SingleFlight(
+                        ttl_seconds=coalescing_config.get("result_ttl_seconds", 30),
+                        max_entries=coalescing_config.get("max_entries", 100),
+                    )
+        return self._chain_coalescer
+
+    def _traced_chain(
+        self,
+        prompt: str,
+        stages: Optional[List[str]],
+        progress_callback,
+        enable_refinement: Optional[bool],
+        mock_mode: Optional[bool],
+        session_id: Optional[str],
+        budget: Optional[ChainBudget],
+        trace: Optional[bool],
+        speculative: Optional[int] = None,
+        compression_mode: Optional[str] = None,
+    ) -> List[RunResult]:
+        """Execute the chain inside a trace scope (see chain())."""
+        with self._trace_scope("chain", trace) as active_trace:
+            with span("chain", stages=",".join(stages or ["builder", "critic", "closer"])):
+                results = self._run_chain(
+                    prompt, stages, progress_callback, enable_refinement, mock_mode, session_id, budget, speculative,
+                    compression_mode,
+                )
+        if active_trace is not None and results:
+            self._finish_trace(active_trace, results[-1])
+        return results
+
+    def _run_chain(
+        self,
+        prompt: str,
+        stages: Optional[List[str]],
+        progress_callback,
+        enable_refinement: Optional[bool],
+        mock_mode: Optional[bool],
+        session_id: Optional[str],
+        budget: Optional[ChainBudget],
+        speculative: Optional[int] = None,
+        compression_mode: Optional[str] = None,
+    ) -> List[RunResult]:
+        """Execute the chain stages (see chain())."""
+        if stages is None:
+            stages = ["builder", "critic", "closer"]
+
         # Load refinement setting from config if not explicitly provided
         if enable_refinement is None:
             refinement_config = self.config.get("refinement", {})
@@ -713,18 +1539,53 @@ ORIGINAL OUTPUT TO SUMMARIZE:
         context = prompt
         refinement_triggered = False
 
+        # Budget scheduler (uses historical per-agent averages from memory)
+        scheduler = None
+        if budget is not None and budget.is_limited():
+            try:
+                agent_stats = self.memory.get_agent_averages()
+            except Exception:
+                agent_stats = {}
+            scheduler = BudgetScheduler(budget, agent_stats, self.config)
+
+        # Speculative builder candidates (replace builder -> critic -> builder-v2 ... rounds)
+        speculative_config = self.config.get("speculative", {})
+        if speculative is None:
+            speculative = speculative_config.get("candidates", 3) if speculative_config.get("enabled", False) else 0
+        skip_stage = None
+        max_iterations_override = None
+
         for i, agent in enumerate(stages):
+            if i == skip_stage:
+                continue  # Critic stage already covered by the candidates' reviews
+            stage_calls = None
+            packing_report = None
+
             # Report progress if callback provided
             if progress_callback:
                 progress_callback(i + 1, len(stages), agent)
 
+            if scheduler:
+                scheduler.begin_stage(stages, i)
+
             # For stages after the first, add context from previous
             if i > 0:
                 agent_cfg = self.config["agents"].get(agent, {})
                 has_memory = agent_cfg.get("memory_enabled", False)
 
                 # Special handling for closer: needs ALL previous stages
-                if agent == "closer":
+                if agent == "closer" and self.config.get("context_packing", {}).get("enabled", False):
+                    # Closer sees every stage, packed into its token budget by importance
+                    sections = self._handoff_sections(results)
+                    texts, packing_report = self._pack_handoff(
+                        [agent], prompt, sections, scheduler, compression_mode
+                    )
+                    context = f"Original request: {prompt}\n\n"
+                    for prev, response_text in zip(results, texts):
+                        context += f"=== {prev.agent.upper()} OUTPUT ===\n{response_text}\n\n"
+                    context += f"Your task as {agent}: Synthesize all above outputs into a coherent final plan."
+
+                elif agent == "closer":
                     # Closer sees full conversation history for synthesis
                     context = f"Original request: {prompt}\n\n"
 
@@ -735,7 +1596,9 @@ ORIGINAL OUTPUT TO SUMMARIZE:
 
                         if len(response_text) > compression_threshold:
                             # Semantic compression preserves meaning while reducing tokens
-                            compressed = self._compress_semantic(response_text, max_tokens=500)
+                            compressed = self._compress_semantic(
+                                response_text, max_tokens=500, scheduler=scheduler, mode=compression_mode
+                            )
                             response_text = f"{compressed}\n\n[Note: Above is structured summary. Full output: {len(response_text)} chars]"
 
                         context += f"=== {prev.agent.upper()} OUTPUT ===\n{response_text}\n\n"
@@ -746,25 +1609,39 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                     # Standard sequential: critic sees builder, etc.
                     prev_result = results[-1]
 
-                    # Semantic compression threshold
+                    # Token-budgeted packing, or the legacy semantic compression threshold:
                     # Memory-enabled agents: 800 chars (they have historical context)
                     # Non-memory agents: 1200 chars (need more immediate context)
                     compression_threshold = 1200 if not has_memory else 800
-
-                    response_text = prev_result.response
-
-                    if len(response_text) > compression_threshold:
-                        # Use semantic compression to preserve all key information
-                        compressed = self._compress_semantic(response_text, max_tokens=500)
-                        response_text = f"{compressed}\n\n[Note: Above is structured summary preserving all key decisions and specs]"
+                    packing_report = {}
+                    response_text = self._handoff_text(
+                        prev_result.response, [agent], prompt, compression_threshold,
+                        scheduler, compression_mode, report=packing_report,
+                    )
 
                     summary = f"Previous {prev_result.agent} output:\n{response_text}"
                     context = (
                         f"Original request: {prompt}\n\n{summary}\n\nYour task as {agent}:"
                     )
 
+            # SPECULATIVE BUILDER: N candidates built and reviewed concurrently, best one proceeds
+            if speculative > 1 and agent == "builder" and i + 1 < len(stages) and stages[i + 1] == "critic":
+                best, review, builder_calls, critic_calls = self._run_speculative_builder(
+                    prompt, context, speculative, mock_mode=mock_mode, session_id=session_id, scheduler=scheduler,
+                    compression_mode=compression_mode,
+                )
+                if review is not None:
+                    results.append(best)
+                    if scheduler:
+                        self._attach_metadata(best, "budget", scheduler.record(agent, builder_calls))
+                    result, agent, stage_calls = review, "critic", critic_calls
+                    skip_stage = i + 1
+                    max_iterations_override = speculative_config.get("max_refinement_passes", 1)
+                else:
+                    result, stage_calls = best, builder_calls
+
             # MULTI-CRITIC EXECUTION: Replace single critic with parallel multi-critic consensus
-            if agent == "critic":
+            elif agent == "critic":
                 # Check if multi-critic is enabled
                 multi_critic_config = self.config.get("multi_critic", {})
                 if multi_critic_config.get("enabled", False):
@@ -772,11 +1649,20 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                     builder_result = results[-1] if results else None
                     if builder_result and builder_result.agent == "builder":
                         # Run multi-critic consensus
-                        consensus, critic_run_results = self._run_multi_critic(builder_result.response, prompt)
+                        quorum_report: Dict[str, Any] = {}
+                        consensus, critic_run_results = self._run_multi_critic(
+                            builder_result.response,
+                            prompt,
+                            scheduler=scheduler,
+                            mock_mode=mock_mode,
+                            session_id=session_id,
+                            report=quorum_report,
+                            compression_mode=compression_mode,
+                        )
 
                         # Create synthetic result for consensus (for compatibility with existing flow)
                         # Use the first critic's metadata but with consensus response
-                        if critic_run_results:
+                        if consensus:
                             first_critic = critic_run_results[0]
                             result = RunResult(
                                 agent="multi-critic",
@@ -784,18 +1670,22 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                                 provider="multi",
                                 prompt=context,
                                 response=consensus,
-                                duration_ms=sum(r.duration_ms for r in critic_run_results),
+                                duration_ms=quorum_report.get("waited_ms", 0.0),  # Critics ran concurrently
                                 prompt_tokens=sum(r.prompt_tokens for r in critic_run_results),
                                 completion_tokens=sum(r.completion_tokens for r in critic_run_results),
                                 total_tokens=sum(r.total_tokens for r in critic_run_results),
                                 timestamp=first_critic.timestamp,
                                 log_file="multi-critic-consensus",
                             )
+                            self._attach_metadata(result, "quorum", quorum_report)
                             # Store all critic results
                             results.extend(critic_run_results)
+                            # Budget the real critic calls, not the synthetic consensus model
+                            stage_calls = critic_run_results
                         else:
                             # Fallback to single critic if multi-critic failed
                             result = self.run(agent=agent, prompt=context, mock_mode=mock_mode, session_id=session_id)
+                            stage_calls = critic_run_results + [result]
                     else:
                         # No builder result, use single critic
                         result = self.run(agent=agent, prompt=context, mock_mode=mock_mode, session_id=session_id)
@@ -807,6 +1697,13 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                 result = self.run(agent=agent, prompt=context, mock_mode=mock_mode, session_id=session_id)
 
             results.append(result)
+            if scheduler:
+                self._attach_metadata(result, "budget", scheduler.record(
+                    agent, stage_calls or [result],
+                    duration_ms=result.duration_ms if result.agent == "multi-critic" else None,
+                ))
+            if packing_report:
+                self._attach_metadata(result, "context_packing", packing_report)
 
             # MULTI-ITERATION REFINEMENT: After critic/multi-critic stage, iteratively refine until convergence
             if enable_refinement and result.agent in ["critic", "multi-critic"] and not refinement_triggered:
@@ -818,6 +1715,8 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                     # Load max_iterations from config
                     refinement_config = self.config.get("refinement", {})
                     max_iterations = refinement_config.get("max_iterations", 3)
+                    if max_iterations_override is not None:
+                        max_iterations = max_iterations_override
 
                     # Track iterations
                     iteration = 1
@@ -836,28 +1735,17 @@ ORIGINAL OUTPUT TO SUMMARIZE:
                                 print(f"✅ Convergence achieved after {iteration-1} iteration(s): {convergence_reason}\n")
                                 break
 
+                        # Budget gate: stop refining if another round doesn't fit
+                        if scheduler and not scheduler.allow_refinement(iteration):
+                            print(f"💰 Budget exhausted - skipping refinement iteration {iteration}\n")
+                            break
+
                         # Store current issues for next iteration
                         previous_issues = critical_issues
 
-                        # Find the most recent builder result
-                        builder_index = -2 if iteration == 1 else -1  # First iteration: before critic, later: last result
+                        # Find the most recent builder result (and the first, full-length one)
+                        builder_results = [r for r in results if r.agent == "builder"]
                         if len(results) >= 2:
-                            # Create refinement prompt for builder
-                            refine_prompt = f"""Original request: {prompt}
-
-Your previous solution had the following CRITICAL ISSUES identified by the critic (iteration {iteration}):
-
-{critical_issues}
-
-Please provide an IMPROVED version of your solution that addresses these critical issues.
-Focus on:
-1. Fixing technical errors
-2. Addressing security concerns
-3. Resolving missing components
-4. Correcting incorrect implementations
-
-Provide a complete, refined solution."""
-
                             # Report progress if callback provided
                             builder_label = f"builder-v{iteration+1}"
                             if progress_callback:
@@ -865,9 +1753,23 @@ Provide a complete, refined solution."""
 
                             print(f"🔄 Iteration {iteration}/{max_iterations}: Running {builder_label}...")
 
-                            # Run builder again with refinement prompt
-                            refined_result = self.run(agent="builder", prompt=refine_prompt, session_id=session_id)
+                            # Run builder again with refinement prompt (edits or full regeneration)
+                            refined_result, builder_calls = self._refine_builder(
+                                prompt,
+                                critical_issues,
+                                iteration,
+                                previous=builder_results[-1] if builder_results else None,
+                                baseline=builder_results[0] if builder_results else None,
+                                mock_mode=mock_mode,
+                                session_id=session_id,
+                            )
                             results.append(refined_result)
+                            if scheduler:
+                                self._attach_metadata(refined_result, "budget", scheduler.record(builder_label, builder_calls))
+
+                            if refined_result.error:
+                                print(f"❌ {builder_label} failed: {refined_result.error} - stopping refinement\n")
+                                break
 
                             print(f"✅ {builder_label} complete ({refined_result.total_tokens} tokens)\n")
 
@@ -879,10 +1781,10 @@ Provide a complete, refined solution."""
                             has_critic_memory = critic_cfg.get("memory_enabled", False)
                             compression_threshold = 1200 if not has_critic_memory else 800
 
-                            response_text = refined_result.response
-                            if len(response_text) > compression_threshold:
-                                compressed = self._compress_semantic(response_text, max_tokens=500)
-                                response_text = f"{compressed}\n\n[Note: Above is structured summary preserving all key decisions and specs]"
+                            response_text = self._handoff_text(
+                                refined_result.response, ["critic"], prompt, compression_threshold,
+                                scheduler, compression_mode,
+                            )
 
                             critic_context = f"Original request: {prompt}\n\nPrevious builder output (iteration {iteration+1}):\n{response_text}\n\nYour task as critic:"
 
@@ -892,8 +1794,17 @@ Provide a complete, refined solution."""
                             print(f"🔄 Iteration {iteration}/{max_iterations}: Running {critic_label}...")
 
                             # Run critic on refined output
-                            critic_result = self.run(agent="critic", prompt=critic_context, session_id=session_id)
+                            critic_result = self.run(
+                                agent="critic", prompt=critic_context, mock_mode=mock_mode, session_id=session_id
+                            )
                             results.append(critic_result)
+                            if scheduler:
+                                self._attach_metadata(critic_result, "budget", scheduler.record(critic_label, [critic_result]))
+
+                            if critic_result.error:
+                                # A failed review says nothing about the refined output
+                                print(f"❌ {critic_label} failed: {critic_result.error} - stopping refinement\n")
+                                break
 
                             # Extract issues from new critic response
                             critical_issues = self._extract_critical_issues(critic_result.response)
@@ -912,4 +1823,296 @@ Provide a complete, refined solution."""
                     if iteration > max_iterations and not converged:
                         print(f"⏹️  Max iterations ({max_iterations}) reached - stopping refinement\n")
 
+        if scheduler and results:
+            self._attach_metadata(results[-1], "budget_report", scheduler.report())
+
         return results
+
+    def _speculative_variants(self, candidates: int) -> List[Tuple[Optional[str], Optional[float]]]:
+        """
+        (model, temperature) per builder candidate.
+
+        Explicit speculative.variants win; otherwise models cycle through the
+        builder's model (None: keeps its fallback order) and fallback_order,
+        and temperatures cycle through speculative.temperatures.
+        """
+        speculative_config = self.config.get("speculative", {})
+        explicit = speculative_config.get("variants")
+        if explicit:
+            return [(v.get("model"), v.get("temperature")) for v in explicit[:candidates]]
+
+        builder_config = self.config["agents"]["builder"]
+        models: List[Optional[str]] = [None]
+        if speculative_config.get("use_fallback_models", True):
+            models += builder_config.get("fallback_order", [])
+        temperatures = speculative_config.get("temperatures") or [builder_config.get("temperature", 0.2)]
+        return [(models[k % len(models)], temperatures[k % len(temperatures)]) for k in range(candidates)]
+
+    def _critic_context(
+        self,
+        prompt: str,
+        builder_response: str,
+        scheduler: Optional[BudgetScheduler] = None,
+        compression_mode: Optional[str] = None,
+    ) -> str:
+        """Critic stage prompt for a builder output (same format as the chain's critic stage)."""
+        has_memory = self.config["agents"].get("critic", {}).get("memory_enabled", False)
+        compression_threshold = 1200 if not has_memory else 800
+
+        response_text = self._handoff_text(
+            builder_response, ["critic"], prompt, compression_threshold, scheduler, compression_mode
+        )
+        return f"Original request: {prompt}\n\nPrevious builder output:\n{response_text}\n\nYour task as critic:"
+
+    def _count_critical_issues(self, critique_text: str) -> int:
+        """Number of critique lines flagged as critical (keywords or Issue N: headers)."""
+        critical_keywords = self.config.get("refinement", {}).get("critical_keywords", [])
+        flagged = uppercase_keyword_lines(critique_text, critical_keywords)
+        return len(flagged | issue_header_lines(critique_text))
+
+    @traced("speculative")
+    def _run_speculative_builder(
+        self,
+        prompt: str,
+        context: str,
+        candidates: int,
+        mock_mode: Optional[bool] = None,
+        session_id: Optional[str] = None,
+        scheduler: Optional[BudgetScheduler] = None,
+        compression_mode: Optional[str] = None,
+    ) -> Tuple[RunResult, Optional[RunResult], List[RunResult], List[RunResult]]:
+        """
+        Build candidates concurrently, review each with the critic, keep the best.
+
+        Each candidate runs builder -> critic in its own thread, so the stage
+        takes one builder + critic latency instead of one per refinement round.
+        The candidate whose review flags the fewest critical lines wins (ties:
+        earlier candidate). Cost and wall-clock versus an iterative round are
+        reported in the winner's metadata["speculative"]. Only the winner and
+        its review are stored to memory; losing drafts are discarded.
+
+        Args:
+            prompt: Original user prompt
+            context: Builder stage prompt
+            candidates: Number of candidates
+            mock_mode: Optional mock mode override
+            session_id: Optional session ID
+            scheduler: Optional chain budget scheduler
+            compression_mode: Optional compression mode for the critic prompts
+
+        Returns:
+            Tuple of (best builder result, its review or None if every candidate
+            failed, all builder calls, all critic calls)
+        """
+        import concurrent.futures
+        import time
+
+        variants = self._speculative_variants(candidates)
+        print(f"🎲 Building {len(variants)} candidates in parallel...\n")
+
+        def build_and_review(model: Optional[str], temperature: Optional[float]):
+            builder = self.run(
+                agent="builder", prompt=context, override_model=model, mock_mode=mock_mode,
+                session_id=session_id, temperature=temperature, persist=False,
+            )
+            if builder.error:
+                return builder, None
+            review = self.run(
+                agent="critic", prompt=self._critic_context(prompt, builder.response, scheduler, compression_mode),
+                mock_mode=mock_mode, session_id=session_id, persist=False,
+            )
+            return builder, review
+
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(variants)) as executor:
+            futures = [executor.submit(bind_context(build_and_review), model, temp) for model, temp in variants]
+            outcomes = [future.result() for future in futures]
+        wall_clock_ms = (time.perf_counter() - started) * 1000
+
+        scored = []
+        for index, ((model, temperature), (builder, review)) in enumerate(zip(variants, outcomes)):
+            usable = review is not None and not review.error
+            issues = self._count_critical_issues(review.response) if usable else None
+            scored.append({
+                "index": index,
+                "model": builder.model if not builder.error else (model or "default"),
+                "temperature": temperature,
+                "issues": issues,
+                "builder_tokens": builder.total_tokens,
+                "critic_tokens": review.total_tokens if review is not None else 0,
+                "builder_ms": builder.duration_ms,
+                "critic_ms": review.duration_ms if review is not None else 0.0,
+                "error": builder.error or (review.error if review is not None else None),
+            })
+
+        ranked = sorted(scored, key=lambda c: (c["issues"] is None, c["issues"] or 0, c["index"]))
+        best_index = ranked[0]["index"]
+        best, review = outcomes[best_index]
+        if review is not None and review.error:
+            review = None
+        for candidate in scored:
+            candidate["chosen"] = candidate["index"] == best_index
+
+        self.store_result(best)
+        if review is not None:
+            self.store_result(review)
+
+        builder_calls = [builder for builder, _ in outcomes]
+        critic_calls = [r for _, r in outcomes if r is not None]
+
+        # One builder -> critic round of iterative refinement, from the primary candidate
+        primary = scored[0]
+        round_ms = primary["builder_ms"] + primary["critic_ms"]
+        round_tokens = primary["builder_tokens"] + primary["critic_tokens"]
+        rounds = 2 if primary["issues"] else 1  # Issues found: at least one more round
+        self._attach_metadata(best, "speculative", {
+            "candidates": scored,
+            "wall_clock_ms": round(wall_clock_ms, 1),
+            "total_tokens": sum(r.total_tokens for r in builder_calls + critic_calls),
+            "iterative_estimate": {
+                "rounds": rounds,
+                "wall_clock_ms": round(round_ms * rounds, 1),
+                "total_tokens": round_tokens * rounds,
+            },
+        })
+
+        if review is not None:
+            print(f"🏆 Candidate {best_index + 1}/{len(variants)} selected ({scored[best_index]['issues']} critical lines)\n")
+        return best, review, builder_calls, critic_calls
+
+    def _refine_builder(
+        self,
+        prompt: str,
+        critical_issues: str,
+        iteration: int,
+        previous: Optional[RunResult] = None,
+        baseline: Optional[RunResult] = None,
+        mock_mode: Optional[bool] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[RunResult, List[RunResult]]:
+        """
+        Run one builder refinement iteration.
+
+        With refinement.mode "patch", the builder answers with SEARCH/REPLACE
+        edits against its previous solution, which are applied locally
+        (core/patching.py). If the edits don't apply, the solution is
+        regenerated in full; a response without edit blocks is used as a full
+        solution. Completion-token savings are reported in metadata["refinement"].
+
+        Args:
+            prompt: Original user prompt
+            critical_issues: Issues extracted from the critic's review
+            iteration: Refinement iteration (1-based)
+            previous: Most recent builder result (the solution being patched)
+            baseline: First builder result (full generation, for the savings estimate)
+            mock_mode: Optional mock mode override
+            session_id: Optional session ID
+
+        Returns:
+            Tuple of (refined result with the full solution text, all builder calls made)
+        """
+        full_prompt = f"""Original request: {prompt}
+
+Your previous solution had the following CRITICAL ISSUES identified by the critic (iteration {iteration}):
+
+{critical_issues}
+
+Please provide an IMPROVED version of your solution that addresses these critical issues.
+Focus on:
+1. Fixing technical errors
+2. Addressing security concerns
+3. Resolving missing components
+4. Correcting incorrect implementations
+
+Provide a complete, refined solution."""
+
+        mode = self.config.get("refinement", {}).get("mode", "full")
+        if mode != "patch" or previous is None or previous.error or not previous.response:
+            result = self.run(agent="builder", prompt=full_prompt, mock_mode=mock_mode, session_id=session_id)
+            return result, [result]
+
+        patch_prompt = f"""Original request: {prompt}
+
+Your previous solution:
+{previous.response}
+
+The critic identified the following CRITICAL ISSUES (iteration {iteration}):
+
+{critical_issues}
+
+Fix these issues (technical errors, security concerns, missing components, incorrect implementations).
+
+{PATCH_INSTRUCTIONS}"""
+
+        # Stored once the edits are applied, so memory holds the solution, not edit blocks
+        patch_result = self.run(
+            agent="builder", prompt=patch_prompt, mock_mode=mock_mode, session_id=session_id, persist=False
+        )
+        if patch_result.error:
+            return patch_result, [patch_result]
+
+        blocks = parse_edit_blocks(patch_result.response)
+        if not blocks:
+            # Builder ignored the edit format and answered with a full solution
+            self.store_result(patch_result, prompt=full_prompt)
+            self._attach_metadata(patch_result, "refinement", {"mode": "full_response"})
+            return patch_result, [patch_result]
+
+        try:
+            patched = apply_edit_blocks(previous.response, blocks)
+        except PatchError as e:
+            print(f"⚠️  Builder edits did not apply ({e}) - regenerating full solution")
+            result = self.run(agent="builder", prompt=full_prompt, mock_mode=mock_mode, session_id=session_id)
+            self._attach_metadata(result, "refinement", {
+                "mode": "full",
+                "patch_error": str(e),
+                "patch_completion_tokens": patch_result.completion_tokens,
+            })
+            return result, [patch_result, result]
+
+        # What a full regeneration would have cost, at the first builder output's tokens per char
+        reference = baseline if baseline is not None and baseline.response else previous
+        estimated_full = round(reference.completion_tokens * len(patched) / max(len(reference.response), 1))
+
+        refined = replace(patch_result, response=patched)
+        self.store_result(refined, prompt=full_prompt, response=patched)
+        self._attach_metadata(refined, "refinement", {
+            "mode": "patch",
+            "edits": len(blocks),
+            "completion_tokens": patch_result.completion_tokens,
+            "estimated_full_completion_tokens": estimated_full,
+            "saved_completion_tokens": max(0, estimated_full - patch_result.completion_tokens),
+        })
+        return refined, [refined]
+
+    def _trace_scope(self, name: str, enabled: Optional[bool] = None):
+        """
+        Start a trace for a top-level run/chain.
+
+        Nested calls (runs inside a traced chain) join the active trace instead.
+
+        Returns:
+            Trace context manager, or nullcontext() when tracing is off
+        """
+        if current_trace() is not None:
+            return nullcontext()
+        if enabled is None:
+            enabled = tracing_requested(self.config.get("tracing"))
+        return Trace(name) if enabled else nullcontext()
+
+    def _finish_trace(self, trace: Trace, result: RunResult) -> None:
+        """Export the trace (if configured) and attach its summary to result.metadata["trace"]."""
+        tracing_config = self.config.get("tracing", {})
+        if tracing_config.get("export", True):
+            try:
+                export_dir = tracing_config.get("export_dir")
+                trace.export(BASE_DIR / export_dir if export_dir else None)
+            except OSError as e:
+                import sys
+                print(f"⚠️  Trace export failed: {e}", file=sys.stderr)
+        self._attach_metadata(result, "trace", trace.summary())
+
+    @staticmethod
+    def _attach_metadata(result: RunResult, key: str, value: Any) -> None:
+        """Add a chain-level annotation to a result's metadata."""
+        result.metadata = {**(result.metadata or {}), key: value}
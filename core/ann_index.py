@@ -0,0 +1,258 @@
+"""
+IVF-flat approximate nearest-neighbour index for conversation embeddings.
+
+An exact VectorIndex query multiplies the query with every stored row. At a
+few hundred thousand conversations that scan dominates context injection.
+IVF-flat partitions the (unit-normalized) rows into ``n_lists`` clusters with
+spherical k-means; a query is compared with the centroids first and only the
+rows of the ``n_probe`` closest clusters are scored exactly. ``n_probe`` is
+the recall/latency knob: more lists probed = higher recall, slower queries.
+
+The index stores row numbers of the VectorIndex matrix, not vectors:
+
+- inserts are assigned to their nearest centroid (no retraining)
+- deletes are tombstoned by the VectorIndex and skipped at query time
+- needs_rebuild() reports when growth or deletes since training make the
+  clusters stale; MemoryEngine then retrains in a background thread
+
+Centroids and list assignments persist next to the database
+(``conversations.ivf.npz``), so restarts don't retrain.
+"""
+
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ASSIGN_CHUNK = 65536  # Rows per centroid-assignment matrix product
+
+
+def default_n_lists(size: int) -> int:
+    """sqrt(N) clusters, between 16 and 4096."""
+    return int(min(4096, max(16, round(math.sqrt(size)))))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IVFFlatIndex:
+    """Inverted file of VectorIndex rows grouped by nearest centroid."""
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        n_probe: int = 16,
+        train_iterations: int = 10,
+        max_train_samples: int = 65536,
+        rebuild_growth: float = 2.0,
+        rebuild_deleted_fraction: float = 0.2,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            n_lists: Number of clusters (None = sqrt of the training size)
+            n_probe: Clusters scored per query (recall/latency trade-off)
+            train_iterations: k-means iterations
+            max_train_samples: Rows sampled for k-means
+            rebuild_growth: Retrain once the index holds this many times its training size
+            rebuild_deleted_fraction: Retrain once this fraction of assigned rows is deleted
+            seed: RNG seed for sampling and initialization
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_iterations = train_iterations
+        self.max_train_samples = max_train_samples
+        self.rebuild_growth = rebuild_growth
+        self.rebuild_deleted_fraction = rebuild_deleted_fraction
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self.deleted_baseline = 0  # Tombstoned rows when trained/loaded (already excluded from lists)
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []  # Cached np views of _lists
+        self._assigned = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, alive: np.ndarray):
+        """
+        Cluster the rows and assign every live row to its list.
+
+        Args:
+            vectors: VectorIndex matrix rows (normalized), shape (N, dim)
+            alive: Live-row mask, shape (N,)
+        """
+        rows = np.flatnonzero(alive)
+        if len(rows) == 0:
+            return
+        rng = np.random.default_rng(self.seed)
+        n_lists = min(self.n_lists or default_n_lists(len(rows)), len(rows))
+        sample = rows if len(rows) <= self.max_train_samples else rng.choice(
+            rows, self.max_train_samples, replace=False
+        )
+        data = vectors[np.sort(sample)].astype(np.float32)
+
+        # Spherical k-means: centroids are normalized means, similarity is the dot product
+        centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = self._nearest(data, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random samples
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+            centroids = _normalize(sums).astype(np.float32)
+
+        self.centroids = centroids
+        self.n_lists = n_lists
+        self.trained_size = len(rows)
+        self._lists = [[] for _ in range(n_lists)]
+        self._list_arrays = [None] * n_lists
+        self._assigned = 0
+        self.assign(rows, vectors[rows])
+
+    @staticmethod
+    def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Nearest centroid of each row (chunked to bound memory)."""
+        labels = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), ASSIGN_CHUNK):
+            chunk = data[start:start + ASSIGN_CHUNK]
+            labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+
+    def assign(self, rows: np.ndarray, vectors: np.ndarray):
+        """
+        Add rows to their nearest list (incremental insert).
+
+        Args:
+            rows: VectorIndex row numbers
+            vectors: Their normalized vectors
+        """
+        if not self.trained or len(rows) == 0:
+            return
+        labels = self._nearest(np.asarray(vectors, dtype=np.float32).reshape(len(rows), -1), self.centroids)
+        for row, label in zip(np.asarray(rows).tolist(), labels.tolist()):
+            self._lists[label].append(row)
+            self._list_arrays[label] = None
+        self._assigned += len(rows)
+
+    def probe(self, query: np.ndarray, n_probe: Optional[int] = None) -> np.ndarray:
+        """
+        Candidate rows for a query: members of the n_probe nearest lists.
+
+        Args:
+            query: Normalized query vector
+            n_probe: Lists to probe (default: self.n_probe)
+
+        Returns:
+            Sorted unique VectorIndex row numbers
+        """
+        if not self.trained:
+            return np.zeros(0, dtype=np.int64)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        similarities = self.centroids @ np.asarray(query, dtype=np.float32)
+        nearest = np.argpartition(-similarities, n_probe - 1)[:n_probe]
+        parts = []
+        for label in nearest.tolist():
+            if self._list_arrays[label] is None:
+                self._list_arrays[label] = np.array(self._lists[label], dtype=np.int64)
+            parts.append(self._list_arrays[label])
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def needs_rebuild(self, live_rows: int, deleted_rows: int) -> bool:
+        """
+        Whether the clusters are stale.
+
+        Args:
+            live_rows: Live rows in the VectorIndex
+            deleted_rows: Tombstoned rows in the VectorIndex (deleted_baseline is subtracted)
+
+        Returns:
+            True if growth or deletes since training exceed the rebuild thresholds
+        """
+        if not self.trained:
+            return True
+        if live_rows > self.trained_size * self.rebuild_growth:
+            return True
+        deleted = deleted_rows - self.deleted_baseline
+        return deleted > self.rebuild_deleted_fraction * max(1, live_rows + deleted)
+
+    def stats(self) -> Dict[str, Any]:
+        """List sizes and training state."""
+        sizes = np.array([len(members) for members in self._lists]) if self._lists else np.zeros(1)
+        return {
+            "trained": self.trained,
+            "n_lists": self.n_lists,
+            "n_probe": self.n_probe,
+            "trained_size": self.trained_size,
+            "assigned": self._assigned,
+            "avg_list_size": round(float(sizes.mean()), 1),
+            "max_list_size": int(sizes.max()),
+        }
+
+    def save(self, path: Path, ids: np.ndarray):
+        """
+        Persist centroids and list assignments.
+
+        Args:
+            path: .npz file
+            ids: Conversation id of every VectorIndex row (row -> id)
+        """
+        if not self.trained:
+            return
+        labels = np.full(len(ids), -1, dtype=np.int32)
+        for label, members in enumerate(self._lists):
+            labels[members] = label
+        assigned = labels >= 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                ids=ids[assigned],
+                labels=labels[assigned],
+                trained_size=np.array(self.trained_size),
+            )
+        tmp.replace(path)
+
+    def load(self, path: Path, positions: Dict[int, int], dim: int) -> np.ndarray:
+        """
+        Restore centroids and assignments saved by save().
+
+        Args:
+            path: .npz file
+            positions: Conversation id -> VectorIndex row
+            dim: Embedding dimension of the VectorIndex
+
+        Returns:
+            Rows restored from the file (the caller assigns the others)
+        """
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            if centroids.ndim != 2 or centroids.shape[1] != dim:
+                raise ValueError(f"IVF centroids have dim {centroids.shape[-1]}, index has {dim}")
+            self.centroids = centroids.astype(np.float32)
+            self.n_lists = len(centroids)
+            self.trained_size = int(data["trained_size"])
+            self._lists = [[] for _ in range(self.n_lists)]
+            self._list_arrays = [None] * self.n_lists
+            restored = []
+            for conversation_id, label in zip(data["ids"].tolist(), data["labels"].tolist()):
+                row = positions.get(conversation_id)
+                if row is not None:
+                    self._lists[label].append(row)
+                    restored.append(row)
+        self._assigned = len(restored)
+        return np.array(restored, dtype=np.int64)
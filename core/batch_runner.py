@@ -0,0 +1,307 @@
+"""
+Batch chain execution for large evaluation runs.
+
+Runs many chains concurrently against a single shared AgentRuntime, so config,
+connector and embedding model are loaded once per process instead of once per
+prompt. Results are streamed to an output JSONL file as each chain finishes,
+which also makes runs restartable: prompts whose id already has a successful
+record in the output are skipped.
+
+Input formats:
+- JSONL: one object per line with "prompt" and optional "id" / "stages"
+- CSV: header row with "prompt" and optional "id" / "stages" (space-separated)
+
+Rows without an id get one derived from prompt + stages; repeats of the same
+prompt get "-2", "-3", ... suffixes in file order, so they stay stable across restarts.
+"""
+
+import csv
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from config.settings import estimate_cost
+
+
+@dataclass
+class BatchItem:
+    """Single prompt in a batch run."""
+
+    id: str
+    prompt: str
+    stages: Optional[List[str]] = None
+
+
+@dataclass
+class BatchStats:
+    """Running totals for a batch run (updated as chains finish)."""
+
+    total: int = 0
+    skipped: int = 0
+    completed: int = 0
+    failed: int = 0
+    total_tokens: int = 0
+    total_cost_usd: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def finished(self) -> int:
+        """Chains finished in this run (success or failure)."""
+        return self.completed + self.failed
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Wall-clock seconds since the run started."""
+        return time.perf_counter() - self.started_at
+
+    @property
+    def throughput_per_min(self) -> float:
+        """Finished chains per minute."""
+        elapsed = self.elapsed_seconds
+        return (self.finished / elapsed) * 60 if elapsed > 0 else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """Tokens consumed per second."""
+        elapsed = self.elapsed_seconds
+        return self.total_tokens / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary."""
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "total_tokens": self.total_tokens,
+            "total_cost_usd": round(self.total_cost_usd, 6),
+            "elapsed_seconds": round(self.elapsed_seconds, 2),
+            "throughput_per_min": round(self.throughput_per_min, 2),
+        }
+
+
+def make_item_id(prompt: str, stages: Optional[List[str]] = None) -> str:
+    """Derive a stable id from prompt + stages (used when input has no id)."""
+    key = json.dumps({"prompt": prompt, "stages": stages or []}, sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _parse_stages(value: Any) -> Optional[List[str]]:
+    """Normalize stages from JSON list or space/comma separated string."""
+    if not value:
+        return None
+    if isinstance(value, list):
+        return [str(s).strip() for s in value if str(s).strip()] or None
+    parts = str(value).replace(",", " ").split()
+    return parts or None
+
+
+def load_batch_items(path: Path) -> List[BatchItem]:
+    """
+    Load prompts from a JSONL or CSV file.
+
+    Args:
+        path: Input file (.jsonl/.json lines or .csv)
+
+    Returns:
+        List of BatchItems in file order (rows without a prompt are ignored)
+
+    Raises:
+        ValueError: If a JSONL line is not valid JSON or explicit ids are duplicated
+    """
+    path = Path(path)
+    rows: List[Dict[str, Any]] = []
+
+    if path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path.name}:{line_no}: invalid JSON ({e})")
+
+    rows = [row for row in rows if (row.get("prompt") or "").strip()]
+    explicit: Set[str] = set()
+    for row in rows:
+        if row.get("id"):
+            item_id = str(row["id"])
+            if item_id in explicit:
+                raise ValueError(f"Duplicate batch id: {item_id}")
+            explicit.add(item_id)
+
+    items = []
+    seen = set(explicit)
+    for row in rows:
+        prompt = row["prompt"].strip()
+        stages = _parse_stages(row.get("stages"))
+        if row.get("id"):
+            item_id = str(row["id"])
+        else:
+            base_id = item_id = make_item_id(prompt, stages)
+            repeat = 1
+            while item_id in seen:  # Same prompt again: a separate run
+                repeat += 1
+                item_id = f"{base_id}-{repeat}"
+            seen.add(item_id)
+        items.append(BatchItem(id=item_id, prompt=prompt, stages=stages))
+
+    return items
+
+
+def load_completed_ids(output_path: Path) -> Set[str]:
+    """
+    Read ids that already completed successfully in a previous run.
+
+    Failed records are not counted, so they are retried on restart.
+    A truncated last line (e.g. process killed mid-write) is ignored.
+    """
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return set()
+
+    completed = set()
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok" and record.get("id"):
+                completed.add(record["id"])
+    return completed
+
+
+def summarize_results(results: Iterable[Any]) -> Dict[str, Any]:
+    """
+    Total tokens and cost for a chain's results.
+
+    The synthetic "multi-critic" consensus result only re-sums its individual
+    critics, so it is excluded to avoid double counting.
+    """
+    tokens = 0
+    cost = 0.0
+    for r in results:
+        if r.agent == "multi-critic":
+            continue
+        tokens += r.total_tokens
+        cost += estimate_cost(r.model, r.prompt_tokens, r.completion_tokens)
+    return {"total_tokens": tokens, "cost_usd": cost}
+
+
+class BatchRunner:
+    """Runs chains for many prompts concurrently and streams results to JSONL."""
+
+    def __init__(
+        self,
+        runtime,
+        concurrency: int = 4,
+        provider_limits: Optional[Dict[str, int]] = None,
+        mock_mode: Optional[bool] = None,
+    ):
+        """
+        Args:
+            runtime: Shared AgentRuntime instance
+            concurrency: Max chains running at the same time
+            provider_limits: Max concurrent LLM calls per provider (e.g. {"google": 2})
+            mock_mode: Optional mock mode override passed to every chain
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.runtime = runtime
+        self.concurrency = concurrency
+        self.mock_mode = mock_mode
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        if provider_limits:
+            self.runtime.connector.set_provider_limits(provider_limits)
+
+    def _run_item(self, item: BatchItem) -> Dict[str, Any]:
+        """Run one chain and build its output record (never raises)."""
+        start = time.perf_counter()
+        record: Dict[str, Any] = {
+            "id": item.id,
+            "prompt": item.prompt,
+            "stages": item.stages,
+        }
+        try:
+            results = self.runtime.chain(
+                prompt=item.prompt,
+                stages=item.stages,
+                mock_mode=self.mock_mode,
+                coalesce=False,  # Duplicate prompts in a batch are separate runs
+            )
+            # A chain succeeds when its final result does (e.g. a failed critic whose consensus still ran)
+            error = results[-1].error if results else "Chain returned no results"
+            record.update(summarize_results(results))
+            record["status"] = "error" if error else "ok"
+            record["error"] = error
+            record["results"] = [r.to_dict() for r in results]
+        except Exception as e:
+            record.update({"status": "error", "error": str(e), "total_tokens": 0, "cost_usd": 0.0, "results": []})
+
+        record["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record["completed_at"] = datetime.now(timezone.utc).isoformat()
+        return record
+
+    def run(
+        self,
+        items: List[BatchItem],
+        output_path: Path,
+        on_result: Optional[Callable[[BatchStats, Dict[str, Any]], None]] = None,
+    ) -> BatchStats:
+        """
+        Run all pending items, appending one JSON line per finished chain.
+
+        Args:
+            items: Prompts to run
+            output_path: Output JSONL (appended to; existing successes are skipped)
+            on_result: Optional callback(stats, record) after each chain finishes
+
+        Returns:
+            Final BatchStats
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        done_ids = load_completed_ids(output_path)
+        pending = [item for item in items if item.id not in done_ids]
+        stats = BatchStats(total=len(items), skipped=len(items) - len(pending))
+
+        if not pending:
+            return stats
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = [executor.submit(self._run_item, item) for item in pending]
+
+                for future in as_completed(futures):
+                    record = future.result()
+
+                    with self._write_lock:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+
+                    with self._stats_lock:
+                        if record["status"] == "ok":
+                            stats.completed += 1
+                        else:
+                            stats.failed += 1
+                        stats.total_tokens += record.get("total_tokens", 0)
+                        stats.total_cost_usd += record.get("cost_usd", 0.0)
+
+                    if on_result:
+                        on_result(stats, record)
+
+        return stats
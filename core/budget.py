@@ -0,0 +1,257 @@
+"""
+Chain-level budget scheduling (tokens, cost, wall-clock time).
+
+A ChainBudget caps what a single chain may spend. The BudgetScheduler uses
+historical per-agent averages from the memory DB to decide, before and during
+the run, how much optional work fits in the remaining budget:
+
+- how many specialized critics to invoke (highest consensus weight first)
+- whether another refinement iteration (builder + critic) is affordable
+- whether to spend an LLM call on semantic compression or truncate locally
+
+Mandatory stages (the ones passed to chain()) always run; the scheduler only
+reserves room for them when deciding on optional work.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.settings import estimate_cost
+
+# Estimates used when an agent has no history in the memory DB yet
+DEFAULT_PROMPT_TOKENS = 1500
+DEFAULT_COMPLETION_RATIO = 0.4  # Fraction of agent max_tokens typically generated
+DEFAULT_DURATION_MS = 20000.0
+COMPRESSION_ESTIMATE = {"tokens": 1500, "cost_usd": 0.0003, "seconds": 5.0}
+
+
+@dataclass
+class ChainBudget:
+    """Limits for one chain execution (None = unlimited)."""
+
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_seconds: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["ChainBudget"]:
+        """Build budget from a request dict (returns None if no limit is set)."""
+        if not data:
+            return None
+        budget = cls(
+            max_tokens=data.get("max_tokens"),
+            max_cost_usd=data.get("max_cost_usd"),
+            max_seconds=data.get("max_seconds"),
+        )
+        return budget if budget.is_limited() else None
+
+    def is_limited(self) -> bool:
+        """Whether any limit is set."""
+        return any(v is not None for v in (self.max_tokens, self.max_cost_usd, self.max_seconds))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary."""
+        return {
+            "max_tokens": self.max_tokens,
+            "max_cost_usd": self.max_cost_usd,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class BudgetScheduler:
+    """Tracks consumption against a ChainBudget and gates optional chain work."""
+
+    def __init__(
+        self,
+        budget: ChainBudget,
+        agent_stats: Dict[str, Dict[str, Any]],
+        config: Dict[str, Any],
+    ):
+        """
+        Args:
+            budget: Limits for this chain
+            agent_stats: Historical averages per agent (MemoryEngine.get_agent_averages)
+            config: Agents config (agents.yaml) for models, max_tokens and weights
+        """
+        self.budget = budget
+        self.agent_stats = agent_stats or {}
+        self.config = config
+        self.started_at = time.perf_counter()
+        self.used_tokens = 0
+        self.used_cost_usd = 0.0
+        self.pending_stages: List[str] = []
+        self.stages: List[Dict[str, Any]] = []
+        self.decisions: List[str] = []
+        self._lock = threading.Lock()  # Speculative candidates record compression calls from worker threads
+
+    # --- Consumption tracking ---
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Wall-clock seconds since the chain started."""
+        return time.perf_counter() - self.started_at
+
+    def remaining(self) -> Dict[str, Optional[float]]:
+        """Remaining budget per dimension (None = unlimited)."""
+        b = self.budget
+        return {
+            "tokens": None if b.max_tokens is None else b.max_tokens - self.used_tokens,
+            "cost_usd": None if b.max_cost_usd is None else b.max_cost_usd - self.used_cost_usd,
+            "seconds": None if b.max_seconds is None else b.max_seconds - self.elapsed_seconds,
+        }
+
+    def record(self, stage: str, results: List[Any], duration_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Record consumption of a finished stage.
+
+        Args:
+            stage: Stage label (e.g. "builder", "critic", "builder-v2")
+            results: RunResults produced by the stage
+            duration_ms: Wall-clock duration when the calls ran concurrently
+                         (default: sum of the results' durations)
+
+        Returns:
+            Stage entry with its own consumption and the remaining budget
+        """
+        tokens = sum(r.total_tokens for r in results)
+        cost = sum(estimate_cost(r.model, r.prompt_tokens, r.completion_tokens) for r in results)
+        if duration_ms is None:
+            duration_ms = sum(r.duration_ms for r in results)
+        return self._add_entry(stage, tokens, cost, duration_ms)
+
+    def record_call(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int, duration_ms: float) -> Dict[str, Any]:
+        """Record an auxiliary LLM call that has no RunResult (e.g. compression)."""
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        return self._add_entry(stage, prompt_tokens + completion_tokens, cost, duration_ms)
+
+    def _add_entry(self, stage: str, tokens: int, cost: float, duration_ms: float) -> Dict[str, Any]:
+        with self._lock:
+            self.used_tokens += tokens
+            self.used_cost_usd += cost
+            remaining = self.remaining()
+            entry = {
+                "stage": stage,
+                "tokens": tokens,
+                "cost_usd": round(cost, 6),
+                "duration_ms": round(duration_ms, 1),
+                "elapsed_seconds": round(self.elapsed_seconds, 2),
+                "remaining_tokens": remaining["tokens"],
+                "remaining_cost_usd": None if remaining["cost_usd"] is None else round(remaining["cost_usd"], 6),
+                "remaining_seconds": None if remaining["seconds"] is None else round(remaining["seconds"], 2),
+            }
+            self.stages.append(entry)
+        return entry
+
+    # --- Estimation ---
+
+    def estimate(self, agent: str) -> Dict[str, float]:
+        """
+        Expected tokens, cost and seconds for one call of agent.
+
+        Uses historical averages when available, otherwise falls back to
+        agent max_tokens and default latency.
+        """
+        stats = self.agent_stats.get(agent)
+        agent_cfg = self.config.get("agents", {}).get(agent, {})
+        model = agent_cfg.get("model", "")
+
+        if stats and stats.get("samples"):
+            prompt_tokens = stats.get("avg_prompt_tokens") or 0
+            completion_tokens = stats.get("avg_completion_tokens") or 0
+            cost = stats.get("avg_cost_usd")
+            if not cost:
+                cost = estimate_cost(model, prompt_tokens, completion_tokens)
+            return {
+                "tokens": float(prompt_tokens + completion_tokens),
+                "cost_usd": float(cost),
+                "seconds": float(stats.get("avg_duration_ms") or DEFAULT_DURATION_MS) / 1000,
+            }
+
+        completion_tokens = agent_cfg.get("max_tokens", 1500) * DEFAULT_COMPLETION_RATIO
+        return {
+            "tokens": float(DEFAULT_PROMPT_TOKENS + completion_tokens),
+            "cost_usd": estimate_cost(model, DEFAULT_PROMPT_TOKENS, int(completion_tokens)),
+            "seconds": DEFAULT_DURATION_MS / 1000,
+        }
+
+    def _estimate_group(self, agents: List[str], parallel: bool = False) -> Dict[str, float]:
+        """Sum estimates for several calls (seconds = max if run in parallel)."""
+        estimates = [self.estimate(a) for a in agents]
+        if not estimates:
+            return {"tokens": 0.0, "cost_usd": 0.0, "seconds": 0.0}
+        seconds = [e["seconds"] for e in estimates]
+        return {
+            "tokens": sum(e["tokens"] for e in estimates),
+            "cost_usd": sum(e["cost_usd"] for e in estimates),
+            "seconds": max(seconds) if parallel else sum(seconds),
+        }
+
+    def _fits(self, need: Dict[str, float]) -> bool:
+        """Whether need plus the reserve for pending mandatory stages fits."""
+        reserve = self._estimate_group(self.pending_stages)
+        remaining = self.remaining()
+        for key in ("tokens", "cost_usd", "seconds"):
+            if remaining[key] is not None and need[key] + reserve[key] > remaining[key]:
+                return False
+        return True
+
+    # --- Decisions ---
+
+    def begin_stage(self, stages: List[str], index: int) -> None:
+        """Mark stage index as running (later stages become the reserve)."""
+        self.pending_stages = [s for s in stages[index + 1:]]
+
+    def plan_critics(self, critic_names: List[str]) -> List[str]:
+        """
+        Pick how many critics fit the budget (at least one).
+
+        Critics are kept in order of consensus weight, so a tight budget
+        drops the lowest-priority reviewers first.
+        """
+        weights = self.config.get("multi_critic", {}).get("consensus", {}).get("weights", {})
+        ordered = sorted(critic_names, key=lambda c: weights.get(c, 1.0), reverse=True)
+
+        selected = ordered[:1]
+        for critic in ordered[1:]:
+            if self._fits(self._estimate_group(selected + [critic], parallel=True)):
+                selected.append(critic)
+            else:
+                break
+
+        if len(selected) < len(critic_names):
+            dropped = [c for c in ordered if c not in selected]
+            self.decisions.append(f"critics trimmed to {len(selected)}/{len(critic_names)} (dropped: {', '.join(dropped)})")
+        return [c for c in critic_names if c in selected]
+
+    def allow_refinement(self, iteration: int) -> bool:
+        """Whether another builder + critic round fits the budget."""
+        if self._fits(self._estimate_group(["builder", "critic"])):
+            return True
+        self.decisions.append(f"refinement iteration {iteration} skipped (budget)")
+        return False
+
+    def allow_compression(self) -> bool:
+        """Whether an LLM compression call fits (otherwise truncate locally)."""
+        if self._fits(COMPRESSION_ESTIMATE):
+            return True
+        if not self.decisions or self.decisions[-1] != "compression replaced by truncation (budget)":
+            self.decisions.append("compression replaced by truncation (budget)")
+        return False
+
+    def report(self) -> Dict[str, Any]:
+        """Final budget report with per-stage consumption."""
+        remaining = self.remaining()
+        exceeded = [k for k, v in remaining.items() if v is not None and v < 0]
+        return {
+            "budget": self.budget.to_dict(),
+            "used": {
+                "tokens": self.used_tokens,
+                "cost_usd": round(self.used_cost_usd, 6),
+                "seconds": round(self.elapsed_seconds, 2),
+            },
+            "exceeded": exceeded,
+            "stages": self.stages,
+            "decisions": self.decisions,
+        }
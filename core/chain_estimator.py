@@ -0,0 +1,305 @@
+"""
+Dry-run chain estimates: critical-path latency, tokens and cost.
+
+No LLM calls are made. Each agent call is modelled from the agent's recent
+conversations (bootstrap over observed prompt/completion tokens, latency and
+cost; error rates reported), or from agents.yaml defaults with a wide
+log-normal spread when there is no history. Calls answered by a fallback
+model are drawn from the fallback calls' own usage (or, without any, the
+defaults priced at the first fallback model) at the observed fallback share. The chain plan mirrors
+chain(): parallel critics cost the slowest critic's latency, and each critic
+stage may trigger refinement rounds (builder + critic) with the historical
+rate at which critiques contained critical issues.
+
+The plan is simulated many times; estimates are reported as mean, median and
+a 90% interval (p5-p95).
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import estimate_cost
+from core.budget import DEFAULT_COMPLETION_RATIO, DEFAULT_DURATION_MS, DEFAULT_PROMPT_TOKENS
+
+DEFAULT_SPREAD = 0.5  # Log-normal sigma for agents without history
+DEFAULT_REFINEMENT_RATE = 0.5  # Refinement trigger rate without critic history
+MIN_SAMPLES = 5  # Fewer successful conversations than this: use defaults
+
+
+@dataclass
+class CallProfile:
+    """Usage distribution of one agent call."""
+
+    agent: str
+    model: str
+    source: str  # "history" or "default"
+    tokens: np.ndarray
+    duration_ms: np.ndarray
+    cost_usd: np.ndarray
+    samples: int = 0
+    fallback_rate: float = 0.0  # Share of all recent calls that used a fallback model
+    error_rate: float = 0.0
+    fallback: Optional["CallProfile"] = None  # Usage of calls answered by a fallback model
+    fallback_share: float = 0.0  # Share of simulated calls drawn from fallback
+
+    def draw(self, rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """n simulated calls as (tokens, duration_ms, cost_usd) arrays."""
+        tokens, duration, cost = self._draw_primary(rng, n)
+        if self.fallback is None or self.fallback_share <= 0:
+            return tokens, duration, cost
+
+        use_fallback = rng.random(n) < self.fallback_share
+        fallback_tokens, fallback_duration, fallback_cost = self.fallback.draw(rng, n)
+        return (
+            np.where(use_fallback, fallback_tokens, tokens),
+            np.where(use_fallback, fallback_duration, duration),
+            np.where(use_fallback, fallback_cost, cost),
+        )
+
+    def _draw_primary(self, rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """n calls of the profile's own distribution (no fallback)."""
+        if self.source == "history":
+            picks = rng.integers(0, len(self.tokens), size=n)
+            return self.tokens[picks], self.duration_ms[picks], self.cost_usd[picks]
+
+        # One log-normal factor per call, shared by tokens and cost (they move together)
+        factor = np.exp(DEFAULT_SPREAD * rng.standard_normal(n) - DEFAULT_SPREAD ** 2 / 2)
+        latency = np.exp(DEFAULT_SPREAD * rng.standard_normal(n) - DEFAULT_SPREAD ** 2 / 2)
+        return self.tokens[0] * factor, self.duration_ms[0] * latency, self.cost_usd[0] * factor
+
+
+def build_profile(agent: str, agent_config: Dict[str, Any], samples: Sequence[Dict[str, Any]]) -> CallProfile:
+    """
+    Call profile from an agent's recent conversations.
+
+    Args:
+        agent: Agent name
+        agent_config: Agent section of agents.yaml
+        samples: Recent usage dicts (MemoryEngine.get_agent_samples)
+
+    Returns:
+        CallProfile (defaults from agent_config if fewer than MIN_SAMPLES successes)
+    """
+    model = agent_config.get("model", "")
+    ok = [s for s in samples if not s.get("error")]
+    fallback_rate = sum(1 for s in samples if s.get("fallback_used")) / len(samples) if samples else 0.0
+    error_rate = (len(samples) - len(ok)) / len(samples) if samples else 0.0
+
+    if len(ok) >= MIN_SAMPLES:
+        # Primary and fallback calls are drawn separately, at the observed share
+        ok_fallback = [s for s in ok if s.get("fallback_used")]
+        primary = [s for s in ok if not s.get("fallback_used")] or ok
+        profile = _history_profile(agent, model, primary)
+        profile.samples, profile.fallback_rate, profile.error_rate = len(ok), fallback_rate, error_rate
+        if ok_fallback and len(primary) < len(ok):
+            profile.fallback = _history_profile(agent, ok_fallback[0].get("model") or model, ok_fallback)
+            profile.fallback_share = len(ok_fallback) / len(ok)
+        return profile
+
+    profile = _default_profile(agent, model, agent_config)
+    profile.samples, profile.fallback_rate, profile.error_rate = len(ok), fallback_rate, error_rate
+    fallback_order = agent_config.get("fallback_order") or []
+    if fallback_order and fallback_rate > 0:
+        profile.fallback = _default_profile(agent, fallback_order[0], agent_config)
+        profile.fallback_share = fallback_rate
+    return profile
+
+
+def _history_profile(agent: str, model: str, samples: Sequence[Dict[str, Any]]) -> CallProfile:
+    """Bootstrap profile over successful calls (cost estimated where none was recorded)."""
+    prompt = np.array([s["prompt_tokens"] for s in samples], dtype=float)
+    completion = np.array([s["completion_tokens"] for s in samples], dtype=float)
+    cost = np.array([
+        s["cost_usd"] or estimate_cost(s.get("model") or model, int(p), int(c))
+        for s, p, c in zip(samples, prompt, completion)
+    ])
+    return CallProfile(
+        agent=agent, model=model, source="history",
+        tokens=prompt + completion,
+        duration_ms=np.array([s["duration_ms"] for s in samples], dtype=float),
+        cost_usd=cost,
+        samples=len(samples),
+    )
+
+
+def _default_profile(agent: str, model: str, agent_config: Dict[str, Any]) -> CallProfile:
+    """Profile from agents.yaml defaults, priced at model."""
+    completion_tokens = int(agent_config.get("max_tokens", 1500) * DEFAULT_COMPLETION_RATIO)
+    return CallProfile(
+        agent=agent, model=model, source="default",
+        tokens=np.array([float(DEFAULT_PROMPT_TOKENS + completion_tokens)]),
+        duration_ms=np.array([DEFAULT_DURATION_MS]),
+        cost_usd=np.array([estimate_cost(model, DEFAULT_PROMPT_TOKENS, completion_tokens)]),
+    )
+
+
+def summarize(values: np.ndarray, digits: int = 1) -> Dict[str, float]:
+    """Mean, median and 90% interval of simulated values."""
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {
+        "mean": round(float(values.mean()), digits),
+        "p50": round(float(p50), digits),
+        "p5": round(float(p5), digits),
+        "p95": round(float(p95), digits),
+    }
+
+
+@dataclass
+class PlannedStage:
+    """One chain stage: its calls and whether they run concurrently."""
+
+    stage: str
+    agents: List[str]
+    parallel: bool = False
+    refinement: bool = False  # Critic stage that may trigger refinement rounds
+    notes: List[str] = field(default_factory=list)
+
+
+class ChainEstimator:
+    """Monte Carlo estimate of a chain plan from per-agent call profiles."""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        agent_samples: Dict[str, List[Dict[str, Any]]],
+        refinement_rate: Optional[float] = None,
+        simulations: int = 2000,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            config: Agents config (agents.yaml)
+            agent_samples: Recent usage per agent (MemoryEngine.get_agent_samples)
+            refinement_rate: Fraction of critiques with critical issues (None = default)
+            simulations: Number of simulated chain runs
+            seed: RNG seed (estimates are reproducible)
+        """
+        self.config = config
+        self.agent_samples = agent_samples or {}
+        self.refinement_rate = DEFAULT_REFINEMENT_RATE if refinement_rate is None else refinement_rate
+        self.simulations = simulations
+        self.seed = seed
+        self._profiles: Dict[str, CallProfile] = {}
+
+    def profile(self, agent: str) -> CallProfile:
+        """Cached call profile of agent."""
+        if agent not in self._profiles:
+            agent_config = self.config.get("agents", {}).get(agent, {})
+            self._profiles[agent] = build_profile(agent, agent_config, self.agent_samples.get(agent, []))
+        return self._profiles[agent]
+
+    def plan(self, stages: Sequence[str], critic_names: Sequence[str]) -> List[PlannedStage]:
+        """
+        Calls per stage, mirroring chain().
+
+        Args:
+            stages: Chain stages
+            critic_names: Specialized critics a critic stage would run (empty = single critic)
+
+        Returns:
+            Planned stages
+        """
+        multi_critic = self.config.get("multi_critic", {})
+        refinement = self.config.get("refinement", {}).get("enabled", True)
+        planned = []
+        for i, stage in enumerate(stages):
+            if stage == "critic" and critic_names:
+                planned.append(PlannedStage(
+                    stage, list(critic_names), parallel=multi_critic.get("parallel_execution", True),
+                ))
+            else:
+                planned.append(PlannedStage(stage, [stage]))
+            if stage == "critic" and refinement and "builder" in stages[:i]:
+                planned[-1].refinement = True
+        return planned
+
+    def estimate(self, stages: Sequence[str], critic_names: Sequence[str] = ()) -> Dict[str, Any]:
+        """
+        Simulate the chain plan.
+
+        Args:
+            stages: Chain stages
+            critic_names: Specialized critics a critic stage would run
+
+        Returns:
+            Dict with per-stage and total latency (critical path), tokens and cost
+            (mean, p50, p5, p95), refinement expectations and per-agent profiles
+        """
+        rng = np.random.default_rng(self.seed)
+        n = self.simulations
+        max_iterations = self.config.get("refinement", {}).get("max_iterations", 3)
+
+        total_latency = np.zeros(n)
+        total_tokens = np.zeros(n)
+        total_cost = np.zeros(n)
+        stage_reports = []
+        refinement_rounds = np.zeros(n)
+
+        for planned in self.plan(stages, critic_names):
+            latency = np.zeros(n)
+            tokens = np.zeros(n)
+            cost = np.zeros(n)
+            for agent in planned.agents:
+                t, d, c = self.profile(agent).draw(rng, n)
+                latency = np.maximum(latency, d) if planned.parallel else latency + d
+                tokens += t
+                cost += c
+
+            if planned.refinement:
+                # Each round: builder + single critic, repeated while critiques keep flagging issues
+                rounds = np.zeros(n)
+                active = np.ones(n, dtype=bool)
+                for _ in range(max_iterations):
+                    active &= rng.random(n) < self.refinement_rate
+                    rounds += active
+                for agent in ("builder", "critic"):
+                    for k in range(max_iterations):
+                        t, d, c = self.profile(agent).draw(rng, n)
+                        in_round = rounds > k
+                        latency += d * in_round
+                        tokens += t * in_round
+                        cost += c * in_round
+                refinement_rounds += rounds
+
+            total_latency += latency
+            total_tokens += tokens
+            total_cost += cost
+            stage_reports.append({
+                "stage": planned.stage,
+                "calls": planned.agents,
+                "parallel": planned.parallel,
+                "includes_refinement": planned.refinement,
+                "latency_ms": summarize(latency),
+                "tokens": summarize(tokens, 0),
+                "cost_usd": summarize(cost, 6),
+            })
+
+        agents = sorted({agent for s in self.plan(stages, critic_names) for agent in s.agents}
+                        | ({"builder", "critic"} if refinement_rounds.any() else set()))
+        return {
+            "stages": stage_reports,
+            "latency_ms": summarize(total_latency),
+            "tokens": summarize(total_tokens, 0),
+            "cost_usd": summarize(total_cost, 6),
+            "refinement": {
+                "trigger_rate": round(self.refinement_rate, 3),
+                "max_iterations": max_iterations,
+                "expected_rounds": round(float(refinement_rounds.mean()), 2),
+            },
+            "agents": {
+                agent: {
+                    "model": self.profile(agent).model,
+                    "source": self.profile(agent).source,
+                    "samples": self.profile(agent).samples,
+                    "fallback_rate": round(self.profile(agent).fallback_rate, 3),
+                    "fallback_model": self.profile(agent).fallback.model if self.profile(agent).fallback else None,
+                    "error_rate": round(self.profile(agent).error_rate, 3),
+                    "latency_ms": summarize(self.profile(agent).duration_ms),
+                }
+                for agent in agents
+            },
+            "confidence": 0.9,
+            "simulations": n,
+        }
@@ -13,14 +13,28 @@ Features:
 
 import logging
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 
 from config.settings import count_tokens
+from core.memory_backend import knowledge_entry, response_snippet, session_entry
 from core.memory_engine import MemoryEngine
+from core.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1024)
+def _line_tokens(line: str) -> int:
+    """Token count of a short, often repeated line (section headers, age/relevance lines)."""
+    return count_tokens(line)
+
+
+def _entry_tokens(conv: Dict[str, Any], column: str, entry: str) -> int:
+    """Stored token count of a formatted entry, counted for rows stored before it was precomputed."""
+    return conv[column] if conv.get(column) is not None else count_tokens(entry)
+
+
 class ContextAggregator:
     """
     Aggregates session and knowledge context for LLM calls.
@@ -32,6 +46,7 @@ class ContextAggregator:
     def __init__(self):
         self.memory = MemoryEngine()
 
+    @traced("context.aggregate")
     def get_full_context(
         self,
         prompt: str,
@@ -76,13 +91,14 @@ class ContextAggregator:
             )
 
             if session_conv:
-                session_text = self._format_session_context(session_conv)
-                session_tokens = count_tokens(session_text)
+                with span("tokens.count"):
+                    session_blocks = self._session_blocks(session_conv)
 
                 contexts.append({
                     'type': 'session',
-                    'text': session_text,
-                    'tokens': session_tokens,
+                    'text': "\n".join(text for text, _ in session_blocks),
+                    'tokens': sum(tokens for _, tokens in session_blocks),
+                    'blocks': session_blocks,
                     'priority': 1,  # Highest priority
                     'count': len(session_conv)
                 })
@@ -97,13 +113,14 @@ class ContextAggregator:
             )
 
             if knowledge_conv:
-                knowledge_text = self._format_knowledge_context(knowledge_conv)
-                knowledge_tokens = count_tokens(knowledge_text)
+                with span("tokens.count"):
+                    knowledge_blocks = self._knowledge_blocks(knowledge_conv)
 
                 contexts.append({
                     'type': 'knowledge',
-                    'text': knowledge_text,
-                    'tokens': knowledge_tokens,
+                    'text': "\n".join(text for text, _ in knowledge_blocks),
+                    'tokens': sum(tokens for _, tokens in knowledge_blocks),
+                    'blocks': knowledge_blocks,
                     'priority': 2,  # Lower priority
                     'count': len(knowledge_conv)
                 })
@@ -128,6 +145,7 @@ class ContextAggregator:
 
         return final_context, metadata
 
+    @traced("context.session")
     def _get_session_conversations(
         self,
         session_id: str,
@@ -143,16 +161,11 @@ class ContextAggregator:
         Returns:
             List of conversation dicts (most recent first)
         """
-        import sqlite3
-        from pathlib import Path
-
-        db_path = Path("data/MEMORY/conversations.db")
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
-        try:
+        with self.memory.backend.pool.reader() as conn:
+            cursor = conn.cursor()
+            # Precomputed snippet and token count instead of the full response
             cursor.execute("""
-                SELECT id, timestamp, agent, prompt, response
+                SELECT id, timestamp, agent, prompt, snippet_300, tokens_session
                 FROM conversations
                 WHERE session_id = ?
                 ORDER BY timestamp DESC
@@ -167,14 +180,13 @@ class ContextAggregator:
                     'timestamp': row[1],
                     'agent': row[2],
                     'prompt': row[3],
-                    'response': row[4]
+                    'snippet_300': row[4],
+                    'tokens_session': row[5]
                 }
                 for row in rows
             ]
 
-        finally:
-            conn.close()
-
+    @traced("context.knowledge")
     def _get_knowledge_conversations(
         self,
         prompt: str,
@@ -267,27 +279,43 @@ class ContextAggregator:
         Returns:
             Formatted string
         """
+        return "\n".join(text for text, _ in self._session_blocks(conversations))
+
+    def _session_blocks(self, conversations: List[Dict[str, Any]]) -> List[Tuple[str, int]]:
+        """
+        Session context as (text, tokens) blocks: the header, then one block per message.
+
+        Joined with newlines, the texts give _format_session_context(). Token
+        counts come from the stored ``tokens_session`` column plus the cached
+        count of the "[N messages ago]" line, so no entry is re-encoded.
+
+        Args:
+            conversations: List of conversation dicts (most recent first)
+
+        Returns:
+            List of (text, token count)
+        """
         if not conversations:
-            return ""
+            return []
 
-        parts = ["[SESSION CONTEXT - Recent conversation]\n"]
+        header = "[SESSION CONTEXT - Recent conversation]\n"
+        blocks = [(header, _line_tokens(header))]
 
         # Reverse to chronological order (oldest first)
         for i, conv in enumerate(reversed(conversations)):
             age = len(conversations) - i
-            age_str = f"{age} message{'s' if age > 1 else ''} ago"
-
-            parts.append(f"[{age_str}]")
-            parts.append(f"User: \"{conv['prompt'][:150]}{'...' if len(conv['prompt']) > 150 else ''}\"")
+            age_line = f"[{age} message{'s' if age > 1 else ''} ago]"
 
-            # Truncate response to first 300 chars
-            response_snippet = conv['response'][:300]
-            if len(conv['response']) > 300:
-                response_snippet += "..."
+            # Response truncated to first 300 chars
+            snippet = conv['snippet_300'] if 'snippet_300' in conv else response_snippet(conv['response'], 300)
+            entry = session_entry(conv['prompt'], snippet)
 
-            parts.append(f"Assistant: \"{response_snippet}\"\n")
+            blocks.append((
+                f"{age_line}\n{entry}",
+                _line_tokens(age_line) + _entry_tokens(conv, 'tokens_session', entry),
+            ))
 
-        return "\n".join(parts)
+        return blocks
 
     def _format_knowledge_context(self, conversations: List[Dict[str, Any]]) -> str:
         """
@@ -312,26 +340,43 @@ class ContextAggregator:
         Returns:
             Formatted string
         """
+        return "\n".join(text for text, _ in self._knowledge_blocks(conversations))
+
+    def _knowledge_blocks(self, conversations: List[Dict[str, Any]]) -> List[Tuple[str, int]]:
+        """
+        Knowledge context as (text, tokens) blocks: the header, then one block per conversation.
+
+        Joined with newlines, the texts give _format_knowledge_context().
+        Token counts come from the stored ``tokens_knowledge`` column plus
+        the cached count of the "[Relevance: ...]" line.
+
+        Args:
+            conversations: List of conversation dicts with _score
+
+        Returns:
+            List of (text, token count)
+        """
         if not conversations:
-            return ""
+            return []
 
-        parts = ["[KNOWLEDGE CONTEXT - Relevant past topics]\n"]
+        header = "[KNOWLEDGE CONTEXT - Relevant past topics]\n"
+        blocks = [(header, _line_tokens(header))]
 
         for conv in conversations:
             score = conv.get('_score', 0.0)
             age = self._calculate_message_age(conv['timestamp'])
+            relevance_line = f"[Relevance: {score:.2f}, {age}]"
 
-            parts.append(f"[Relevance: {score:.2f}, {age}]")
-            parts.append(f"Topic: {conv['prompt'][:80]}")
-
-            # Truncate response to first 200 chars
-            response_snippet = conv['response'][:200]
-            if len(conv['response']) > 200:
-                response_snippet += "..."
+            # Response truncated to first 200 chars
+            snippet = conv['snippet_200'] if 'snippet_200' in conv else response_snippet(conv['response'], 200)
+            entry = knowledge_entry(conv['prompt'], snippet)
 
-            parts.append(f"Summary: \"{response_snippet}\"\n")
+            blocks.append((
+                f"{relevance_line}\n{entry}",
+                _line_tokens(relevance_line) + _entry_tokens(conv, 'tokens_knowledge', entry),
+            ))
 
-        return "\n".join(parts)
+        return blocks
 
     def _calculate_message_age(self, timestamp: str) -> str:
         """
@@ -382,6 +427,7 @@ class ContextAggregator:
 
         Args:
             contexts: List of context dicts with 'type', 'text', 'tokens', 'priority'
+                      (and optionally 'blocks', see _truncate_blocks)
             max_tokens: Total budget
 
         Returns:
@@ -421,7 +467,10 @@ class ContextAggregator:
             if allocated > 0:
                 # Truncate context if needed
                 if allocated < ctx['tokens']:
-                    ctx['text'] = self._truncate_to_tokens(ctx['text'], allocated)
+                    if ctx.get('blocks'):
+                        ctx['text'] = self._truncate_blocks(ctx['blocks'], allocated)
+                    else:
+                        ctx['text'] = self._truncate_to_tokens(ctx['text'], allocated)
                     ctx['tokens'] = allocated
 
                 selected.append(ctx)
@@ -432,25 +481,36 @@ class ContextAggregator:
 
         return selected
 
-    def _truncate_to_tokens(self, text: str, target_tokens: int) -> str:
+    @traced("tokens.truncate")
+    def _truncate_blocks(self, blocks: List[Tuple[str, int]], target_tokens: int) -> str:
         """
-        Truncate text to fit target token count using accurate tiktoken counting.
+        Truncate a section given as (text, tokens) blocks to a target token count.
 
-        Uses tiktoken for precise token counting (handles Chinese/emoji correctly).
+        Whole blocks are kept by their known counts; only the first block
+        that doesn't fit is tokenized, to cut it at a word boundary.
 
         Args:
-            text: Text to truncate
+            blocks: Section blocks (joined with newlines)
             target_tokens: Target token count
 
         Returns:
             Truncated text
         """
-        # Check if already within budget
-        current_tokens = count_tokens(text)
-        if current_tokens <= target_tokens:
-            return text
+        kept = []
+        remaining = target_tokens
+        for text, tokens in blocks:
+            if tokens > remaining:
+                partial = self._token_prefix(text, remaining)
+                if partial:
+                    kept.append(partial)
+                break
+            kept.append(text)
+            remaining -= tokens
 
-        # Binary search for optimal truncation point
+        return "\n".join(kept) + "...\n[Context truncated to fit budget]"
+
+    def _token_prefix(self, text: str, target_tokens: int) -> str:
+        """Longest word prefix of text (words joined by spaces) within target_tokens."""
         words = text.split()
         left, right = 0, len(words)
         best_truncation = ""
@@ -466,7 +526,29 @@ class ContextAggregator:
             else:
                 right = mid - 1
 
-        return best_truncation + "...\n[Context truncated to fit budget]"
+        return best_truncation
+
+    @traced("tokens.truncate")
+    def _truncate_to_tokens(self, text: str, target_tokens: int) -> str:
+        """
+        Truncate text to fit target token count using accurate tiktoken counting.
+
+        Uses tiktoken for precise token counting (handles Chinese/emoji correctly).
+
+        Args:
+            text: Text to truncate
+            target_tokens: Target token count
+
+        Returns:
+            Truncated text
+        """
+        # Check if already within budget
+        current_tokens = count_tokens(text)
+        if current_tokens <= target_tokens:
+            return text
+
+        # Binary search for optimal truncation point
+        return self._token_prefix(text, target_tokens) + "...\n[Context truncated to fit budget]"
 
     def _format_final_context(self, contexts: List[Dict[str, Any]]) -> str:
         """
@@ -0,0 +1,190 @@
+"""
+Token-budgeted context packing for stage handoffs.
+
+A stage prompt carries prior stages' outputs (the critic sees the builder, the
+closer sees every stage). Instead of compressing anything over a fixed
+character threshold, the packer:
+- derives the next agent's input budget from its model's context window
+  (smallest across its fallback models), its max_tokens and a reserve for
+  the system prompt and injected memory
+- leaves all outputs untouched when they fit
+- otherwise allocates the budget across outputs by importance (water-filling:
+  outputs smaller than their weighted share keep their full size, the rest is
+  split among the larger ones) and compresses or trims only those over their
+  share
+
+All sizes are measured in tokens (count_tokens).
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import count_tokens
+
+# Input context windows (tokens) for models missing from litellm's model map
+MODEL_CONTEXT_WINDOWS = {
+    "anthropic/claude": 200_000,
+    "openai/gpt-4o": 128_000,
+    "openai/gpt-4.1": 1_000_000,
+    "openai/o": 200_000,
+    "gemini/gemini-2.5": 1_048_576,
+    "gemini/gemini-2.0": 1_048_576,
+    "gemini/gemini-1.5": 1_000_000,
+}
+DEFAULT_CONTEXT_WINDOW = 32_000
+
+
+def model_context_window(model: str, overrides: Optional[Dict[str, int]] = None) -> int:
+    """
+    Input context window of a model in tokens.
+
+    Lookup order: overrides (exact model), litellm's model map (max_input_tokens),
+    MODEL_CONTEXT_WINDOWS (longest matching prefix), DEFAULT_CONTEXT_WINDOW.
+
+    Args:
+        model: Model identifier (e.g. "openai/gpt-4o")
+        overrides: Optional model -> window mapping from config
+
+    Returns:
+        Context window in tokens
+    """
+    if overrides and model in overrides:
+        return int(overrides[model])
+
+    try:
+        import litellm
+
+        bare = model.split("/", 1)[-1]
+        info = litellm.model_cost.get(model) or litellm.model_cost.get(bare) or {}
+        window = info.get("max_input_tokens") or info.get("max_tokens")
+        if window:
+            return int(window)
+    except ImportError:
+        pass
+
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if matches:
+        return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def allocate_budget(sizes: Sequence[int], weights: Sequence[float], budget: int) -> List[int]:
+    """
+    Split a token budget across sections by weight (water-filling).
+
+    Sections needing less than their weighted share get exactly what they
+    need; the leftover is re-split among the remaining sections.
+
+    Args:
+        sizes: Tokens each section needs
+        weights: Importance of each section (> 0)
+        budget: Total tokens available
+
+    Returns:
+        Tokens allocated per section (each <= its size)
+    """
+    allocation = [0] * len(sizes)
+    open_sections = [i for i, size in enumerate(sizes) if size > 0]
+    remaining = max(budget, 0)
+
+    while open_sections and remaining > 0:
+        total_weight = sum(weights[i] for i in open_sections) or float(len(open_sections))
+        shares = {i: remaining * (weights[i] or 1.0) / total_weight for i in open_sections}
+        satisfied = [i for i in open_sections if sizes[i] <= shares[i]]
+        if not satisfied:
+            for i in open_sections:
+                allocation[i] = int(shares[i])
+            break
+        for i in satisfied:
+            allocation[i] = sizes[i]
+            remaining -= sizes[i]
+            open_sections.remove(i)
+
+    return allocation
+
+
+def truncate_to_tokens(text: str, max_tokens: int, token_counter: Callable[[str], int] = count_tokens) -> str:
+    """Longest prefix of text within max_tokens, cut at a line or word boundary when possible."""
+    if token_counter(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if token_counter(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+
+    cut = text[:low]
+    boundary = max(cut.rfind("\n"), cut.rfind(" "))
+    if boundary > low * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip()
+
+
+@dataclass
+class ContextSection:
+    """One prior-stage output to fit into the next prompt."""
+
+    name: str
+    text: str
+    weight: float = 1.0
+
+
+class ContextPacker:
+    """Fits prior-stage outputs into a token budget, compressing only what doesn't fit."""
+
+    def __init__(
+        self,
+        compress: Optional[Callable[[str, int], str]] = None,
+        token_counter: Callable[[str], int] = count_tokens,
+        min_compress_tokens: int = 64,
+    ):
+        """
+        Args:
+            compress: Compression function (text, target_tokens) -> text; None = trim only
+            token_counter: Token counting function
+            min_compress_tokens: Allocations below this are trimmed instead of compressed
+        """
+        self.compress = compress
+        self.token_counter = token_counter
+        self.min_compress_tokens = min_compress_tokens
+
+    def pack(self, sections: Sequence[ContextSection], budget_tokens: int) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Fit sections into budget_tokens.
+
+        Args:
+            sections: Outputs in prompt order
+            budget_tokens: Tokens available for all sections together
+
+        Returns:
+            Tuple of (packed text per section, report with budget, input and
+            packed token counts and the compressed/trimmed section names)
+        """
+        sizes = [self.token_counter(section.text) for section in sections]
+        report: Dict[str, Any] = {
+            "budget_tokens": budget_tokens,
+            "input_tokens": sum(sizes),
+            "packed_tokens": sum(sizes),
+            "compressed": [],
+            "trimmed": [],
+        }
+        if sum(sizes) <= budget_tokens:
+            return [section.text for section in sections], report
+
+        allocation = allocate_budget(sizes, [section.weight for section in sections], budget_tokens)
+        packed = []
+        for section, size, allowed in zip(sections, sizes, allocation):
+            text = section.text
+            if size > allowed:
+                if self.compress is not None and allowed >= self.min_compress_tokens:
+                    text = self.compress(text, allowed)
+                    report["compressed"].append(section.name)
+                if self.token_counter(text) > allowed:
+                    text = truncate_to_tokens(text, allowed, self.token_counter)
+                    report["trimmed"].append(section.name)
+            packed.append(text)
+
+        report["packed_tokens"] = sum(self.token_counter(text) for text in packed)
+        return packed, report
@@ -0,0 +1,97 @@
+"""
+Single-call multi-persona critic panel.
+
+Instead of one request per specialized critic (each repeating the same
+builder output), one model answers as every selected critic persona in a
+single request. Each persona's review is written under a marker line:
+
+    === CRITIC: security-critic ===
+    ...review...
+
+and parsed back into one section per critic, so the consensus merge sees the
+same (critic, feedback) pairs as with separate calls.
+"""
+
+import re
+from typing import Dict, List, Sequence
+
+SECTION_RE = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?={2,}[ \t]*CRITIC:[ \t]*(?P<name>[A-Za-z0-9_.-]+)[ \t]*={2,}[ \t]*$",
+    re.MULTILINE,
+)
+
+
+def build_panel_system(personas: Dict[str, str]) -> str:
+    """
+    System prompt combining every critic persona.
+
+    Args:
+        personas: Critic name -> that critic's system prompt
+
+    Returns:
+        Panel system prompt
+    """
+    parts = [
+        "You are a review panel of independent specialized critics. "
+        "Review the same builder output once per persona below, each strictly from its own perspective."
+    ]
+    for name, system in personas.items():
+        parts.append(f"## PERSONA: {name}\n{system.strip()}")
+    return "\n\n".join(parts)
+
+
+def panel_instructions(names: Sequence[str]) -> str:
+    """Output format instructions appended to the critic context."""
+    markers = "\n".join(f"=== CRITIC: {name} ===" for name in names)
+    return (
+        "Answer as EVERY persona, in this order. Start each review with its marker line, "
+        "exactly as written, and write nothing before the first marker:\n"
+        f"{markers}"
+    )
+
+
+def parse_panel_response(text: str, names: Sequence[str]) -> Dict[str, str]:
+    """
+    Split a panel answer into per-critic reviews.
+
+    Args:
+        text: Combined model response
+        names: Critic names that were requested
+
+    Returns:
+        Critic name -> review for every requested critic with a non-empty
+        section (first section wins if a marker repeats; unknown names ignored)
+    """
+    wanted = set(names)
+    matches = list(SECTION_RE.finditer(text))
+    sections: Dict[str, str] = {}
+    for k, match in enumerate(matches):
+        name = match.group("name")
+        end = matches[k + 1].start() if k + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if name in wanted and name not in sections and body:
+            sections[name] = body
+    return sections
+
+
+def split_usage(total: int, weights: Sequence[float]) -> List[int]:
+    """
+    Split a token count proportionally to weights (parts sum to total).
+
+    Args:
+        total: Tokens to split
+        weights: Relative share per part
+
+    Returns:
+        Integer share per part
+    """
+    if not weights:
+        return []
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        weights, weight_sum = [1.0] * len(weights), float(len(weights))
+    shares = [int(total * w / weight_sum) for w in weights]
+    # Hand out the rounding remainder to the largest parts first
+    for k in sorted(range(len(weights)), key=lambda i: -weights[i])[:total - sum(shares)]:
+        shares[k] += 1
+    return shares
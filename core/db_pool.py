@@ -0,0 +1,265 @@
+"""
+Shared SQLite connection pool for the memory database.
+
+Every memory query used to open (and close) its own connection, losing the
+page cache and compiled statements each time, and the default rollback
+journal made readers and writers block each other. The pool keeps:
+
+- one read connection per thread (``PRAGMA query_only``), reused across calls
+  so SQLite's statement cache (``cached_statements``) and page cache stay warm;
+  it is closed when the thread exits (critic / candidate thread pools are
+  created per chain, so leaving them open would leak connections)
+- one writer connection shared by all threads and serialized by a lock;
+  each ``writer()`` block is one transaction (commit on exit, rollback on error)
+
+Connections are opened in WAL mode with tuned ``synchronous``, ``cache_size``,
+``mmap_size`` and ``busy_timeout`` pragmas (``sqlite`` section of
+memory.yaml), so readers never wait for the writer.
+
+Pools are shared per database file: SQLiteBackend, SessionManager,
+ContextAggregator and the API health check all use get_pool().
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import load_memory_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Durable across app crashes in WAL mode; fsync only at checkpoints
+    "cache_size": -16000,  # Negative = KiB (16 MB page cache per connection)
+    "mmap_size": 268435456,  # 256 MB memory-mapped reads
+    "busy_timeout": 5000,  # ms to wait for a lock held by another process
+    "temp_store": "MEMORY",
+}
+
+
+class _ThreadReader:
+    """Thread-local holder of a read connection; its finalizer closes the connection."""
+
+    def __init__(self, generation: int, conn: sqlite3.Connection):
+        self.generation = generation
+        self.conn = conn
+
+
+def _file_identity(path: Path) -> Optional[Tuple[int, int]]:
+    """(device, inode) of the database file, None if it doesn't exist."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class SQLitePool:
+    """Per-thread read connections plus one serialized writer for a database file."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        pragmas: Optional[Dict[str, Any]] = None,
+        cached_statements: int = 256,
+    ):
+        """
+        Args:
+            db_path: SQLite database file
+            pragmas: PRAGMA name -> value applied to every connection (default: DEFAULT_PRAGMAS)
+            cached_statements: Prepared statements cached per connection
+        """
+        self.db_path = Path(db_path)
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._generation = 0  # Bumped by close(); stale thread-local readers are reopened
+        self._stats_lock = threading.Lock()
+        self.stats_counters = {"reads": 0, "writes": 0, "write_wait_ms": 0.0}
+
+        # Opening the writer creates the file and switches it to WAL (persistent per file)
+        with self._write_lock:
+            self._writer = self.connect(check_same_thread=False)
+        self.identity = _file_identity(self.db_path)
+
+    def connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        """
+        Open a new, tuned connection outside the pool (the caller closes it).
+
+        Args:
+            check_same_thread: sqlite3 same-thread check (pool connections disable it
+                so close() can run from any thread)
+
+        Returns:
+            Connection with row_factory = sqlite3.Row and the pool's pragmas applied
+        """
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.pragmas.get("busy_timeout", 5000) / 1000,
+            check_same_thread=check_same_thread,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {name}={value}")
+            except sqlite3.DatabaseError as e:
+                logger.warning(f"SQLite PRAGMA {name}={value} failed on {self.db_path}: {e}")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read connection (opened on first use, closed when the thread exits)."""
+        holder = getattr(self._local, "reader", None)
+        if holder is None or holder.generation != self._generation:
+            conn = self.connect(check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            with self._readers_lock:
+                self._readers.append(conn)
+                holder = _ThreadReader(self._generation, conn)
+            # Thread-local values are dropped when the thread ends (or the holder is replaced)
+            weakref.finalize(holder, self._release_reader, conn)
+            self._local.reader = holder
+        return holder.conn
+
+    def _release_reader(self, conn: sqlite3.Connection) -> None:
+        """Close a thread's read connection and forget it."""
+        with self._readers_lock:
+            try:
+                self._readers.remove(conn)
+            except ValueError:
+                pass  # Already closed by close()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Read connection for the calling thread.
+
+        Statements run in autocommit mode, so each one sees the latest
+        committed writes. Writes on this connection fail (query_only).
+        """
+        with self._stats_lock:
+            self.stats_counters["reads"] += 1
+        yield self._reader()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        The shared write connection, held exclusively for one transaction.
+
+        Commits when the block exits, rolls back if it raises. Blocks nest
+        (re-entrant lock); only the outermost one commits.
+        """
+        start = time.perf_counter()
+        with self._write_lock:
+            self.stats_counters["write_wait_ms"] += (time.perf_counter() - start) * 1000
+            if self._writer is None:
+                self._writer = self.connect(check_same_thread=False)
+            conn = self._writer
+            outermost = not getattr(self._local, "in_write", False)
+            self._local.in_write = True
+            try:
+                yield conn
+                if outermost:
+                    conn.commit()
+            except BaseException:
+                if outermost:
+                    conn.rollback()
+                raise
+            finally:
+                if outermost:
+                    self._local.in_write = False
+                    self.stats_counters["writes"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool counters and the database's journal mode."""
+        journal_mode = None
+        if self._writer is not None:
+            with self._write_lock:
+                journal_mode = self._writer.execute("PRAGMA journal_mode").fetchone()[0]
+        with self._readers_lock:
+            readers = len(self._readers)
+        return {
+            "journal_mode": journal_mode,
+            "read_connections": readers,
+            "reads": self.stats_counters["reads"],
+            "writes": self.stats_counters["writes"],
+            "write_wait_ms": round(self.stats_counters["write_wait_ms"], 1),
+        }
+
+    def close(self):
+        """
+        Close every pooled connection (a final WAL checkpoint runs on the last close).
+
+        The pool stays usable: connections are reopened on the next reader()/writer().
+        """
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+            self._generation += 1
+        for conn in readers:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Path) -> SQLitePool:
+    """
+    Get the shared pool for a database file.
+
+    Pools are keyed by resolved path. A pool whose file was deleted or
+    replaced (e.g. temporary test databases) is replaced by a fresh one.
+
+    Args:
+        db_path: SQLite database file
+
+    Returns:
+        SQLitePool configured from the ``sqlite`` section of memory.yaml
+    """
+    path = Path(db_path).resolve()
+    key = str(path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.identity != _file_identity(path):
+            pool.close()
+            pool = None
+        if pool is None:
+            config = load_memory_config().get("sqlite", {})
+            pool = SQLitePool(
+                path,
+                pragmas=config.get("pragmas"),
+                cached_statements=config.get("cached_statements", 256),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def close_pools():
+    """Close all pools (API shutdown, tests)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
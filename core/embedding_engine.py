@@ -9,11 +9,53 @@ Model: paraphrase-multilingual-MiniLM-L12-v2
 - Dimensions: 384
 - Languages: 50+
 - Speed: ~2000 sentences/sec on CPU
+
+Stored embeddings use a raw little-endian layout with an 8-byte header
+(EMBEDDING_MAGIC, format version, dtype code, dimension) and are decoded
+with np.frombuffer without copying. Databases written before v1.1.0 hold
+pickled ndarrays; deserialize_embedding() still reads those (numpy globals
+only) until scripts/migrate_embeddings_format.py has converted them.
 """
 
+import io
+import pickle
+import struct
 import numpy as np
 from typing import List, Optional
-import pickle
+
+from core.tracing import traced
+
+EMBEDDING_MAGIC = b"EMB"
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_HEADER = struct.Struct("<3sBBxH")  # magic, version, dtype code, pad, dim (8 bytes)
+EMBEDDING_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}  # code -> stored dtype
+EMBEDDING_DTYPE_CODES = {"float32": 0, "float16": 1}
+
+# Globals a pickled ndarray needs (legacy BLOBs); anything else is refused.
+# Protocol 5 pickles rebuild arrays with numeric._frombuffer instead of _reconstruct.
+_LEGACY_PICKLE_GLOBALS = {
+    ("numpy.core.multiarray", "_reconstruct"),
+    ("numpy._core.multiarray", "_reconstruct"),
+    ("numpy.core.numeric", "_frombuffer"),
+    ("numpy._core.numeric", "_frombuffer"),
+    ("numpy", "ndarray"),
+    ("numpy", "dtype"),
+    ("_codecs", "encode"),
+}
+
+
+class _LegacyEmbeddingUnpickler(pickle.Unpickler):
+    """Unpickler for pre-v1.1.0 embedding BLOBs that only resolves ndarray globals."""
+
+    def find_class(self, module, name):
+        if (module, name) not in _LEGACY_PICKLE_GLOBALS:
+            raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from an embedding BLOB")
+        return super().find_class(module, name)
+
+
+def is_legacy_embedding(data: bytes) -> bool:
+    """True if a stored embedding is a pickled ndarray (pre-v1.1.0 format)."""
+    return not bytes(data[:3]) == EMBEDDING_MAGIC
 
 
 class EmbeddingEngine:
@@ -49,6 +91,7 @@ class EmbeddingEngine:
 
         return self._model
 
+    @traced("embedding.encode")
     def encode(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text.
@@ -67,6 +110,7 @@ class EmbeddingEngine:
         embedding = self.model.encode(text, convert_to_numpy=True)
         return embedding
 
+    @traced("embedding.encode_batch")
     def encode_batch(self, texts: List[str]) -> np.ndarray:
         """
         Generate embeddings for multiple texts (more efficient).
@@ -144,30 +188,51 @@ class EmbeddingEngine:
         return similarities[:top_k]
 
     @staticmethod
-    def serialize_embedding(embedding: np.ndarray) -> bytes:
+    def serialize_embedding(embedding: np.ndarray, dtype: str = "float32") -> bytes:
         """
         Serialize embedding to bytes for database storage.
 
         Args:
             embedding: Numpy array embedding
+            dtype: Storage precision ("float32" or "float16", half the size)
 
         Returns:
-            Pickled bytes representation
+            Header + raw little-endian values
         """
-        return pickle.dumps(embedding)
+        if dtype not in EMBEDDING_DTYPE_CODES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype} (use float32 or float16)")
+        code = EMBEDDING_DTYPE_CODES[dtype]
+        values = np.asarray(embedding).ravel().astype(EMBEDDING_DTYPES[code], copy=False)
+        return EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION, code, len(values)) + values.tobytes()
 
     @staticmethod
     def deserialize_embedding(data: bytes) -> np.ndarray:
         """
         Deserialize embedding from database bytes.
 
+        Raw BLOBs are returned as a read-only view of ``data`` in their stored
+        dtype (float16 is not upcast); legacy pickled BLOBs are unpickled with
+        an unpickler restricted to numpy array globals.
+
         Args:
-            data: Pickled bytes from database
+            data: Stored embedding BLOB
 
         Returns:
             Numpy array embedding
+
+        Raises:
+            ValueError: Unknown format version/dtype or truncated BLOB
         """
-        return pickle.loads(data)
+        if is_legacy_embedding(data):
+            return _LegacyEmbeddingUnpickler(io.BytesIO(data)).load()
+
+        _, version, code, dim = EMBEDDING_HEADER.unpack_from(data)
+        if version != EMBEDDING_FORMAT_VERSION or code not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding format (version {version}, dtype code {code})")
+        dtype = EMBEDDING_DTYPES[code]
+        if len(data) != EMBEDDING_HEADER.size + dim * dtype.itemsize:
+            raise ValueError(f"Embedding BLOB has {len(data)} bytes, expected {dim} x {dtype.name}")
+        return np.frombuffer(data, dtype=dtype, count=dim, offset=EMBEDDING_HEADER.size)
 
 
 # Global singleton instance (lazy loaded)
@@ -0,0 +1,357 @@
+"""
+Append-only, memory-mapped embedding store shared across processes.
+
+Without it every API worker and CLI process rebuilds its own VectorIndex
+matrix by deserializing every embedding BLOB from SQLite. The store keeps
+the normalized vectors in a flat file next to the database that each
+process maps read-only, so the rows are shared through the page cache and
+are available as soon as the file is mapped.
+
+Layout (``conversations.vec`` / ``conversations.vec.ids``):
+
+- both files start with a 64-byte header: magic, version, dim, generation,
+  count, synced_id
+- ``.vec`` holds fixed-width rows of ``dim`` little-endian float32 values
+- ``.vec.ids`` holds one int64 conversation id per row (the id map)
+
+``count`` is the high-water mark: rows below it are committed. An append
+writes rows and ids past ``count``, fsyncs them and only then publishes the
+new count in the header, so a crash mid-append leaves unpublished bytes that
+the next append overwrites. Appends from several processes are serialized
+with ``flock`` on the ``.vec`` file. ``synced_id`` records the SQLite id up
+to which conversations have been copied into the store. The store needs
+POSIX file APIs (``SUPPORTED``); elsewhere MemoryEngine keeps the vectors in
+process memory as before.
+
+Rows are never rewritten: a re-embedded conversation gets a new row and
+deleted conversations keep theirs. build_store() (``memory_cli
+rebuild-vectors``) writes fresh files from SQLite and renames them into
+place; open stores notice the replacement with stale() and are reopened.
+"""
+
+import logging
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<8sIIQQQ")  # magic, version, dim, generation, count, synced_id
+HEADER_SIZE = 64
+VECTORS_MAGIC = b"MAOVEC\x00\x00"
+IDS_MAGIC = b"MAOIDS\x00\x00"
+STORE_VERSION = 1
+MIN_CAPACITY = 4096  # Rows preallocated when a file is created or grown
+SUPPORTED = fcntl is not None and hasattr(os, "pwrite")
+
+
+def _identity(fd_or_path) -> Tuple[int, int]:
+    stat = os.fstat(fd_or_path) if isinstance(fd_or_path, int) else os.stat(fd_or_path)
+    return stat.st_dev, stat.st_ino
+
+
+def _write_header(fd: int, magic: bytes, dim: int, generation: int, count: int, synced_id: int):
+    os.pwrite(fd, HEADER.pack(magic, STORE_VERSION, dim, generation, count, synced_id).ljust(HEADER_SIZE, b"\0"), 0)
+
+
+def _read_header(fd: int, magic: bytes) -> Tuple[int, int, int, int]:
+    """(dim, generation, count, synced_id) of a store file."""
+    data = os.pread(fd, HEADER.size, 0)
+    if len(data) < HEADER.size:
+        raise ValueError("truncated embedding store header")
+    file_magic, version, dim, generation, count, synced_id = HEADER.unpack(data)
+    if file_magic != magic or version != STORE_VERSION:
+        raise ValueError(f"not an embedding store file (magic {file_magic!r}, version {version})")
+    return dim, generation, count, synced_id
+
+
+def _create_files(path: Path, ids_path: Path, dim: int, capacity: int, synced_id: int = 0) -> Tuple[int, int]:
+    """Create an empty pair of store files; returns (vectors fd, ids fd)."""
+    generation = secrets.randbits(63)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    ids_fd = os.open(ids_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.ftruncate(fd, HEADER_SIZE + capacity * dim * 4)
+    os.ftruncate(ids_fd, HEADER_SIZE + capacity * 8)
+    _write_header(ids_fd, IDS_MAGIC, dim, generation, 0, 0)
+    _write_header(fd, VECTORS_MAGIC, dim, generation, 0, synced_id)
+    return fd, ids_fd
+
+
+class EmbeddingStore:
+    """Memory-mapped append-only rows of (conversation id, normalized float32 vector)."""
+
+    def __init__(self, path: Path, fsync: bool = True):
+        """
+        Args:
+            path: ``.vec`` file (the id map is ``<path>.ids``); created on first append
+            fsync: fsync rows before publishing them (crash safety vs append latency)
+        """
+        self.path = Path(path)
+        self.ids_path = self.path.with_name(self.path.name + ".ids")
+        self.fsync = fsync
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.count = 0  # Committed rows as of the last refresh()/append()
+        self.synced_id = 0
+        self.vectors = np.zeros((0, 0), dtype=np.float32)  # Read-only view of the mapped rows
+        self.ids = np.zeros(0, dtype=np.int64)
+        self._fd: Optional[int] = None
+        self._ids_fd: Optional[int] = None
+        self._capacity = 0
+        self._lock = threading.RLock()
+        self._open()
+
+    # --- Opening and mapping ---
+
+    def _open(self) -> bool:
+        """Open and map existing files (False if absent or mid-rebuild)."""
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            ids_fd = os.open(self.ids_path, os.O_RDWR)
+        except FileNotFoundError:
+            os.close(fd)
+            return False
+        try:
+            dim, generation, count, synced_id = _read_header(fd, VECTORS_MAGIC)
+            ids_dim, ids_generation, _, _ = _read_header(ids_fd, IDS_MAGIC)
+            if (ids_dim, ids_generation) != (dim, generation):
+                raise ValueError("vector and id files are from different builds")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring embedding store {self.path}: {e}")
+            os.close(fd)
+            os.close(ids_fd)
+            return False
+
+        self.close()
+        self._fd, self._ids_fd = fd, ids_fd
+        self.dim, self.generation, self.count, self.synced_id = dim, generation, count, synced_id
+        self._map()
+        return True
+
+    def _map(self):
+        """(Re)map both files at their current size."""
+        capacity = min(
+            (os.fstat(self._fd).st_size - HEADER_SIZE) // (self.dim * 4),
+            (os.fstat(self._ids_fd).st_size - HEADER_SIZE) // 8,
+        )
+        vectors = mmap.mmap(self._fd, HEADER_SIZE + capacity * self.dim * 4, access=mmap.ACCESS_READ)
+        ids = mmap.mmap(self._ids_fd, HEADER_SIZE + capacity * 8, access=mmap.ACCESS_READ)
+        self.vectors = np.frombuffer(vectors, dtype="<f4", count=capacity * self.dim, offset=HEADER_SIZE).reshape(
+            capacity, self.dim
+        )
+        self.ids = np.frombuffer(ids, dtype="<i8", count=capacity, offset=HEADER_SIZE)
+        self._capacity = capacity
+
+    def refresh(self) -> int:
+        """
+        Pick up rows committed by other processes.
+
+        Returns:
+            Committed row count
+        """
+        with self._lock:
+            if self._fd is None:
+                self._open()
+                return self.count
+            _, _, self.count, self.synced_id = _read_header(self._fd, VECTORS_MAGIC)
+            if self.count > self._capacity:
+                self._map()
+            return self.count
+
+    def stale(self) -> bool:
+        """True if the files were replaced (rebuild) or created since this store was opened."""
+        with self._lock:
+            try:
+                current = _identity(self.path)
+            except FileNotFoundError:
+                return self._fd is not None
+            return self._fd is None or current != _identity(self._fd)
+
+    def close(self):
+        """Close the file descriptors (mapped views stay valid until released)."""
+        with self._lock:
+            for fd in (self._fd, self._ids_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._ids_fd = None
+
+    # --- Appends ---
+
+    @contextmanager
+    def _append_lock(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _create(self, dim: int):
+        """Create the files on first append (losing a creation race opens the winner's files)."""
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        ids_tmp = self.ids_path.with_name(f"{self.ids_path.name}.{os.getpid()}.tmp")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        for fd in _create_files(tmp, ids_tmp, dim, MIN_CAPACITY):
+            os.close(fd)
+        try:
+            os.link(tmp, self.path)  # Atomic, fails if another process created it first
+            os.replace(ids_tmp, self.ids_path)
+        except FileExistsError:
+            ids_tmp.unlink()
+        finally:
+            tmp.unlink()
+        for _ in range(20):
+            if self._open():
+                return
+            time.sleep(0.05)  # The winner hasn't renamed its id map yet
+        raise RuntimeError(f"Embedding store {self.path} could not be opened after creation")
+
+    def append(self, conversation_ids: np.ndarray, vectors: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Append rows and publish them (crash-safe).
+
+        Args:
+            conversation_ids: Conversation ids, shape (n,)
+            vectors: Normalized embeddings, shape (n, dim)
+
+        Returns:
+            Row numbers of the appended rows, or None if the store was rebuilt
+            by another process (reopen it)
+
+        Raises:
+            ValueError: Dimension differs from the store's
+        """
+        conversation_ids = np.asarray(conversation_ids, dtype="<i8").ravel()
+        vectors = np.asarray(vectors, dtype="<f4").reshape(len(conversation_ids), -1)
+        with self._lock:
+            if self._fd is None and not self._open():
+                self._create(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != store dim {self.dim}")
+
+            with self._append_lock():
+                if self.stale():
+                    return None
+                _, _, count, synced_id = _read_header(self._fd, VECTORS_MAGIC)
+                needed = count + len(conversation_ids)
+                if needed > self._capacity:
+                    capacity = max(needed, self._capacity * 2, MIN_CAPACITY)
+                    os.ftruncate(self._fd, max(os.fstat(self._fd).st_size, HEADER_SIZE + capacity * self.dim * 4))
+                    os.ftruncate(self._ids_fd, max(os.fstat(self._ids_fd).st_size, HEADER_SIZE + capacity * 8))
+
+                os.pwrite(self._ids_fd, conversation_ids.tobytes(), HEADER_SIZE + count * 8)
+                os.pwrite(self._fd, vectors.tobytes(), HEADER_SIZE + count * self.dim * 4)
+                if self.fsync:
+                    os.fsync(self._ids_fd)
+                    os.fsync(self._fd)
+                # Publish: rows below the new count are now visible to readers
+                _write_header(self._fd, VECTORS_MAGIC, self.dim, self.generation, needed, synced_id)
+                if self.fsync:
+                    os.fsync(self._fd)
+
+            self.count, self.synced_id = needed, synced_id
+            if needed > self._capacity:
+                self._map()
+            return np.arange(count, needed)
+
+    def set_synced_id(self, conversation_id: int):
+        """Persist that SQLite conversations up to this id are in the store (only ever raised)."""
+        with self._lock:
+            if self._fd is None or conversation_id <= self.synced_id:
+                return
+            with self._append_lock():
+                if self.stale():
+                    return
+                _, _, count, synced_id = _read_header(self._fd, VECTORS_MAGIC)
+                if conversation_id > synced_id:
+                    _write_header(self._fd, VECTORS_MAGIC, self.dim, self.generation, count, conversation_id)
+                    synced_id = conversation_id
+                self.count, self.synced_id = count, synced_id
+
+    def stats(self) -> Dict[str, Any]:
+        """Row count, dimension and file size."""
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "rows": self.count,
+                "dim": self.dim,
+                "capacity": self._capacity,
+                "synced_id": self.synced_id,
+                "file_bytes": self.path.stat().st_size if self._fd is not None else 0,
+            }
+
+
+def build_store(
+    path: Path, batches: Iterable[Tuple[np.ndarray, np.ndarray]], synced_id: Optional[int] = None
+) -> int:
+    """
+    Write a new store from (ids, normalized vectors) batches and swap it in.
+
+    The files are written under temporary names and renamed over the old
+    ones (id map first), so open stores keep reading the old generation
+    until they notice stale().
+
+    Args:
+        path: ``.vec`` file
+        batches: Iterable of (conversation ids, vectors) arrays
+        synced_id: Highest SQLite conversation id covered (default: highest id written)
+
+    Returns:
+        Rows written
+    """
+    path = Path(path)
+    ids_path = path.with_name(path.name + ".ids")
+    tmp = path.with_name(path.name + ".rebuild")
+    ids_tmp = ids_path.with_name(ids_path.name + ".rebuild")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    rows, max_id = 0, 0
+    fd = ids_fd = None
+    try:
+        for conversation_ids, vectors in batches:
+            conversation_ids = np.asarray(conversation_ids, dtype="<i8").ravel()
+            if not len(conversation_ids):
+                continue
+            vectors = np.asarray(vectors, dtype="<f4").reshape(len(conversation_ids), -1)
+            if fd is None:
+                dim = vectors.shape[1]
+                fd, ids_fd = _create_files(tmp, ids_tmp, dim, MIN_CAPACITY)
+                _, generation, _, _ = _read_header(fd, VECTORS_MAGIC)
+            os.pwrite(ids_fd, conversation_ids.tobytes(), HEADER_SIZE + rows * 8)
+            os.pwrite(fd, vectors.tobytes(), HEADER_SIZE + rows * dim * 4)
+            rows += len(conversation_ids)
+            max_id = max(max_id, int(conversation_ids.max()))
+
+        if fd is None:
+            # Nothing to store: remove the old files (created again on first append)
+            for old in (path, ids_path):
+                old.unlink(missing_ok=True)
+            return 0
+
+        _write_header(fd, VECTORS_MAGIC, dim, generation, rows, max_id if synced_id is None else synced_id)
+        os.fsync(ids_fd)
+        os.fsync(fd)
+    finally:
+        for handle in (fd, ids_fd):
+            if handle is not None:
+                os.close(handle)
+
+    os.replace(ids_tmp, ids_path)
+    os.replace(tmp, path)
+    return rows
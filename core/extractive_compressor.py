@@ -0,0 +1,226 @@
+"""
+Local extractive compression (no LLM call).
+
+Splits an output into units (fenced code blocks, headings, list items and
+sentences), scores each unit by:
+- embedding centrality: cosine similarity to the mean unit embedding, so
+  units about the output's main topic win (EmbeddingEngine, optional)
+- keyword salience: density of the output's recurring terms plus decision
+  cue words (MUST, BECAUSE, TRADE-OFF, ...)
+
+and packs the best units into the token target, keeping their original order.
+Without sentence-transformers the ranking uses keyword salience only.
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from config.settings import count_tokens
+from core.text_classifier import compile_keywords
+from core.tracing import traced
+
+DEFAULT_CUE_KEYWORDS = (
+    "MUST", "SHOULD", "DECISION", "DECIDED", "BECAUSE", "TRADE-OFF", "TRADEOFF", "RISK",
+    "REQUIRE", "CRITICAL", "SECURITY", "RECOMMEND", "TODO", "OPEN QUESTION",
+)
+
+_CODE_FENCE_RE = re.compile(r"^```[^\n]*\n.*?^```[^\n]*$", re.DOTALL | re.MULTILINE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[`*])")
+_STANDALONE_LINE_RE = re.compile(r"^\s*(#{1,6}\s|[-*+]\s|\d+[.)]\s|\|)")
+_WORD_RE = re.compile(r"[a-z][a-z0-9_]{2,}")
+_STOPWORDS = frozenset(
+    "the and for with that this from are was were will can not but you your have has had its into "
+    "use using used also than then them they their there these those which when where what while "
+    "should would could must may might our out all any each more most other some such only own same "
+    "very just about over under again further once here why how both few nor off too".split()
+)
+
+
+@dataclass
+class TextUnit:
+    """One extractable piece of the text."""
+
+    text: str
+    block: int  # Units of the same block (paragraph) are joined with spaces
+    kind: str  # "code", "line" or "sentence"
+
+
+def split_units(text: str) -> List[TextUnit]:
+    """
+    Split text into code blocks, standalone lines (headings, list items, table
+    rows) and sentences of prose paragraphs.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        Units in original order
+    """
+    units: List[TextUnit] = []
+    block = 0
+
+    def add_prose(prose: str) -> None:
+        nonlocal block
+        for paragraph in re.split(r"\n\s*\n", prose):
+            lines = [line for line in paragraph.split("\n") if line.strip()]
+            pending: List[str] = []
+            for line in lines + [None]:
+                if line is not None and not _STANDALONE_LINE_RE.match(line):
+                    pending.append(line.strip())
+                    continue
+                if pending:
+                    for sentence in _SENTENCE_END_RE.split(" ".join(pending)):
+                        units.append(TextUnit(sentence, block, "sentence"))
+                    block += 1
+                    pending = []
+                if line is not None:
+                    units.append(TextUnit(line.rstrip(), block, "line"))
+                    block += 1
+
+    position = 0
+    for match in _CODE_FENCE_RE.finditer(text):
+        add_prose(text[position:match.start()])
+        units.append(TextUnit(match.group(0), block, "code"))
+        block += 1
+        position = match.end()
+    add_prose(text[position:])
+    return units
+
+
+def join_units(units: Sequence[TextUnit]) -> str:
+    """Rebuild text from units (sentences of one paragraph on one line)."""
+    parts: List[str] = []
+    previous_block = None
+    for unit in units:
+        if parts and unit.block == previous_block and unit.kind == "sentence":
+            parts[-1] = f"{parts[-1]} {unit.text}"
+        else:
+            parts.append(unit.text)
+        previous_block = unit.block
+    return "\n".join(parts)
+
+
+def _normalize(scores: np.ndarray) -> np.ndarray:
+    """Scale scores to [0, 1] (all-equal scores become 0)."""
+    low, high = float(scores.min()), float(scores.max())
+    if high - low < 1e-12:
+        return np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+class ExtractiveCompressor:
+    """Ranks text units by centrality and salience and packs them into a token target."""
+
+    def __init__(
+        self,
+        embedding_engine=None,
+        cue_keywords: Sequence[str] = DEFAULT_CUE_KEYWORDS,
+        centrality_weight: float = 0.6,
+        salience_weight: float = 0.4,
+        token_counter: Callable[[str], int] = count_tokens,
+    ):
+        """
+        Args:
+            embedding_engine: EmbeddingEngine for centrality (None = salience only)
+            cue_keywords: Upper-case decision cue words that raise a unit's salience
+            centrality_weight: Weight of embedding centrality in the unit score
+            salience_weight: Weight of keyword salience in the unit score
+            token_counter: Token counting function (default: tiktoken count_tokens)
+        """
+        self.embedding_engine = embedding_engine
+        self.cue_matcher = compile_keywords(tuple(k.upper() for k in cue_keywords))
+        self.centrality_weight = centrality_weight
+        self.salience_weight = salience_weight
+        self.token_counter = token_counter
+
+    def centrality(self, units: Sequence[TextUnit]) -> Optional[np.ndarray]:
+        """Cosine similarity of each unit to the mean unit embedding (None if unavailable)."""
+        if self.embedding_engine is None or len(units) < 2:
+            return None
+        try:
+            embeddings = np.asarray(self.embedding_engine.encode_batch([u.text for u in units]), dtype=np.float32)
+        except (ImportError, RuntimeError):
+            self.embedding_engine = None  # Model unavailable: salience only from now on
+            return None
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        centroid = embeddings.mean(axis=0)
+        centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+        return embeddings @ centroid
+
+    def salience(self, units: Sequence[TextUnit]) -> np.ndarray:
+        """Recurring-term density plus decision cue hits per unit."""
+        unit_words = [[w for w in _WORD_RE.findall(u.text.lower()) if w not in _STOPWORDS] for u in units]
+        term_frequency = Counter(w for words in unit_words for w in words)
+
+        scores = np.zeros(len(units))
+        for i, (unit, words) in enumerate(zip(units, unit_words)):
+            recurring = sum(math.log(term_frequency[w]) for w in set(words))
+            density = recurring / math.sqrt(len(words) + 1)
+            cues = sum(1 for n in self.cue_matcher.count(unit.text.upper()).values() if n)
+            scores[i] = density + cues
+        return scores
+
+    def score(self, units: Sequence[TextUnit]) -> np.ndarray:
+        """Combined unit scores (higher = keep first)."""
+        salience = _normalize(self.salience(units))
+        centrality = self.centrality(units)
+        if centrality is None:
+            scores = salience
+        else:
+            total = self.centrality_weight + self.salience_weight
+            scores = (self.centrality_weight * _normalize(centrality) + self.salience_weight * salience) / total
+
+        # Headings keep the structure readable; the opening unit usually states the approach
+        for i, unit in enumerate(units):
+            if unit.kind == "line" and unit.text.lstrip().startswith("#"):
+                scores[i] += 0.2
+        if len(units) > 0:
+            scores[0] += 0.1
+        return scores
+
+    @traced("compression.extractive")
+    def compress(self, text: str, max_tokens: int = 500) -> str:
+        """
+        Select the highest-scoring units that fit max_tokens.
+
+        Args:
+            text: Text to compress
+            max_tokens: Token target (measured with token_counter)
+
+        Returns:
+            Selected units in original order (text unchanged if it already fits)
+        """
+        if self.token_counter(text) <= max_tokens:
+            return text
+        units = split_units(text)
+        if not units:
+            return text
+
+        scores = self.score(units)
+        costs = [self.token_counter(u.text) + 1 for u in units]  # +1: separator
+
+        selected = set()
+        remaining = max_tokens
+        for i in sorted(range(len(units)), key=lambda k: (-scores[k], k)):
+            if costs[i] <= remaining:
+                selected.add(i)
+                remaining -= costs[i]
+
+        if not selected:
+            # Even the best unit is too long: cut it (≈4 chars per token)
+            best = int(np.argmax(scores))
+            return units[best].text[:max_tokens * 4]
+
+        # Separator estimates can be off for merged sentences: drop lowest scores until it fits
+        result = join_units([units[i] for i in sorted(selected)])
+        while len(selected) > 1 and self.token_counter(result) > max_tokens:
+            selected.remove(min(selected, key=lambda k: (scores[k], -k)))
+            result = join_units([units[i] for i in sorted(selected)])
+        return result
@@ -1,13 +1,16 @@
 """LLM connector using LiteLLM for unified API access."""
 
 import os
+import threading
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import litellm
 
 from config.settings import is_provider_enabled
+from core.tracing import annotate, span, traced
 
 
 @dataclass
@@ -32,9 +35,64 @@ class LLMConnector:
 
     def __init__(self, retry_count: int = 1):
         self.retry_count = retry_count
+        # Per-provider concurrency limits (provider -> semaphore), empty = unlimited
+        self._provider_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._provider_limits: Dict[str, int] = {}
+        # Calls in progress per provider (waiting for a slot or running)
+        self._in_flight: Dict[str, int] = {}
+        self._in_flight_lock = threading.Lock()
         # Disable LiteLLM logging
         litellm.suppress_debug_info = True
 
+    def set_provider_limits(self, limits: Optional[Dict[str, int]]) -> None:
+        """
+        Cap the number of concurrent in-flight calls per provider.
+
+        Used by batch runs so that many parallel chains don't exceed
+        provider rate limits. Providers not listed stay unlimited.
+
+        Args:
+            limits: Mapping of provider name (openai, anthropic, google) to max
+                    concurrent calls, or None to remove all limits
+        """
+        self._provider_limits = {
+            provider.lower(): limit for provider, limit in (limits or {}).items() if limit and limit > 0
+        }
+        self._provider_slots = {
+            provider: threading.BoundedSemaphore(limit) for provider, limit in self._provider_limits.items()
+        }
+
+    def in_flight(self, provider: Optional[str] = None) -> int:
+        """Calls in progress (waiting for a slot or running), for one provider or in total."""
+        with self._in_flight_lock:
+            if provider is not None:
+                return self._in_flight.get(provider, 0)
+            return sum(self._in_flight.values())
+
+    def provider_limit(self, provider: str) -> Optional[int]:
+        """Concurrency limit of a provider (None = unlimited)."""
+        return self._provider_limits.get(provider)
+
+    @contextmanager
+    def _provider_slot(self, provider: str):
+        """Hold a concurrency slot for provider (no-op if provider is unlimited)."""
+        with self._in_flight_lock:
+            self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+        try:
+            slot = self._provider_slots.get(provider)
+            if slot is None:
+                yield
+                return
+            with span("llm.slot_wait", provider=provider):
+                slot.acquire()
+            try:
+                yield
+            finally:
+                slot.release()
+        finally:
+            with self._in_flight_lock:
+                self._in_flight[provider] -= 1
+
     def _extract_provider(self, model: str) -> str:
         """
         Extract provider name from model string.
@@ -51,6 +109,7 @@ class LLMConnector:
 
         return provider_map.get(prefix, prefix)
 
+    @traced("llm.attempt")
     def _try_model(
         self,
         model: str,
@@ -66,6 +125,7 @@ class LLMConnector:
             Tuple of (LLMResponse if successful, error_reason if failed)
         """
         provider = self._extract_provider(model)
+        annotate(model=model)
 
         # Check if provider is enabled
         if not is_provider_enabled(provider):
@@ -75,12 +135,13 @@ class LLMConnector:
         last_error = None
         for attempt in range(self.retry_count + 1):
             try:
-                response = litellm.completion(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
+                with self._provider_slot(provider):
+                    response = litellm.completion(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    )
 
                 duration_ms = (time.perf_counter() - start_time) * 1000
 
@@ -139,6 +200,7 @@ class LLMConnector:
         # All retries failed
         return None, f"Model call failed after {self.retry_count + 1} attempts: {last_error}"
 
+    @traced("llm.call")
     def call(
         self,
         model: str,
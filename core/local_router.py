@@ -0,0 +1,388 @@
+"""
+Local embedding-based router for agent="auto" requests.
+
+Classifies prompts into builder / critic / closer without an LLM round-trip,
+using EmbeddingEngine vectors and either nearest-centroid or k-NN voting.
+
+Training data:
+- Labelled examples (config/router_examples.yaml)
+- Historical routed conversations from the memory DB (tagged "auto-routed")
+
+The model (example vectors + labels) is persisted to data/MEMORY/ as .npz so
+it can be reloaded without re-encoding. It stores a hash of the routing
+settings, labelled examples and embedding model it was built from, and is
+retrained when they change. The runtime only trusts a local
+decision when its confidence clears the configured threshold; otherwise it
+falls back to the LLM router.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from config.settings import BASE_DIR
+from core.embedding_engine import EmbeddingEngine, get_embedding_engine
+
+logger = logging.getLogger(__name__)
+
+ROUTER_LABELS = ("builder", "critic", "closer")
+ROUTED_TAG = "auto-routed"
+LLM_ROUTED_TAG = "router:llm"  # Routed rows are tagged router:<source>; only LLM decisions train the model
+
+
+def load_router_examples(path: Path) -> List[Tuple[str, str]]:
+    """
+    Load labelled routing examples from YAML.
+
+    Expected format:
+        builder:
+          - "Implement a REST API"
+        critic:
+          - "Review this code"
+
+    Returns:
+        List of (prompt, label) tuples
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+
+    examples = []
+    for label, prompts in data.items():
+        if label not in ROUTER_LABELS:
+            continue
+        examples.extend((str(p), label) for p in prompts or [])
+    return examples
+
+
+def router_config_hash(config: Dict[str, Any], examples: Sequence[Tuple[str, str]], model_name: str) -> str:
+    """
+    Fingerprint of what a router model is built from.
+
+    Args:
+        config: routing.local section of agents.yaml
+        examples: Labelled (prompt, label) examples
+        model_name: Embedding model name
+
+    Returns:
+        sha256 hex digest (history rows are excluded: they change on every run)
+    """
+    relevant = {
+        "labels": list(ROUTER_LABELS),
+        "method": config.get("method", "centroid"),
+        "k": config.get("k", 5),
+        "temperature": config.get("temperature", 0.05),
+        "include_history": config.get("include_history", True),
+        "history_limit": config.get("history_limit", 2000),
+        "examples": [list(example) for example in examples],
+        "model_name": model_name,
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LocalRouter:
+    """Nearest-centroid / k-NN prompt classifier over sentence embeddings."""
+
+    def __init__(
+        self,
+        embedding_engine: Optional[EmbeddingEngine] = None,
+        method: str = "centroid",
+        k: int = 5,
+        temperature: float = 0.05,
+    ):
+        """
+        Args:
+            embedding_engine: Engine used to embed prompts (default: global singleton)
+            method: "centroid" (compare to per-label mean) or "knn" (vote of k nearest examples)
+            k: Neighbours for k-NN
+            temperature: Softmax temperature for centroid confidence (lower = sharper)
+        """
+        if method not in ("centroid", "knn"):
+            raise ValueError(f"Unknown router method: {method}")
+        self._embedding_engine = embedding_engine
+        self.method = method
+        self.k = k
+        self.temperature = temperature
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.labels: List[str] = []
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.centroid_labels: List[str] = []
+        self.trained_at: Optional[float] = None
+        self.config_hash: Optional[str] = None  # router_config_hash() of the training inputs
+
+    @property
+    def embedding_engine(self) -> EmbeddingEngine:
+        """Lazy load embedding engine only when needed."""
+        if self._embedding_engine is None:
+            self._embedding_engine = get_embedding_engine()
+        return self._embedding_engine
+
+    @property
+    def is_trained(self) -> bool:
+        """Whether the router has at least two labels to choose between."""
+        return len(self.centroid_labels) >= 2
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        """L2-normalize rows (zero rows stay zero)."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _rebuild_centroids(self) -> None:
+        """Recompute normalized per-label centroids from example vectors."""
+        labels = [label for label in ROUTER_LABELS if label in self.labels]
+        label_array = np.array(self.labels)
+        self.centroid_labels = labels
+        if not labels:
+            self.centroids = np.zeros((0, 0), dtype=np.float32)
+            return
+        self.centroids = self._normalize(
+            np.stack([self.vectors[label_array == label].mean(axis=0) for label in labels])
+        )
+
+    def train(self, examples: Sequence[Tuple[str, str]]) -> int:
+        """
+        Train (replace) the router from (prompt, label) examples.
+
+        Returns:
+            Number of examples used
+        """
+        examples = [(p, label) for p, label in examples if p and p.strip() and label in ROUTER_LABELS]
+        if not examples:
+            return 0
+
+        prompts = [p for p, _ in examples]
+        self.vectors = self._normalize(self.embedding_engine.encode_batch(prompts))
+        self.labels = [label for _, label in examples]
+        self._rebuild_centroids()
+        self.trained_at = time.time()
+        return len(examples)
+
+    def train_from_memory(
+        self,
+        memory,
+        examples: Sequence[Tuple[str, str]] = (),
+        limit: int = 2000,
+    ) -> int:
+        """
+        Train from labelled examples plus historical routed conversations.
+
+        Args:
+            memory: MemoryEngine (or backend) exposing get_routed_examples()
+            examples: Labelled (prompt, label) examples
+            limit: Max historical conversations to include
+
+        Returns:
+            Number of examples used
+        """
+        history: List[Tuple[str, str]] = []
+        try:
+            history = memory.get_routed_examples(limit=limit)
+        except Exception as e:
+            logger.warning(f"Failed to load routed conversations for router training: {e}")
+        return self.train(list(examples) + list(history))
+
+    def scores(self, prompt: str) -> Dict[str, float]:
+        """
+        Per-label confidence for prompt (sums to 1).
+
+        Returns:
+            Dict of label -> probability (empty if untrained)
+        """
+        if not self.is_trained:
+            return {}
+
+        query = self._normalize(self.embedding_engine.encode(prompt))[0]
+
+        if self.method == "knn":
+            similarities = self.vectors @ query
+            k = min(self.k, len(similarities))
+            top = np.argpartition(-similarities, k - 1)[:k]
+            votes = {label: 0.0 for label in self.centroid_labels}
+            for idx in top:
+                votes[self.labels[idx]] += max(float(similarities[idx]), 0.0)
+            total = sum(votes.values())
+            if total == 0:
+                return {label: 1.0 / len(votes) for label in votes}
+            return {label: v / total for label, v in votes.items()}
+
+        similarities = self.centroids @ query
+        logits = similarities / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        return {label: float(p) for label, p in zip(self.centroid_labels, probs)}
+
+    def predict(self, prompt: str) -> Tuple[Optional[str], float]:
+        """
+        Classify prompt.
+
+        Returns:
+            Tuple of (label or None if untrained, confidence 0-1)
+        """
+        scores = self.scores(prompt)
+        if not scores:
+            return (None, 0.0)
+        label = max(scores, key=scores.get)
+        return (label, scores[label])
+
+    def evaluate(
+        self,
+        examples: Sequence[Tuple[str, str]],
+        thresholds: Sequence[float] = (0.0, 0.5, 0.6, 0.7, 0.8, 0.9),
+    ) -> Dict[str, Any]:
+        """
+        Offline accuracy vs latency report on held-out examples.
+
+        For each confidence threshold, reports the share of prompts the local
+        router would answer (coverage) and its accuracy on that share. The
+        remainder would go to the LLM router.
+
+        Returns:
+            Report dict with overall accuracy, latency percentiles and per-threshold rows
+        """
+        predictions = []
+        latencies_ms = []
+        for prompt, expected in examples:
+            start = time.perf_counter()
+            label, confidence = self.predict(prompt)
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            predictions.append((label, confidence, expected))
+
+        total = len(predictions)
+        if not total:
+            return {"examples": 0, "accuracy": 0.0, "thresholds": []}
+
+        rows = []
+        for threshold in thresholds:
+            covered = [(label, expected) for label, conf, expected in predictions if conf >= threshold]
+            correct = sum(1 for label, expected in covered if label == expected)
+            rows.append({
+                "threshold": threshold,
+                "coverage": round(len(covered) / total, 4),
+                "accuracy": round(correct / len(covered), 4) if covered else None,
+            })
+
+        latencies = np.array(latencies_ms)
+        return {
+            "examples": total,
+            "method": self.method,
+            "accuracy": round(sum(1 for label, _, expected in predictions if label == expected) / total, 4),
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+                "mean": round(float(latencies.mean()), 3),
+            },
+            "thresholds": rows,
+        }
+
+    def save(self, path: Path) -> Path:
+        """Persist example vectors, labels and settings to an .npz file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "method": self.method,
+            "k": self.k,
+            "temperature": self.temperature,
+            "model_name": self.embedding_engine.model_name,
+            "trained_at": self.trained_at,
+            "config_hash": self.config_hash,
+        }
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                vectors=self.vectors,
+                labels=np.array(self.labels),
+                meta=np.array(json.dumps(meta)),
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Path, embedding_engine: Optional[EmbeddingEngine] = None) -> "LocalRouter":
+        """
+        Load a router saved with save().
+
+        Raises:
+            FileNotFoundError: If path does not exist
+            ValueError: If the model was trained with a different embedding model
+        """
+        with np.load(Path(path), allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            router = cls(
+                embedding_engine=embedding_engine,
+                method=meta.get("method", "centroid"),
+                k=meta.get("k", 5),
+                temperature=meta.get("temperature", 0.05),
+            )
+            router.vectors = data["vectors"].astype(np.float32)
+            router.labels = [str(label) for label in data["labels"]]
+
+        if embedding_engine is not None and meta.get("model_name") not in (None, embedding_engine.model_name):
+            raise ValueError(
+                f"Router trained with '{meta.get('model_name')}', engine uses '{embedding_engine.model_name}'"
+            )
+
+        router.trained_at = meta.get("trained_at")
+        router.config_hash = meta.get("config_hash")
+        router._rebuild_centroids()
+        return router
+
+
+def load_or_train_local_router(
+    config: Dict[str, Any],
+    memory=None,
+    embedding_engine: Optional[EmbeddingEngine] = None,
+) -> LocalRouter:
+    """
+    Load the persisted router model, or train and persist a new one.
+
+    The persisted model is reused only if it was built from the current
+    settings, examples and embedding model (router_config_hash()).
+
+    Args:
+        config: routing.local section of agents.yaml
+        memory: Optional MemoryEngine for historical routed conversations
+        embedding_engine: Optional embedding engine (default: global singleton)
+
+    Returns:
+        LocalRouter (may be untrained if no examples are available)
+    """
+    embedding_engine = embedding_engine or get_embedding_engine()
+    examples_path = BASE_DIR / config.get("examples_path", "config/router_examples.yaml")
+    examples = load_router_examples(examples_path) if examples_path.exists() else []
+    config_hash = router_config_hash(config, examples, embedding_engine.model_name)
+
+    model_path = BASE_DIR / config.get("model_path", "data/MEMORY/router_model.npz")
+    if model_path.exists():
+        try:
+            router = LocalRouter.load(model_path, embedding_engine=embedding_engine)
+            if router.config_hash == config_hash:
+                return router
+            logger.info(f"Routing config changed since {model_path} was trained, retraining")
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Router model at {model_path} unusable, retraining: {e}")
+
+    router = LocalRouter(
+        embedding_engine=embedding_engine,
+        method=config.get("method", "centroid"),
+        k=config.get("k", 5),
+        temperature=config.get("temperature", 0.05),
+    )
+
+    if memory is not None and config.get("include_history", True):
+        router.train_from_memory(memory, examples, limit=config.get("history_limit", 2000))
+    else:
+        router.train(examples)
+
+    router.config_hash = config_hash
+    if router.is_trained:
+        router.save(model_path)
+    return router
@@ -6,7 +6,7 @@ import re
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from config.settings import CONVERSATIONS_DIR, estimate_cost
 
@@ -33,12 +33,28 @@ def mask_sensitive_data(text: str) -> str:
     return text
 
 
-def write_json(record: Dict[str, Any]) -> Path:
+def new_log_path(agent: str) -> Path:
+    """
+    Generate a unique conversation log path (file is not created).
+
+    Args:
+        agent: Agent name (part of the filename)
+
+    Returns:
+        Path inside CONVERSATIONS_DIR
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    return CONVERSATIONS_DIR / f"{timestamp}-{agent}-{unique_id}.json"
+
+
+def write_json(record: Dict[str, Any], filepath: Optional[Path] = None) -> Path:
     """
     Write conversation record to JSON file.
 
     Args:
         record: Dictionary containing conversation data
+        filepath: Target path (default: new path from new_log_path)
 
     Returns:
         Path to written file
@@ -47,11 +63,8 @@ def write_json(record: Dict[str, Any]) -> Path:
     CONVERSATIONS_DIR.mkdir(parents=True, exist_ok=True)
 
     # Generate filename
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    agent = record.get("agent", "unknown")
-    unique_id = str(uuid.uuid4())[:8]
-    filename = f"{timestamp}-{agent}-{unique_id}.json"
-    filepath = CONVERSATIONS_DIR / filename
+    if filepath is None:
+        filepath = new_log_path(record.get("agent", "unknown"))
 
     # Mask sensitive data
     if "prompt" in record:
@@ -1,17 +1,203 @@
 """Memory storage backend implementations."""
 
 import json
+import re
 import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from config.settings import BASE_DIR
+from config.settings import BASE_DIR, count_tokens
+from core.db_pool import get_pool
+from core.tracing import traced
 
 # Memory data directory
 MEMORY_DIR = BASE_DIR / "data" / "MEMORY"
 MEMORY_DIR.mkdir(parents=True, exist_ok=True)
 
+# Full-text index over prompt/response (external content: rows live in conversations).
+# unicode61 folds case and diacritics (Turkish, etc.); prefix indexes make "term*" queries
+# index lookups instead of scans.
+FTS_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        prompt, response,
+        content='conversations', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+"""
+
+# Keep the index in sync with the table. Updates only fire for text changes,
+# so embedding updates don't touch the index.
+FTS_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts(rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, prompt, response)
+        VALUES ('delete', old.id, old.prompt, old.response);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_au AFTER UPDATE OF prompt, response ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, prompt, response)
+        VALUES ('delete', old.id, old.prompt, old.response);
+        INSERT INTO conversations_fts(rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+    END
+    """,
+]
+
+# BM25 column weights: a match in the prompt counts twice as much as one in the response
+FTS_RANK = "bm25(2.0, 1.0)"
+SNIPPET_TOKENS = 16
+
+# Response prefixes used by the context formats ("A:"/session: 300 chars, knowledge: 200),
+# stored per row so retrieval never reads full responses
+SNIPPET_LENGTHS = (300, 200)
+
+
+def response_snippet(response: str, length: int) -> str:
+    """First ``length`` characters of a response, with "..." if it was cut."""
+    return response[:length] + "..." if len(response) > length else response
+
+
+def past_conversation_entry(prompt: str, snippet_300: str) -> str:
+    """MemoryEngine context entry, as sized for the token budget (score header left out)."""
+    return f"[Past conversation]\nQ: {prompt}\nA: {snippet_300}"
+
+
+def session_entry(prompt: str, snippet_300: str) -> str:
+    """Session context entry body (ContextAggregator), below its "[N messages ago]" line."""
+    return f"User: \"{prompt[:150]}{'...' if len(prompt) > 150 else ''}\"\nAssistant: \"{snippet_300}\"\n"
+
+
+def knowledge_entry(prompt: str, snippet_200: str) -> str:
+    """Knowledge context entry body (ContextAggregator), below its "[Relevance: ...]" line."""
+    return f"Topic: {prompt[:80]}\nSummary: \"{snippet_200}\"\n"
+
+
+# Token counts of the entries above, stored per row so budget selection is
+# integer arithmetic instead of a tokenizer pass per candidate per query
+TOKEN_COLUMNS = ("tokens_context", "tokens_session", "tokens_knowledge")
+
+
+def entry_token_counts(prompt: str, snippet_300: str, snippet_200: str) -> Tuple[int, int, int]:
+    """Token counts of a conversation's context entries, in TOKEN_COLUMNS order."""
+    return (
+        count_tokens(past_conversation_entry(prompt, snippet_300)),
+        count_tokens(session_entry(prompt, snippet_300)),
+        count_tokens(knowledge_entry(prompt, snippet_200)),
+    )
+
+
+def _snippet_sql(length: int) -> str:
+    """SQL equivalent of response_snippet() (substr/length count characters, like Python)."""
+    return f"CASE WHEN length(response) > {length} THEN substr(response, 1, {length}) || '...' ELSE response END"
+
+
+def encode_keywords(keywords) -> str:
+    """Keyword set -> stored text (one keyword per line, each line terminated)."""
+    return "".join(keyword + "\n" for keyword in sorted(keywords))
+
+
+def decode_keywords(text: str) -> set:
+    """Stored keyword text -> keyword set (inverse of encode_keywords)."""
+    return set(text.split("\n")[:-1])
+
+
+# Inverted keyword index: term -> conversations containing it, with term frequency.
+# Written in the same transaction as the keywords column, so the rows with
+# keywords IS NULL are exactly the ones not indexed yet.
+KEYWORD_POSTINGS_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS keyword_postings (
+        term TEXT NOT NULL,
+        conversation_id INTEGER NOT NULL,
+        tf INTEGER NOT NULL,
+        PRIMARY KEY (term, conversation_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_postings_conversation ON keyword_postings(conversation_id)",
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_keywords_ad AFTER DELETE ON conversations BEGIN
+        DELETE FROM keyword_postings WHERE conversation_id = old.id;
+    END
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_keywords_missing ON conversations(id) WHERE keywords IS NULL",
+]
+
+
+_QUERY_PART_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def build_fts_query(query: str) -> Optional[str]:
+    """
+    Translate a search string into an FTS5 MATCH expression.
+
+    - ``"exact phrase"``: phrase query
+    - ``term*``: prefix query
+    - other words: all must match (any order)
+
+    Every part is quoted, so FTS5 operators and punctuation in user input
+    can't cause syntax errors.
+
+    Args:
+        query: User search string
+
+    Returns:
+        MATCH expression, or None if the query has no searchable words
+    """
+    parts = []
+    for phrase, word in _QUERY_PART_RE.findall(query):
+        tokens = _WORD_RE.findall(phrase or word)
+        if not tokens:
+            continue
+        term = '"' + " ".join(tokens) + '"'
+        parts.append(term + "*" if word.endswith("*") else term)
+    return " ".join(parts) or None
+
+
+def ensure_fts(conn: sqlite3.Connection, rebuild: bool = False) -> bool:
+    """
+    Create the FTS5 index and its sync triggers.
+
+    A new index over an empty table is ready at once. Over existing
+    conversations it is left to the backfill (rebuild=True, run by
+    scripts/migrate_add_fts.py) so that opening a large database stays
+    fast; until then search falls back to LIKE (see fts_ready).
+
+    Args:
+        conn: Writable connection (caller commits)
+        rebuild: Backfill the index from the table even if it already exists
+
+    Returns:
+        False if this SQLite build has no FTS5 (search falls back to LIKE)
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='conversations_fts'"
+    ).fetchone()
+    try:
+        conn.execute(FTS_TABLE_SQL)
+    except sqlite3.OperationalError:  # no such module: fts5
+        return False
+
+    for trigger_sql in FTS_TRIGGERS_SQL:
+        conn.execute(trigger_sql)
+    if rebuild or (not exists and not conn.execute("SELECT 1 FROM conversations LIMIT 1").fetchone()):
+        conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')")
+        # The rank setting is written only once the index covers every row: it marks it ready
+        conn.execute(f"INSERT INTO conversations_fts(conversations_fts, rank) VALUES ('rank', '{FTS_RANK}')")
+    return True
+
+
+def fts_ready(conn: sqlite3.Connection) -> bool:
+    """Whether the FTS5 index has been backfilled (ensure_fts sets its rank then)."""
+    return conn.execute("SELECT 1 FROM conversations_fts_config WHERE k = 'rank'").fetchone() is not None
+
 
 class SQLiteBackend:
     """SQLite storage backend for conversation memory."""
@@ -24,14 +210,13 @@ class SQLiteBackend:
             db_path: Path to SQLite database file (default: data/MEMORY/conversations.db)
         """
         self.db_path = db_path or (MEMORY_DIR / "conversations.db")
+        self.pool = get_pool(self.db_path)
         self._init_database()
 
     def _init_database(self):
         """Initialize database schema."""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
             # Create conversations table
             cursor.execute(
                 """
@@ -53,11 +238,50 @@ class SQLiteBackend:
                     fallback_reason TEXT,
                     session_id TEXT,
                     tags TEXT,
-                    error TEXT
+                    error TEXT,
+                    embedding BLOB,
+                    snippet_300 TEXT,
+                    snippet_200 TEXT,
+                    keywords TEXT,
+                    tokens_context INTEGER,
+                    tokens_session INTEGER,
+                    tokens_knowledge INTEGER
                 )
             """
             )
 
+            # Databases created before embeddings were persisted lack the column
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(conversations)")}
+            if "embedding" not in columns:
+                cursor.execute("ALTER TABLE conversations ADD COLUMN embedding BLOB")
+
+            # Precomputed retrieval columns (v1.1.0): snippets are backfilled here,
+            # keywords by MemoryEngine when it first scores a row without them
+            for length in SNIPPET_LENGTHS:
+                if f"snippet_{length}" not in columns:
+                    cursor.execute(f"ALTER TABLE conversations ADD COLUMN snippet_{length} TEXT")
+                    cursor.execute(f"UPDATE conversations SET snippet_{length} = {_snippet_sql(length)}")
+            if "keywords" not in columns:
+                cursor.execute("ALTER TABLE conversations ADD COLUMN keywords TEXT")
+
+            # Token counts need the tokenizer: filled by backfill_token_counts()
+            # (memory_cli backfill-tokens), readers count rows without them
+            for column in TOKEN_COLUMNS:
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE conversations ADD COLUMN {column} INTEGER")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tokens_missing ON conversations(id) WHERE tokens_context IS NULL"
+            )
+
+            postings_exist = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='keyword_postings'"
+            ).fetchone()
+            for statement in KEYWORD_POSTINGS_SQL:
+                cursor.execute(statement)
+            if not postings_exist and "keywords" in columns:
+                # Keywords stored before the index existed have no postings: re-extract them
+                cursor.execute("UPDATE conversations SET keywords = NULL")
+
             # Create indexes for fast queries
             cursor.execute(
                 "CREATE INDEX IF NOT EXISTS idx_timestamp ON conversations(timestamp DESC)"
@@ -68,16 +292,73 @@ class SQLiteBackend:
             )
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_model ON conversations(model)")
 
-            conn.commit()
-        finally:
-            conn.close()
+            self.fts_enabled = ensure_fts(conn)
+            self._fts_ready = self.fts_enabled and fts_ready(conn)
 
     def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection."""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row  # Enable column access by name
-        return conn
+        """
+        Get a standalone database connection (the caller closes it).
 
+        Backend methods use the shared pool (self.pool.reader()/writer());
+        this is for scripts and tests that run their own SQL.
+        """
+        return self.pool.connect()
+
+    _INSERT_SQL = """
+        INSERT INTO conversations (
+            timestamp, agent, model, provider, prompt, response,
+            duration_ms, prompt_tokens, completion_tokens, total_tokens,
+            cost_usd, fallback_used, original_model, fallback_reason,
+            session_id, tags, error, embedding, snippet_300, snippet_200, keywords,
+            tokens_context, tokens_session, tokens_knowledge
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    @staticmethod
+    def _conversation_params(conversation: Dict[str, Any]) -> tuple:
+        """Map a conversation dict to INSERT parameters (see _INSERT_SQL)."""
+        prompt = conversation.get("prompt", "")
+        response = conversation.get("response", "")
+        snippet_300, snippet_200 = response_snippet(response, 300), response_snippet(response, 200)
+        return (
+            conversation.get("timestamp", datetime.now(timezone.utc).isoformat()),
+            conversation.get("agent", "unknown"),
+            conversation.get("model", "unknown"),
+            conversation.get("provider", "unknown"),
+            prompt,
+            response,
+            conversation.get("duration_ms", 0),
+            conversation.get("prompt_tokens", 0),
+            conversation.get("completion_tokens", 0),
+            conversation.get("total_tokens", 0),
+            conversation.get("estimated_cost_usd") or conversation.get("cost_usd", 0.0),
+            conversation.get("fallback_used", False),
+            conversation.get("original_model"),
+            conversation.get("fallback_reason"),
+            conversation.get("session_id"),
+            json.dumps(conversation.get("tags", [])),
+            conversation.get("error"),
+            conversation.get("embedding"),
+            snippet_300,
+            snippet_200,
+            encode_keywords(conversation["keyword_counts"])
+            if "keyword_counts" in conversation
+            else conversation.get("keywords"),
+            *entry_token_counts(prompt, snippet_300, snippet_200),
+        )
+
+    @staticmethod
+    def _postings_params(conversation_id: int, conversation: Dict[str, Any]) -> List[tuple]:
+        """Keyword postings of a conversation (term frequencies, or 1 per stored keyword)."""
+        counts = conversation.get("keyword_counts")
+        if counts is None:
+            keywords = conversation.get("keywords")
+            counts = dict.fromkeys(decode_keywords(keywords), 1) if keywords is not None else {}
+        return [(term, conversation_id, tf) for term, tf in counts.items()]
+
+    _INSERT_POSTINGS_SQL = "INSERT OR REPLACE INTO keyword_postings (term, conversation_id, tf) VALUES (?, ?, ?)"
+
+    @traced("sqlite.insert")
     def store(self, conversation: Dict[str, Any]) -> int:
         """
         Store conversation to database.
@@ -88,66 +369,37 @@ class SQLiteBackend:
         Returns:
             Row ID of inserted conversation
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        params = self._conversation_params(conversation)  # Tokenizes: outside the write lock
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._INSERT_SQL, params)
+            row_id = cursor.lastrowid
+            cursor.executemany(self._INSERT_POSTINGS_SQL, self._postings_params(row_id, conversation))
+            return row_id
 
-        try:
-            # Extract fields
-            timestamp = conversation.get("timestamp", datetime.now(timezone.utc).isoformat())
-            agent = conversation.get("agent", "unknown")
-            model = conversation.get("model", "unknown")
-            provider = conversation.get("provider", "unknown")
-            prompt = conversation.get("prompt", "")
-            response = conversation.get("response", "")
-            duration_ms = conversation.get("duration_ms", 0)
-            prompt_tokens = conversation.get("prompt_tokens", 0)
-            completion_tokens = conversation.get("completion_tokens", 0)
-            total_tokens = conversation.get("total_tokens", 0)
-            cost_usd = conversation.get("estimated_cost_usd") or conversation.get(
-                "cost_usd", 0.0
-            )
-            fallback_used = conversation.get("fallback_used", False)
-            original_model = conversation.get("original_model")
-            fallback_reason = conversation.get("fallback_reason")
-            session_id = conversation.get("session_id")
-            tags = json.dumps(conversation.get("tags", []))
-            error = conversation.get("error")
+    @traced("sqlite.insert_many")
+    def store_many(self, conversations: List[Dict[str, Any]]) -> List[int]:
+        """
+        Store several conversations in a single transaction.
 
-            cursor.execute(
-                """
-                INSERT INTO conversations (
-                    timestamp, agent, model, provider, prompt, response,
-                    duration_ms, prompt_tokens, completion_tokens, total_tokens,
-                    cost_usd, fallback_used, original_model, fallback_reason,
-                    session_id, tags, error
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    timestamp,
-                    agent,
-                    model,
-                    provider,
-                    prompt,
-                    response,
-                    duration_ms,
-                    prompt_tokens,
-                    completion_tokens,
-                    total_tokens,
-                    cost_usd,
-                    fallback_used,
-                    original_model,
-                    fallback_reason,
-                    session_id,
-                    tags,
-                    error,
-                ),
-            )
+        Args:
+            conversations: Conversation data dictionaries
 
-            row_id = cursor.lastrowid
-            conn.commit()
-            return row_id
-        finally:
-            conn.close()
+        Returns:
+            Row IDs in input order
+        """
+        if not conversations:
+            return []
+
+        params = [self._conversation_params(conversation) for conversation in conversations]
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            row_ids = []
+            for conversation, conversation_params in zip(conversations, params):
+                cursor.execute(self._INSERT_SQL, conversation_params)
+                row_ids.append(cursor.lastrowid)
+                cursor.executemany(self._INSERT_POSTINGS_SQL, self._postings_params(row_ids[-1], conversation))
+            return row_ids
 
     def get_recent(
         self, limit: int = 10, agent: Optional[str] = None
@@ -162,10 +414,8 @@ class SQLiteBackend:
         Returns:
             List of conversation dictionaries
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
             if agent:
                 cursor.execute(
                     """
@@ -188,8 +438,6 @@ class SQLiteBackend:
 
             rows = cursor.fetchall()
             return [self._row_to_dict(row) for row in rows]
-        finally:
-            conn.close()
 
     def search(
         self,
@@ -204,8 +452,15 @@ class SQLiteBackend:
         """
         Search conversations with filters.
 
+        With a query, matches come from the FTS5 index ranked by BM25
+        (best first) and carry ``score`` and a highlighted ``snippet``
+        (matches wrapped in ``**``). Queries support ``"exact phrases"`` and
+        ``prefix*`` terms; all words must match. Without FTS5 (or without
+        searchable words, or before the index of an existing database is
+        backfilled) the query is a substring match, newest first.
+
         Args:
-            query: Keyword to search in prompt/response
+            query: Search string for prompt/response
             agent: Filter by agent name
             model: Filter by model name
             from_date: Filter from date (ISO format)
@@ -216,50 +471,71 @@ class SQLiteBackend:
         Returns:
             List of matching conversations
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        fts_query = build_fts_query(query) if query and self._fts_searchable() else None
 
-        try:
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
             # Build query dynamically
             where_clauses = []
             params = []
 
-            if query:
-                where_clauses.append("(prompt LIKE ? OR response LIKE ?)")
+            if fts_query:
+                where_clauses.append("conversations_fts MATCH ?")
+                params.append(fts_query)
+            elif query:
+                where_clauses.append("(c.prompt LIKE ? OR c.response LIKE ?)")
                 params.extend([f"%{query}%", f"%{query}%"])
 
             if agent:
-                where_clauses.append("agent = ?")
+                where_clauses.append("c.agent = ?")
                 params.append(agent)
 
             if model:
-                where_clauses.append("model = ?")
+                where_clauses.append("c.model = ?")
                 params.append(model)
 
             if from_date:
-                where_clauses.append("timestamp >= ?")
+                where_clauses.append("c.timestamp >= ?")
                 params.append(from_date)
 
             if to_date:
-                where_clauses.append("timestamp <= ?")
+                where_clauses.append("c.timestamp <= ?")
                 params.append(to_date)
 
             if session_id:
-                where_clauses.append("session_id = ?")
+                where_clauses.append("c.session_id = ?")
                 params.append(session_id)
 
             # Construct SQL
-            sql = "SELECT * FROM conversations"
+            if fts_query:
+                sql = (
+                    "SELECT c.*, conversations_fts.rank AS rank, "
+                    f"snippet(conversations_fts, -1, '**', '**', '…', {SNIPPET_TOKENS}) AS snippet "
+                    "FROM conversations_fts JOIN conversations c ON c.id = conversations_fts.rowid"
+                )
+            else:
+                sql = "SELECT c.* FROM conversations c"
             if where_clauses:
                 sql += " WHERE " + " AND ".join(where_clauses)
-            sql += " ORDER BY timestamp DESC LIMIT ?"
+            sql += " ORDER BY conversations_fts.rank LIMIT ?" if fts_query else " ORDER BY c.timestamp DESC LIMIT ?"
             params.append(limit)
 
             cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            return [self._row_to_dict(row) for row in rows]
-        finally:
-            conn.close()
+            results = []
+            for row in cursor.fetchall():
+                result = self._row_to_dict(row)
+                if fts_query:
+                    result["score"] = round(-row["rank"], 4)  # bm25() is lower-is-better
+                    result["snippet"] = row["snippet"]
+                results.append(result)
+            return results
+
+    def _fts_searchable(self) -> bool:
+        """Whether search can use the FTS5 index (rechecked until the backfill has run)."""
+        if self.fts_enabled and not self._fts_ready:
+            with self.pool.reader() as conn:
+                self._fts_ready = fts_ready(conn)
+        return self._fts_ready
 
     def get_by_id(self, conversation_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -271,15 +547,11 @@ class SQLiteBackend:
         Returns:
             Conversation dict or None if not found
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
             cursor.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,))
             row = cursor.fetchone()
             return self._row_to_dict(row) if row else None
-        finally:
-            conn.close()
 
     def delete(self, conversation_id: int) -> bool:
         """
@@ -291,16 +563,11 @@ class SQLiteBackend:
         Returns:
             True if deleted, False if not found
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
             cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
             deleted = cursor.rowcount > 0
-            conn.commit()
             return deleted
-        finally:
-            conn.close()
 
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -309,10 +576,8 @@ class SQLiteBackend:
         Returns:
             Statistics dictionary
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
             # Total conversations
             cursor.execute("SELECT COUNT(*) FROM conversations")
             total_conversations = cursor.fetchone()[0]
@@ -352,8 +617,6 @@ class SQLiteBackend:
                 "by_agent": by_agent,
                 "by_model": by_model,
             }
-        finally:
-            conn.close()
 
     def cleanup(self, days: int) -> int:
         """
@@ -365,10 +628,8 @@ class SQLiteBackend:
         Returns:
             Number of conversations deleted
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
             cutoff_date = datetime.now(timezone.utc).replace(
                 hour=0, minute=0, second=0, microsecond=0
             )
@@ -378,10 +639,7 @@ class SQLiteBackend:
                 "DELETE FROM conversations WHERE timestamp < ?", (cutoff_date.isoformat(),)
             )
             deleted_count = cursor.rowcount
-            conn.commit()
             return deleted_count
-        finally:
-            conn.close()
 
     def update_embedding(self, conversation_id: int, embedding_blob: bytes) -> bool:
         """
@@ -394,20 +652,15 @@ class SQLiteBackend:
         Returns:
             True if successful, False otherwise
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "UPDATE conversations SET embedding = ? WHERE id = ?",
-                (embedding_blob, conversation_id),
-            )
-            conn.commit()
+            with self.pool.writer() as conn:
+                conn.execute(
+                    "UPDATE conversations SET embedding = ? WHERE id = ?",
+                    (embedding_blob, conversation_id),
+                )
             return True
         except Exception:
             return False
-        finally:
-            conn.close()
 
     def query_candidates(
         self,
@@ -429,10 +682,8 @@ class SQLiteBackend:
         Returns:
             List of conversation dictionaries
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
             # Build query
             where_clauses = []
             params = []
@@ -455,8 +706,486 @@ class SQLiteBackend:
             cursor.execute(sql, params)
             rows = cursor.fetchall()
             return [self._row_to_dict(row) for row in rows]
-        finally:
-            conn.close()
+
+    def _scoring_columns(self, with_keywords: bool, with_embedding: bool) -> str:
+        """SELECT list of the scoring queries (full text only for rows missing precomputed data)."""
+        columns = ["id", "timestamp", "tokens_context"]
+        if with_keywords:
+            columns += ["keywords", "CASE WHEN keywords IS NULL THEN prompt || ' ' || response END AS keyword_text"]
+        if with_embedding:
+            columns += [
+                "embedding",
+                "CASE WHEN embedding IS NULL THEN prompt || char(10) || substr(response, 1, 200) END AS embed_text",
+            ]
+        return ", ".join(columns)
+
+    def query_scoring_rows(
+        self,
+        agent: Optional[str] = None,
+        exclude_session_id: Optional[str] = None,
+        limit: int = 500,
+        *,
+        with_keywords: bool = True,
+        with_embedding: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Narrow candidate query for context retrieval (no prompt/response/tags).
+
+        Like query_candidates(), but only reads what scoring and budget
+        selection need: id, timestamp, token count, stored keywords and/or
+        embedding. Prompt and response are
+        only read for rows stored before those were precomputed (as
+        ``keyword_text`` / ``embed_text``). Text for the records that survive
+        scoring is fetched with get_snippets().
+
+        Args:
+            agent: Filter by agent (None = all agents)
+            exclude_session_id: Exclude conversations from this session
+            limit: Maximum candidates to return
+            with_keywords: Include keywords (keywords/hybrid strategies)
+            with_embedding: Include embedding (semantic/hybrid strategies)
+
+        Returns:
+            List of {id, timestamp, tokens_context[, keywords, keyword_text][, embedding, embed_text]},
+            newest first
+        """
+        where_clauses = []
+        params: List[Any] = []
+        if agent:
+            where_clauses.append("agent = ?")
+            params.append(agent)
+        if exclude_session_id:
+            where_clauses.append("(session_id IS NULL OR session_id != ?)")
+            params.append(exclude_session_id)
+
+        sql = f"SELECT {self._scoring_columns(with_keywords, with_embedding)} FROM conversations"
+        if where_clauses:
+            sql += " WHERE " + " AND ".join(where_clauses)
+        sql += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+
+        with self.pool.reader() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def get_scoring_rows(self, conversation_ids: List[int], *, with_keywords: bool = True) -> Dict[int, Dict[str, Any]]:
+        """
+        Scoring columns of several conversations (see query_scoring_rows()).
+
+        Args:
+            conversation_ids: Conversation IDs
+            with_keywords: Include keywords
+
+        Returns:
+            Dict of id -> {id, timestamp, tokens_context[, keywords, keyword_text]} (missing ids are left out)
+        """
+        columns = self._scoring_columns(with_keywords, with_embedding=False)
+        records: Dict[int, Dict[str, Any]] = {}
+        with self.pool.reader() as conn:
+            for start in range(0, len(conversation_ids), 500):
+                chunk = conversation_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                for row in conn.execute(f"SELECT {columns} FROM conversations WHERE id IN ({placeholders})", chunk):
+                    records[row["id"]] = dict(row)
+        return records
+
+    def get_snippets(self, conversation_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Prompt and response snippets of several conversations (for formatting).
+
+        Args:
+            conversation_ids: Conversation IDs
+
+        Returns:
+            Dict of id -> {prompt, snippet_300, snippet_200} (missing ids are left out)
+        """
+        records: Dict[int, Dict[str, Any]] = {}
+        with self.pool.reader() as conn:
+            for start in range(0, len(conversation_ids), 500):
+                chunk = conversation_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                for row in conn.execute(
+                    f"SELECT id, prompt, snippet_300, snippet_200 FROM conversations WHERE id IN ({placeholders})",
+                    chunk,
+                ):
+                    records[row["id"]] = {
+                        "prompt": row["prompt"],
+                        "snippet_300": row["snippet_300"],
+                        "snippet_200": row["snippet_200"],
+                    }
+        return records
+
+    def update_keywords(self, keyword_counts: Dict[int, Dict[str, int]]):
+        """
+        Store precomputed keywords and their postings in the inverted index.
+
+        Args:
+            keyword_counts: Conversation id -> {keyword: term frequency}
+        """
+        if not keyword_counts:
+            return
+        with self.pool.writer() as conn:
+            for conversation_id, counts in keyword_counts.items():
+                updated = conn.execute(
+                    "UPDATE conversations SET keywords = ? WHERE id = ?",
+                    (encode_keywords(counts), conversation_id),
+                ).rowcount
+                if not updated:
+                    continue  # Deleted meanwhile: don't leave orphan postings
+                conn.execute("DELETE FROM keyword_postings WHERE conversation_id = ?", (conversation_id,))
+                conn.executemany(
+                    self._INSERT_POSTINGS_SQL, [(term, conversation_id, tf) for term, tf in counts.items()]
+                )
+
+    def backfill_token_counts(self, batch_size: int = 1000) -> int:
+        """
+        Compute token counts for conversations stored before they were precomputed.
+
+        Args:
+            batch_size: Conversations per transaction
+
+        Returns:
+            Number of conversations updated
+        """
+        updated = 0
+        while True:
+            with self.pool.reader() as conn:
+                rows = conn.execute(
+                    "SELECT id, prompt, snippet_300, snippet_200 FROM conversations "
+                    "WHERE tokens_context IS NULL ORDER BY id LIMIT ?",
+                    (batch_size,),
+                ).fetchall()
+            if not rows:
+                return updated
+            counts = [
+                (*entry_token_counts(row["prompt"], row["snippet_300"], row["snippet_200"]), row["id"])
+                for row in rows
+            ]
+            with self.pool.writer() as conn:
+                conn.executemany(
+                    "UPDATE conversations SET tokens_context = ?, tokens_session = ?, tokens_knowledge = ? "
+                    "WHERE id = ?",
+                    counts,
+                )
+            updated += len(rows)
+
+    def get_unindexed_keyword_rows(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Conversations without keywords (stored before they were precomputed).
+
+        Args:
+            limit: Maximum rows to return
+
+        Returns:
+            List of {id, keyword_text}, oldest first
+        """
+        with self.pool.reader() as conn:
+            return [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT id, prompt || ' ' || response AS keyword_text FROM conversations "
+                    "WHERE keywords IS NULL ORDER BY id LIMIT ?",
+                    (limit,),
+                )
+            ]
+
+    def keyword_statistics(self, terms: List[str]) -> Tuple[int, Dict[str, int]]:
+        """
+        Corpus size and document frequencies for idf weighting.
+
+        Args:
+            terms: Query keywords
+
+        Returns:
+            (number of conversations, {term: number of conversations containing it})
+            Terms that occur nowhere are left out.
+        """
+        with self.pool.reader() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            if not terms:
+                return total, {}
+            placeholders = ", ".join("?" for _ in terms)
+            document_frequencies = dict(
+                conn.execute(
+                    f"SELECT term, COUNT(*) FROM keyword_postings WHERE term IN ({placeholders}) GROUP BY term",
+                    terms,
+                ).fetchall()
+            )
+        return total, document_frequencies
+
+    @traced("sqlite.keyword_matches")
+    def query_keyword_matches(
+        self,
+        weights: Dict[str, float],
+        *,
+        min_weight: float = 0.0,
+        agent: Optional[str] = None,
+        exclude_session_id: Optional[str] = None,
+        limit: int = 500,
+    ) -> List[Dict[str, Any]]:
+        """
+        Conversations matching query keywords, from the inverted index.
+
+        Walks the posting lists of the query terms (whole corpus, not just
+        recent rows) and sums the weights of the terms each conversation
+        contains.
+
+        Args:
+            weights: Query keyword -> weight (e.g. idf)
+            min_weight: Drop conversations whose summed weight is below this
+            agent: Filter by agent (None = all agents)
+            exclude_session_id: Exclude conversations from this session
+            limit: Maximum matches to return
+
+        Returns:
+            List of {id, timestamp, tokens_context, keyword_weight}, highest weight first (newest first on ties)
+        """
+        if not weights:
+            return []
+
+        values = ", ".join("(?, ?)" for _ in weights)
+        params: List[Any] = [value for item in weights.items() for value in item]
+        params.append(min_weight)
+
+        where_clauses = []
+        if agent:
+            where_clauses.append("c.agent = ?")
+            params.append(agent)
+        if exclude_session_id:
+            where_clauses.append("(c.session_id IS NULL OR c.session_id != ?)")
+            params.append(exclude_session_id)
+        where = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        params.append(limit)
+
+        sql = f"""
+            WITH query(term, weight) AS (VALUES {values}),
+            matches AS (
+                SELECT p.conversation_id AS id, SUM(query.weight) AS keyword_weight
+                FROM query JOIN keyword_postings p ON p.term = query.term
+                GROUP BY p.conversation_id
+                HAVING keyword_weight >= ?
+            )
+            SELECT c.id, c.timestamp, c.tokens_context, matches.keyword_weight
+            FROM matches JOIN conversations c ON c.id = matches.id
+            {where}
+            ORDER BY matches.keyword_weight DESC, c.timestamp DESC
+            LIMIT ?
+        """
+        with self.pool.reader() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def iter_vector_rows(self, after_id: int = 0, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream the columns the vector index needs, in id order.
+
+        Prompt/response are only read (as the embedding text) for rows
+        without a stored embedding.
+
+        Args:
+            after_id: Only rows with a greater id
+            batch_size: Rows per yielded batch
+
+        Yields:
+            Lists of {id, timestamp, agent, session_id, embedding, embed_text}
+        """
+        with self.pool.reader() as conn:
+            cursor = conn.execute(
+                """
+                SELECT id, timestamp, agent, session_id, embedding,
+                       CASE WHEN embedding IS NULL
+                            THEN prompt || char(10) || substr(response, 1, 200) END AS embed_text
+                FROM conversations
+                WHERE id > ?
+                ORDER BY id
+            """,
+                (after_id,),
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [dict(row) for row in rows]
+
+    def get_vector_metadata(self, conversation_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Timestamp, agent and session of several conversations (no text or embedding).
+
+        Args:
+            conversation_ids: Conversation IDs
+
+        Returns:
+            Dict of id -> {timestamp, agent, session_id} (missing ids are left out)
+        """
+        records: Dict[int, Dict[str, Any]] = {}
+        with self.pool.reader() as conn:
+            for start in range(0, len(conversation_ids), 500):
+                chunk = conversation_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                for row in conn.execute(
+                    f"SELECT id, timestamp, agent, session_id FROM conversations WHERE id IN ({placeholders})", chunk
+                ):
+                    records[row["id"]] = {"timestamp": row["timestamp"], "agent": row["agent"], "session_id": row["session_id"]}
+        return records
+
+    def get_by_ids(self, conversation_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Get several conversations by ID.
+
+        Args:
+            conversation_ids: Conversation IDs
+
+        Returns:
+            Dict of id -> conversation dict (missing ids are left out)
+        """
+        records: Dict[int, Dict[str, Any]] = {}
+        with self.pool.reader() as conn:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(conversation_ids), 500):
+                chunk = conversation_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                for row in conn.execute(f"SELECT * FROM conversations WHERE id IN ({placeholders})", chunk):
+                    records[row["id"]] = self._row_to_dict(row)
+        return records
+
+    def get_agent_averages(self, recent_per_agent: int = 200) -> Dict[str, Dict[str, Any]]:
+        """
+        Average tokens, cost and latency per agent over its most recent conversations.
+
+        Used by the chain budget scheduler to predict what a stage will cost.
+
+        Args:
+            recent_per_agent: Number of most recent conversations per agent to average
+
+        Returns:
+            Dict of agent -> averages (avg_prompt_tokens, avg_completion_tokens,
+            avg_total_tokens, avg_cost_usd, avg_duration_ms, samples)
+        """
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT agent,
+                       AVG(prompt_tokens), AVG(completion_tokens), AVG(total_tokens),
+                       AVG(cost_usd), AVG(duration_ms), COUNT(*)
+                FROM (
+                    SELECT agent, prompt_tokens, completion_tokens, total_tokens,
+                           cost_usd, duration_ms,
+                           ROW_NUMBER() OVER (PARTITION BY agent ORDER BY timestamp DESC) AS rn
+                    FROM conversations
+                    WHERE error IS NULL
+                )
+                WHERE rn <= ?
+                GROUP BY agent
+            """,
+                (recent_per_agent,),
+            )
+            return {
+                row[0]: {
+                    "avg_prompt_tokens": row[1] or 0,
+                    "avg_completion_tokens": row[2] or 0,
+                    "avg_total_tokens": row[3] or 0,
+                    "avg_cost_usd": row[4] or 0.0,
+                    "avg_duration_ms": row[5] or 0.0,
+                    "samples": row[6],
+                }
+                for row in cursor.fetchall()
+            }
+
+    def get_agent_samples(self, recent_per_agent: int = 200) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Per-call usage of each agent's most recent conversations (errors included).
+
+        Used by the chain estimator for token/latency distributions and
+        fallback rates.
+
+        Args:
+            recent_per_agent: Number of most recent conversations per agent
+
+        Returns:
+            Dict of agent -> list of {model, prompt_tokens, completion_tokens,
+            cost_usd, duration_ms, fallback_used, error} (newest first)
+        """
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT agent, model, prompt_tokens, completion_tokens, cost_usd,
+                       duration_ms, fallback_used, error
+                FROM (
+                    SELECT agent, model, prompt_tokens, completion_tokens, cost_usd,
+                           duration_ms, fallback_used, error,
+                           ROW_NUMBER() OVER (PARTITION BY agent ORDER BY timestamp DESC) AS rn
+                    FROM conversations
+                )
+                WHERE rn <= ?
+                ORDER BY agent, rn
+            """,
+                (recent_per_agent,),
+            )
+            samples: Dict[str, List[Dict[str, Any]]] = {}
+            for row in cursor.fetchall():
+                samples.setdefault(row[0], []).append({
+                    "model": row[1],
+                    "prompt_tokens": row[2] or 0,
+                    "completion_tokens": row[3] or 0,
+                    "cost_usd": row[4] or 0.0,
+                    "duration_ms": row[5] or 0.0,
+                    "fallback_used": bool(row[6]),
+                    "error": row[7],
+                })
+            return samples
+
+    def get_recent_responses(self, agents: List[str], limit: int = 200) -> List[str]:
+        """
+        Most recent successful responses of the given agents.
+
+        Args:
+            agents: Agent names
+            limit: Max responses (newest first)
+
+        Returns:
+            List of response texts
+        """
+        if not agents:
+            return []
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" for _ in agents)
+            cursor.execute(
+                f"""
+                SELECT response FROM conversations
+                WHERE agent IN ({placeholders}) AND error IS NULL
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """,
+                (*agents, limit),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_routed_examples(self, tag: str, limit: int = 2000) -> List[Tuple[str, str]]:
+        """
+        Get (prompt, agent) pairs from conversations carrying a routing tag.
+
+        Used to train the local router from past router decisions.
+
+        Args:
+            tag: Tag stored in the conversation's tags list (e.g. "router:llm")
+            limit: Max pairs to return (most recent first)
+
+        Returns:
+            List of (prompt, agent) tuples
+        """
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT prompt, agent FROM conversations
+                WHERE tags LIKE ? AND error IS NULL
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """,
+                (f'%"{tag}"%', limit),
+            )
+            return [(row[0], row[1]) for row in cursor.fetchall()]
 
     def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         """Convert SQLite row to dictionary."""
@@ -480,4 +1209,7 @@ class SQLiteBackend:
             "tags": json.loads(row["tags"]) if row["tags"] else [],
             "error": row["error"],
             "embedding": row["embedding"] if "embedding" in row.keys() else None,
+            "snippet_300": row["snippet_300"] if "snippet_300" in row.keys() else response_snippet(row["response"], 300),
+            "snippet_200": row["snippet_200"] if "snippet_200" in row.keys() else response_snippet(row["response"], 200),
+            **{column: row[column] if column in row.keys() else None for column in TOKEN_COLUMNS},
         }
@@ -2,14 +2,99 @@
 
 import logging
 import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Set
-
-from core.memory_backend import SQLiteBackend
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config.settings import load_memory_config
+from core.memory_backend import (
+    SQLiteBackend,
+    decode_keywords,
+    encode_keywords,
+    past_conversation_entry,
+    response_snippet,
+)
 from core.embedding_engine import get_embedding_engine, EmbeddingEngine
+from core.local_router import LLM_ROUTED_TAG
+from core.ann_index import IVFFlatIndex
+from core.embedding_store import SUPPORTED as EMBEDDING_STORE_SUPPORTED, EmbeddingStore, build_store
+from core.tracing import traced
+from core.vector_index import VectorIndex, parse_epoch
 
 logger = logging.getLogger(__name__)
 
+# Records ranked in the first round of budget selection (grows while the budget has room)
+TOP_K_START = 32
+
+
+@dataclass
+class ScoredCandidates:
+    """Retrieval candidates and their scores as parallel arrays (one entry per record)."""
+
+    records: List[Dict[str, Any]]
+    scores: np.ndarray
+    epochs: np.ndarray  # Timestamps in epoch seconds (decay and tie-breaking)
+
+
+def record_epochs(records: List[Dict[str, Any]]) -> np.ndarray:
+    """Timestamps of records as epoch seconds (parsed once per record)."""
+    return np.array([parse_epoch(rec["timestamp"]) for rec in records], dtype=np.float64)
+
+
+def decay_factors(
+    epochs: np.ndarray, time_decay_hours: int, now: Optional[float] = None, *, clamp_future: bool = True
+) -> np.ndarray:
+    """
+    Time decay exp(-age_hours / time_decay_hours) for an array of timestamps.
+
+    Args:
+        epochs: Timestamps (epoch seconds)
+        time_decay_hours: Time decay factor (0 = no decay)
+        now: Reference epoch seconds (default: current time)
+        clamp_future: Treat future timestamps as age 0 (keyword scoring; the
+                      semantic paths don't clamp, matching VectorIndex.search)
+
+    Returns:
+        Decay factor per timestamp
+    """
+    if not time_decay_hours or time_decay_hours <= 0:
+        return np.ones(len(epochs))
+    now = time.time() if now is None else now
+    age_hours = (now - epochs) / 3600
+    if clamp_future:
+        age_hours = np.maximum(age_hours, 0.0)
+    return np.exp(-age_hours / float(time_decay_hours))
+
+
+def cosine_similarities(query: np.ndarray, embeddings: List[np.ndarray]) -> np.ndarray:
+    """
+    Cosine similarity of a query with each embedding, clamped to [0, 1].
+
+    Same values as EmbeddingEngine.cosine_similarity (zero vectors score 0),
+    computed with one matrix-vector product.
+
+    Args:
+        query: Query embedding
+        embeddings: Candidate embeddings (same dimension)
+
+    Returns:
+        Similarity per embedding
+    """
+    if not embeddings:
+        return np.zeros(0)
+    matrix = np.vstack(embeddings).astype(np.float64)
+    query = np.asarray(query, dtype=np.float64)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    dots = matrix @ query
+    similarities = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+    return np.clip(similarities, 0.0, 1.0)
+
 
 class MemoryEngine:
     """
@@ -34,6 +119,16 @@ class MemoryEngine:
             self.backend = SQLiteBackend()
             self.enabled = True  # Can be disabled via config
             self._embedding_engine: Optional[EmbeddingEngine] = None  # Lazy load
+            memory_config = load_memory_config().get("memory", {})
+            self.vector_config = memory_config.get("vector_index", {})
+            self.embedding_dtype = memory_config.get("embedding_dtype", "float32")  # Stored BLOB precision
+            self.keyword_config = memory_config.get("keyword_index", {})
+            self._keywords_pending = False  # Rows without keywords left after the last indexing pass
+            self._vector_index: Optional[VectorIndex] = None  # Lazy load (first semantic query)
+            self._vector_index_backend: Optional[SQLiteBackend] = None
+            self._vector_watermark = 0  # Highest conversation id read into the index
+            self._vector_lock = threading.Lock()
+            self._ann_thread: Optional[threading.Thread] = None  # Background IVF (re)build
             self._initialized = True
 
     @property
@@ -43,6 +138,7 @@ class MemoryEngine:
             self._embedding_engine = get_embedding_engine()
         return self._embedding_engine
 
+    @traced("memory.store")
     def store_conversation(
         self,
         prompt: str,
@@ -73,13 +169,98 @@ class MemoryEngine:
         if not self.enabled:
             return -1
 
-        # Build conversation record
+        conversation = self._build_conversation(prompt, response, agent, model, provider, metadata, session_id)
+
+        # Generate embedding if requested
+        embedding = None
+        if generate_embedding:
+            try:
+                # Combine prompt + first 200 chars of response for embedding
+                text_for_embedding = f"{prompt}\n{response[:200]}"
+                embedding = self.embedding_engine.encode(text_for_embedding)
+                conversation["embedding"] = EmbeddingEngine.serialize_embedding(embedding, self.embedding_dtype)
+            except Exception as e:
+                # If embedding fails, continue without it (graceful degradation)
+                logger.warning(f"Failed to generate embedding during conversation storage: {e}")
+                embedding = None
+
+        # Store to backend
+        conversation_id = self.backend.store(conversation)
+        self._index_conversation(conversation_id, conversation, embedding)
+        return conversation_id
+
+    @traced("memory.store_batch")
+    def store_conversations(
+        self,
+        items: List[Dict[str, Any]],
+        generate_embedding: bool = True,
+    ) -> List[int]:
+        """
+        Store several conversations with one embedding batch and one transaction.
+
+        Used by the write-behind persistence queue.
+
+        Args:
+            items: Dicts with store_conversation() keyword arguments
+                   (prompt, response, agent, model, provider, metadata, session_id)
+            generate_embedding: Whether to generate and store embeddings
+
+        Returns:
+            Conversation IDs in input order
+        """
+        if not self.enabled or not items:
+            return []
+
+        conversations = [
+            self._build_conversation(
+                item["prompt"],
+                item["response"],
+                item["agent"],
+                item["model"],
+                item["provider"],
+                item.get("metadata"),
+                item.get("session_id"),
+            )
+            for item in items
+        ]
+
+        embeddings = [None] * len(conversations)
+        if generate_embedding:
+            try:
+                texts = [f"{c['prompt']}\n{c['response'][:200]}" for c in conversations]
+                embeddings = list(self.embedding_engine.encode_batch(texts))
+                for conversation, embedding in zip(conversations, embeddings):
+                    conversation["embedding"] = EmbeddingEngine.serialize_embedding(embedding, self.embedding_dtype)
+            except Exception as e:
+                logger.warning(f"Failed to generate embeddings during batch storage: {e}")
+                embeddings = [None] * len(conversations)
+
+        conversation_ids = self.backend.store_many(conversations)
+        for conversation_id, conversation, embedding in zip(conversation_ids, conversations, embeddings):
+            self._index_conversation(conversation_id, conversation, embedding)
+        return conversation_ids
+
+    def _build_conversation(
+        self,
+        prompt: str,
+        response: str,
+        agent: str,
+        model: str,
+        provider: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Build the backend record for a conversation."""
         conversation = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "prompt": prompt,
             "response": response,
             "agent": agent,
             "model": model,
             "provider": provider,
+            # Tokenized once here (keywords column + inverted index); keyword
+            # scoring never reads the response again
+            "keyword_counts": self._keyword_counts(prompt + " " + response),
         }
 
         # Add session_id if provided
@@ -90,21 +271,9 @@ class MemoryEngine:
         if metadata:
             conversation.update(metadata)
 
-        # Generate embedding if requested
-        if generate_embedding:
-            try:
-                # Combine prompt + first 200 chars of response for embedding
-                text_for_embedding = f"{prompt}\n{response[:200]}"
-                embedding = self.embedding_engine.encode(text_for_embedding)
-                conversation["embedding"] = EmbeddingEngine.serialize_embedding(embedding)
-            except Exception as e:
-                # If embedding fails, continue without it (graceful degradation)
-                logger.warning(f"Failed to generate embedding during conversation storage: {e}")
-                pass
-
-        # Store to backend
-        return self.backend.store(conversation)
+        return conversation
 
+    @traced("memory.recent")
     def get_recent_conversations(
         self, limit: int = 10, agent: Optional[str] = None
     ) -> List[Dict[str, Any]]:
@@ -123,6 +292,7 @@ class MemoryEngine:
 
         return self.backend.get_recent(limit=limit, agent=agent)
 
+    @traced("memory.search")
     def search_conversations(
         self,
         query: Optional[str] = None,
@@ -189,7 +359,10 @@ class MemoryEngine:
         if not self.enabled:
             return False
 
-        return self.backend.delete(conversation_id)
+        deleted = self.backend.delete(conversation_id)
+        if deleted and self._vector_index is not None:
+            self._vector_index.remove(conversation_id)
+        return deleted
 
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -209,6 +382,67 @@ class MemoryEngine:
 
         return self.backend.get_stats()
 
+    def get_agent_averages(self, recent_per_agent: int = 200) -> Dict[str, Dict[str, Any]]:
+        """
+        Get historical per-agent averages (tokens, cost, latency).
+
+        Args:
+            recent_per_agent: Number of most recent conversations per agent
+
+        Returns:
+            Dict of agent -> averages
+        """
+        if not self.enabled:
+            return {}
+
+        return self.backend.get_agent_averages(recent_per_agent)
+
+    def get_agent_samples(self, recent_per_agent: int = 200) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get per-call usage of each agent's recent conversations (chain estimator).
+
+        Args:
+            recent_per_agent: Number of most recent conversations per agent
+
+        Returns:
+            Dict of agent -> list of usage dicts
+        """
+        if not self.enabled:
+            return {}
+
+        return self.backend.get_agent_samples(recent_per_agent)
+
+    def get_recent_responses(self, agents: List[str], limit: int = 200) -> List[str]:
+        """
+        Get the most recent successful responses of the given agents.
+
+        Args:
+            agents: Agent names
+            limit: Max responses
+
+        Returns:
+            List of response texts
+        """
+        if not self.enabled:
+            return []
+
+        return self.backend.get_recent_responses(agents, limit)
+
+    def get_routed_examples(self, limit: int = 2000) -> List[Tuple[str, str]]:
+        """
+        Get (prompt, agent) pairs decided by the LLM router (local router training data).
+
+        Args:
+            limit: Max pairs to return (most recent first)
+
+        Returns:
+            List of (prompt, agent) tuples
+        """
+        if not self.enabled:
+            return []
+
+        return self.backend.get_routed_examples(LLM_ROUTED_TAG, limit)
+
     def cleanup_old_conversations(self, days: int = 90) -> int:
         """
         Delete conversations older than specified days.
@@ -222,8 +456,229 @@ class MemoryEngine:
         if not self.enabled:
             return 0
 
-        return self.backend.cleanup(days)
+        deleted = self.backend.cleanup(days)
+        if deleted:
+            self.reset_vector_index()  # Reloaded on the next semantic query
+        return deleted
+
+    def backfill_token_counts(self, batch_size: int = 1000) -> int:
+        """
+        Store context entry token counts for conversations saved before they were precomputed.
+
+        Args:
+            batch_size: Conversations per transaction
+
+        Returns:
+            Number of conversations updated
+        """
+        return self.backend.backfill_token_counts(batch_size)
+
+    def reset_vector_index(self):
+        """
+        Drop the in-memory vector index (rebuilt from the database on next use).
+
+        A saved IVF index is kept: it maps rows by conversation id on load.
+        """
+        with self._vector_lock:
+            if self._vector_index is not None and self._vector_index.store is not None:
+                self._vector_index.store.close()
+            self._vector_index = None
+            self._vector_index_backend = None
+            self._vector_watermark = 0
+
+    def _index_conversation(
+        self, conversation_id: int, conversation: Dict[str, Any], embedding: Optional[Any]
+    ):
+        """Append a just-stored conversation to the vector index (if it is loaded)."""
+        index = self._vector_index
+        if embedding is None or index is None or self._vector_index_backend is not self.backend:
+            return
+        index.add(
+            conversation_id,
+            embedding,
+            conversation["timestamp"],
+            conversation.get("agent"),
+            conversation.get("session_id"),
+        )
+
+    def _sync_vector_index(self) -> Optional[VectorIndex]:
+        """
+        Vector index of the current backend, including rows stored since the last sync.
+
+        The first call loads every stored embedding; later calls only read
+        rows with a higher id (e.g. stored by another process). Rows without an
+        embedding are embedded in one batch per read and updated in the database.
+
+        With the shared embedding store (vector_index.store), the vectors are
+        mapped from the store and only their metadata is read from SQLite;
+        rows not yet in the store (up to its synced_id) are appended to it.
+
+        Returns:
+            VectorIndex, or None when disabled (memory.vector_index.enabled)
+        """
+        if not self.vector_config.get("enabled", True):
+            return None
+
+        with self._vector_lock:
+            index = self._vector_index
+            if (
+                index is None
+                or self._vector_index_backend is not self.backend
+                or (index.store is not None and index.store.stale())  # Rebuilt (or created) elsewhere
+            ):
+                if index is not None and index.store is not None:
+                    index.store.close()
+                self._vector_index = VectorIndex(store=self._open_embedding_store())
+                self._vector_index_backend = self.backend
+                self._vector_watermark = 0
+            index = self._vector_index
+
+            if index.store is not None:
+                index.sync_store(self.backend.get_vector_metadata)
+                self._vector_watermark = max(self._vector_watermark, index.store.synced_id)
+
+            for batch in self.backend.iter_vector_rows(after_id=self._vector_watermark):
+                vectors = self._embed_missing([row for row in batch if row["embedding"] is None])
+                for row in batch:
+                    if row["id"] in index:
+                        continue  # Appended by store_conversation()
+                    vector = vectors.get(row["id"])
+                    if vector is None and row["embedding"] is not None:
+                        try:
+                            vector = EmbeddingEngine.deserialize_embedding(row["embedding"])
+                        except Exception as e:
+                            logger.warning(f"Failed to deserialize embedding for record {row['id']}: {e}")
+                    if vector is not None:
+                        index.add(row["id"], vector, row["timestamp"], row["agent"], row["session_id"])
+                self._vector_watermark = batch[-1]["id"]
+
+            if index.store is not None:
+                index.store.set_synced_id(self._vector_watermark)
+
+        self._maybe_build_ann(index)
+        return index
+
+    def _open_embedding_store(self) -> Optional[EmbeddingStore]:
+        """Shared embedding store next to the database (None = vectors kept in process memory)."""
+        store_config = self.vector_config.get("store", {})
+        if not store_config.get("enabled", True) or not EMBEDDING_STORE_SUPPORTED:
+            return None
+        path = Path(self.backend.db_path).with_suffix(".vec")
+        try:
+            return EmbeddingStore(path, fsync=store_config.get("fsync", True))
+        except OSError as e:
+            logger.warning(f"Embedding store {path} unavailable, keeping vectors in memory: {e}")
+            return None
+
+    def rebuild_embedding_store(self, batch_size: int = 1000) -> int:
+        """
+        Rewrite the shared embedding store from SQLite.
+
+        Drops rows of deleted conversations and superseded embeddings; rows
+        without an embedding are embedded (and updated in the database).
+        Processes mapping the old store reopen it on their next query.
+
+        Args:
+            batch_size: Conversations read per batch
+
+        Returns:
+            Rows written
+        """
+        path = Path(self.backend.db_path).with_suffix(".vec")
+
+        def batches():
+            for batch in self.backend.iter_vector_rows(batch_size=batch_size):
+                vectors = self._embed_missing([row for row in batch if row["embedding"] is None])
+                ids, rows = [], []
+                for row in batch:
+                    vector = vectors.get(row["id"])
+                    if vector is None and row["embedding"] is not None:
+                        try:
+                            vector = EmbeddingEngine.deserialize_embedding(row["embedding"])
+                        except Exception as e:
+                            logger.warning(f"Failed to deserialize embedding for record {row['id']}: {e}")
+                    if vector is not None:
+                        vector = np.asarray(vector, dtype=np.float32)
+                        norm = float(np.linalg.norm(vector))
+                        ids.append(row["id"])
+                        rows.append(vector / norm if norm > 0 else vector)
+                if rows:
+                    yield np.array(ids), np.array(rows)
+
+        # Hold the sync lock so this process doesn't append to the old files meanwhile
+        with self._vector_lock:
+            rows = build_store(path, batches())
+        self.reset_vector_index()
+        return rows
+
+    def _ann_path(self) -> Path:
+        """IVF index file next to the database (conversations.ivf.npz)."""
+        return Path(self.backend.db_path).with_suffix(".ivf.npz")
+
+    def _maybe_build_ann(self, index: VectorIndex):
+        """
+        Attach an IVF index once the corpus is large enough (memory.vector_index.ann).
+
+        A saved index is loaded on first use; otherwise (and whenever
+        needs_rebuild() reports stale clusters) it is trained in a background
+        thread while queries keep using the current index or the exact scan.
+        """
+        ann_config = self.vector_config.get("ann", {})
+        if not ann_config.get("enabled", True) or len(index) < ann_config.get("min_rows", 50000):
+            return
+        if self._ann_thread is not None and self._ann_thread.is_alive():
+            return
+
+        path = self._ann_path()
+        if index.ann is None and path.exists():
+            try:
+                index.load_ann(self._new_ann(ann_config), path)
+                logger.info(f"Loaded IVF index from {path}")
+            except Exception as e:
+                logger.warning(f"Failed to load IVF index from {path}, retraining: {e}")
+        if index.ann is not None and not index.ann.needs_rebuild(len(index), index.deleted_rows):
+            return
+
+        def build():
+            start = time.perf_counter()
+            index.attach_ann(self._new_ann(ann_config))
+            index.save_ann(path)
+            logger.info(f"Trained IVF index on {len(index)} conversations in {time.perf_counter() - start:.1f}s")
+
+        if ann_config.get("background", True):
+            self._ann_thread = threading.Thread(target=build, name="ivf-build", daemon=True)
+            self._ann_thread.start()
+        else:
+            build()
+
+    @staticmethod
+    def _new_ann(ann_config: Dict[str, Any]) -> IVFFlatIndex:
+        return IVFFlatIndex(
+            n_lists=ann_config.get("n_lists"),
+            n_probe=ann_config.get("n_probe", 16),
+            train_iterations=ann_config.get("train_iterations", 10),
+            rebuild_growth=ann_config.get("rebuild_growth", 2.0),
+            rebuild_deleted_fraction=ann_config.get("rebuild_deleted_fraction", 0.2),
+        )
+
+    def _embed_missing(self, rows: List[Dict[str, Any]]) -> Dict[int, Any]:
+        """Embed rows stored without an embedding and persist them; returns id -> embedding."""
+        rows = [row for row in rows if row.get("embed_text")]
+        if not rows:
+            return {}
+        try:
+            embeddings = self.embedding_engine.encode_batch([row["embed_text"] for row in rows])
+        except Exception as e:
+            logger.warning(f"Failed to generate embeddings for {len(rows)} conversations: {e}")
+            return {}
+
+        vectors = {}
+        for row, embedding in zip(rows, embeddings):
+            vectors[row["id"]] = embedding
+            self.backend.update_embedding(row["id"], EmbeddingEngine.serialize_embedding(embedding, self.embedding_dtype))
+        return vectors
 
+    @traced("memory.context")
     def get_context_for_prompt(
         self,
         prompt: str,
@@ -240,7 +695,7 @@ class MemoryEngine:
         Get relevant context from past conversations for a prompt.
 
         Supports multiple retrieval strategies:
-        - keywords: Simple keyword matching (fast, multilingual-friendly)
+        - keywords: idf-weighted keyword overlap over the inverted index (fast, multilingual-friendly)
         - semantic: Embedding-based semantic similarity (slow first time, accurate)
         - hybrid: Combination of both (weighted 70% semantic + 30% keywords)
 
@@ -260,58 +715,364 @@ class MemoryEngine:
         if not self.enabled:
             return ""
 
-        # Query candidates from backend
         exclude_session = session_id if exclude_current_session else None
-        candidates = self.backend.query_candidates(
-            agent=agent, exclude_session_id=exclude_session, limit=500
-        )
+        now = time.time()  # One reference time for every decay factor of this query
+
+        query_weights: Dict[str, float] = {}
+        if strategy != "semantic":
+            # One bounded batch per query; a large backlog is left to `memory_cli index-keywords`
+            self.index_missing_keywords(batch_size=self.keyword_config.get("query_batch", 200), max_batches=1)
+            query_weights = self._keyword_weights(self._extract_keywords(prompt))
+
+        # Semantic strategies score the whole corpus through the vector index
+        index = self._sync_vector_index() if strategy in ("semantic", "hybrid") else None
+        if index is not None:
+            scored = self._score_indexed(
+                prompt,
+                index,
+                strategy=strategy,
+                query_weights=query_weights,
+                agent=agent,
+                exclude_session_id=exclude_session,
+                time_decay_hours=time_decay_hours,
+                min_relevance=min_relevance,
+                now=now,
+            )
+        elif self._use_keyword_index(strategy, query_weights, min_relevance):
+            # Keyword strategy scores the whole corpus through the inverted index
+            scored = self._score_keyword_index(
+                query_weights,
+                agent=agent,
+                exclude_session_id=exclude_session,
+                time_decay_hours=time_decay_hours,
+                min_relevance=min_relevance,
+                now=now,
+            )
+        else:
+            # Query candidates from backend (scoring columns only, no prompt/response)
+            candidates = self.backend.query_scoring_rows(
+                agent=agent,
+                exclude_session_id=exclude_session,
+                limit=500,
+                with_keywords=strategy != "semantic",
+                with_embedding=strategy in ("semantic", "hybrid"),
+            )
 
-        if not candidates:
+            if not candidates:
+                return ""
+            if strategy != "semantic":
+                self._ensure_keywords(candidates)
+
+            # Score candidates based on strategy
+            if strategy == "semantic":
+                scored = self._score_semantic(prompt, candidates, time_decay_hours, now)
+            elif strategy == "hybrid":
+                scored = self._score_hybrid(prompt, candidates, query_weights, time_decay_hours, now)
+            else:  # Default: keywords
+                scored = self._score_keywords(candidates, query_weights, time_decay_hours, now)
+
+        # Filter by min relevance, rank (score DESC, then timestamp DESC) and
+        # select within the budget on the stored token counts
+        picked = self._select_within_budget(scored, min_relevance, max_tokens)
+
+        # Second fetch, picked records only: prompt and response snippet for formatting
+        picked = self._attach_snippets(picked)
+        if not picked:
             return ""
 
-        # Score candidates based on strategy
-        if strategy == "semantic":
-            scored = self._score_semantic(prompt, candidates, time_decay_hours)
-        elif strategy == "hybrid":
-            scored = self._score_hybrid(prompt, candidates, time_decay_hours)
-        else:  # Default: keywords
-            query_tokens = self._extract_keywords(prompt)
-            scored = []
-            for rec in candidates:
-                score = self._score_record(
-                    rec, query_tokens, time_decay_hours=time_decay_hours
-                )
-                if score >= min_relevance:
-                    rec["_score"] = score
-                    rec["_est_tokens"] = self._estimate_tokens(rec)
-                    scored.append(rec)
+        return self._format_context(picked)
 
-        # Filter by min relevance
-        scored = [r for r in scored if r.get("_score", 0) >= min_relevance]
+    def _ensure_keywords(self, records: List[Dict[str, Any]]):
+        """
+        Fill in keywords for rows stored before they were precomputed, and persist them.
 
-        if not scored:
-            return ""
+        Args:
+            records: Scoring rows (keywords, keyword_text) from the backend
+        """
+        missing = {}
+        for rec in records:
+            if rec.get("keywords") is None and rec.get("keyword_text") is not None:
+                missing[rec["id"]] = self._keyword_counts(rec["keyword_text"])
+                rec["keywords"] = encode_keywords(missing[rec["id"]])
+        if missing:
+            try:
+                self.backend.update_keywords(missing)
+            except Exception as e:
+                logger.warning(f"Failed to store keywords for {len(missing)} conversations: {e}")
+
+    def index_missing_keywords(self, batch_size: int = 1000, max_batches: Optional[int] = None) -> int:
+        """
+        Add conversations stored without keywords to the inverted keyword index.
+
+        Covers databases created before keywords were extracted at insert
+        and rows written by other tools. Cheap when nothing is missing (one
+        lookup on a partial index), so keyword queries run one batch of it;
+        the full backfill of an upgraded database is `memory_cli index-keywords`.
+
+        Args:
+            batch_size: Conversations per transaction
+            max_batches: Stop after this many batches (None = until none are missing)
 
-        # Sort by score DESC, then timestamp DESC
-        scored.sort(
-            key=lambda r: (
-                -r["_score"],
-                -self._parse_timestamp(r["timestamp"]).timestamp(),
+        Returns:
+            Number of conversations indexed
+        """
+        indexed = 0
+        batches = 0
+        self._keywords_pending = True
+        while max_batches is None or batches < max_batches:
+            rows = self.backend.get_unindexed_keyword_rows(batch_size)
+            if rows:
+                try:
+                    counts = {row["id"]: self._keyword_counts(row["keyword_text"]) for row in rows}
+                    self.backend.update_keywords(counts)
+                except Exception as e:
+                    logger.warning(f"Failed to index keywords for {len(rows)} conversations: {e}")
+                    return indexed
+            indexed += len(rows)
+            batches += 1
+            if len(rows) < batch_size:
+                self._keywords_pending = False
+                break
+        return indexed
+
+    def _use_keyword_index(self, strategy: str, query_weights: Dict[str, float], min_relevance: float) -> bool:
+        """
+        Whether the keywords strategy can score through the inverted index.
+
+        Records without any query keyword score 0, so they are only needed
+        (via the recency scan) when min_relevance <= 0. While rows without
+        keywords remain, the index is incomplete and the recency scan (which
+        extracts their keywords on the fly) is used instead.
+        """
+        return (
+            strategy == "keywords"
+            and bool(query_weights)
+            and min_relevance > 0
+            and not self._keywords_pending
+            and self.keyword_config.get("enabled", True)
+        )
+
+    def _keyword_weights(self, query_tokens: Set[str]) -> Dict[str, float]:
+        """
+        idf weight of each query keyword.
+
+        idf = ln(1 + (N - df + 0.5) / (df + 0.5)) (the BM25 form: always
+        positive, highest for terms in no stored conversation), so rare
+        terms count for more of the overlap than ubiquitous ones.
+
+        Args:
+            query_tokens: Query keywords
+
+        Returns:
+            Dict of keyword -> weight
+        """
+        if not query_tokens:
+            return {}
+        total, document_frequencies = self.backend.keyword_statistics(sorted(query_tokens))
+        weights = {}
+        for term in query_tokens:
+            df = document_frequencies.get(term, 0)
+            weights[term] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        return weights
+
+    def _score_keyword_index(
+        self,
+        query_weights: Dict[str, float],
+        *,
+        agent: Optional[str],
+        exclude_session_id: Optional[str],
+        time_decay_hours: int,
+        min_relevance: float,
+        now: Optional[float] = None,
+    ) -> ScoredCandidates:
+        """
+        Score the whole corpus with the inverted keyword index (keywords strategy).
+
+        The posting lists of the query keywords give each matching
+        conversation its idf-weighted overlap; since time decay is at most
+        1, conversations whose overlap is already below min_relevance are
+        dropped in SQL. The top ``keyword_index.max_candidates`` by overlap
+        are then decayed like _score_keywords.
+
+        Args:
+            query_weights: Query keyword -> idf weight
+            agent: Filter by agent
+            exclude_session_id: Session to exclude
+            time_decay_hours: Time decay factor
+            min_relevance: Minimum final score
+            now: Reference epoch seconds for decay (default: current time)
+
+        Returns:
+            Scored candidates
+        """
+        total_weight = sum(query_weights.values())
+        matches = self.backend.query_keyword_matches(
+            query_weights,
+            min_weight=min_relevance * total_weight * (1 - 1e-9),  # Float sums: keep boundary matches
+            agent=agent,
+            exclude_session_id=exclude_session_id,
+            limit=self.keyword_config.get("max_candidates", 500),
+        )
+
+        keyword_scores = np.array([rec.pop("keyword_weight") for rec in matches], dtype=np.float64) / total_weight
+        epochs = record_epochs(matches)
+        return ScoredCandidates(matches, keyword_scores * decay_factors(epochs, time_decay_hours, now), epochs)
+
+    def _score_keywords(
+        self,
+        candidates: List[Dict[str, Any]],
+        query_weights: Dict[str, float],
+        time_decay_hours: int,
+        now: Optional[float] = None,
+    ) -> ScoredCandidates:
+        """
+        Score candidates by weighted keyword overlap and time decay (vectorized _score_record).
+
+        Args:
+            candidates: Candidate records (precomputed keywords)
+            query_weights: Query keyword -> idf weight
+            time_decay_hours: Time decay factor
+            now: Reference epoch seconds for decay (default: current time)
+
+        Returns:
+            Scored candidates
+        """
+        epochs = record_epochs(candidates)
+        scores = self._keyword_overlap(candidates, query_weights) * decay_factors(epochs, time_decay_hours, now)
+        return ScoredCandidates(candidates, scores, epochs)
+
+    def _keyword_overlap(self, records: List[Dict[str, Any]], query_weights: Dict[str, float]) -> np.ndarray:
+        """
+        Weighted keyword overlap of each record (share of the query's keyword weight it contains).
+
+        Builds a records x query-terms membership matrix from the stored
+        keyword lines (substring tests, no set decoding) and reduces it with
+        one matrix-vector product.
+
+        Args:
+            records: Records with precomputed keywords (or prompt/response)
+            query_weights: Query keyword -> weight
+
+        Returns:
+            Overlap per record (0-1)
+        """
+        total_weight = sum(query_weights.values())
+        if not records or not total_weight:
+            return np.zeros(len(records))
+
+        terms = list(query_weights)
+        weights = np.array([query_weights[term] for term in terms], dtype=np.float64)
+        documents = [
+            "\n" + (
+                rec["keywords"]
+                if rec.get("keywords") is not None
+                else encode_keywords(self._extract_keywords(rec["prompt"] + " " + rec["response"]))
             )
+            for rec in records
+        ]
+        needles = [f"\n{term}\n" for term in terms]
+        membership = np.fromiter(
+            (needle in document for document in documents for needle in needles),
+            dtype=bool,
+            count=len(documents) * len(needles),
+        ).reshape(len(documents), len(needles))
+        return membership @ weights / total_weight
+
+    def _select_within_budget(
+        self, scored: ScoredCandidates, min_relevance: float, max_tokens: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Pick the best records that fit the token budget.
+
+        Records are ranked by score DESC, then timestamp DESC, and taken
+        greedily while their ``tokens_context`` fits the remaining budget.
+        Only the top ``k`` are ranked (argpartition); if the budget could
+        still take one of the rest, ``k`` grows and the selection reruns,
+        so the result equals ranking every record.
+
+        Args:
+            scored: Scored candidates
+            min_relevance: Minimum score
+            max_tokens: Token budget
+
+        Returns:
+            Picked records in rank order, with _score set
+        """
+        survivors = np.flatnonzero(scored.scores >= min_relevance)
+        if survivors.size == 0:
+            return []
+        scores, epochs = scored.scores[survivors], scored.epochs[survivors]
+        # Unknown counts (rows stored before they were precomputed) might fit anything
+        tokens = np.array(
+            [scored.records[i].get("tokens_context") or 0 for i in survivors.tolist()], dtype=np.float64
         )
 
-        # Budget selection
-        picked = []
-        budget = max_tokens
-        for r in scored:
-            if r["_est_tokens"] <= budget:
-                picked.append(r)
-                budget -= r["_est_tokens"]
+        k = min(survivors.size, TOP_K_START)
+        while True:
+            if k < survivors.size:
+                kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+                top = np.flatnonzero(scores >= kth_score)  # Ties at the cut are all ranked
+            else:
+                top = np.arange(survivors.size)
+            ranked = top[np.lexsort((-epochs[top], -scores[top]))]
+
+            records = [scored.records[i] for i in survivors[ranked].tolist()]
+            self._fill_missing_token_counts(records)
+            picked = []
+            budget = max_tokens
+            for rec, score in zip(records, scores[ranked].tolist()):
+                if rec["tokens_context"] <= budget:
+                    rec["_score"] = score
+                    picked.append(rec)
+                    budget -= rec["tokens_context"]
 
-        if not picked:
-            return ""
+            rest = np.ones(survivors.size, dtype=bool)
+            rest[top] = False
+            if top.size == survivors.size or not (tokens[rest] <= budget).any():
+                return picked
+            k *= 4
 
-        return self._format_context(picked)
+    def _attach_snippets(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add prompt and snippets to scored records.
+
+        Args:
+            records: Scored records (only id needed)
+
+        Returns:
+            Records with prompt, snippet_300 and snippet_200
+            (conversations deleted meanwhile are dropped)
+        """
+        if not records:
+            return []
+        snippets = self.backend.get_snippets([rec["id"] for rec in records])
+        attached = []
+        for rec in records:
+            snippet = snippets.get(rec["id"])
+            if snippet is None:
+                continue
+            rec.update(snippet)
+            attached.append(rec)
+        return attached
+
+    def _fill_missing_token_counts(self, records: List[Dict[str, Any]]):
+        """
+        Count tokens for records stored before token counts were precomputed.
+
+        Rows written since are sized from their ``tokens_context`` column;
+        ``memory_cli backfill-tokens`` fills in the older ones.
+
+        Args:
+            records: Scored records (tokens_context may be None)
+        """
+        missing = [rec for rec in records if rec.get("tokens_context") is None]
+        if not missing:
+            return
+        for rec in self._attach_snippets(missing):
+            rec["tokens_context"] = self._estimate_tokens(rec)
+        for rec in missing:
+            if rec.get("tokens_context") is None:
+                rec["tokens_context"] = math.inf  # Deleted meanwhile: never picked
 
     def _extract_keywords(self, text: str, min_length: int = 3) -> Set[str]:
         """
@@ -324,6 +1085,19 @@ class MemoryEngine:
         Returns:
             Set of keywords
         """
+        return set(self._keyword_counts(text, min_length))
+
+    def _keyword_counts(self, text: str, min_length: int = 3) -> Counter:
+        """
+        Extract keywords from text with their frequencies (see _extract_keywords).
+
+        Args:
+            text: Input text
+            min_length: Minimum word length
+
+        Returns:
+            Counter of keyword -> occurrences
+        """
         # Simple approach: split by space, filter short words and common words
         stop_words = {
             "the",
@@ -368,72 +1142,89 @@ class MemoryEngine:
         }
 
         words = text.lower().split()
-        keywords = {
+        keywords = Counter(
             w.strip(".,!?;:")
             for w in words
             if len(w) >= min_length and w.lower() not in stop_words
-        }
+        )
 
         return keywords
 
     def _score_record(
-        self, rec: Dict[str, Any], query_tokens: Set[str], *, time_decay_hours: int
+        self, rec: Dict[str, Any], query_weights: Dict[str, float], *, time_decay_hours: int
     ) -> float:
         """
         Calculate relevance score for a conversation record.
 
-        Score = keyword_overlap * exp(-age_hours / decay_hours)
+        Score = weighted_keyword_overlap * exp(-age_hours / decay_hours)
+
+        The overlap is the share of the query's keyword weight (idf, see
+        _keyword_weights) found in the record.
 
         Args:
-            rec: Conversation record
-            query_tokens: Set of query keywords
+            rec: Conversation record (precomputed keywords, or prompt/response)
+            query_weights: Query keyword -> weight
             time_decay_hours: Time decay factor (0 = no decay)
 
         Returns:
             Relevance score (0-1)
         """
         # Keyword overlap scoring
-        if not query_tokens:
+        total_weight = sum(query_weights.values())
+        if not total_weight:
             kw_score = 0.0
         else:
-            doc_tokens = self._extract_keywords(rec["prompt"] + " " + rec["response"])
-            overlap = len(query_tokens & doc_tokens)
-            kw_score = overlap / max(1, len(query_tokens))
-
-        # Time decay
-        if time_decay_hours:
-            age_hours = max(
-                0.0,
-                (
-                    datetime.now(timezone.utc) - self._parse_timestamp(rec["timestamp"])
-                ).total_seconds()
-                / 3600,
-            )
-            decay = math.exp(-age_hours / float(time_decay_hours))
-        else:
-            decay = 1.0
+            if rec.get("keywords") is not None:
+                doc_tokens = decode_keywords(rec["keywords"])
+            else:
+                doc_tokens = self._extract_keywords(rec["prompt"] + " " + rec["response"])
+            overlap = sum(weight for term, weight in query_weights.items() if term in doc_tokens)
+            kw_score = overlap / total_weight
+
+        return kw_score * self._time_decay(rec["timestamp"], time_decay_hours)
 
-        return kw_score * decay
+    def _time_decay(self, timestamp: str, time_decay_hours: int) -> float:
+        """
+        Time decay factor exp(-age_hours / decay_hours) of a record.
+
+        Args:
+            timestamp: Record timestamp (ISO format)
+            time_decay_hours: Time decay factor (0 = no decay)
+
+        Returns:
+            Decay factor (0-1)
+        """
+        if not time_decay_hours:
+            return 1.0
+        age_hours = max(
+            0.0,
+            (datetime.now(timezone.utc) - self._parse_timestamp(timestamp)).total_seconds() / 3600,
+        )
+        return math.exp(-age_hours / float(time_decay_hours))
 
     def _estimate_tokens(self, rec: Dict[str, Any]) -> int:
         """
         Estimate token count for a conversation record.
 
+        Uses the stored ``tokens_context`` count when the record has one.
+
         Args:
-            rec: Conversation record
+            rec: Conversation record (prompt and snippet_300, or prompt/response)
 
         Returns:
             Estimated token count
         """
+        if rec.get("tokens_context") is not None:
+            return rec["tokens_context"]
+
         from config.settings import count_tokens
 
         # Truncate response to first 300 chars to fit budget
         # (Full responses are 2000-4000 tokens, budget is only 600)
-        response_snippet = rec['response'][:300] + "..." if len(rec['response']) > 300 else rec['response']
+        snippet = rec["snippet_300"] if "snippet_300" in rec else response_snippet(rec["response"], 300)
 
-        # Format: "[Past conversation]\nQ: {prompt}\nA: {response_snippet}"
-        text = f"[Past conversation]\nQ: {rec['prompt']}\nA: {response_snippet}"
-        return count_tokens(text)
+        # Format: "[Past conversation]\nQ: {prompt}\nA: {snippet}"
+        return count_tokens(past_conversation_entry(rec["prompt"], snippet))
 
     def _format_context(self, conversations: List[Dict[str, Any]]) -> str:
         """
@@ -454,12 +1245,12 @@ class MemoryEngine:
             score = conv.get("_score", 0.0)
 
             # Truncate response to first 300 chars (matches token estimation)
-            response_snippet = conv['response'][:300] + "..." if len(conv['response']) > 300 else conv['response']
+            snippet = conv["snippet_300"] if "snippet_300" in conv else response_snippet(conv["response"], 300)
 
             context_parts.append(
                 f"[Past conversation (relevance: {score:.2f})]\n"
                 f"Q: {conv['prompt']}\n"
-                f"A: {response_snippet}"
+                f"A: {snippet}"
             )
 
         return "\n\n".join(context_parts)
@@ -494,7 +1285,8 @@ class MemoryEngine:
         prompt: str,
         candidates: List[Dict[str, Any]],
         time_decay_hours: int,
-    ) -> List[Dict[str, Any]]:
+        now: Optional[float] = None,
+    ) -> ScoredCandidates:
         """
         Score candidates using semantic similarity (embedding-based).
 
@@ -502,83 +1294,121 @@ class MemoryEngine:
             prompt: Query prompt
             candidates: Candidate conversation records
             time_decay_hours: Time decay factor
+            now: Reference epoch seconds for decay (default: current time)
 
         Returns:
-            List of scored records with _score and _est_tokens fields
+            Scored candidates (records without an available embedding are left out)
         """
         # Generate query embedding
         query_embedding = self.embedding_engine.encode(prompt)
 
-        scored = []
+        records, embeddings = [], []
         for rec in candidates:
             # Get or generate embedding for candidate
             candidate_embedding = self._get_or_generate_embedding(rec)
-
             if candidate_embedding is None:
                 continue  # Skip if embedding unavailable
+            records.append(rec)
+            embeddings.append(candidate_embedding)
 
-            # Calculate semantic similarity
-            similarity = self.embedding_engine.cosine_similarity(
-                query_embedding, candidate_embedding
-            )
+        epochs = record_epochs(records)
+        similarities = cosine_similarities(query_embedding, embeddings)
+        scores = similarities * decay_factors(epochs, time_decay_hours, now, clamp_future=False)
+        return ScoredCandidates(records, scores, epochs)
 
-            # Apply time decay
-            if time_decay_hours > 0:
-                age_hours = (
-                    datetime.now(timezone.utc)
-                    - self._parse_timestamp(rec["timestamp"])
-                ).total_seconds() / 3600
-                decay = math.exp(-age_hours / time_decay_hours)
-                score = similarity * decay
-            else:
-                score = similarity
+    def _score_indexed(
+        self,
+        prompt: str,
+        index: VectorIndex,
+        *,
+        strategy: str,
+        query_weights: Dict[str, float],
+        agent: Optional[str],
+        exclude_session_id: Optional[str],
+        time_decay_hours: int,
+        min_relevance: float,
+        now: Optional[float] = None,
+    ) -> ScoredCandidates:
+        """
+        Score the whole corpus with one matrix-vector product (semantic/hybrid).
 
-            rec["_score"] = score
-            rec["_est_tokens"] = self._estimate_tokens(rec)
-            scored.append(rec)
+        The scoring columns of the top ``vector_index.max_candidates``
+        conversations by semantic score are loaded from the database; for
+        hybrid, their keyword scores are blended in (70% semantic + 30%
+        keywords) as in _score_hybrid.
 
-        return scored
+        Args:
+            prompt: Query prompt
+            index: Vector index of the backend
+            strategy: "semantic" or "hybrid"
+            query_weights: Query keyword -> idf weight (hybrid)
+            agent: Filter by agent
+            exclude_session_id: Session to exclude
+            time_decay_hours: Time decay factor
+            min_relevance: Minimum final score
+            now: Reference epoch seconds for decay (default: current time)
+
+        Returns:
+            Scored candidates
+        """
+        query_embedding = self.embedding_engine.encode(prompt)
+        now = time.time() if now is None else now
+
+        # Hybrid keyword share is at most 0.3 (keyword overlap <= 1, decay <= 1)
+        min_semantic = min_relevance if strategy == "semantic" else max(0.0, (min_relevance - 0.3) / 0.7)
+        ids, scores = index.search(
+            query_embedding,
+            agent=agent,
+            exclude_session_id=exclude_session_id,
+            time_decay_hours=time_decay_hours,
+            min_score=min_semantic,
+            top_k=self.vector_config.get("max_candidates", 500),
+            now=now,
+        )
+        records = self.backend.get_scoring_rows(ids.tolist(), with_keywords=strategy == "hybrid")
+        if strategy == "hybrid":
+            self._ensure_keywords(list(records.values()))
+
+        # Deleted by another process since the index was synced: left out
+        found = np.array([conversation_id in records for conversation_id in ids.tolist()], dtype=bool)
+        kept = [records[conversation_id] for conversation_id in ids[found].tolist()]
+        scores = scores[found].astype(np.float64)
+        epochs = record_epochs(kept)
+        if strategy == "hybrid":
+            keyword_scores = self._keyword_overlap(kept, query_weights) * decay_factors(epochs, time_decay_hours, now)
+            scores = 0.7 * scores + 0.3 * keyword_scores
+
+        return ScoredCandidates(kept, scores, epochs)
 
     def _score_hybrid(
         self,
         prompt: str,
         candidates: List[Dict[str, Any]],
+        query_weights: Dict[str, float],
         time_decay_hours: int,
-    ) -> List[Dict[str, Any]]:
+        now: Optional[float] = None,
+    ) -> ScoredCandidates:
         """
         Score candidates using hybrid approach (70% semantic + 30% keywords).
 
         Args:
             prompt: Query prompt
             candidates: Candidate conversation records
+            query_weights: Query keyword -> idf weight
             time_decay_hours: Time decay factor
+            now: Reference epoch seconds for decay (default: current time)
 
         Returns:
-            List of scored records with _score and _est_tokens fields
+            Scored candidates (records without an available embedding are left out)
         """
-        # Get keyword scores
-        query_tokens = self._extract_keywords(prompt)
-        keyword_scores = {}
-        for rec in candidates:
-            score = self._score_record(
-                rec, query_tokens, time_decay_hours=time_decay_hours
-            )
-            keyword_scores[rec["id"]] = score
-
-        # Get semantic scores
-        semantic_scored = self._score_semantic(prompt, candidates, time_decay_hours)
+        now = time.time() if now is None else now
+        semantic = self._score_semantic(prompt, candidates, time_decay_hours, now)
 
         # Combine: 70% semantic + 30% keywords
-        scored = []
-        for rec in semantic_scored:
-            semantic_score = rec["_score"]
-            keyword_score = keyword_scores.get(rec["id"], 0.0)
-            hybrid_score = 0.7 * semantic_score + 0.3 * keyword_score
-
-            rec["_score"] = hybrid_score
-            scored.append(rec)
-
-        return scored
+        keyword_scores = self._keyword_overlap(semantic.records, query_weights) * decay_factors(
+            semantic.epochs, time_decay_hours, now
+        )
+        return ScoredCandidates(semantic.records, 0.7 * semantic.scores + 0.3 * keyword_scores, semantic.epochs)
 
     def _get_or_generate_embedding(self, record: Dict[str, Any]) -> Optional[Any]:
         """
@@ -600,12 +1430,12 @@ class MemoryEngine:
 
         # Generate on-demand if missing
         try:
-            text = f"{record['prompt']}\n{record['response'][:200]}"
+            text = record.get("embed_text") or f"{record['prompt']}\n{record['response'][:200]}"
             embedding = self.embedding_engine.encode(text)
 
             # Update database with new embedding (fire-and-forget)
             try:
-                serialized = EmbeddingEngine.serialize_embedding(embedding)
+                serialized = EmbeddingEngine.serialize_embedding(embedding, self.embedding_dtype)
                 self.backend.update_embedding(record["id"], serialized)
             except Exception as e:
                 logger.warning(f"Failed to update embedding in database for record {record.get('id')}: {e}")
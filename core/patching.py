@@ -0,0 +1,141 @@
+"""
+Patch-based refinement: apply builder edits to the previous solution.
+
+Instead of regenerating the whole solution (up to max_tokens completion
+tokens) to fix a few critical issues, the builder answers a refinement with
+SEARCH/REPLACE blocks against its previous output:
+
+    <<<<<<< SEARCH
+    exact lines from the previous solution
+    =======
+    corrected lines
+    >>>>>>> REPLACE
+
+The runtime applies them locally to rebuild the full text. An empty SEARCH
+section appends the replacement to the end. Blocks that don't match the
+previous text exactly once raise PatchError; callers then fall back to a
+full regeneration.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+EDIT_BLOCK_RE = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(?P<search>.*?)^={5,9}[^\S\n]*\n(?P<replace>.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+PATCH_INSTRUCTIONS = """Do NOT rewrite the whole solution. Reply ONLY with edit blocks against your previous solution, in this exact format:
+
+<<<<<<< SEARCH
+(exact lines copied from the previous solution, enough to be unique)
+=======
+(the corrected lines)
+>>>>>>> REPLACE
+
+Rules:
+- SEARCH text must match the previous solution exactly, including indentation
+- Use one block per change; keep blocks small
+- Use an empty SEARCH section to append new sections at the end
+- No text outside the blocks"""
+
+
+class PatchError(ValueError):
+    """Edit blocks could not be applied to the previous text."""
+
+
+@dataclass
+class EditBlock:
+    """One SEARCH/REPLACE edit."""
+
+    search: str
+    replace: str
+
+
+def parse_edit_blocks(text: str) -> List[EditBlock]:
+    """
+    Extract SEARCH/REPLACE blocks from a model response.
+
+    Args:
+        text: Builder response
+
+    Returns:
+        Edit blocks in order (empty if the response contains none)
+    """
+    return [EditBlock(m.group("search"), m.group("replace")) for m in EDIT_BLOCK_RE.finditer(text)]
+
+
+def _find_unique(text: str, search: str) -> Optional[int]:
+    """Position of search in text; None if missing; PatchError if ambiguous."""
+    position = text.find(search)
+    if position == -1:
+        return None
+    if text.find(search, position + 1) != -1:
+        raise PatchError(f"SEARCH text is ambiguous (matches more than once): {search[:60]!r}")
+    return position
+
+
+def _find_lines_loose(text: str, search: str) -> Optional[tuple]:
+    """
+    Match search line by line, ignoring trailing whitespace.
+
+    Returns:
+        (start, end) character span in text, or None if not found
+    """
+    search_lines = [line.rstrip() for line in search.rstrip("\n").split("\n")]
+    text_lines = text.split("\n")
+    stripped = [line.rstrip() for line in text_lines]
+    n = len(search_lines)
+    matches = [i for i in range(len(text_lines) - n + 1) if stripped[i:i + n] == search_lines]
+    if not matches:
+        return None
+    if len(matches) > 1:
+        raise PatchError(f"SEARCH text is ambiguous (matches more than once): {search[:60]!r}")
+
+    start = sum(len(line) + 1 for line in text_lines[:matches[0]])
+    end = start + sum(len(line) + 1 for line in text_lines[matches[0]:matches[0] + n])
+    return start, min(end, len(text))
+
+
+def apply_edit_blocks(original: str, blocks: List[EditBlock]) -> str:
+    """
+    Apply edit blocks in order.
+
+    Each SEARCH text must occur exactly once in the current text (exact match
+    first, then line-wise ignoring trailing whitespace).
+
+    Args:
+        original: Previous full solution
+        blocks: Edits from parse_edit_blocks()
+
+    Returns:
+        Patched full text
+
+    Raises:
+        PatchError: If there are no blocks or a block doesn't match exactly once
+    """
+    if not blocks:
+        raise PatchError("No edit blocks found")
+
+    text = original
+    for block in blocks:
+        if not block.search.strip():
+            text = f"{text.rstrip()}\n\n{block.replace}" if text.strip() else block.replace
+            continue
+
+        position = _find_unique(text, block.search)
+        if position is not None:
+            text = text[:position] + block.replace + text[position + len(block.search):]
+            continue
+
+        span = _find_lines_loose(text, block.search)
+        if span is None:
+            raise PatchError(f"SEARCH text not found in previous solution: {block.search[:60]!r}")
+        start, end = span
+        replace = block.replace
+        if end == len(text) and not text.endswith("\n"):
+            replace = replace.rstrip("\n")
+        text = text[:start] + replace + text[end:]
+
+    return text
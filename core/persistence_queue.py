@@ -0,0 +1,377 @@
+"""
+Write-behind persistence for conversation logs and memory rows.
+
+AgentRuntime.run used to write the JSON log, embed the conversation and
+commit it to SQLite on the request thread. With the queue enabled, run() only
+reserves the log path and enqueues the work; a background worker:
+
+- writes JSON logs (masking + serialization)
+- groups memory rows into batches: one encode_batch() call for embeddings
+  and one SQLite transaction per batch
+
+The queue is bounded. When it is full, submit() either blocks (backpressure)
+or spills the item to a JSONL file in data/SPILL/ that the worker replays
+once it catches up (and on the next start after a crash). While spilled items
+are pending, later items are spilled too, so writes are persisted in
+submission order (a session's turns stay in order).
+
+Pending work is flushed at interpreter exit and on API shutdown.
+Synchronous behaviour (the pre-queue code path) is kept with
+PERSISTENCE_SYNC=1 or persistence.mode: "sync" in memory.yaml.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import BASE_DIR, load_memory_config
+from core.logging_utils import write_json
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def is_sync_mode(config: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether persistence should run on the request thread."""
+    if os.getenv("PERSISTENCE_SYNC", "").lower() in ("1", "true", "yes", "on"):
+        return True
+    return (config or {}).get("mode", "async") == "sync"
+
+
+class PersistenceQueue:
+    """Bounded background queue that persists logs and memory rows in batches."""
+
+    def __init__(
+        self,
+        memory_factory: Optional[Callable[[], Any]] = None,
+        max_size: int = 1000,
+        batch_size: int = 32,
+        flush_interval: float = 0.2,
+        overflow: str = "spill",
+        block_timeout: float = 2.0,
+        spill_dir: Optional[Path] = None,
+    ):
+        """
+        Args:
+            memory_factory: Returns the MemoryEngine used for memory rows (default: MemoryEngine)
+            max_size: Max queued items before overflow handling kicks in
+            batch_size: Max memory rows per embedding batch / transaction
+            flush_interval: Seconds the worker waits to fill a batch
+            overflow: "spill" (write to disk when full) or "block" (wait, then spill)
+            block_timeout: Seconds submit() waits for room in "block" mode
+            spill_dir: Directory for overflow files (default: data/SPILL)
+        """
+        if overflow not in ("spill", "block"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self._memory_factory = memory_factory
+        self._memory = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.spill_dir = spill_dir or (BASE_DIR / "data" / "SPILL")
+        self.spill_path = self.spill_dir / "persistence.jsonl"
+        self.processing_path = self.spill_path.with_suffix(".processing")  # Spill being replayed
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_size)
+        self._spill_lock = threading.Lock()
+        self._replay_lock = threading.Lock()  # One replay at a time (worker, flush/close, late submits)
+        # Spilled items pending (or a replay cut short by a crash): new items spill too
+        self._spilling = self.spill_path.exists() or self.processing_path.exists()
+        self._stats_lock = threading.Lock()
+        self._pending_lock = threading.Condition()
+        self._pending_sessions: Dict[str, int] = {}
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.stats_counters = {
+            "logs_written": 0,
+            "memory_rows_stored": 0,
+            "batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "errors": 0,
+        }
+
+    @property
+    def memory(self):
+        """Lazy MemoryEngine (only created when the first memory row is persisted)."""
+        if self._memory is None:
+            if self._memory_factory is not None:
+                self._memory = self._memory_factory()
+            else:
+                from core.memory_engine import MemoryEngine
+
+                self._memory = MemoryEngine()
+        return self._memory
+
+    # --- Producer side ---
+
+    def start(self) -> "PersistenceQueue":
+        """Start the worker thread (idempotent)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._closed = False
+            self._worker = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+            self._worker.start()
+        return self
+
+    def submit_log(self, record: Dict[str, Any], filepath: Path) -> None:
+        """Queue a JSON conversation log for writing to filepath."""
+        self._submit({"kind": "log", "record": record, "filepath": str(filepath)})
+
+    def submit_memory(self, item: Dict[str, Any]) -> None:
+        """
+        Queue a memory row.
+
+        Args:
+            item: store_conversation() keyword arguments
+                  (prompt, response, agent, model, provider, metadata, session_id)
+        """
+        session_id = item.get("session_id")
+        if session_id:
+            with self._pending_lock:
+                self._pending_sessions[session_id] = self._pending_sessions.get(session_id, 0) + 1
+        self._submit({"kind": "memory", "item": item})
+
+    def _submit(self, entry: Dict[str, Any]) -> None:
+        if self._closed:
+            self._replay_spill()
+            self._process([entry])
+            return
+        self.start()
+        if self._spilling and self._spill(entry, only_if_spilling=True):
+            return  # Queued behind earlier spilled items
+        try:
+            if self.overflow == "block":
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._spill(entry)
+
+    def _spill(self, entry: Dict[str, Any], only_if_spilling: bool = False) -> bool:
+        """
+        Append an entry to the spill file (replayed by the worker later).
+
+        Returns:
+            False if only_if_spilling and the pending spill was replayed meanwhile
+        """
+        with self._spill_lock:
+            if only_if_spilling and not self._spilling:
+                return False
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self._spilling = True
+        self._count("spilled")
+        return True
+
+    def _count(self, name: str, n: int = 1) -> None:
+        """Increment a stats counter (called from the worker and caller threads)."""
+        with self._stats_lock:
+            self.stats_counters[name] += n
+
+    def wait_for_session(self, session_id: str, timeout: float = 5.0) -> bool:
+        """
+        Block until queued memory rows of a session are stored.
+
+        Called before reading session context so a follow-up turn sees the
+        previous one.
+
+        Returns:
+            True if nothing is pending for the session any more
+        """
+        deadline = time.monotonic() + timeout
+        with self._pending_lock:
+            while self._pending_sessions.get(session_id):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._pending_lock.wait(remaining)
+        return True
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """
+        Wait until everything queued so far (and spilled) is persisted.
+
+        Returns:
+            True if the queue drained within timeout
+        """
+        if self._worker is None or not self._worker.is_alive():
+            self._replay_spill()
+            return True
+
+        done = threading.Event()
+        self._queue.put({"kind": "barrier", "event": done})  # Never spilled
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Flush pending work and stop the worker."""
+        if self._worker is not None and self._worker.is_alive():
+            self.flush(timeout)
+            self._queue.put(_STOP)
+            self._worker.join(timeout)
+        self._closed = True
+        self._replay_spill()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and counters."""
+        with self._stats_lock:
+            counters = dict(self.stats_counters)
+        return {
+            "queued": self._queue.qsize(),
+            "max_size": self._queue.maxsize,
+            "running": self._worker is not None and self._worker.is_alive(),
+            "spill_pending": self.spill_path.exists() or self.processing_path.exists(),
+            **counters,
+        }
+
+    # --- Worker side ---
+
+    def _run(self) -> None:
+        self._replay_spill()
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or batch[-1].get("kind") == "barrier":
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            barriers = self._process(batch)
+            if barriers or self._queue.empty():
+                self._replay_spill()
+            for event in barriers:
+                event.set()
+            if stop:
+                return
+
+    def _process(self, batch: List[Dict[str, Any]]) -> List[threading.Event]:
+        """
+        Persist a batch: logs one by one, memory rows in one transaction.
+
+        Returns:
+            Flush barriers found in the batch (set by the caller once done)
+        """
+        memory_items = []
+        barriers = []
+
+        for entry in batch:
+            kind = entry.get("kind")
+            if kind == "log":
+                try:
+                    write_json(entry["record"], Path(entry["filepath"]))
+                    self._count("logs_written")
+                except Exception as e:
+                    self._count("errors")
+                    logger.warning(f"Failed to write conversation log {entry['filepath']}: {e}")
+            elif kind == "memory":
+                memory_items.append(entry["item"])
+            elif kind == "barrier":
+                barriers.append(entry["event"])
+
+        if memory_items:
+            try:
+                self.memory.store_conversations(memory_items)
+                self._count("memory_rows_stored", len(memory_items))
+                self._count("batches")
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Failed to store {len(memory_items)} conversations: {e}")
+            finally:
+                self._release_sessions(memory_items)
+
+        return barriers
+
+    def _release_sessions(self, items: List[Dict[str, Any]]) -> None:
+        with self._pending_lock:
+            for item in items:
+                session_id = item.get("session_id")
+                if session_id and self._pending_sessions.get(session_id):
+                    self._pending_sessions[session_id] -= 1
+                    if not self._pending_sessions[session_id]:
+                        del self._pending_sessions[session_id]
+            self._pending_lock.notify_all()
+
+    def _replay_spill(self) -> None:
+        """
+        Persist entries that overflowed to disk.
+
+        A .processing file left by a replay that was cut short (crash) is
+        replayed first; it is older than the current spill file. Items
+        spilled during the replay are replayed next; spilling stops only once
+        the file is empty, so queued items never overtake spilled ones.
+        """
+        processing = self.processing_path
+        with self._replay_lock:
+            while True:
+                if not processing.exists():
+                    with self._spill_lock:
+                        if not self.spill_path.exists():
+                            self._spilling = False
+                            return
+                        self.spill_path.replace(processing)
+
+                entries = []
+                with open(processing, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue  # Truncated line from a crash mid-write
+
+                for start in range(0, len(entries), self.batch_size):
+                    self._process(entries[start:start + self.batch_size])
+                self._count("replayed", len(entries))
+                processing.unlink()
+
+
+_persistence_queue: Optional[PersistenceQueue] = None
+_persistence_lock = threading.Lock()
+
+
+def get_persistence_queue() -> Optional[PersistenceQueue]:
+    """
+    Get the global persistence queue (None when running in sync mode).
+
+    Returns:
+        Started PersistenceQueue instance, or None for synchronous persistence
+    """
+    global _persistence_queue
+
+    config = load_memory_config().get("persistence", {})
+    if is_sync_mode(config):
+        return None
+
+    with _persistence_lock:
+        if _persistence_queue is None:
+            _persistence_queue = PersistenceQueue(
+                max_size=config.get("queue_size", 1000),
+                batch_size=config.get("batch_size", 32),
+                flush_interval=config.get("flush_interval_ms", 200) / 1000,
+                overflow=config.get("overflow", "spill"),
+                block_timeout=config.get("block_timeout_seconds", 2.0),
+                spill_dir=BASE_DIR / config.get("spill_dir", "data/SPILL"),
+            ).start()
+            atexit.register(_persistence_queue.close)
+    return _persistence_queue
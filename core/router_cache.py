@@ -0,0 +1,207 @@
+"""
+Routing decision cache for agent="auto" requests.
+
+Repeated prompts (UI retries, re-runs, copy-pasted questions) are routed once:
+the decision is cached under a hash of the normalized prompt. Optionally,
+near-identical prompts can reuse a decision via embedding similarity.
+
+Eviction: LRU (max_entries) + TTL (ttl_seconds).
+Invalidation: the cache is cleared whenever the router configuration
+fingerprint changes (router agent / routing section of agents.yaml).
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from core.embedding_engine import EmbeddingEngine, get_embedding_engine
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and strip trailing punctuation."""
+    return _WHITESPACE_RE.sub(" ", prompt.lower()).strip().rstrip(".!?;:,").strip()
+
+
+def prompt_key(prompt: str) -> str:
+    """Cache key for a prompt (sha256 of the normalized text)."""
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """Fingerprint of the config sections that affect routing decisions."""
+    relevant = {
+        "router": config.get("agents", {}).get("router"),
+        "routing": config.get("routing"),
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    agent: str
+    source: str
+    expires_at: float
+    embedding: Optional[np.ndarray] = None
+
+
+class RouterCache:
+    """Thread-safe LRU + TTL cache of routing decisions."""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: Optional[float] = None,
+        embedding_engine: Optional[EmbeddingEngine] = None,
+    ):
+        """
+        Args:
+            max_entries: Max cached decisions (least recently used evicted first)
+            ttl_seconds: Seconds a decision stays valid
+            similarity_threshold: Cosine similarity for near-duplicate hits (None = exact only)
+            embedding_engine: Engine for similarity lookups (default: global singleton)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._embedding_engine = embedding_engine
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.fingerprint: Optional[str] = None
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def embedding_engine(self) -> EmbeddingEngine:
+        """Lazy load embedding engine only when needed."""
+        if self._embedding_engine is None:
+            self._embedding_engine = get_embedding_engine()
+        return self._embedding_engine
+
+    def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        """Normalized prompt embedding (None if similarity lookup is off or fails)."""
+        if self.similarity_threshold is None:
+            return None
+        try:
+            vector = np.asarray(self.embedding_engine.encode(normalize_prompt(prompt)), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Router cache similarity lookup disabled: {e}")
+            self.similarity_threshold = None
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+            self.evictions += 1
+
+    def check_fingerprint(self, fingerprint: str) -> bool:
+        """
+        Clear the cache if the routing config fingerprint changed.
+
+        Returns:
+            True if the cache was invalidated
+        """
+        with self._lock:
+            if self.fingerprint == fingerprint:
+                return False
+            changed = self.fingerprint is not None
+            self.fingerprint = fingerprint
+            if changed:
+                self._entries.clear()
+                self.invalidations += 1
+            return changed
+
+    def get(self, prompt: str) -> Optional[Dict[str, str]]:
+        """
+        Look up a cached routing decision.
+
+        Returns:
+            Dict with "agent" and original "source", or None on miss
+        """
+        key = prompt_key(prompt)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return {"agent": entry.agent, "source": entry.source}
+                del self._entries[key]
+                self.evictions += 1
+
+        query = self._embed(prompt)
+        if query is not None:
+            with self._lock:
+                self._purge_expired(now)
+                keys = [k for k, e in self._entries.items() if e.embedding is not None]
+                if keys:
+                    matrix = np.stack([self._entries[k].embedding for k in keys])
+                    similarities = matrix @ query
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(keys[best])
+                        entry = self._entries[keys[best]]
+                        self.similar_hits += 1
+                        return {"agent": entry.agent, "source": entry.source}
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, prompt: str, agent: str, source: str) -> None:
+        """Cache a routing decision."""
+        key = prompt_key(prompt)
+        entry = _Entry(
+            agent=agent,
+            source=source,
+            expires_at=time.time() + self.ttl_seconds,
+            embedding=self._embed(prompt),
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all cached decisions."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -18,13 +18,10 @@ import re
 import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
-from threading import Lock
 from typing import Optional, Dict, Any
 from uuid import uuid4
 
-
-# Singleton lock for thread safety
-_session_db_lock = Lock()
+from core.db_pool import get_pool
 
 
 class SessionManager:
@@ -184,29 +181,21 @@ class SessionManager:
 
         Cleanup runs randomly (10% probability) to spread load.
         """
-        with _session_db_lock:
-            conn = sqlite3.connect(str(self.db_path))
+        with get_pool(self.db_path).writer() as conn:
             cursor = conn.cursor()
-
-            try:
-                # Save/update session
-                cursor.execute("""
-                    INSERT INTO sessions (session_id, source, metadata, last_active)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(session_id)
-                    DO UPDATE SET
-                        last_active = CURRENT_TIMESTAMP,
-                        metadata = excluded.metadata
-                """, (session_id, source, json.dumps(metadata)))
-
-                conn.commit()
-
-                # Probabilistic cleanup (10% of requests)
-                if random.random() < 0.1:
-                    self._cleanup_old_sessions(cursor, conn)
-
-            finally:
-                conn.close()
+            # Save/update session
+            cursor.execute("""
+                INSERT INTO sessions (session_id, source, metadata, last_active)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(session_id)
+                DO UPDATE SET
+                    last_active = CURRENT_TIMESTAMP,
+                    metadata = excluded.metadata
+            """, (session_id, source, json.dumps(metadata)))
+
+            # Probabilistic cleanup (10% of requests)
+            if random.random() < 0.1:
+                self._cleanup_old_sessions(cursor, conn)
 
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -218,32 +207,26 @@ class SessionManager:
         Returns:
             Session dict or None if not found
         """
-        with _session_db_lock:
-            conn = sqlite3.connect(str(self.db_path))
+        with get_pool(self.db_path).reader() as conn:
             cursor = conn.cursor()
+            cursor.execute("""
+                SELECT session_id, created_at, last_active, source, metadata
+                FROM sessions
+                WHERE session_id = ?
+            """, (session_id,))
 
-            try:
-                cursor.execute("""
-                    SELECT session_id, created_at, last_active, source, metadata
-                    FROM sessions
-                    WHERE session_id = ?
-                """, (session_id,))
+            row = cursor.fetchone()
 
-                row = cursor.fetchone()
+            if row:
+                return {
+                    'session_id': row[0],
+                    'created_at': row[1],
+                    'last_active': row[2],
+                    'source': row[3],
+                    'metadata': json.loads(row[4]) if row[4] else {}
+                }
 
-                if row:
-                    return {
-                        'session_id': row[0],
-                        'created_at': row[1],
-                        'last_active': row[2],
-                        'source': row[3],
-                        'metadata': json.loads(row[4]) if row[4] else {}
-                    }
-
-                return None
-
-            finally:
-                conn.close()
+            return None
 
     def _get_recent_cli_session(
         self,
@@ -263,36 +246,30 @@ class SessionManager:
         cutoff = datetime.now() - timedelta(hours=within_hours)
         cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
 
-        with _session_db_lock:
-            conn = sqlite3.connect(str(self.db_path))
+        with get_pool(self.db_path).reader() as conn:
             cursor = conn.cursor()
-
-            try:
-                cursor.execute("""
-                    SELECT session_id, created_at, last_active, source, metadata
-                    FROM sessions
-                    WHERE source = 'cli'
-                      AND metadata LIKE ?
-                      AND datetime(last_active) > datetime(?)
-                    ORDER BY last_active DESC
-                    LIMIT 1
-                """, (f'%"pid":{pid}%', cutoff_str))
-
-                row = cursor.fetchone()
-
-                if row:
-                    return {
-                        'session_id': row[0],
-                        'created_at': row[1],
-                        'last_active': row[2],
-                        'source': row[3],
-                        'metadata': json.loads(row[4]) if row[4] else {}
-                    }
-
-                return None
-
-            finally:
-                conn.close()
+            cursor.execute("""
+                SELECT session_id, created_at, last_active, source, metadata
+                FROM sessions
+                WHERE source = 'cli'
+                  AND metadata LIKE ?
+                  AND datetime(last_active) > datetime(?)
+                ORDER BY last_active DESC
+                LIMIT 1
+            """, (f'%"pid":{pid}%', cutoff_str))
+
+            row = cursor.fetchone()
+
+            if row:
+                return {
+                    'session_id': row[0],
+                    'created_at': row[1],
+                    'last_active': row[2],
+                    'source': row[3],
+                    'metadata': json.loads(row[4]) if row[4] else {}
+                }
+
+            return None
 
     def _cleanup_old_sessions(
         self,
@@ -341,16 +318,10 @@ class SessionManager:
         Returns:
             Number of sessions deleted
         """
-        with _session_db_lock:
-            conn = sqlite3.connect(str(self.db_path))
+        with get_pool(self.db_path).writer() as conn:
             cursor = conn.cursor()
-
-            try:
-                deleted = self._cleanup_old_sessions(cursor, conn, hours)
-                return deleted
-
-            finally:
-                conn.close()
+            deleted = self._cleanup_old_sessions(cursor, conn, hours)
+            return deleted
 
 
 # Singleton instance
@@ -0,0 +1,149 @@
+"""
+Single-flight coalescing for identical concurrent chain requests.
+
+The same chain (same prompt, stages and settings, no session) is often
+triggered from the UI and CI within seconds. While one execution for a
+request key is in flight, duplicates wait for it and receive its result
+instead of running the chain again. Results are kept for a short TTL so
+duplicates arriving just after completion are served too.
+
+Results with errors are shared with waiting duplicates but not cached.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def chain_request_key(
+    prompt: str,
+    stages: List[str],
+    enable_refinement: Optional[bool],
+    mock_mode: Optional[bool],
+    budget: Optional[Dict[str, Any]],
+    speculative: Optional[int] = None,
+    compression_mode: Optional[str] = None,
+) -> str:
+    """
+    Canonical key of a chain request (sha256).
+
+    Whitespace in the prompt is collapsed; case is kept (it can change the answer).
+    """
+    canonical = {
+        "prompt": _WHITESPACE_RE.sub(" ", prompt).strip(),
+        "stages": list(stages),
+        "enable_refinement": enable_refinement,
+        "mock_mode": mock_mode,
+        "budget": budget,
+        "speculative": speculative,
+        "compression_mode": compression_mode,
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """An in-flight execution that duplicates wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Thread-safe in-flight deduplication plus a short-lived result cache."""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 100):
+        """
+        Args:
+            ttl_seconds: How long completed results serve duplicates (0 = in-flight only)
+            max_entries: Max cached results (LRU eviction)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats_counters = {"executions": 0, "in_flight_hits": 0, "cache_hits": 0}
+
+    def do(
+        self,
+        key: str,
+        func: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Tuple[Any, str]:
+        """
+        Run func once per key; concurrent and recent duplicates share its result.
+
+        Args:
+            key: Request key (e.g. chain_request_key())
+            func: Work to execute
+            cacheable: Whether a result may be served after completion
+
+        Returns:
+            Tuple of (result, source: "executed", "in_flight" or "cache")
+
+        Raises:
+            Whatever func raised (duplicates waiting on it get the same exception)
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._results.move_to_end(key)
+                    self.stats_counters["cache_hits"] += 1
+                    return cached[1], "cache"
+                del self._results[key]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats_counters["executions"] += 1
+
+        if not leader:
+            call.done.wait()
+            with self._lock:
+                self.stats_counters["in_flight_hits"] += 1
+            if call.error is not None:
+                raise call.error
+            return call.value, "in_flight"
+
+        try:
+            call.value = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            if self.ttl_seconds > 0 and cacheable(call.value):
+                with self._lock:
+                    self._results[key] = (time.monotonic() + self.ttl_seconds, call.value)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+            return call.value, "executed"
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def clear(self) -> None:
+        """Drop cached results (in-flight executions are unaffected)."""
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """In-flight count, cached results and hit counters."""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "cached": len(self._results),
+                "ttl_seconds": self.ttl_seconds,
+                **self.stats_counters,
+            }
@@ -0,0 +1,195 @@
+"""
+Compiled multi-keyword matcher for critical-issue extraction and cue counting.
+
+Critical-issue extraction checks every line of a critic review for any of
+the critical keywords; calling `in` once per keyword and line rescans the
+text for every keyword. KeywordMatcher compiles all keywords into a single
+trie-shaped regex and finds every keyword occurrence in one pass; counting
+stays inside the regex engine (findall + Counter), so the Python cost is per
+distinct keyword, not per occurrence.
+
+Counts are identical to str.count() per keyword (non-overlapping occurrences,
+scanning left to right), including keywords that overlap each other or are
+contained in other keywords (e.g. "auth" inside "oauth").
+"""
+
+import re
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+
+# "Issue 3:" / "Problem 1:" headers at the start of a line ([^\S\n] = whitespace except newline)
+ISSUE_HEADER_RE = re.compile(r"^[^\S\n]*(?:Issue|Problem)[^\S\n]+\d+:", re.IGNORECASE | re.MULTILINE)
+
+
+def newline_offsets(text: str) -> List[int]:
+    """Positions of newlines in text (for mapping match positions to line indices)."""
+    return [m.start() for m in re.finditer("\n", text)]
+
+
+def issue_header_lines(text: str, newlines: Optional[List[int]] = None) -> Set[int]:
+    r"""
+    Indices of lines (text.split("\n")) starting with an "Issue N:" / "Problem N:" header.
+
+    Equivalent to re.match(r'^\s*(?:Issue|Problem)\s+\d+:', line, re.IGNORECASE) per line.
+    """
+    if newlines is None:
+        newlines = newline_offsets(text)
+    return {bisect_right(newlines, m.start()) for m in ISSUE_HEADER_RE.finditer(text)}
+
+
+def _trie_regex(keywords: Sequence[str]) -> str:
+    """Build a regex that matches the longest keyword at a position."""
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"  # Greedy: prefer the longer keyword
+        return pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Counts occurrences of a fixed keyword set in a single pass."""
+
+    def __init__(self, keywords: Sequence[str]):
+        """
+        Args:
+            keywords: Keywords to match verbatim (callers normalize case)
+        """
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(k for k in keywords if k))
+        self._has_empty = any(k == "" for k in keywords)  # "" matches everywhere, like str.count
+        self._pattern = re.compile(_trie_regex(self.keywords)) if self.keywords else None
+
+        # Longest keyword at *every* start position, overlapping ones included:
+        # consume one candidate first character (lets sre skip ahead by charset),
+        # then step back and capture the trie match starting at that character.
+        self._all_starts = None
+        if self.keywords:
+            first_chars = "".join(sorted({re.escape(k[0]) for k in self.keywords}))
+            self._all_starts = re.compile(
+                f"[{first_chars}](?<=(?=({_trie_regex(self.keywords)})).)", re.DOTALL
+            )
+
+        # Keywords that can overlap themselves ("aa" in "aaa"): str.count skips
+        # overlapping repeats, so they are counted with str.count directly.
+        self._self_overlapping: Tuple[str, ...] = tuple(
+            k for k in self.keywords if any(k.startswith(k[i:]) for i in range(1, len(k)))
+        )
+
+        # For a longest match L at position p, the keywords starting at p are the
+        # keywords that are prefixes of L (the trie regex only reports the longest).
+        self._prefixes: Dict[str, Tuple[str, ...]] = {
+            longest: tuple(k for k in self.keywords if longest.startswith(k)) for longest in self.keywords
+        }
+
+        # Offsets inside L where another keyword could start. finditer() resumes
+        # after L, so these positions are re-checked explicitly.
+        self._inner_offsets: Dict[str, Tuple[int, ...]] = {
+            longest: tuple(
+                offset
+                for offset in range(1, len(longest))
+                if any(k.startswith(longest[offset:]) or longest[offset:].startswith(k) for k in self.keywords)
+            )
+            for longest in self.keywords
+        }
+
+        # Whether a match can lie within a single line (some keyword starting there has no newline)
+        self._line_safe: Dict[str, bool] = {
+            longest: any("\n" not in k for k in prefixes) for longest, prefixes in self._prefixes.items()
+        }
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (position, longest keyword) for every position where a keyword starts.
+
+        Positions are yielded in increasing order.
+        """
+        if self._pattern is None:
+            return
+        match_at = self._pattern.match
+        for m in self._pattern.finditer(text):
+            start, longest = m.start(), m.group()
+            yield start, longest
+            for offset in self._inner_offsets[longest]:
+                inner = match_at(text, start + offset)
+                if inner is not None:
+                    yield start + offset, inner.group()
+
+    def count(self, text: str) -> Dict[str, int]:
+        """
+        Count non-overlapping occurrences of every keyword.
+
+        Returns:
+            Dict of keyword -> count (same as text.count(keyword) for each keyword)
+        """
+        counts = dict.fromkeys(self.keywords, 0)
+        if self._has_empty:
+            counts[""] = len(text) + 1
+        if self._all_starts is None:
+            return counts
+
+        # A keyword starts at a position iff it is a prefix of the longest keyword
+        # there; without self-overlap, occurrences never overlap, so the number of
+        # start positions is exactly str.count().
+        for longest, n in Counter(self._all_starts.findall(text)).items():
+            for keyword in self._prefixes[longest]:
+                counts[keyword] += n
+        for keyword in self._self_overlapping:
+            counts[keyword] = text.count(keyword)
+        return counts
+
+    def matching_lines(self, text: str, newlines: Optional[List[int]] = None) -> Set[int]:
+        """
+        Indices of lines (text.split("\\n")) that contain at least one keyword.
+
+        Equivalent to `any(k in line for k in keywords)` for each line.
+
+        Args:
+            text: Text to scan
+            newlines: Precomputed newline_offsets(text), if available
+        """
+        if newlines is None:
+            newlines = newline_offsets(text)
+        if self._has_empty:
+            return set(range(len(newlines) + 1))
+        lines: Set[int] = set()
+        for position, longest in self.iter_matches(text):
+            if self._line_safe[longest]:
+                lines.add(bisect_right(newlines, position))
+        return lines
+
+
+@lru_cache(maxsize=32)
+def compile_keywords(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    """Compiled matcher for a keyword tuple (cached per distinct keyword set)."""
+    return KeywordMatcher(keywords)
+
+
+def uppercase_keyword_lines(text: str, keywords: Sequence[str]) -> Set[int]:
+    """
+    Indices of lines (text.split("\n")) whose uppercased text contains a keyword.
+
+    Equivalent to `any(k in line.upper() for k in keywords)` for each line.
+    Newline offsets are taken from the uppercased text: str.upper() can
+    lengthen it ("ß" -> "SS"), so offsets of the original would map matches
+    to the wrong lines.
+
+    Args:
+        text: Text to scan (original case)
+        keywords: Uppercase keywords
+    """
+    upper = text.upper()
+    return compile_keywords(tuple(keywords)).matching_lines(upper, newline_offsets(upper))
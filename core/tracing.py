@@ -0,0 +1,304 @@
+"""
+Lightweight per-request tracing spans.
+
+A trace is started around a chain (or a single run) and every instrumented
+step inside it records a span: context aggregation, token counting,
+embedding, LLM calls, compression, log writes and SQLite commits. Spans
+keep their parent (the enclosing span) and the thread they ran on, so the
+parallel critics of a multi-critic stage show up as concurrent tracks.
+
+Traces export as Chrome trace-event JSON (open in https://ui.perfetto.dev or
+chrome://tracing) and as a compact summary attached to the chain response.
+
+When no trace is active, span() returns a shared no-op object after a single
+ContextVar lookup, so instrumented code costs next to nothing with tracing
+disabled.
+
+Work done later by the write-behind persistence worker is not part of the
+request trace; the request only records the time spent enqueueing it.
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+_span_ids = itertools.count(1)
+
+
+def tracing_requested(config: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether tracing is switched on (TRACE env var or tracing.enabled in agents.yaml)."""
+    if os.getenv("TRACE", "").lower() in ("1", "true", "yes", "on"):
+        return True
+    return bool((config or {}).get("enabled", False))
+
+
+class Span:
+    """A timed step inside a trace."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns",
+                 "thread_id", "thread_name", "attrs", "_token")
+
+    def __init__(self, trace: "Trace", name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id: Optional[int] = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.thread_id = 0
+        self.thread_name = ""
+        self.attrs = attrs
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None and parent.trace is self.trace else None
+        thread = threading.current_thread()
+        self.thread_id = thread.ident or 0
+        self.thread_name = thread.name
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace._add(self)
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        """Attach attributes (tokens, model, sizes, ...) to the span."""
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """Returned by span() when no trace is active."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Collects the spans of one request (thread-safe)."""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        """
+        Args:
+            name: Root span name (e.g. "chain", "agent.run")
+            trace_id: Optional id (default: random hex)
+        """
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.spans: List[Span] = []
+        self.file: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._tokens = None
+
+    def _add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def __enter__(self) -> "Trace":
+        self._tokens = (_current_trace.set(self), _current_span.set(None))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        trace_token, span_token = self._tokens
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        return False
+
+    def _finished_spans(self) -> List[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start_ns)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Chrome trace-event JSON ("X" complete events, timestamps in microseconds).
+
+        Returns:
+            Dict with traceEvents, loadable by Perfetto / chrome://tracing
+        """
+        spans = self._finished_spans()
+        origin = spans[0].start_ns if spans else 0
+        pid = os.getpid()
+
+        events: List[Dict[str, Any]] = []
+        for thread_id, thread_name in {s.thread_id: s.thread_name for s in spans}.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        for s in spans:
+            events.append({
+                "name": s.attrs.get("label", s.name),
+                "cat": s.name.split(".")[0],
+                "ph": "X",
+                "ts": (s.start_ns - origin) / 1000,
+                "dur": (s.end_ns - s.start_ns) / 1000,
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": {"span_id": s.span_id, "parent_id": s.parent_id,
+                         **{k: _jsonable(v) for k, v in s.attrs.items()}},
+            })
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id, "name": self.name},
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Time per span name, for attaching to a chain response.
+
+        Returns:
+            Dict with trace_id, wall-clock duration, span/thread counts, export
+            file (if written) and per-name count / total / max milliseconds
+            (sorted by total time, descending)
+        """
+        spans = self._finished_spans()
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for s in spans:
+            entry = by_name.setdefault(s.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += s.duration_ms
+            entry["max_ms"] = max(entry["max_ms"], s.duration_ms)
+
+        duration_ms = 0.0
+        if spans:
+            duration_ms = (max(s.end_ns for s in spans) - spans[0].start_ns) / 1e6
+
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": round(duration_ms, 2),
+            "spans": len(spans),
+            "threads": len({s.thread_id for s in spans}),
+            "file": str(self.file) if self.file else None,
+            "by_name": {
+                name: {"count": e["count"], "total_ms": round(e["total_ms"], 2), "max_ms": round(e["max_ms"], 2)}
+                for name, e in sorted(by_name.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            },
+        }
+
+    def export(self, directory: Optional[Path] = None) -> Path:
+        """
+        Write the Chrome trace JSON to <directory>/<trace_id>.json.
+
+        Args:
+            directory: Output directory (default: data/TRACES)
+
+        Returns:
+            Path of the written file
+        """
+        if directory is None:
+            from config.settings import DATA_DIR
+
+            directory = DATA_DIR / "TRACES"
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.trace_id}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        self.file = path
+        return path
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def span(name: str, **attrs: Any):
+    """
+    Time a block as a child of the current span.
+
+    A "label" attribute replaces the name in Chrome trace exports (the summary
+    still groups by name).
+
+    Usage:
+        with span("llm.call", model=model) as s:
+            response = ...
+            s.set(total_tokens=response.total_tokens)
+
+    Returns:
+        Span context manager, or a shared no-op when no trace is active
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return Span(trace, name, attrs)
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator: record every call of the function as a span named name.
+
+    Without an active trace the wrapper only adds one ContextVar lookup.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with Span(trace, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def current_trace() -> Optional[Trace]:
+    """Trace active in this context, if any."""
+    return _current_trace.get()
+
+
+def annotate(**attrs: Any) -> None:
+    """Attach attributes to the innermost active span (no-op without one)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def bind_context(func: Callable) -> Callable:
+    """
+    Bind func to a copy of the current context (active trace and span).
+
+    Thread pools don't inherit ContextVars; submit bind_context(func) instead
+    of func so spans recorded in the worker thread nest under the caller.
+    Bind once per submitted call (a context can't be entered by two threads).
+    """
+    context = contextvars.copy_context()
+
+    def run_in_context(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+
+    return run_in_context
@@ -0,0 +1,416 @@
+"""
+In-memory vector index for semantic memory retrieval.
+
+Semantic scoring used to fetch the newest 500 conversations, unpickle each
+embedding and compute a cosine similarity per record in Python. The index
+keeps every conversation embedding in one contiguous float32 matrix of
+unit-normalized rows, with parallel arrays of ids, epoch timestamps, agent
+and session codes. A query is one matrix-vector product over the whole
+corpus, with agent/session filters and time decay applied as array
+operations.
+
+Rows are appended in place (the matrix grows by doubling) and deletes are
+tombstoned, so the index is loaded once and kept current by MemoryEngine.
+With an attached IVF-flat index (core/ann_index.py), queries only score the
+rows of the clusters nearest to the query.
+
+Backed by an EmbeddingStore (core/embedding_store.py), the matrix is the
+store's read-only mapping shared by all processes: row numbers are store
+rows, appends go to the store, and the per-row metadata arrays are filled
+from SQLite by sync_store().
+"""
+
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.ann_index import IVFFlatIndex
+from core.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+
+def parse_epoch(timestamp: str) -> float:
+    """
+    ISO timestamp -> epoch seconds (timestamps without timezone are UTC).
+
+    Args:
+        timestamp: ISO format string (stored conversation timestamp)
+
+    Returns:
+        Seconds since the epoch
+    """
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class VectorIndex:
+    """Contiguous matrix of normalized embeddings with per-row metadata."""
+
+    def __init__(self, initial_capacity: int = 1024, store: Optional[EmbeddingStore] = None):
+        """
+        Args:
+            initial_capacity: Rows allocated before the first growth
+            store: Shared embedding store holding the vectors (None = in-process matrix)
+        """
+        self.dim: Optional[int] = None
+        self._initial_capacity = initial_capacity
+        self._size = 0  # Rows used (including tombstones)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.timestamps = np.zeros(0, dtype=np.float64)
+        self.agents = np.zeros(0, dtype=np.int32)
+        self.sessions = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+
+        self._positions: Dict[int, int] = {}  # conversation id -> row
+        self._codes: Dict[Optional[str], int] = {None: 0}  # agent/session string -> code
+        self._lock = threading.Lock()
+        self.ann: Optional[IVFFlatIndex] = None  # Approximate search once attached
+
+        self.store = store
+        self._store_rows = 0  # Store rows whose metadata sync_store() has processed
+        if store is not None and store.dim is not None:
+            self.dim = store.dim
+            self.vectors = store.vectors
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, conversation_id: int) -> bool:
+        return conversation_id in self._positions
+
+    @property
+    def deleted_rows(self) -> int:
+        """Tombstoned rows still allocated in the matrix."""
+        return self._size - len(self._positions)
+
+    def _code(self, value: Optional[str]) -> int:
+        """Integer code of an agent or session string."""
+        if value not in self._codes:
+            self._codes[value] = len(self._codes)
+        return self._codes[value]
+
+    def _grow(self, needed: int):
+        """Make room for needed rows (capacity doubles)."""
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, self._initial_capacity)
+
+        def grown(array: np.ndarray) -> np.ndarray:
+            shape = (new_capacity,) + array.shape[1:]
+            out = np.zeros(shape, dtype=array.dtype)
+            out[:self._size] = array[:self._size]
+            return out
+
+        if self.store is None:
+            self.vectors = grown(self.vectors)
+        self.ids = grown(self.ids)
+        self.timestamps = grown(self.timestamps)
+        self.agents = grown(self.agents)
+        self.sessions = grown(self.sessions)
+        self.alive = grown(self.alive)
+
+    def add(
+        self,
+        conversation_id: int,
+        embedding: np.ndarray,
+        timestamp: str,
+        agent: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> bool:
+        """
+        Append (or replace) a conversation's embedding.
+
+        Args:
+            conversation_id: Conversation ID
+            embedding: Embedding vector (any float dtype)
+            timestamp: Conversation timestamp (ISO format)
+            agent: Agent name
+            session_id: Session ID
+
+        Returns:
+            False if the embedding's dimension doesn't match the index
+        """
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        if self.store is not None:
+            return self._add_to_store(conversation_id, vector, timestamp, agent, session_id)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(vector)
+                self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+            if len(vector) != self.dim:
+                logger.warning(
+                    f"Skipping embedding of conversation {conversation_id}: dim {len(vector)} != {self.dim}"
+                )
+                return False
+
+            row = self._positions.get(conversation_id)
+            if row is None:
+                self._grow(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._positions[conversation_id] = row
+
+            norm = float(np.linalg.norm(vector))
+            self.vectors[row] = vector / norm if norm > 0 else vector
+            self._set_row(row, conversation_id, timestamp, agent, session_id)
+            if self.ann is not None:
+                self.ann.assign(np.array([row]), self.vectors[row:row + 1])
+            return True
+
+    def _set_row(self, row: int, conversation_id: int, timestamp: str, agent: Optional[str], session_id: Optional[str]):
+        """Fill a row's metadata and mark it live (caller holds the lock)."""
+        self.ids[row] = conversation_id
+        self.timestamps[row] = parse_epoch(timestamp)
+        self.agents[row] = self._code(agent)
+        self.sessions[row] = self._code(session_id)
+        self.alive[row] = True
+
+    def _place(self, row: int, conversation_id: int) -> bool:
+        """
+        Make a store row the conversation's current row (caller holds the lock).
+
+        Returns:
+            False if the conversation already has a newer row
+        """
+        previous = self._positions.get(conversation_id)
+        if previous is not None:
+            if previous > row:
+                return False
+            self.alive[previous] = False  # Re-embedded: the newer row wins
+        self._grow(row + 1)
+        self._size = max(self._size, row + 1)
+        self._positions[conversation_id] = row
+        return True
+
+    def _add_to_store(
+        self, conversation_id: int, vector: np.ndarray, timestamp: str, agent: Optional[str], session_id: Optional[str]
+    ) -> bool:
+        """add() for a store-backed index: append to the store, then index the new row."""
+        if self.dim is not None and len(vector) != self.dim:
+            logger.warning(f"Skipping embedding of conversation {conversation_id}: dim {len(vector)} != {self.dim}")
+            return False
+        norm = float(np.linalg.norm(vector))
+        normalized = vector / norm if norm > 0 else vector
+        try:
+            rows = self.store.append(np.array([conversation_id]), normalized[None, :])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to append conversation {conversation_id} to the embedding store: {e}")
+            return False
+        if rows is None:
+            return False  # Store rebuilt elsewhere; picked up from SQLite after the reload
+
+        row = int(rows[0])
+        with self._lock:
+            self.dim = self.store.dim
+            self.vectors = self.store.vectors
+            if not self._place(row, conversation_id):
+                return True
+            self._set_row(row, conversation_id, timestamp, agent, session_id)
+            if self.ann is not None:
+                self.ann.assign(np.array([row]), self.vectors[row:row + 1])
+            return True
+
+    def sync_store(
+        self, metadata: Callable[[List[int]], Dict[int, Dict[str, Any]]], batch_size: int = 10000
+    ) -> int:
+        """
+        Index the store rows appended since the last call (by any process).
+
+        Args:
+            metadata: ids -> {id: {timestamp, agent, session_id}} for conversations
+                that still exist (deleted ones are left out and stay unindexed)
+            batch_size: Rows per metadata lookup
+
+        Returns:
+            Rows indexed
+        """
+        count = self.store.refresh()
+        indexed = 0
+        while self._store_rows < count:
+            start, end = self._store_rows, min(count, self._store_rows + batch_size)
+            conversation_ids = self.store.ids[start:end].tolist()
+            records = metadata(conversation_ids)
+            with self._lock:
+                self.dim = self.store.dim
+                self.vectors = self.store.vectors
+                self._grow(end)
+                self._size = max(self._size, end)
+                added = []
+                for row, conversation_id in enumerate(conversation_ids, start):
+                    record = records.get(conversation_id)
+                    if record is None or self.alive[row] or not self._place(row, conversation_id):
+                        continue  # Deleted, appended by this process, or superseded
+                    self._set_row(row, conversation_id, record["timestamp"], record["agent"], record["session_id"])
+                    added.append(row)
+                if self.ann is not None and added:
+                    self.ann.assign(np.array(added), self.vectors[added])
+                self._store_rows = end
+                indexed += len(added)
+        return indexed
+
+    def remove(self, conversation_id: int) -> bool:
+        """
+        Tombstone a conversation (its row is skipped by search).
+
+        Args:
+            conversation_id: Conversation ID
+
+        Returns:
+            True if it was indexed
+        """
+        with self._lock:
+            row = self._positions.pop(conversation_id, None)
+            if row is None:
+                return False
+            self.alive[row] = False
+            return True
+
+    def remove_many(self, conversation_ids: Iterable[int]) -> int:
+        """Tombstone several conversations; returns how many were indexed."""
+        return sum(self.remove(conversation_id) for conversation_id in conversation_ids)
+
+    def search(
+        self,
+        query: np.ndarray,
+        *,
+        agent: Optional[str] = None,
+        exclude_session_id: Optional[str] = None,
+        time_decay_hours: float = 0,
+        min_score: float = 0.0,
+        top_k: Optional[int] = None,
+        now: Optional[float] = None,
+        exact: bool = False,
+        n_probe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every indexed conversation against a query embedding.
+
+        score = clamp(cosine, 0, 1) * exp(-age_hours / time_decay_hours)
+
+        Args:
+            query: Query embedding
+            agent: Only conversations of this agent
+            exclude_session_id: Skip conversations of this session
+            time_decay_hours: Time decay factor (0 = no decay)
+            min_score: Drop conversations scoring below this
+            top_k: Max results (None = all above min_score)
+            now: Reference epoch seconds for decay (default: current time)
+            exact: Score every row even if an ANN index is attached
+            n_probe: IVF lists to probe (default: the ANN index's n_probe)
+
+        Returns:
+            (conversation ids, scores), best first (ties: newest first)
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        with self._lock:
+            n = self._size
+            if n == 0 or self.dim is None:
+                return empty
+            query = np.asarray(query, dtype=np.float32).ravel()
+            if len(query) != self.dim:
+                logger.warning(f"Query embedding dim {len(query)} != index dim {self.dim}")
+                return empty
+            norm = float(np.linalg.norm(query))
+            if norm > 0:
+                query = query / norm
+
+            # Candidate rows: all, or the members of the nearest IVF lists
+            if not exact and self.ann is not None and self.ann.trained:
+                rows = self.ann.probe(query, n_probe)
+            else:
+                rows = slice(0, n)
+            ids = self.ids[rows].copy()
+            timestamps = self.timestamps[rows].copy()
+            mask = self.alive[rows].copy()
+            if agent is not None:
+                if agent not in self._codes:
+                    return empty
+                mask &= self.agents[rows] == self._codes[agent]
+            if exclude_session_id is not None and exclude_session_id in self._codes:
+                mask &= self.sessions[rows] != self._codes[exclude_session_id]
+
+            if norm == 0:
+                similarities = np.zeros(len(ids), dtype=np.float64)
+            else:
+                similarities = np.clip(self.vectors[rows] @ query, 0.0, 1.0).astype(np.float64)
+
+        if time_decay_hours and time_decay_hours > 0:
+            now = datetime.now(timezone.utc).timestamp() if now is None else now
+            age_hours = (now - timestamps) / 3600
+            scores = similarities * np.exp(-age_hours / float(time_decay_hours))
+        else:
+            scores = similarities
+
+        selected = np.flatnonzero(mask & (scores >= min_score))
+        if top_k is not None and len(selected) > top_k:
+            # Partial selection first; exact ordering only for the survivors
+            keep = np.argpartition(-scores[selected], top_k - 1)[:top_k] if top_k > 0 else []
+            selected = selected[keep]
+        order = np.lexsort((-timestamps[selected], -scores[selected]))
+        selected = selected[order]
+        return ids[selected], scores[selected]
+
+    def attach_ann(self, ann: IVFFlatIndex):
+        """
+        Train an IVF index on the current rows and use it for search.
+
+        Training runs outside the lock on a snapshot, so stores and queries
+        continue meanwhile; rows added during training are assigned before
+        the index is attached (replacing any previous one).
+
+        Args:
+            ann: Untrained IVFFlatIndex
+        """
+        with self._lock:
+            n = self._size
+            vectors = self.vectors  # Rows below n are not moved by _grow (it copies)
+            alive = self.alive[:n].copy()
+        ann.train(vectors[:n], alive)
+        with self._lock:
+            ann.deleted_baseline = self.deleted_rows
+            added = np.arange(n, self._size)
+            added = added[self.alive[n:self._size]]
+            ann.assign(added, self.vectors[added])
+            self.ann = ann
+
+    def load_ann(self, ann: IVFFlatIndex, path: Path):
+        """
+        Attach an IVF index saved by save_ann(); rows missing from the file are assigned.
+
+        Args:
+            ann: Untrained IVFFlatIndex (search parameters)
+            path: .npz file
+        """
+        with self._lock:
+            restored = ann.load(path, self._positions, self.dim)
+            live = np.flatnonzero(self.alive[:self._size])
+            missing = np.setdiff1d(live, restored)
+            ann.assign(missing, self.vectors[missing])
+            ann.deleted_baseline = self.deleted_rows
+            self.ann = ann
+
+    def save_ann(self, path: Path):
+        """Persist the attached IVF index (centroids and list assignments)."""
+        with self._lock:
+            if self.ann is not None:
+                self.ann.save(path, self.ids[:self._size])
+
+    def memory_bytes(self) -> int:
+        """Bytes allocated by the index arrays (a store's mapped vectors are shared, not counted)."""
+        arrays = [self.ids, self.timestamps, self.agents, self.sessions, self.alive]
+        if self.store is None:
+            arrays.append(self.vectors)
+        return sum(a.nbytes for a in arrays)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Benchmark: exact vector scan vs IVF-flat (recall@k and query latency per n_probe)."""
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.ann_index import IVFFlatIndex
+from core.vector_index import VectorIndex
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+
+def make_vectors(size: int, dim: int, clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    """Clustered synthetic embeddings (topics with noise), like real conversation embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 1.5 * rng.standard_normal((size, dim)).astype(np.float32)
+
+
+def load_vectors(db_path: Path) -> np.ndarray:
+    """Stored conversation embeddings of a memory database."""
+    from core.embedding_engine import EmbeddingEngine
+    from core.memory_backend import SQLiteBackend
+
+    backend = SQLiteBackend(db_path)
+    vectors = [
+        EmbeddingEngine.deserialize_embedding(row["embedding"])
+        for batch in backend.iter_vector_rows()
+        for row in batch
+        if row["embedding"] is not None
+    ]
+    return np.array(vectors, dtype=np.float32)
+
+
+def timed_search(index: VectorIndex, queries: np.ndarray, top_k: int, **kwargs):
+    """Top-k ids per query and per-query latencies (ms)."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(query, top_k=top_k, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(ids.tolist()))
+    return results, np.array(latencies)
+
+
+def main():
+    """CLI entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark exact vs IVF-flat memory retrieval")
+    parser.add_argument("--size", type=int, default=200_000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic embedding dimension")
+    parser.add_argument("--from-db", type=Path, help="Use the embeddings of a memory database instead")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top-k", type=int, default=10, help="k for recall@k")
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF clusters (default: sqrt(N))")
+    parser.add_argument("--n-probe", nargs="+", type=int, default=[1, 4, 8, 16, 32, 64],
+                        help="n_probe values to compare")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.from_db) if args.from_db else make_vectors(args.size, args.dim)
+    if len(vectors) == 0:
+        console.print("[red]No embeddings found.[/red]")
+        sys.exit(1)
+
+    timestamp = datetime.now(timezone.utc).isoformat()
+    index = VectorIndex(initial_capacity=len(vectors))
+    for i, vector in enumerate(vectors):
+        index.add(i + 1, vector, timestamp)
+
+    # Queries: stored vectors with noise (a prompt close to, not equal to, past conversations)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.5 * rng.standard_normal(vectors[picks].shape).astype(np.float32)
+
+    start = time.perf_counter()
+    index.attach_ann(IVFFlatIndex(n_lists=args.n_lists))
+    train_s = time.perf_counter() - start
+    stats = index.ann.stats()
+
+    exact, exact_ms = timed_search(index, queries, args.top_k, exact=True)
+
+    table = Table(title=(
+        f"{len(vectors):,} vectors x {vectors.shape[1]} dims, {stats['n_lists']} lists "
+        f"(trained in {train_s:.1f}s), {len(queries)} queries"
+    ))
+    for column in ("Search", f"Recall@{args.top_k}", "p50 ms", "p95 ms", "Speedup (p50)"):
+        table.add_column(column, justify="right")
+    exact_p50 = np.percentile(exact_ms, 50)
+    table.add_row("exact", "1.000", f"{exact_p50:.2f}", f"{np.percentile(exact_ms, 95):.2f}", "1.0x")
+
+    for n_probe in args.n_probe:
+        approx, approx_ms = timed_search(index, queries, args.top_k, n_probe=n_probe)
+        recall = np.mean([len(a & e) / max(1, len(e)) for a, e in zip(approx, exact)])
+        p50 = np.percentile(approx_ms, 50)
+        table.add_row(
+            f"ivf n_probe={n_probe}", f"{recall:.3f}", f"{p50:.2f}",
+            f"{np.percentile(approx_ms, 95):.2f}", f"{exact_p50 / p50:.1f}x",
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,13 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config.settings import get_env_source
 from core.agent_runtime import AgentRuntime
+from core.batch_runner import BatchRunner, load_batch_items
+from core.budget import ChainBudget
 from core.session_manager import get_session_manager
 from rich.console import Console
 from rich.syntax import Syntax
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
+from rich.table import Table
 import re
 
 console = Console()
@@ -102,6 +105,130 @@ def print_stage_result(result, stage_num: int, total_stages: int):
     console.print("─" * console.width)
 
 
+def print_estimate(estimate: dict):
+    """Print a chain dry-run estimate."""
+    def interval(summary, fmt):
+        return f"{fmt(summary['p50'])} ({fmt(summary['p5'])}–{fmt(summary['p95'])})"
+
+    def seconds(ms):
+        return f"{ms / 1000:.1f}s"
+
+    def cost(usd):
+        return f"${usd:.4f}"
+
+    table = Table(title="Chain estimate: median (90% interval)")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Calls")
+    table.add_column("Latency", justify="right")
+    table.add_column("Tokens", justify="right")
+    table.add_column("Cost", justify="right")
+    for stage in estimate["stages"]:
+        calls = ", ".join(stage["calls"]) + (" (parallel)" if stage["parallel"] else "")
+        if stage["includes_refinement"]:
+            calls += " + refinement"
+        table.add_row(stage["stage"], calls, interval(stage["latency_ms"], seconds),
+                      interval(stage["tokens"], lambda v: f"{v:.0f}"), interval(stage["cost_usd"], cost))
+    table.add_row("[bold]total[/bold]", "", interval(estimate["latency_ms"], seconds),
+                  interval(estimate["tokens"], lambda v: f"{v:.0f}"), interval(estimate["cost_usd"], cost))
+    console.print(table)
+
+    refinement = estimate["refinement"]
+    console.print(f"🔄 Refinement trigger rate {refinement['trigger_rate']:.0%}, "
+                  f"expected rounds {refinement['expected_rounds']} (max {refinement['max_iterations']})")
+    for agent, profile in estimate["agents"].items():
+        source = f"{profile['samples']} samples" if profile["source"] == "history" else "no history, defaults"
+        console.print(f"   {agent}: {profile['model']} ({source}, fallback {profile['fallback_rate']:.0%})")
+
+
+def parse_provider_limits(values) -> dict:
+    """Parse repeated PROVIDER=N options into a dict."""
+    limits = {}
+    for value in values or []:
+        provider, sep, limit = value.partition("=")
+        if not sep or not limit.isdigit():
+            raise ValueError(f"Invalid provider limit '{value}' (expected PROVIDER=N)")
+        limits[provider.strip().lower()] = int(limit)
+    return limits
+
+
+def run_batch_mode(args):
+    """Run chains for every prompt in a JSONL/CSV file (restartable)."""
+    batch_path = Path(args.batch)
+    if not batch_path.exists():
+        console.print(f"[bold red]❌ Error:[/bold red] Batch file not found: {batch_path}")
+        sys.exit(1)
+
+    output_path = Path(args.output) if args.output else batch_path.with_suffix(".results.jsonl")
+
+    try:
+        items = load_batch_items(batch_path)
+        provider_limits = parse_provider_limits(args.provider_limit)
+    except ValueError as e:
+        console.print(f"[bold red]❌ Error:[/bold red] {e}")
+        sys.exit(1)
+
+    valid_agents = ["builder", "critic", "closer"]
+    for item in items:
+        for stage in item.stages or []:
+            if stage not in valid_agents:
+                console.print(f"[bold red]Error:[/bold red] Invalid agent '{stage}' in batch item {item.id}")
+                sys.exit(1)
+
+    console.print(f"[bold]📦 Batch:[/bold] {len(items)} prompts from [cyan]{batch_path}[/cyan]")
+    console.print(f"[bold]💾 Output:[/bold] [dim]{output_path}[/dim]")
+    console.print(f"[bold]⚙️  Concurrency:[/bold] {args.concurrency}"
+                  + (f" | provider limits: {provider_limits}" if provider_limits else ""))
+    console.print()
+
+    # One runtime for the whole batch (config, connector and models loaded once)
+    runner = BatchRunner(
+        AgentRuntime(),
+        concurrency=args.concurrency,
+        provider_limits=provider_limits,
+        mock_mode=True if args.mock else None,
+    )
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total}"),
+        TextColumn("[green]{task.fields[rate]:.1f}/min[/green]"),
+        TextColumn("[yellow]{task.fields[tokens]:,} tok[/yellow]"),
+        TextColumn("[magenta]${task.fields[cost]:.4f}[/magenta]"),
+        TextColumn("[red]{task.fields[failed]} failed[/red]"),
+        TimeElapsedColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task("Running chains", total=len(items), rate=0.0, tokens=0, cost=0.0, failed=0)
+
+        def on_result(stats, record):
+            progress.update(
+                task,
+                completed=stats.skipped + stats.finished,
+                rate=stats.throughput_per_min,
+                tokens=stats.total_tokens,
+                cost=stats.total_cost_usd,
+                failed=stats.failed,
+            )
+
+        stats = runner.run(items, output_path, on_result=on_result)
+        progress.update(task, completed=stats.skipped + stats.finished)
+
+    console.print(f"\n[bold cyan]{'='*80}[/bold cyan]")
+    console.print("[bold white]BATCH SUMMARY[/bold white]")
+    console.print(f"[bold cyan]{'='*80}[/bold cyan]")
+    console.print(f"[bold green]✅ Completed:[/bold green] {stats.completed}")
+    console.print(f"[bold]⏭️  Skipped (already done):[/bold] {stats.skipped}")
+    console.print(f"[bold red]❌ Failed:[/bold red] {stats.failed}")
+    console.print(f"[bold]⏱️  Elapsed:[/bold] {stats.elapsed_seconds:.1f}s ({stats.throughput_per_min:.1f} chains/min)")
+    console.print(f"[bold]🔢 Tokens:[/bold] {stats.total_tokens:,} ({stats.tokens_per_sec:.0f} tok/s)")
+    console.print(f"[bold]💰 Estimated cost:[/bold] ${stats.total_cost_usd:.4f}")
+
+    if stats.failed:
+        sys.exit(1)
+
+
 def main():
     """Main CLI entry point."""
     # Parse arguments
@@ -113,6 +240,7 @@ Examples:
   mao-chain "Design a REST API"
   mao-chain "Review code" builder critic
   mao-chain "Analyze system" --save-to report.md
+  mao-chain --batch prompts.jsonl --output results.jsonl --concurrency 8 --provider-limit google=2
   mao-chain  (interactive mode)
         """
     )
@@ -120,6 +248,31 @@ Examples:
     parser.add_argument("stages", nargs="*", help="Custom stages (e.g., builder critic)")
     parser.add_argument("--save-to", "-o", metavar="FILE", help="Save output to file")
 
+    # Chain budget (optional work is scheduled to fit)
+    parser.add_argument("--max-tokens", type=int, help="Token budget for the chain")
+    parser.add_argument("--max-cost", type=float, metavar="USD", help="Cost budget for the chain (USD)")
+    parser.add_argument("--max-seconds", type=float, help="Wall-clock budget for the chain")
+    parser.add_argument("--trace", action="store_true",
+                        help="Record per-stage spans and write a Chrome trace JSON (open in ui.perfetto.dev)")
+    parser.add_argument("--speculative", type=int, metavar="N",
+                        help="Build N builder candidates in parallel and keep the one critics rate best (0 = off)")
+    parser.add_argument("--compression", choices=["llm", "extractive", "auto"],
+                        help="How long outputs are compressed between stages (default: agents.yaml)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Only estimate latency, tokens and cost from history (no LLM calls)")
+
+    # Batch mode (nightly evaluation runs)
+    parser.add_argument("--batch", metavar="FILE", help="Run chains for every prompt in a JSONL or CSV file")
+    parser.add_argument("--output", metavar="FILE", help="Batch results JSONL (default: <batch>.results.jsonl)")
+    parser.add_argument("--concurrency", "-j", type=int, default=4, help="Chains to run in parallel (default: 4)")
+    parser.add_argument(
+        "--provider-limit",
+        action="append",
+        metavar="PROVIDER=N",
+        help="Max concurrent LLM calls per provider (repeatable, e.g. google=2)",
+    )
+    parser.add_argument("--mock", action="store_true", help="Use mock LLM responses (no API calls)")
+
     # If no args, go interactive
     if len(sys.argv) == 1:
         console.print("\n[bold cyan]🔗 Multi-Agent Chain Runner[/bold cyan]")
@@ -135,11 +288,29 @@ Examples:
             sys.exit(0)
         stages = None
         save_to = None
+        budget = None
+        trace = None
+        speculative = None
+        compression_mode = None
+        estimate = False
     else:
         args = parser.parse_args()
+        if args.batch:
+            run_batch_mode(args)
+            return
+
         prompt = args.prompt
         stages = args.stages if args.stages else None
         save_to = args.save_to
+        trace = True if args.trace else None
+        speculative = args.speculative
+        compression_mode = args.compression
+        estimate = args.estimate
+        budget = ChainBudget.from_dict({
+            "max_tokens": args.max_tokens,
+            "max_cost_usd": args.max_cost,
+            "max_seconds": args.max_seconds,
+        })
 
         if not prompt:
             parser.print_help()
@@ -154,6 +325,10 @@ Examples:
                 console.print(f"Valid agents: {', '.join(valid_agents)}")
                 sys.exit(1)
 
+    if estimate:
+        print_estimate(AgentRuntime().estimate_chain(prompt, stages))
+        return
+
     # Show environment source
     env_source = get_env_source()
     if env_source == "environment":
@@ -187,7 +362,11 @@ Examples:
             prompt=prompt,
             stages=stages,
             progress_callback=show_progress,
-            session_id=session_id  # v0.11.0
+            session_id=session_id,  # v0.11.0
+            budget=budget,
+            trace=trace,
+            speculative=speculative,
+            compression_mode=compression_mode,
         )
     except Exception as e:
         console.print(f"\n[bold red]❌ Chain failed:[/bold red] {str(e)}")
@@ -211,6 +390,41 @@ Examples:
     console.print(f"[bold]⏱️  Total duration:[/bold] {total_duration:.0f}ms ({total_duration/1000:.1f}s)")
     console.print(f"[bold]🔢 Total tokens:[/bold] {total_tokens}")
 
+    budget_report = (results[-1].metadata or {}).get("budget_report") if results else None
+    if budget_report:
+        used = budget_report["used"]
+        console.print(
+            f"[bold]💰 Budget used:[/bold] {used['tokens']} tokens, ${used['cost_usd']:.4f}, {used['seconds']:.1f}s"
+            + (f" [red](exceeded: {', '.join(budget_report['exceeded'])})[/red]" if budget_report["exceeded"] else "")
+        )
+        for decision in budget_report["decisions"]:
+            console.print(f"   [dim]- {decision}[/dim]")
+
+    patched = [(r.metadata or {}).get("refinement") for r in results]
+    patched = [info for info in patched if info and info["mode"] == "patch"]
+    if patched:
+        saved = sum(info["saved_completion_tokens"] for info in patched)
+        console.print(f"[bold]🩹 Patch refinement:[/bold] {len(patched)} iteration(s), ~{saved} completion tokens saved")
+
+    speculative_info = next(((r.metadata or {}).get("speculative") for r in results
+                             if (r.metadata or {}).get("speculative")), None)
+    if speculative_info:
+        estimate = speculative_info["iterative_estimate"]
+        console.print(f"[bold]🎲 Speculative:[/bold] {len(speculative_info['candidates'])} candidates in "
+                      f"{speculative_info['wall_clock_ms']:.0f}ms, {speculative_info['total_tokens']} tokens "
+                      f"(iterative estimate: {estimate['wall_clock_ms']:.0f}ms, {estimate['total_tokens']} tokens)")
+        for candidate in speculative_info["candidates"]:
+            marker = "🏆" if candidate["chosen"] else "  "
+            issues = "error" if candidate["issues"] is None else f"{candidate['issues']} critical"
+            console.print(f"   {marker} {candidate['model']} @ {candidate['temperature']}: {issues}")
+
+    trace_summary = (results[-1].metadata or {}).get("trace") if results else None
+    if trace_summary:
+        console.print(f"[bold]🧭 Trace:[/bold] {trace_summary['duration_ms']:.0f}ms, {trace_summary['spans']} spans"
+                      + (f" → {trace_summary['file']}" if trace_summary["file"] else ""))
+        for name, entry in list(trace_summary["by_name"].items())[:8]:
+            console.print(f"   [dim]- {name}: {entry['total_ms']:.0f}ms ({entry['count']}x)[/dim]")
+
     if errors:
         console.print(f"\n[bold red]❌ Errors:[/bold red] {len(errors)}")
         for err_result in errors:
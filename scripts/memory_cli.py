@@ -43,6 +43,10 @@ def format_conversation(conv: dict, show_full: bool = False) -> str:
         f"Response: {response}",
     ]
 
+    # Full-text search results: BM25 score and the best matching fragment
+    if conv.get("snippet"):
+        lines.insert(3, f"Score: {conv.get('score', 0):.3f} | Match: {conv['snippet']}")
+
     return "\n".join(lines)
 
 
@@ -134,6 +138,34 @@ def cmd_cleanup(args):
         print("Cancelled.")
 
 
+def cmd_rebuild_vectors(args):
+    """Rebuild the shared embedding store from the database."""
+    memory = MemoryEngine()
+
+    print("Rebuilding embedding store from the database...")
+    rows = memory.rebuild_embedding_store(batch_size=args.batch_size)
+    path = Path(memory.backend.db_path).with_suffix(".vec")
+    print(f"✓ {rows} embeddings written to {path}")
+
+
+def cmd_index_keywords(args):
+    """Add conversations stored without keywords to the inverted keyword index."""
+    memory = MemoryEngine()
+
+    print("Indexing keywords of conversations stored without them...")
+    rows = memory.index_missing_keywords(batch_size=args.batch_size)
+    print(f"✓ {rows} conversations indexed")
+
+
+def cmd_backfill_tokens(args):
+    """Store context token counts for conversations saved without them."""
+    memory = MemoryEngine()
+
+    print("Counting context tokens of conversations stored without them...")
+    rows = memory.backfill_token_counts(batch_size=args.batch_size)
+    print(f"✓ {rows} conversations updated")
+
+
 def cmd_export(args):
     """Export conversations."""
     memory = MemoryEngine()
@@ -171,7 +203,9 @@ def main():
 
     # Search command
     search_parser = subparsers.add_parser("search", help="Search conversations")
-    search_parser.add_argument("query", help="Search query")
+    search_parser.add_argument(
+        "query", help='Search query ("exact phrase", prefix*, words must all match)'
+    )
     search_parser.add_argument("--agent", help="Filter by agent")
     search_parser.add_argument("--model", help="Filter by model")
     search_parser.add_argument("--limit", type=int, default=10, help="Max results")
@@ -202,6 +236,30 @@ def main():
         "-y", "--confirm", action="store_true", help="Skip confirmation"
     )
 
+    # Rebuild-vectors command
+    rebuild_parser = subparsers.add_parser(
+        "rebuild-vectors", help="Rebuild the shared embedding store from the database"
+    )
+    rebuild_parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Conversations per batch"
+    )
+
+    # Index-keywords command
+    keywords_parser = subparsers.add_parser(
+        "index-keywords", help="Index keywords of conversations stored without them"
+    )
+    keywords_parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Conversations per transaction"
+    )
+
+    # Backfill-tokens command
+    tokens_parser = subparsers.add_parser(
+        "backfill-tokens", help="Store context token counts for conversations saved without them"
+    )
+    tokens_parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Conversations per transaction"
+    )
+
     # Export command
     export_parser = subparsers.add_parser("export", help="Export conversations")
     export_parser.add_argument("--from-date", help="From date (ISO format)")
@@ -224,6 +282,9 @@ def main():
         "delete": cmd_delete,
         "cleanup": cmd_cleanup,
         "export": cmd_export,
+        "rebuild-vectors": cmd_rebuild_vectors,
+        "index-keywords": cmd_index_keywords,
+        "backfill-tokens": cmd_backfill_tokens,
     }
 
     try:
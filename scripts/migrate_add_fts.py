@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Migration script: Add full-text search index (v1.1.0)
+
+This script adds the FTS5 index used by memory search (BM25 ranking,
+highlighted snippets, prefix and phrase queries).
+
+Changes:
+1. Creates the conversations_fts virtual table (external content over conversations)
+2. Creates triggers that keep it in sync on insert/update/delete
+3. Backfills it from existing conversations and merges index segments
+
+The backend creates the index and triggers on first start, but only
+backfills it for an empty database; until this script has run, memory
+search on an existing database falls back to LIKE.
+
+Safe to run multiple times (idempotent; the index is rebuilt each run).
+"""
+
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import load_memory_config
+from core.memory_backend import ensure_fts
+
+
+def migrate():
+    """Run migration to add the full-text search index."""
+    config = load_memory_config()
+    db_path = Path(__file__).parent.parent / config["memory"]["db_path"]
+
+    if not db_path.exists():
+        print(f"❌ Database not found: {db_path}")
+        print("   Run the system first to create the database, then run this migration.")
+        sys.exit(1)
+
+    # Backup first
+    backup_path = db_path.with_suffix(f'.db.backup.{datetime.now().strftime("%Y%m%d_%H%M%S")}')
+    shutil.copy2(db_path, backup_path)
+    print(f"📦 Backup created: {backup_path}")
+
+    conn = sqlite3.connect(str(db_path))
+
+    try:
+        conv_count = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        print(f"🔄 Indexing {conv_count} conversations...")
+
+        start = time.perf_counter()
+        if not ensure_fts(conn, rebuild=True):
+            print("❌ This SQLite build has no FTS5 support; memory search keeps using LIKE.")
+            sys.exit(1)
+        # Merge index segments into one b-tree for faster queries
+        conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('optimize')")
+        conn.commit()
+        print(f"✓ conversations_fts built in {time.perf_counter() - start:.1f}s")
+
+        triggers = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'conversations_fts_%' ORDER BY name"
+        ).fetchall()
+        print(f"✓ sync triggers: {', '.join(t[0] for t in triggers)}")
+
+        print()
+        print("✅ Migration complete!")
+        print()
+        print(f"Backup available at: {backup_path}")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        print(f"📦 Restore from backup: {backup_path}")
+        sys.exit(1)
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Full-Text Search Migration (v1.1.0)")
+    print("=" * 60)
+    print()
+
+    migrate()
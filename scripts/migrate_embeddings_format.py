@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Migration script: Convert pickled embeddings to the raw format (v1.1.0)
+
+Embeddings used to be stored as pickled numpy arrays. They are now stored
+as an 8-byte header (magic, version, dtype, dimension) followed by raw
+little-endian float32/float16 values (see core/embedding_engine.py).
+
+Changes:
+1. Streams conversations in id order, one transaction per batch
+2. Rewrites every embedding not already in the target format
+   (legacy pickles, or raw BLOBs of the other dtype)
+
+The memory engine reads both formats, so the system can keep running
+while this converts a large database. Interrupted runs resume where they
+stopped (converted rows are skipped). Safe to run multiple times.
+
+Usage:
+    python scripts/migrate_embeddings_format.py [--dtype float16] [--batch-size 1000] [--no-backup] [--vacuum]
+"""
+
+import argparse
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import load_memory_config
+from core.embedding_engine import EMBEDDING_DTYPE_CODES, EmbeddingEngine, is_legacy_embedding
+
+
+def needs_conversion(blob: bytes, dtype_code: int) -> bool:
+    """True if a BLOB is a legacy pickle or a raw BLOB of another dtype."""
+    return is_legacy_embedding(blob) or blob[4] != dtype_code
+
+
+def migrate(dtype: str, batch_size: int, backup: bool, vacuum: bool):
+    """Run migration to convert embeddings to the raw format."""
+    config = load_memory_config()
+    db_path = Path(__file__).parent.parent / config["memory"]["db_path"]
+
+    if not db_path.exists():
+        print(f"❌ Database not found: {db_path}")
+        print("   Run the system first to create the database, then run this migration.")
+        sys.exit(1)
+
+    backup_path = None
+    if backup:
+        backup_path = db_path.with_suffix(f'.db.backup.{datetime.now().strftime("%Y%m%d_%H%M%S")}')
+        shutil.copy2(db_path, backup_path)
+        print(f"📦 Backup created: {backup_path}")
+
+    # Other processes may keep writing: wait on their locks, commit per batch
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    dtype_code = EMBEDDING_DTYPE_CODES[dtype]
+
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM conversations WHERE embedding IS NOT NULL").fetchone()[0]
+        print(f"🔄 Converting {total} embeddings to raw {dtype} (batches of {batch_size})...")
+
+        start = time.perf_counter()
+        last_id, scanned, converted, failed = 0, 0, 0, 0
+        bytes_before, bytes_after = 0, 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, embedding FROM conversations WHERE id > ? AND embedding IS NOT NULL ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            updates = []
+            for conversation_id, blob in rows:
+                if not needs_conversion(blob, dtype_code):
+                    continue
+                try:
+                    embedding = EmbeddingEngine.deserialize_embedding(blob)
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️  Skipping conversation {conversation_id}: {e}")
+                    continue
+                new_blob = EmbeddingEngine.serialize_embedding(embedding, dtype)
+                bytes_before += len(blob)
+                bytes_after += len(new_blob)
+                updates.append((new_blob, conversation_id))
+
+            if updates:
+                with conn:
+                    conn.executemany("UPDATE conversations SET embedding = ? WHERE id = ?", updates)
+                converted += len(updates)
+            print(f"   {scanned}/{total} scanned, {converted} converted", end="\r")
+
+        print()
+        print(f"✓ {converted} embeddings converted in {time.perf_counter() - start:.1f}s"
+              f" ({scanned - converted - failed} already raw {dtype}, {failed} unreadable)")
+        if converted:
+            print(f"✓ Embedding bytes: {bytes_before:,} → {bytes_after:,}")
+
+        if vacuum:
+            print("🔄 VACUUM (reclaiming freed pages)...")
+            conn.execute("VACUUM")
+
+        print()
+        print("✅ Migration complete!")
+        if backup_path:
+            print()
+            print(f"Backup available at: {backup_path}")
+
+    except Exception as e:
+        conn.rollback()
+        print()
+        print(f"❌ Migration failed: {e}")
+        print("   Converted batches are committed; run again to resume.")
+        if backup_path:
+            print(f"📦 Restore from backup: {backup_path}")
+        sys.exit(1)
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled embeddings to the raw float32/float16 format")
+    parser.add_argument("--dtype", choices=sorted(EMBEDDING_DTYPE_CODES), default=None,
+                        help="Storage precision (default: memory.embedding_dtype)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction")
+    parser.add_argument("--no-backup", action="store_true", help="Skip the database backup copy")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Embedding Format Migration (v1.1.0)")
+    print("=" * 60)
+    print()
+
+    dtype = args.dtype or load_memory_config()["memory"].get("embedding_dtype", "float32")
+    migrate(dtype, args.batch_size, backup=not args.no_backup, vacuum=args.vacuum)
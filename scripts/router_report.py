@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Offline accuracy vs latency report for the local embedding router."""
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import BASE_DIR, load_agents_config
+from core.local_router import LocalRouter, load_or_train_local_router, load_router_examples
+from core.memory_engine import MemoryEngine
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+
+def split_examples(examples, holdout: float, seed: int):
+    """Stratified train/test split (keeps every label in both halves)."""
+    rng = random.Random(seed)
+    train, test = [], []
+    by_label = {}
+    for prompt, label in examples:
+        by_label.setdefault(label, []).append((prompt, label))
+    for items in by_label.values():
+        rng.shuffle(items)
+        n_test = max(1, int(len(items) * holdout)) if len(items) > 1 else 0
+        test.extend(items[:n_test])
+        train.extend(items[n_test:])
+    return train, test
+
+
+def evaluate_llm_router(examples):
+    """Accuracy and latency of the LLM router on the same held-out prompts."""
+    from core.agent_runtime import AgentRuntime
+
+    runtime = AgentRuntime()
+    correct = 0
+    latencies = []
+    for prompt, expected in examples:
+        start = time.perf_counter()
+        agent = runtime._route_llm(prompt) or "builder"
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += agent == expected
+    latencies.sort()
+    return {
+        "accuracy": round(correct / len(examples), 4) if examples else 0.0,
+        "latency_ms": {
+            "p50": round(latencies[len(latencies) // 2], 1) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        },
+    }
+
+
+def main():
+    """CLI entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Evaluate the local router (accuracy vs latency) and retrain its persisted model",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python scripts/router_report.py                       # Held-out report on labelled examples
+  python scripts/router_report.py --method knn --k 3    # Try k-NN instead of centroids
+  python scripts/router_report.py --llm                 # Compare with the LLM router (makes API calls)
+  python scripts/router_report.py --retrain             # Retrain on all data and save the model
+        """,
+    )
+    parser.add_argument("--examples", help="Labelled examples YAML (default: routing.local.examples_path)")
+    parser.add_argument("--holdout", type=float, default=0.3, help="Fraction of examples held out for testing")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the split")
+    parser.add_argument("--method", choices=["centroid", "knn"], help="Override routing.local.method")
+    parser.add_argument("--k", type=int, help="Override routing.local.k")
+    parser.add_argument("--history", action="store_true", help="Add past LLM-routed conversations to the training split")
+    parser.add_argument("--llm", action="store_true", help="Also measure the LLM router on the held-out prompts")
+    parser.add_argument("--retrain", action="store_true", help="Retrain on all examples (+ history) and save the model")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    args = parser.parse_args()
+
+    local_config = dict(load_agents_config().get("routing", {}).get("local", {}))
+    if args.method:
+        local_config["method"] = args.method
+    if args.k:
+        local_config["k"] = args.k
+
+    examples_path = Path(args.examples) if args.examples else BASE_DIR / local_config.get(
+        "examples_path", "config/router_examples.yaml"
+    )
+    examples = load_router_examples(examples_path)
+    if not examples:
+        console.print(f"[red]No labelled examples in {examples_path}[/red]")
+        sys.exit(1)
+
+    if args.retrain:
+        model_path = BASE_DIR / local_config.get("model_path", "data/MEMORY/router_model.npz")
+        model_path.unlink(missing_ok=True)
+        local_config["examples_path"] = str(examples_path)
+        router = load_or_train_local_router(local_config, memory=MemoryEngine())
+        console.print(f"[green]✓ Router retrained on {len(router.labels)} examples → {model_path}[/green]")
+        return
+
+    train, test = split_examples(examples, args.holdout, args.seed)
+    router = LocalRouter(
+        method=local_config.get("method", "centroid"),
+        k=local_config.get("k", 5),
+        temperature=local_config.get("temperature", 0.05),
+    )
+
+    start = time.perf_counter()
+    if args.history:
+        n_train = router.train_from_memory(MemoryEngine(), train, limit=local_config.get("history_limit", 2000))
+    else:
+        n_train = router.train(train)
+    train_seconds = time.perf_counter() - start
+
+    configured_threshold = local_config.get("confidence_threshold", 0.6)
+    report = router.evaluate(test, thresholds=sorted({0.0, 0.5, 0.6, 0.7, 0.8, 0.9, configured_threshold}))
+    report["train_examples"] = n_train
+    report["train_seconds"] = round(train_seconds, 2)
+    report["configured_threshold"] = configured_threshold
+    if args.llm:
+        report["llm_router"] = evaluate_llm_router(test)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    console.print(f"\n[bold]Local router ({report['method']})[/bold] — "
+                  f"trained on {n_train}, tested on {report['examples']} held-out prompts")
+    console.print(f"Accuracy: [cyan]{report['accuracy']:.1%}[/cyan]  "
+                  f"Latency p50/p95: [cyan]{report['latency_ms']['p50']:.1f}/{report['latency_ms']['p95']:.1f} ms[/cyan]")
+
+    table = Table(title="Confidence threshold trade-off")
+    table.add_column("Threshold", justify="right")
+    table.add_column("Local coverage", justify="right")
+    table.add_column("Local accuracy", justify="right")
+    table.add_column("LLM fallbacks", justify="right")
+    for row in report["thresholds"]:
+        marker = " ◀" if row["threshold"] == report["configured_threshold"] else ""
+        accuracy = "-" if row["accuracy"] is None else f"{row['accuracy']:.1%}"
+        table.add_row(
+            f"{row['threshold']:.2f}{marker}",
+            f"{row['coverage']:.1%}",
+            accuracy,
+            f"{1 - row['coverage']:.1%}",
+        )
+    console.print(table)
+
+    if "llm_router" in report:
+        llm = report["llm_router"]
+        console.print(f"LLM router: accuracy [cyan]{llm['accuracy']:.1%}[/cyan], "
+                      f"latency p50 [cyan]{llm['latency_ms']['p50']:.0f} ms[/cyan]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Wall-clock and token cost: speculative builder candidates vs iterative refinement."""
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.agent_runtime import AgentRuntime
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+DEFAULT_PROMPTS = [
+    "Design a REST API for a todo app with authentication",
+    "Implement a rate limiter for a FastAPI service",
+    "Write a migration that adds soft deletes to the users table",
+]
+
+
+def run_mode(runtime: AgentRuntime, prompt: str, speculative: int, stages, mock: bool):
+    """Run one chain and summarize its cost."""
+    start = time.perf_counter()
+    results = runtime.chain(prompt, stages=stages, mock_mode=mock or None, speculative=speculative)
+    wall_clock_ms = (time.perf_counter() - start) * 1000
+
+    tokens = sum(r.total_tokens for r in results)
+    winner_index = next((i for i, r in enumerate(results) if (r.metadata or {}).get("speculative")), None)
+    if winner_index is not None:
+        # Results hold the winner and its review; the report covers every candidate
+        tokens += results[winner_index].metadata["speculative"]["total_tokens"]
+        tokens -= sum(r.total_tokens for r in results[winner_index:winner_index + 2])
+
+    critiques = [r for r in results if r.agent in ("critic", "multi-critic")]
+    return {
+        "wall_clock_ms": wall_clock_ms,
+        "tokens": tokens,
+        "rounds": sum(1 for r in results if r.agent == "builder"),
+        "final_issues": runtime._count_critical_issues(critiques[-1].response) if critiques else 0,
+        "errors": sum(1 for r in results if r.error),
+    }
+
+
+def main():
+    """CLI entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare speculative candidates with iterative refinement")
+    parser.add_argument("prompts", nargs="*", help="Prompts to run (default: built-in samples)")
+    parser.add_argument("--candidates", type=int, default=3, help="Speculative candidates (default: 3)")
+    parser.add_argument("--stages", nargs="+", default=["builder", "critic"], help="Chain stages")
+    parser.add_argument("--mock", action="store_true", help="Use mock LLM responses (no API calls)")
+    args = parser.parse_args()
+
+    runtime = AgentRuntime()
+    runtime.config["coalescing"] = {"enabled": False}  # Both modes must really execute
+    runtime.config["multi_critic"]["enabled"] = False  # Same critic in both modes
+
+    table = Table(title=f"Iterative vs speculative ({args.candidates} candidates)")
+    table.add_column("Prompt", max_width=40)
+    table.add_column("Mode")
+    table.add_column("Wall clock", justify="right")
+    table.add_column("Tokens", justify="right")
+    table.add_column("Builder rounds", justify="right")
+    table.add_column("Final critical lines", justify="right")
+
+    totals = {"iterative": [0.0, 0], "speculative": [0.0, 0]}
+    for prompt in args.prompts or DEFAULT_PROMPTS:
+        for mode, candidates in (("iterative", 0), ("speculative", args.candidates)):
+            row = run_mode(runtime, prompt, candidates, args.stages, args.mock)
+            totals[mode][0] += row["wall_clock_ms"]
+            totals[mode][1] += row["tokens"]
+            table.add_row(
+                prompt if mode == "iterative" else "",
+                mode,
+                f"{row['wall_clock_ms']:.0f}ms",
+                str(row["tokens"]),
+                str(row["rounds"]),
+                str(row["final_issues"]) + (f" ({row['errors']} errors)" if row["errors"] else ""),
+            )
+
+    console.print(table)
+    (it_ms, it_tokens), (sp_ms, sp_tokens) = totals["iterative"], totals["speculative"]
+    if it_ms and it_tokens:
+        console.print(f"Speculative wall clock: {sp_ms / it_ms:.2f}x iterative, tokens: {sp_tokens / it_tokens:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
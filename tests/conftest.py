@@ -0,0 +1,6 @@
+"""Shared pytest configuration."""
+
+import os
+
+# Tests read logs and memory rows right after run(): keep persistence synchronous
+os.environ.setdefault("PERSISTENCE_SYNC", "1")
@@ -0,0 +1,91 @@
+"""Test the IVF-flat approximate index and its VectorIndex integration."""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from core.ann_index import IVFFlatIndex, default_n_lists
+from core.vector_index import VectorIndex
+
+TIMESTAMP = "2026-01-10T00:00:00+00:00"
+
+
+def clustered(size=4000, dim=32, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    return centers[rng.integers(0, clusters, size)] + 0.3 * rng.standard_normal((size, dim))
+
+
+def build_index(vectors, **ann_kwargs):
+    index = VectorIndex()
+    for i, vector in enumerate(vectors):
+        index.add(i + 1, vector, TIMESTAMP)
+    index.attach_ann(IVFFlatIndex(**ann_kwargs))
+    return index
+
+
+def test_ivf_recall_matches_exact_search():
+    """Test top-k recall against the exact scan, and that probing prunes rows."""
+    vectors = clustered()
+    index = build_index(vectors, n_probe=4)
+    assert index.ann.n_lists == default_n_lists(len(vectors))
+
+    rng = np.random.default_rng(1)
+    recalls = []
+    for query in vectors[rng.choice(len(vectors), 50, replace=False)]:
+        exact, _ = index.search(query, top_k=10, exact=True)
+        approx, scores = index.search(query, top_k=10)
+        recalls.append(len(set(exact.tolist()) & set(approx.tolist())) / 10)
+        assert list(scores) == sorted(scores, reverse=True)
+        assert len(index.ann.probe(query / np.linalg.norm(query))) < len(vectors)
+    assert np.mean(recalls) >= 0.9
+
+
+def test_inserts_after_training_are_searchable_and_deletes_skipped():
+    """Test incremental assignment on add and tombstones at query time."""
+    vectors = clustered(size=1000)
+    index = build_index(vectors, n_probe=2)
+
+    new = vectors[0] * 2
+    index.add(5000, new, TIMESTAMP)
+    assert 5000 in index.search(new, top_k=3)[0].tolist()
+
+    index.remove(5000)
+    assert 5000 not in index.search(new, top_k=3)[0].tolist()
+
+
+def test_needs_rebuild_thresholds():
+    """Test growth and delete fractions since training trigger a rebuild."""
+    ann = IVFFlatIndex(rebuild_growth=2.0, rebuild_deleted_fraction=0.2)
+    assert ann.needs_rebuild(100, 0)  # Untrained
+
+    vectors = clustered(size=500)
+    ann.train(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), np.ones(500, dtype=bool))
+    ann.deleted_baseline = 10
+    assert not ann.needs_rebuild(999, 10)
+    assert ann.needs_rebuild(1001, 10)
+    assert not ann.needs_rebuild(500, 110)  # 100 deleted since training = 16.7%
+    assert ann.needs_rebuild(500, 150)
+
+
+def test_save_and_load_round_trip():
+    """Test saved assignments are restored by conversation id and new rows assigned."""
+    vectors = clustered(size=1000)
+    index = build_index(vectors)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "conversations.ivf.npz"
+        index.save_ann(path)
+
+        reloaded = VectorIndex()
+        for i, vector in enumerate(vectors):
+            reloaded.add(i + 1, vector, TIMESTAMP)
+        reloaded.add(5000, vectors[3], TIMESTAMP)  # Not in the saved file
+        reloaded.load_ann(IVFFlatIndex(), path)
+
+    np.testing.assert_allclose(reloaded.ann.centroids, index.ann.centroids)
+    assert reloaded.ann.stats()["assigned"] == 1001
+    for query in vectors[:20]:
+        restored = [i for i in reloaded.search(query, top_k=6)[0].tolist() if i != 5000][:5]
+        assert index.search(query, top_k=5)[0].tolist() == restored
+    assert 5000 in reloaded.search(vectors[3], top_k=2)[0].tolist()
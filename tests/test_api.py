@@ -105,3 +105,14 @@ def test_logs_endpoint():
     response = client.get("/logs?limit=10")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+
+def test_router_stats_endpoint():
+    """Test router stats expose decision counts and cache stats."""
+    response = client.get("/router/stats")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert "decisions" in data
+    assert "total" in data
+    assert "cache" in data
@@ -0,0 +1,160 @@
+"""Test batch chain runner."""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.agent_runtime import AgentRuntime, RunResult
+from core.batch_runner import BatchRunner, load_batch_items, load_completed_ids
+from core.llm_connector import LLMConnector
+
+
+def _result(agent, tokens=15, error=None):
+    return RunResult(
+        agent=agent,
+        model="openai/gpt-4o-mini",
+        provider="openai",
+        prompt="test",
+        response=f"{agent} response",
+        duration_ms=100.0,
+        prompt_tokens=10,
+        completion_tokens=tokens - 10,
+        total_tokens=tokens,
+        timestamp="2024-01-01T00:00:00",
+        log_file="test.json",
+        error=error,
+    )
+
+
+def test_load_batch_items_jsonl_and_csv(tmp_path):
+    """Test JSONL and CSV inputs produce items with stable ids."""
+    jsonl = tmp_path / "prompts.jsonl"
+    jsonl.write_text(
+        json.dumps({"id": "a", "prompt": "Design API", "stages": ["builder", "critic"]})
+        + "\n\n"
+        + json.dumps({"prompt": "Review code"})
+        + "\n",
+        encoding="utf-8",
+    )
+    items = load_batch_items(jsonl)
+    assert [i.id for i in items][0] == "a"
+    assert items[0].stages == ["builder", "critic"]
+    assert items[1].stages is None
+    assert len(items[1].id) == 16
+
+    csv_file = tmp_path / "prompts.csv"
+    csv_file.write_text("id,prompt,stages\nx,Design API,builder critic\n", encoding="utf-8")
+    items = load_batch_items(csv_file)
+    assert items[0].id == "x"
+    assert items[0].stages == ["builder", "critic"]
+
+
+def test_load_batch_items_ids_for_repeated_prompts(tmp_path):
+    """Test repeated prompts without an id get distinct stable ids; duplicate explicit ids raise."""
+    jsonl = tmp_path / "prompts.jsonl"
+    jsonl.write_text("\n".join(json.dumps({"prompt": "Design API"}) for _ in range(3)), encoding="utf-8")
+    ids = [i.id for i in load_batch_items(jsonl)]
+    assert ids[1:] == [f"{ids[0]}-2", f"{ids[0]}-3"]
+    assert [i.id for i in load_batch_items(jsonl)] == ids
+
+    jsonl.write_text("\n".join(json.dumps({"id": "a", "prompt": p}) for p in ("x", "y")), encoding="utf-8")
+    with pytest.raises(ValueError, match="Duplicate batch id: a"):
+        load_batch_items(jsonl)
+
+
+def test_batch_run_streams_and_resumes(tmp_path):
+    """Test results are written per chain and completed ids are skipped on restart."""
+    items_file = tmp_path / "prompts.jsonl"
+    items_file.write_text(
+        "\n".join(json.dumps({"id": f"p{i}", "prompt": f"prompt {i}"}) for i in range(5)),
+        encoding="utf-8",
+    )
+    output = tmp_path / "out.jsonl"
+
+    runtime = MagicMock()
+    runtime.chain.side_effect = lambda prompt, stages=None, mock_mode=None, coalesce=None: [
+        _result("builder", 15),
+        _result("critic", 20, error="boom" if prompt == "prompt 1" else None),  # Consensus still ran
+        _result("multi-critic", 20, error="boom" if prompt == "prompt 3" else None),
+    ]
+
+    runner = BatchRunner(runtime, concurrency=3)
+    stats = runner.run(load_batch_items(items_file), output)
+
+    assert stats.completed == 4
+    assert stats.failed == 1
+    assert stats.total_tokens == 35 * 5  # multi-critic consensus not double counted
+    assert len(output.read_text(encoding="utf-8").splitlines()) == 5
+    assert load_completed_ids(output) == {"p0", "p1", "p2", "p4"}
+
+    # Restart: only the failed prompt runs again
+    runtime.chain.reset_mock()
+    stats = runner.run(load_batch_items(items_file), output)
+    assert stats.skipped == 4
+    assert runtime.chain.call_count == 1
+
+
+def test_batch_runs_duplicate_prompts(tmp_path):
+    """Test duplicate prompts each execute, even with chain coalescing enabled."""
+    items_file = tmp_path / "prompts.jsonl"
+    items_file.write_text(
+        "\n".join(json.dumps({"id": f"p{i}", "prompt": "Design API", "stages": ["builder"]}) for i in range(3)),
+        encoding="utf-8",
+    )
+    runtime = AgentRuntime()
+    runtime.config["coalescing"] = {"enabled": True, "result_ttl_seconds": 30}
+    calls = []
+
+    def mock_run(agent, prompt, **kwargs):
+        calls.append(prompt)
+        time.sleep(0.02)
+        return _result(agent)
+
+    with patch.object(runtime, "run", side_effect=mock_run):
+        stats = BatchRunner(runtime, concurrency=3).run(load_batch_items(items_file), tmp_path / "out.jsonl")
+
+    assert stats.completed == 3
+    assert len(calls) == 3
+    assert runtime.chain_coalescer.stats()["executions"] == 0
+
+
+def test_provider_limit_caps_concurrency():
+    """Test per-provider semaphores cap concurrent litellm calls."""
+    connector = LLMConnector(retry_count=0)
+    connector.set_provider_limits({"openai": 2})
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_completion(**kwargs):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = "ok"
+        response.usage.prompt_tokens = 1
+        response.usage.completion_tokens = 1
+        response.usage.total_tokens = 2
+        return response
+
+    with patch("core.llm_connector.is_provider_enabled", return_value=True):
+        with patch("core.llm_connector.litellm.completion", side_effect=slow_completion):
+            threads = [
+                threading.Thread(target=connector.call, args=("openai/gpt-4o-mini", "s", "u"))
+                for _ in range(6)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+    assert peak == 2
@@ -0,0 +1,143 @@
+"""Test chain budget scheduling."""
+
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from core.agent_runtime import AgentRuntime, RunResult
+from config.settings import estimate_cost
+from core.budget import BudgetScheduler, ChainBudget
+from core.memory_backend import SQLiteBackend
+
+
+def _result(agent, tokens=1000, model="openai/gpt-4o-mini", response=None):
+    return RunResult(
+        agent=agent,
+        model=model,
+        provider="openai",
+        prompt="test",
+        response=response or f"{agent} response",
+        duration_ms=100.0,
+        prompt_tokens=tokens // 2,
+        completion_tokens=tokens // 2,
+        total_tokens=tokens,
+        timestamp="2024-01-01T00:00:00",
+        log_file="test.json",
+    )
+
+
+def _stats(tokens):
+    return {
+        "avg_prompt_tokens": tokens / 2,
+        "avg_completion_tokens": tokens / 2,
+        "avg_total_tokens": tokens,
+        "avg_cost_usd": 0.001,
+        "avg_duration_ms": 1000.0,
+        "samples": 10,
+    }
+
+
+def test_budget_from_dict():
+    """Test empty budgets are treated as unlimited."""
+    assert ChainBudget.from_dict(None) is None
+    assert ChainBudget.from_dict({"max_tokens": None}) is None
+    assert ChainBudget.from_dict({"max_tokens": 100}).max_tokens == 100
+
+
+def test_plan_critics_keeps_highest_weight_within_budget():
+    """Test critics are trimmed by weight when the budget is tight."""
+    runtime = AgentRuntime()
+    stats = {c: _stats(3000) for c in ["security-critic", "performance-critic", "code-quality-critic", "closer"]}
+    scheduler = BudgetScheduler(ChainBudget(max_tokens=10000), stats, runtime.config)
+    scheduler.begin_stage(["builder", "critic", "closer"], 1)
+
+    selected = scheduler.plan_critics(["code-quality-critic", "performance-critic", "security-critic"])
+
+    # 3000 reserved for closer -> room for two 3000-token critics
+    assert selected == ["performance-critic", "security-critic"]
+    assert "critics trimmed" in scheduler.decisions[0]
+
+
+def test_refinement_and_compression_gates():
+    """Test refinement/compression are refused once the budget is used up."""
+    runtime = AgentRuntime()
+    stats = {"builder": _stats(2000), "critic": _stats(1000)}
+    scheduler = BudgetScheduler(ChainBudget(max_tokens=5000), stats, runtime.config)
+
+    assert scheduler.allow_refinement(1) is True
+    scheduler.record("builder", [_result("builder", 4000)])
+    assert scheduler.allow_refinement(1) is False
+    assert scheduler.allow_compression() is False
+
+    report = scheduler.report()
+    assert report["used"]["tokens"] == 4000
+    assert report["stages"][0]["remaining_tokens"] == 1000
+
+
+def test_chain_reports_budget_per_stage():
+    """Test chain attaches per-stage budget entries and a final report."""
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["enabled"] = False
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None):
+        if agent == "critic":
+            return _result(agent, 500, response="CRITICAL: missing validation")
+        return _result(agent, 1000)
+
+    try:
+        with patch.object(runtime, "run", side_effect=mock_run), \
+                patch.object(runtime.memory, "get_agent_averages", return_value={
+                    "builder": _stats(1000), "critic": _stats(500), "closer": _stats(1000)}):
+            results = runtime.chain(
+                "test prompt",
+                stages=["builder", "critic", "closer"],
+                budget=ChainBudget(max_tokens=3000),
+            )
+    finally:
+        runtime.config["multi_critic"]["enabled"] = True
+
+    # Refinement would need 1500 more tokens + 1000 reserved for closer: skipped
+    assert [r.agent for r in results] == ["builder", "critic", "closer"]
+    assert results[0].metadata["budget"]["tokens"] == 1000
+    report = results[-1].metadata["budget_report"]
+    assert report["used"]["tokens"] == 2500
+    assert any("refinement" in d for d in report["decisions"])
+
+
+def test_multi_critic_stage_budgets_real_critic_calls():
+    """Test the consensus stage is priced by the critics' models, not the synthetic consensus model."""
+    runtime = AgentRuntime()
+    runtime.config["dynamic_selection"]["enabled"] = False
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None):
+        return _result(agent, 500 if agent.endswith("-critic") else 1000)
+
+    with patch.object(runtime, "run", side_effect=mock_run), \
+            patch.object(runtime.memory, "get_agent_averages", return_value={}):
+        results = runtime.chain("test prompt", stages=["builder", "critic"],
+                                budget=ChainBudget(max_tokens=100000), enable_refinement=False)
+
+    critic_calls = [r for r in results[:-1] if r.agent.endswith("-critic")]
+    consensus = results[-1]
+    assert critic_calls and consensus.agent == "multi-critic"
+    entry = consensus.metadata["budget"]
+    assert entry["tokens"] == 500 * len(critic_calls)
+    assert entry["cost_usd"] == round(sum(estimate_cost(r.model, r.prompt_tokens, r.completion_tokens)
+                                          for r in critic_calls), 6)
+    assert entry["duration_ms"] == round(consensus.duration_ms, 1)  # Wall clock, not the sum
+
+
+def test_agent_averages_from_history():
+    """Test per-agent averages are computed from stored conversations."""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = Path(f.name)
+    try:
+        backend = SQLiteBackend(db_path)
+        for tokens in (100, 300):
+            backend.store({"agent": "builder", "model": "m", "provider": "p", "prompt": "q",
+                           "response": "r", "total_tokens": tokens, "duration_ms": tokens})
+        averages = backend.get_agent_averages()
+        assert averages["builder"]["avg_total_tokens"] == 200
+        assert averages["builder"]["samples"] == 2
+    finally:
+        db_path.unlink()
@@ -0,0 +1,121 @@
+"""Test the chain dry-run estimator."""
+
+from unittest.mock import patch
+
+from core.agent_runtime import AgentRuntime
+from core.chain_estimator import ChainEstimator, build_profile
+
+CONFIG = {
+    "agents": {
+        "builder": {"model": "openai/gpt-4o", "max_tokens": 2000},
+        "critic": {"model": "openai/gpt-4o-mini", "max_tokens": 1000},
+        "security-critic": {"model": "openai/gpt-4o", "max_tokens": 1000},
+        "performance-critic": {"model": "openai/gpt-4o", "max_tokens": 1000},
+        "closer": {"model": "openai/gpt-4o", "max_tokens": 1000},
+    },
+    "multi_critic": {"parallel_execution": True},
+    "refinement": {"enabled": True, "max_iterations": 3},
+}
+
+
+def samples(duration_ms, tokens=(600, 400), n=20, **extra):
+    return [{"model": "openai/gpt-4o", "prompt_tokens": tokens[0], "completion_tokens": tokens[1],
+             "cost_usd": 0.01, "duration_ms": duration_ms, "fallback_used": False, "error": None, **extra}
+            for _ in range(n)]
+
+
+def test_profile_uses_history_or_defaults():
+    """Test enough successful samples make a history profile; rates count every call."""
+    history = samples(1000, n=8) + samples(1000, n=2, error="timeout", fallback_used=True)
+    profile = build_profile("builder", CONFIG["agents"]["builder"], history)
+    assert profile.source == "history"
+    assert profile.samples == 8
+    assert profile.error_rate == 0.2 and profile.fallback_rate == 0.2
+
+    assert build_profile("builder", CONFIG["agents"]["builder"], samples(1000, n=3)).source == "default"
+
+
+def test_fallback_calls_are_simulated():
+    """Test fallback calls are drawn from their own usage at the observed share."""
+    history = samples(1000, n=15) + samples(5000, n=5, fallback_used=True, model="openai/gpt-4o-mini")
+    estimator = ChainEstimator(CONFIG, {"builder": history}, refinement_rate=0.0, simulations=4000)
+    estimate = estimator.estimate(["builder"])
+
+    assert 1800 < estimate["latency_ms"]["mean"] < 2200  # 0.75 * 1000 + 0.25 * 5000
+    assert estimate["latency_ms"]["p95"] == 5000
+    assert estimate["agents"]["builder"]["fallback_rate"] == 0.25
+    assert estimate["agents"]["builder"]["fallback_model"] == "openai/gpt-4o-mini"
+
+    # Without history: defaults priced at the first fallback model
+    config = {**CONFIG, "agents": {"builder": {**CONFIG["agents"]["builder"],
+                                               "fallback_order": ["openai/gpt-4o-mini"]}}}
+    flaky = samples(1000, n=2, fallback_used=True) + samples(1000, n=2)
+    cheap = ChainEstimator(config, {"builder": flaky}, refinement_rate=0.0).estimate(["builder"])
+    full = ChainEstimator(config, {}, refinement_rate=0.0).estimate(["builder"])
+    assert cheap["cost_usd"]["mean"] < full["cost_usd"]["mean"]
+
+
+def test_parallel_critics_cost_the_slowest_on_the_critical_path():
+    """Test parallel critics add max latency but summed tokens."""
+    estimator = ChainEstimator(CONFIG, {
+        "builder": samples(2000),
+        "security-critic": samples(3000),
+        "performance-critic": samples(1000),
+        "closer": samples(500),
+    }, refinement_rate=0.0)
+
+    estimate = estimator.estimate(["builder", "critic", "closer"], ["security-critic", "performance-critic"])
+    assert [s["stage"] for s in estimate["stages"]] == ["builder", "critic", "closer"]
+    assert estimate["stages"][1]["latency_ms"]["p50"] == 3000
+    assert estimate["stages"][1]["tokens"]["p50"] == 2000
+    assert estimate["latency_ms"]["p50"] == 5500
+    assert estimate["cost_usd"]["mean"] == 0.04
+    assert estimate["refinement"]["expected_rounds"] == 0
+
+
+def test_refinement_rounds_follow_trigger_rate():
+    """Test always-triggered refinement runs max_iterations builder + critic rounds."""
+    history = {"builder": samples(2000), "critic": samples(1000)}
+    always = ChainEstimator(CONFIG, history, refinement_rate=1.0).estimate(["builder", "critic"])
+    assert always["refinement"]["expected_rounds"] == 3
+    assert always["latency_ms"]["p50"] == 3000 + 3 * 3000
+
+    sometimes = ChainEstimator(CONFIG, history, refinement_rate=0.5).estimate(["builder", "critic"])
+    assert 0.5 < sometimes["refinement"]["expected_rounds"] < 1.2
+    assert sometimes["latency_ms"]["p5"] < sometimes["latency_ms"]["p95"]
+
+
+def test_runtime_estimate_chain_makes_no_llm_calls():
+    """Test the runtime estimate reads history only and derives the trigger rate from critiques."""
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["enabled"] = False
+    critiques = ["CRITICAL: SQL injection"] * 3 + ["Looks good."] * 7
+
+    with patch.object(runtime.memory, "get_agent_samples", return_value={"builder": samples(2000)}), \
+            patch.object(runtime.memory, "get_recent_responses", return_value=critiques), \
+            patch.object(runtime.connector, "call") as call:
+        estimate = runtime.estimate_chain("Design an API", stages=["builder", "critic"], simulations=500)
+
+    call.assert_not_called()
+    assert estimate["refinement"]["trigger_rate"] == 0.3
+    assert estimate["agents"]["builder"]["source"] == "history"
+    assert estimate["agents"]["critic"]["source"] == "default"
+    assert estimate["simulations"] == 500
+
+
+def test_runtime_estimate_chain_selects_critics_silently(capsys):
+    """Test the dry run picks the same critics as a real run without printing the selection."""
+    runtime = AgentRuntime()
+    original = runtime.config["multi_critic"]["enabled"], runtime.config["dynamic_selection"]["enabled"]
+    runtime.config["multi_critic"]["enabled"] = runtime.config["dynamic_selection"]["enabled"] = True
+    prompt = "Build a JWT auth API"
+
+    try:
+        with patch.object(runtime.memory, "get_agent_samples", return_value={}), \
+                patch.object(runtime.memory, "get_recent_responses", return_value=[]):
+            estimate = runtime.estimate_chain(prompt, stages=["builder", "critic"], simulations=100)
+
+        assert capsys.readouterr().out == ""
+        assert estimate["stages"][1]["calls"] == runtime._select_relevant_critics(prompt, "")
+    finally:
+        runtime.config["multi_critic"]["enabled"], runtime.config["dynamic_selection"]["enabled"] = original
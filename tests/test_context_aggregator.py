@@ -0,0 +1,76 @@
+"""Test the context aggregator's token accounting and truncation."""
+
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from config.settings import count_tokens
+from core.context_aggregator import ContextAggregator
+from core.memory_backend import SQLiteBackend
+from core.memory_engine import MemoryEngine
+
+
+@pytest.fixture
+def aggregator():
+    """ContextAggregator over a MemoryEngine on a temporary database."""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = Path(f.name)
+    MemoryEngine._instance = None
+    MemoryEngine._initialized = False
+    memory = MemoryEngine()
+    memory.backend = SQLiteBackend(db_path)
+    yield ContextAggregator()
+    MemoryEngine._instance = None
+    MemoryEngine._initialized = False
+    db_path.unlink(missing_ok=True)
+
+
+def store(memory, prompt, response, session_id="s1"):
+    return memory.store_conversation(
+        prompt=prompt, response=response, agent="builder", model="m", provider="p",
+        generate_embedding=False, session_id=session_id,
+    )
+
+
+def test_session_section_sized_from_stored_counts(aggregator):
+    """Test the session section keeps its format and is sized without re-encoding entries."""
+    memory = aggregator.memory
+    store(memory, "Draw a chart", "Use matplotlib " * 30)
+    store(memory, "Make it red", "Pass color='red'")
+    conversations = aggregator._get_session_conversations("s1")
+    assert all(conv["tokens_session"] > 0 for conv in conversations)
+
+    text = aggregator._format_session_context(conversations)
+    assert text == (
+        "[SESSION CONTEXT - Recent conversation]\n\n"
+        "[2 messages ago]\n"
+        f"User: \"Draw a chart\"\nAssistant: \"{('Use matplotlib ' * 30)[:300]}...\"\n\n"
+        "[1 message ago]\n"
+        "User: \"Make it red\"\nAssistant: \"Pass color='red'\"\n"
+    )
+
+    # Stored counts are used as-is: a changed count changes the section size
+    conversations[0]["tokens_session"] += 100
+    blocks = aggregator._session_blocks(conversations)
+    assert "\n".join(text for text, _ in blocks) == text
+    assert sum(tokens for _, tokens in blocks) == pytest.approx(count_tokens(text) + 100, abs=len(blocks))
+
+
+def test_truncation_keeps_whole_blocks_within_budget(aggregator):
+    """Test over-budget sections drop trailing blocks and cut only the first one that doesn't fit."""
+    memory = aggregator.memory
+    for i in range(4):
+        store(memory, f"Question {i}", "answer " * 40)
+    blocks = aggregator._session_blocks(aggregator._get_session_conversations("s1"))
+    budget = blocks[0][1] + blocks[1][1] + blocks[2][1] // 2
+
+    context = {"type": "session", "text": "\n".join(t for t, _ in blocks),
+               "tokens": sum(t for _, t in blocks), "blocks": blocks, "priority": 1, "count": 4}
+    # Session context gets at most 75% of max_tokens
+    [selected] = aggregator._apply_token_budget_with_priority([context], budget * 4 // 3)
+
+    assert selected["text"].startswith(blocks[0][0] + "\n" + blocks[1][0] + "\n")
+    assert selected["text"].endswith("...\n[Context truncated to fit budget]")
+    assert blocks[3][0] not in selected["text"]
+    assert count_tokens(selected["text"]) <= budget * 4 // 3 + 16  # Marker is not budgeted
@@ -0,0 +1,108 @@
+"""Test token-budgeted stage handoff packing."""
+
+from unittest.mock import patch
+
+from core.agent_runtime import AgentRuntime, RunResult
+from core.context_packer import (
+    DEFAULT_CONTEXT_WINDOW,
+    ContextPacker,
+    ContextSection,
+    allocate_budget,
+    model_context_window,
+    truncate_to_tokens,
+)
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def words(n, word="word"):
+    return " ".join([word] * n)
+
+
+def test_allocate_budget_water_fills_by_weight():
+    """Test small sections keep their size and the rest is split by weight."""
+    assert allocate_budget([10, 500, 500], [1.0, 1.0, 1.0], 310) == [10, 150, 150]
+    assert allocate_budget([10, 500, 500], [1.0, 2.0, 1.0], 310) == [10, 200, 100]
+    assert allocate_budget([10, 20], [1.0, 1.0], 100) == [10, 20]
+
+
+def test_pack_leaves_fitting_sections_untouched():
+    """Test no compression call happens when everything fits."""
+    calls = []
+    packer = ContextPacker(compress=lambda text, target: calls.append(target) or text, token_counter=word_count)
+    sections = [ContextSection("builder", words(100)), ContextSection("critic", words(50))]
+
+    texts, report = packer.pack(sections, budget_tokens=200)
+    assert texts == [s.text for s in sections]
+    assert calls == []
+    assert report["packed_tokens"] == 150
+
+
+def test_pack_compresses_only_what_does_not_fit():
+    """Test sections over their share are compressed, then trimmed if still too long."""
+    packer = ContextPacker(compress=lambda text, target: words(target + 20, "summary"), token_counter=word_count)
+    sections = [
+        ContextSection("critic", words(30)),
+        ContextSection("builder-v1", words(400), weight=1.0),
+        ContextSection("builder-v2", words(400), weight=3.0),
+    ]
+
+    texts, report = packer.pack(sections, budget_tokens=230)
+    assert texts[0] == sections[0].text
+    assert [word_count(t) for t in texts[1:]] == [50, 150]
+    assert report["compressed"] == ["builder-v2"]  # 50 tokens: below min_compress_tokens, trimmed only
+    assert report["trimmed"] == ["builder-v1", "builder-v2"]
+    assert report["packed_tokens"] <= 230
+
+
+def test_truncate_to_tokens_cuts_at_word_boundary():
+    """Test trimming stays within the budget without splitting a word."""
+    assert truncate_to_tokens("alpha beta gamma delta", 2, word_count) == "alpha beta"
+
+
+def test_model_context_window_lookup():
+    """Test overrides, known models and the default."""
+    assert model_context_window("openai/my-finetune", {"openai/my-finetune": 16000}) == 16000
+    assert model_context_window("openai/gpt-4o") >= 128000
+    assert model_context_window("unknown/model") == DEFAULT_CONTEXT_WINDOW
+
+
+def _chain_with_builder_output(response, max_input_tokens):
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["enabled"] = False
+    runtime.config["refinement"]["enabled"] = False
+    runtime.config["context_packing"].update({"enabled": True, "max_input_tokens": max_input_tokens})
+    prompts = {}
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None):
+        prompts[agent] = prompt
+        return RunResult(agent=agent, model="m", provider="p", prompt=prompt, response=response,
+                         duration_ms=1.0, prompt_tokens=1, completion_tokens=1, total_tokens=2,
+                         timestamp="t", log_file="x.json")
+
+    with patch.object(runtime, "run", side_effect=mock_run), \
+            patch.object(runtime, "_compress_semantic", return_value="compressed summary") as compress:
+        results = runtime.chain("Design an API", stages=["builder", "critic"])
+    return results, prompts, compress
+
+
+def test_chain_skips_compression_for_outputs_that_fit():
+    """Test a 2000-char builder output reaches the critic verbatim (legacy threshold: 1200 chars)."""
+    output = "The API uses JWT auth. " * 90
+    results, prompts, compress = _chain_with_builder_output(output, max_input_tokens=12000)
+
+    compress.assert_not_called()
+    assert output in prompts["critic"]
+    assert results[1].metadata["context_packing"]["compressed"] == []
+
+
+def test_chain_compresses_to_token_share():
+    """Test an output over the budget is compressed to the available tokens, not a fixed 500."""
+    output = "The API uses JWT auth. " * 400
+    results, prompts, compress = _chain_with_builder_output(output, max_input_tokens=800)
+
+    assert compress.call_args.kwargs["max_tokens"] == 800
+    assert "compressed summary" in prompts["critic"]
+    assert results[1].metadata["context_packing"]["compressed"] == ["output"]
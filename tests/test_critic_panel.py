@@ -0,0 +1,100 @@
+"""Test the single-call multi-persona critic panel."""
+
+from unittest.mock import patch
+
+from core.agent_runtime import AgentRuntime, RunResult
+from core.critic_panel import build_panel_system, panel_instructions, parse_panel_response, split_usage
+
+CRITICS = ["security-critic", "performance-critic", "code-quality-critic"]
+
+PANEL_ANSWER = """=== CRITIC: security-critic ===
+CRITICAL: SQL injection in login.
+
+### === CRITIC: performance-critic ===
+N+1 queries when listing users.
+=== CRITIC: unknown-critic ===
+ignored
+=== CRITIC: code-quality-critic ===
+
+=== CRITIC: security-critic ===
+duplicate, ignored
+"""
+
+
+def test_parse_panel_response_splits_sections():
+    """Test sections map to requested critics; empty, unknown and repeated markers are skipped."""
+    sections = parse_panel_response(PANEL_ANSWER, CRITICS)
+    assert sections == {
+        "security-critic": "CRITICAL: SQL injection in login.",
+        "performance-critic": "N+1 queries when listing users.",
+    }
+    assert parse_panel_response("no markers at all", CRITICS) == {}
+
+
+def test_panel_prompt_lists_every_persona():
+    """Test the system prompt and instructions name every critic."""
+    system = build_panel_system({"security-critic": "Find vulnerabilities.", "performance-critic": "Find hot paths."})
+    assert "## PERSONA: security-critic\nFind vulnerabilities." in system
+    assert panel_instructions(CRITICS).endswith("=== CRITIC: code-quality-critic ===")
+
+
+def test_split_usage_sums_to_total():
+    """Test proportional token splits keep the total."""
+    assert split_usage(100, [1, 1, 1]) == [34, 33, 33]
+    assert split_usage(10, [3, 1]) == [8, 2]
+    assert sum(split_usage(7, [0, 0])) == 7
+
+
+def _panel_runtime(response):
+    runtime = AgentRuntime()
+    runtime.config["dynamic_selection"]["enabled"] = False
+    runtime.config["multi_critic"]["execution"] = {"mode": "combined", "combined_agent": "critic"}
+    calls = []
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None, temperature=None, system=None):
+        calls.append((agent, system))
+        text = response if system else f"{agent} separate review"
+        return RunResult(agent=agent, model="m", provider="p", prompt=prompt, response=text, duration_ms=1.0,
+                         prompt_tokens=300, completion_tokens=90, total_tokens=390, timestamp="t", log_file="x.json")
+
+    return runtime, mock_run, calls
+
+
+def test_combined_execution_makes_one_call():
+    """Test one panel call yields a RunResult per critic with the usage split across them."""
+    answer = "".join(f"=== CRITIC: {name} ===\nReview by {name}.\n" for name in CRITICS)
+    runtime, mock_run, calls = _panel_runtime(answer)
+    report = {}
+
+    with patch.object(runtime, "run", side_effect=mock_run):
+        consensus, results = runtime._run_multi_critic("builder output", "Build login", report=report)
+
+    assert len(calls) == 1 and calls[0][0] == "critic" and "PERSONA: security-critic" in calls[0][1]
+    assert [r.agent for r in results] == CRITICS
+    assert results[0].response == "Review by security-critic."
+    assert sum(r.total_tokens for r in results) == 390
+    assert results[0].metadata["critic_panel"]["total_tokens"] == 390
+    assert report["execution"] == "combined"
+    assert "Review by performance-critic." in consensus
+
+
+def test_combined_execution_runs_unanswered_critics_separately():
+    """Test critics missing from the panel answer fall back to their own call."""
+    runtime, mock_run, calls = _panel_runtime(PANEL_ANSWER)
+
+    with patch.object(runtime, "run", side_effect=mock_run):
+        _, results = runtime._run_multi_critic("builder output", "Build login")
+
+    assert [agent for agent, system in calls if system is None] == ["code-quality-critic"]
+    assert results[-1].response == "code-quality-critic separate review"
+
+
+def test_auto_mode_combines_under_load():
+    """Test auto mode switches to one call when provider limits can't take a call per critic."""
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["execution"] = {"mode": "auto", "auto_in_flight_threshold": 6}
+    assert runtime._critic_execution_mode(CRITICS) == "separate"
+
+    runtime.connector.set_provider_limits({"openai": 2})
+    assert runtime._critic_execution_mode(CRITICS) == "combined"
+    assert runtime._critic_execution_mode(["security-critic"]) == "separate"
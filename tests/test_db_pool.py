@@ -0,0 +1,141 @@
+"""Test the shared SQLite connection pool."""
+
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from core.db_pool import SQLitePool, get_pool
+from core.memory_backend import SQLiteBackend
+
+
+@pytest.fixture
+def temp_db():
+    """Temporary database path."""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = Path(f.name)
+    yield db_path
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        if path.exists():
+            path.unlink()
+
+
+def test_pool_uses_wal_and_tuned_pragmas(temp_db):
+    """Test connections are opened in WAL mode with the configured pragmas."""
+    pool = SQLitePool(temp_db, pragmas={"busy_timeout": 1234})
+    with pool.reader() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert pool.stats()["journal_mode"] == "wal"
+    pool.close()
+
+
+def test_reader_is_reused_per_thread_and_read_only(temp_db):
+    """Test each thread keeps one read connection, which rejects writes."""
+    pool = SQLitePool(temp_db)
+    with pool.reader() as first, pool.reader() as second:
+        assert first is second
+        with pytest.raises(sqlite3.OperationalError):
+            first.execute("CREATE TABLE t (x INTEGER)")
+
+    other = []
+    in_thread = []
+    thread = threading.Thread(target=lambda: (other.append(pool._reader()),
+                                              in_thread.append(pool.stats()["read_connections"])))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+    assert in_thread == [2]
+    assert pool.stats()["read_connections"] == 1  # Closed when its thread exited
+    pool.close()
+
+
+def test_short_lived_threads_release_readers(temp_db):
+    """Test per-chain thread pools don't leave read connections behind."""
+    import concurrent.futures
+
+    pool = SQLitePool(temp_db)
+
+    def read(_):
+        with pool.reader() as conn:
+            return conn.execute("SELECT 1").fetchone()[0]
+
+    for _ in range(50):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            assert list(executor.map(read, range(3))) == [1, 1, 1]
+
+    assert pool.stats()["read_connections"] == 0
+    assert pool.stats()["reads"] == 150
+    pool.close()
+
+
+def test_writer_commits_or_rolls_back(temp_db):
+    """Test a writer block is one transaction visible to readers after it exits."""
+    pool = SQLitePool(temp_db)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+            raise RuntimeError("abort")
+
+    with pool.reader() as conn:
+        assert [row[0] for row in conn.execute("SELECT x FROM t")] == [1]
+    pool.close()
+
+
+def test_close_reopens_lazily(temp_db):
+    """Test a closed pool reconnects on next use."""
+    pool = SQLitePool(temp_db)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    pool.close()
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    pool.close()
+
+
+def test_backends_share_one_pool_per_file(temp_db):
+    """Test get_pool() returns the same pool for a file and a new one when it is replaced."""
+    backend = SQLiteBackend(temp_db)
+    assert SQLiteBackend(temp_db).pool is backend.pool
+    assert get_pool(temp_db) is backend.pool
+
+    old_pool = backend.pool
+    with old_pool.reader():
+        pass
+    temp_db.unlink()
+    assert SQLiteBackend(temp_db).pool is not old_pool
+    assert old_pool.stats()["read_connections"] == 0  # Replaced pool is closed
+    assert old_pool._writer is None
+
+
+def test_concurrent_writes_and_reads(temp_db):
+    """Test threads storing and reading through one backend don't lose rows or hit lock errors."""
+    backend = SQLiteBackend(temp_db)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(20):
+                backend.store({"agent": f"agent-{n}", "prompt": f"p{i}", "response": "r"})
+                backend.get_recent(limit=5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert backend.get_stats()["total_conversations"] == 80
+    backend.pool.close()
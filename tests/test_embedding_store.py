@@ -0,0 +1,100 @@
+"""Test the memory-mapped embedding store and the store-backed vector index."""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core.embedding_store import HEADER, HEADER_SIZE, EmbeddingStore, build_store
+from core.vector_index import VectorIndex
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "pwrite"), reason="embedding store needs POSIX file APIs")
+
+TIMESTAMP = "2026-01-10T00:00:00+00:00"
+
+
+@pytest.fixture
+def path():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield Path(tmp) / "conversations.vec"
+
+
+def unit_rows(n, dim=8, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_append_is_visible_to_other_readers(path):
+    """Test rows appended by one store are read zero-copy by another after refresh()."""
+    writer = EmbeddingStore(path, fsync=False)
+    reader = EmbeddingStore(path)  # Opened before the files exist
+    rows = unit_rows(5000)  # Crosses the preallocated capacity
+
+    assert writer.append(np.arange(1, 5001), rows).tolist() == list(range(5000))
+    assert reader.refresh() == 5000
+    np.testing.assert_array_equal(reader.vectors[:5000], rows)
+    assert reader.ids[:5000].tolist() == list(range(1, 5001))
+    assert not reader.vectors.flags.writeable
+
+    with pytest.raises(ValueError):
+        writer.append([9], unit_rows(1, dim=4))
+
+
+def test_unpublished_rows_are_ignored_after_a_crash(path):
+    """Test bytes written past the high-water mark (crash before publish) are not rows."""
+    store = EmbeddingStore(path, fsync=False)
+    store.append([1, 2], unit_rows(2))
+
+    # Simulate a crash after writing row 3 but before updating the header count
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + 2 * 8 * 4)
+        f.write(unit_rows(1, seed=1).tobytes())
+    reopened = EmbeddingStore(path)
+    assert reopened.count == 2
+
+    assert reopened.append([3], unit_rows(1, seed=2)).tolist() == [2]  # Overwrites the torn row
+    np.testing.assert_array_equal(EmbeddingStore(path).vectors[2], unit_rows(1, seed=2)[0])
+    assert HEADER.unpack(path.read_bytes()[:HEADER.size])[4] == 3
+
+
+def test_rebuild_replaces_files_and_marks_open_stores_stale(path):
+    """Test build_store() swaps in new files and records the synced id."""
+    store = EmbeddingStore(path, fsync=False)
+    store.append([1, 2, 3], unit_rows(3))
+
+    assert build_store(path, [(np.array([2, 3]), unit_rows(2, seed=3))]) == 2
+    assert store.stale()
+
+    rebuilt = EmbeddingStore(path)
+    assert not rebuilt.stale()
+    assert (rebuilt.count, rebuilt.synced_id) == (2, 3)
+    assert rebuilt.ids[:2].tolist() == [2, 3]
+
+
+def test_store_backed_index_shares_rows_across_processes(path):
+    """Test one index's appends are searchable by another index over the same files."""
+    metadata = {}
+
+    def lookup(ids):
+        return {i: metadata[i] for i in ids if i in metadata}
+
+    writer = VectorIndex(store=EmbeddingStore(path, fsync=False))
+    reader = VectorIndex(store=EmbeddingStore(path))
+    rows = unit_rows(4)
+    for i, row in enumerate(rows, 1):
+        metadata[i] = {"timestamp": TIMESTAMP, "agent": "builder" if i % 2 else "critic", "session_id": None}
+        writer.add(i, row * 3, TIMESTAMP, metadata[i]["agent"])  # Stored normalized
+
+    del metadata[4]  # Deleted in SQLite: never indexed by the reader
+    assert reader.sync_store(lookup) == 3
+    ids, scores = reader.search(rows[0], agent="builder")
+    assert ids.tolist()[0] == 1 and scores[0] == pytest.approx(1.0)
+    assert 4 not in reader and len(reader) == 3
+
+    # Re-embedding appends a newer row that supersedes the old one
+    writer.add(1, rows[1], TIMESTAMP, "builder")
+    reader.sync_store(lookup)
+    assert sorted(reader.search(rows[1], top_k=2)[0].tolist()) == [1, 2]  # Both now match exactly
+    assert reader.deleted_rows == 2  # Superseded row of 1, never-indexed row of 4
@@ -0,0 +1,95 @@
+"""Test local extractive compression."""
+
+from unittest.mock import patch
+
+import numpy as np
+
+from core.agent_runtime import AgentRuntime
+from core.extractive_compressor import ExtractiveCompressor, join_units, split_units
+
+
+def word_count(text):
+    return len(text.split())
+
+
+OUTPUT = """# Auth service design
+
+I recommend PostgreSQL for the user store because it provides ACID guarantees. The weather is nice today. JWT tokens must expire after 15 minutes.
+
+- Refresh tokens stored in Redis
+- Trade-off: Redis adds an operational dependency
+
+```python
+def issue_token(user):
+    return jwt.encode({"sub": user.id}, SECRET)
+```
+
+Some filler sentence about nothing in particular.
+"""
+
+
+class TopicEmbeddings:
+    """Embeds units onto two axes: auth/storage topic vs everything else."""
+
+    TOPIC = ("postgresql", "jwt", "redis", "token", "auth")
+
+    def encode_batch(self, texts):
+        return np.array([[float(any(t in text.lower() for t in self.TOPIC)), 0.3] for text in texts])
+
+
+def test_split_units_keeps_code_blocks_and_lines():
+    """Test code blocks stay whole, list items and headings are standalone, prose splits into sentences."""
+    units = split_units(OUTPUT)
+    kinds = [u.kind for u in units]
+    assert kinds == ["line", "sentence", "sentence", "sentence", "line", "line", "code", "sentence"]
+    assert units[6].text.startswith("```python\n") and units[6].text.endswith("```")
+    assert join_units(units[1:4]) == OUTPUT.split("\n")[2]
+
+
+def test_compress_fits_target_and_keeps_order():
+    """Test the most salient units are kept within the token target, in original order."""
+    compressor = ExtractiveCompressor(token_counter=word_count)
+    compressed = compressor.compress(OUTPUT, max_tokens=35)
+
+    assert word_count(compressed) <= 35
+    assert "JWT tokens must expire after 15 minutes." in compressed
+    assert "The weather is nice today." not in compressed
+    assert compressed.index("# Auth service design") < compressed.index("JWT tokens")
+    assert compressor.compress("short text", max_tokens=40) == "short text"
+
+
+def test_centrality_favors_main_topic():
+    """Test embedding centrality ranks on-topic units above off-topic ones."""
+    compressor = ExtractiveCompressor(embedding_engine=TopicEmbeddings(), token_counter=word_count)
+    units = split_units(OUTPUT)
+    scores = compressor.score(units)
+    weather = next(i for i, u in enumerate(units) if "weather" in u.text)
+    refresh = next(i for i, u in enumerate(units) if "Refresh tokens" in u.text)
+    assert scores[refresh] > scores[weather]
+
+
+def test_unavailable_embeddings_fall_back_to_salience():
+    """Test a missing embedding model disables centrality instead of failing."""
+    class Missing:
+        def encode_batch(self, texts):
+            raise ImportError("sentence-transformers not installed")
+
+    compressor = ExtractiveCompressor(embedding_engine=Missing(), token_counter=word_count)
+    assert compressor.compress(OUTPUT, max_tokens=40)
+    assert compressor.embedding_engine is None
+
+
+def test_auto_mode_uses_extractive_when_llm_too_slow():
+    """Test auto mode skips the LLM call when its expected latency exceeds the budget."""
+    runtime = AgentRuntime()
+    runtime.config["compression"].update({"mode": "auto", "latency_budget_ms": 2000, "expected_llm_ms": 3000})
+    runtime._extractive_compressor = ExtractiveCompressor(token_counter=word_count)
+
+    with patch.object(runtime.connector, "call") as call:
+        compressed = runtime._compress_semantic(OUTPUT, max_tokens=40)
+    call.assert_not_called()
+    assert "JWT tokens must expire" in compressed
+
+    runtime._record_compression_latency(500.0)  # Fast LLM compression observed
+    assert runtime._resolve_compression_mode("auto") == "llm"
+    assert runtime._resolve_compression_mode("extractive") == "extractive"
@@ -0,0 +1,165 @@
+"""Test local embedding router."""
+
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from core.agent_runtime import AgentRuntime
+from core.llm_connector import LLMResponse
+from core.local_router import LocalRouter, load_or_train_local_router
+from core.memory_backend import SQLiteBackend
+
+VOCAB = ["implement", "write", "create", "review", "bug", "wrong", "summarize", "decide", "next"]
+
+
+class KeywordEngine:
+    """Deterministic bag-of-words stand-in for the sentence-transformers engine."""
+
+    model_name = "keyword-test"
+
+    def encode(self, text):
+        words = text.lower().split()
+        return np.array([float(w in words) for w in VOCAB], dtype=np.float32)
+
+    def encode_batch(self, texts):
+        return np.stack([self.encode(t) for t in texts])
+
+
+EXAMPLES = [
+    ("implement a parser", "builder"),
+    ("write a function", "builder"),
+    ("create an api", "builder"),
+    ("review this code", "critic"),
+    ("find the bug", "critic"),
+    ("what is wrong here", "critic"),
+    ("summarize the discussion", "closer"),
+    ("decide between options", "closer"),
+    ("what are next steps", "closer"),
+]
+
+
+@pytest.mark.parametrize("method", ["centroid", "knn"])
+def test_train_and_predict(method):
+    """Test prompts are classified to the nearest label with high confidence."""
+    router = LocalRouter(embedding_engine=KeywordEngine(), method=method, k=3)
+    assert router.train(EXAMPLES) == len(EXAMPLES)
+
+    label, confidence = router.predict("please review for a bug")
+    assert label == "critic"
+    assert confidence > 0.6
+
+    scores = router.scores("summarize and decide")
+    assert max(scores, key=scores.get) == "closer"
+    assert sum(scores.values()) == pytest.approx(1.0)
+
+
+def test_untrained_router_abstains():
+    """Test an untrained router returns no label."""
+    router = LocalRouter(embedding_engine=KeywordEngine())
+    assert router.predict("anything") == (None, 0.0)
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    """Test the persisted model predicts the same as the trained one."""
+    engine = KeywordEngine()
+    router = LocalRouter(embedding_engine=engine, method="knn", k=3)
+    router.train(EXAMPLES)
+    path = router.save(tmp_path / "router.npz")
+
+    loaded = LocalRouter.load(path, embedding_engine=engine)
+    assert loaded.method == "knn"
+    assert loaded.labels == router.labels
+    assert loaded.predict("write code") == router.predict("write code")
+
+    other = KeywordEngine()
+    other.model_name = "different-model"
+    with pytest.raises(ValueError):
+        LocalRouter.load(path, embedding_engine=other)
+
+
+def test_persisted_router_retrains_when_config_changes(tmp_path):
+    """Test the saved model is reused for the same config and rebuilt when examples or settings change."""
+    import yaml
+
+    examples_path = tmp_path / "examples.yaml"
+    examples_path.write_text(yaml.safe_dump({"builder": ["implement a parser"], "critic": ["review this code"]}),
+                             encoding="utf-8")
+    config = {"examples_path": str(examples_path), "model_path": str(tmp_path / "router.npz")}
+    engine = KeywordEngine()
+
+    first = load_or_train_local_router(config, embedding_engine=engine)
+    assert first.labels == ["builder", "critic"]
+    assert load_or_train_local_router(config, embedding_engine=engine).trained_at == first.trained_at
+
+    relabelled_examples = {"builder": ["implement a parser"], "closer": ["summarize the discussion"]}
+    examples_path.write_text(yaml.safe_dump(relabelled_examples), encoding="utf-8")
+    relabelled = load_or_train_local_router(config, embedding_engine=engine)
+    assert relabelled.labels == ["builder", "closer"]
+
+    rebuilt = load_or_train_local_router({**config, "method": "knn"}, embedding_engine=engine)
+    assert rebuilt.method == "knn"
+    assert rebuilt.config_hash != relabelled.config_hash
+
+    other = KeywordEngine()
+    other.model_name = "different-model"
+    switched = load_or_train_local_router({**config, "method": "knn"}, embedding_engine=other)
+    assert switched.config_hash != rebuilt.config_hash
+
+
+def test_evaluate_reports_coverage_per_threshold():
+    """Test the offline report covers accuracy, latency and threshold rows."""
+    router = LocalRouter(embedding_engine=KeywordEngine())
+    router.train(EXAMPLES)
+
+    report = router.evaluate([("implement it", "builder"), ("hello", "critic")], thresholds=(0.0, 0.9))
+
+    assert report["examples"] == 2
+    assert report["thresholds"][0]["coverage"] == 1.0
+    # The ambiguous prompt has no matching words -> low confidence -> left to the LLM
+    assert report["thresholds"][1]["coverage"] == 0.5
+    assert report["thresholds"][1]["accuracy"] == 1.0
+    assert "p95" in report["latency_ms"]
+
+
+def test_route_falls_back_to_llm_below_threshold():
+    """Test confident prompts are routed locally and ambiguous ones by the LLM."""
+    runtime = AgentRuntime()
+    router = LocalRouter(embedding_engine=KeywordEngine())
+    router.train(EXAMPLES)
+    runtime._local_router = router
+
+    llm_response = LLMResponse(
+        text="closer",
+        model="gemini/gemini-2.5-flash",
+        provider="google",
+        prompt_tokens=10,
+        completion_tokens=1,
+        total_tokens=11,
+        duration_ms=100.0,
+    )
+
+    with patch.object(runtime.connector, "call", return_value=llm_response) as mock_call:
+        assert runtime._route_with_source("review this bug") == ("critic", "local")
+        assert mock_call.call_count == 0
+
+        assert runtime._route_with_source("hello there") == ("closer", "llm")
+        assert mock_call.call_count == 1
+
+
+def test_routed_examples_only_use_tagged_conversations():
+    """Test history training data comes from conversations carrying the routing tag."""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = Path(f.name)
+    try:
+        backend = SQLiteBackend(db_path)
+        base = {"model": "m", "provider": "p", "response": "r"}
+        backend.store({**base, "agent": "critic", "prompt": "audit this", "tags": ["auto-routed", "router:llm"]})
+        backend.store({**base, "agent": "builder", "prompt": "local pick", "tags": ["auto-routed", "router:local"]})
+        backend.store({**base, "agent": "builder", "prompt": "explicit agent"})
+
+        assert backend.get_routed_examples("router:llm") == [("audit this", "critic")]
+    finally:
+        db_path.unlink()
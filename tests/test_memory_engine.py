@@ -1,12 +1,23 @@
 """Tests for memory engine and backend."""
 
+import random
 import tempfile
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from unittest.mock import patch
 
+import numpy as np
 import pytest
 
-from core.memory_backend import SQLiteBackend
-from core.memory_engine import MemoryEngine
+from core.memory_backend import (
+    TOKEN_COLUMNS,
+    SQLiteBackend,
+    decode_keywords,
+    encode_keywords,
+    ensure_fts,
+    entry_token_counts,
+)
+from core.memory_engine import MemoryEngine, ScoredCandidates, record_epochs
 
 
 class TestSQLiteBackend:
@@ -177,6 +188,125 @@ class TestSQLiteBackend:
         assert len(results) == 1
         assert results[0]["model"] == "openai/gpt-4o"
 
+    def test_full_text_search_ranking_and_syntax(self, temp_db):
+        """Test BM25 ranking, snippets, phrase/prefix queries and filters."""
+        backend = SQLiteBackend(temp_db)
+        assert backend.fts_enabled
+
+        for agent, prompt, response in [
+            ("builder", "Add JWT authentication", "Token auth middleware for the login endpoint"),
+            ("builder", "Write a login form", "HTML form with validation"),
+            ("critic", "Review the auth module", "Authentication looks fine; add rate limiting"),
+            ("builder", "Cache layer", "Redis cache with TTL"),
+        ]:
+            backend.store({"agent": agent, "model": "test", "provider": "test", "prompt": prompt, "response": response})
+
+        results = backend.search(query="login")
+        assert {r["prompt"] for r in results} == {"Add JWT authentication", "Write a login form"}
+        assert results[0]["prompt"] == "Write a login form"  # Prompt matches rank higher
+        assert "**login**" in results[0]["snippet"]
+        assert results[0]["score"] >= results[1]["score"]
+
+        assert [r["prompt"] for r in backend.search(query='"login form"')] == ["Write a login form"]
+        assert len(backend.search(query="authent*")) == 2
+        assert [r["agent"] for r in backend.search(query="authent*", agent="critic")] == ["critic"]
+        assert backend.search(query='auth OR "NEAR(') == []  # Operators are quoted, not parsed
+
+    def test_full_text_index_follows_updates_and_deletes(self, temp_db):
+        """Test triggers keep the index in sync and a new index is used once backfilled."""
+        backend = SQLiteBackend(temp_db)
+        row_id = backend.store({"agent": "builder", "prompt": "Deploy to Kubernetes", "response": "Helm chart"})
+
+        conn = backend._get_connection()
+        conn.execute("UPDATE conversations SET prompt = 'Deploy to Nomad' WHERE id = ?", (row_id,))
+        conn.commit()
+        conn.close()
+        assert backend.search(query="kubernetes") == []
+        assert len(backend.search(query="nomad")) == 1
+
+        # Drop the index: the next backend start recreates it, search uses LIKE until the backfill
+        conn = backend._get_connection()
+        conn.execute("DROP TABLE conversations_fts")
+        conn.commit()
+        conn.close()
+        backend = SQLiteBackend(temp_db)
+        results = backend.search(query="helm")
+        assert len(results) == 1 and "score" not in results[0]
+
+        conn = backend._get_connection()
+        ensure_fts(conn, rebuild=True)
+        conn.commit()
+        conn.close()
+        results = backend.search(query="helm")
+        assert len(results) == 1 and "score" in results[0]
+
+        backend.delete(row_id)
+        assert backend.search(query="helm") == []
+
+    def test_snippet_columns_stored_and_backfilled(self, temp_db):
+        """Test snippets are stored at insert and backfilled for databases that predate them."""
+        backend = SQLiteBackend(temp_db)
+        long_id = backend.store({"agent": "builder", "prompt": "Long", "response": "x" * 250})
+        short_id = backend.store({"agent": "builder", "prompt": "Short", "response": "ok"})
+
+        snippets = backend.get_snippets([long_id, short_id, 999])
+        assert snippets[long_id] == {"prompt": "Long", "snippet_300": "x" * 250, "snippet_200": "x" * 200 + "..."}
+        assert snippets[short_id]["snippet_200"] == "ok"
+        assert 999 not in snippets
+
+        # Simulate a pre-v1.1.0 database: the columns are re-added and filled on startup
+        conn = backend._get_connection()
+        conn.execute("DROP INDEX idx_keywords_missing")
+        for column in ("snippet_300", "snippet_200", "keywords"):
+            conn.execute(f"ALTER TABLE conversations DROP COLUMN {column}")
+        conn.commit()
+        conn.close()
+        assert SQLiteBackend(temp_db).get_snippets([long_id])[long_id]["snippet_200"] == "x" * 200 + "..."
+
+    def test_scoring_rows_skip_full_text(self, temp_db):
+        """Test the scoring query reads stored keywords, and text only when they are missing."""
+        backend = SQLiteBackend(temp_db)
+        with_kw = backend.store({"agent": "builder", "prompt": "A", "response": "B", "keywords": "alpha\n"})
+        without_kw = backend.store({"agent": "builder", "prompt": "Deploy", "response": "Helm"})
+
+        rows = {row["id"]: row for row in backend.query_scoring_rows(limit=10)}
+        assert set(rows[with_kw]) == {"id", "timestamp", "tokens_context", "keywords", "keyword_text"}
+        assert rows[with_kw]["keyword_text"] is None
+        assert rows[without_kw]["keyword_text"] == "Deploy Helm"
+
+        backend.update_keywords({without_kw: {"deploy": 1, "helm": 1}})
+        assert backend.get_scoring_rows([without_kw])[without_kw]["keywords"] == "deploy\nhelm\n"
+
+    def test_keyword_postings_follow_inserts_and_deletes(self, temp_db):
+        """Test the inverted keyword index is written at insert and cleaned up on delete."""
+        backend = SQLiteBackend(temp_db)
+        helm = backend.store({"agent": "builder", "prompt": "p", "response": "r", "keyword_counts": {"helm": 2, "chart": 1}})
+        backend.store({"agent": "critic", "prompt": "p", "response": "r", "keyword_counts": {"helm": 1}})
+
+        assert backend.keyword_statistics(["helm", "chart", "absent"]) == (2, {"helm": 2, "chart": 1})
+        matches = backend.query_keyword_matches({"helm": 1.0, "chart": 2.0}, min_weight=1.5)
+        assert [(m["id"], m["keyword_weight"]) for m in matches] == [(helm, 3.0)]
+        assert backend.query_keyword_matches({"helm": 1.0}, agent="critic")[0]["id"] != helm
+
+        backend.delete(helm)
+        assert backend.keyword_statistics(["helm", "chart"]) == (1, {"helm": 1})
+
+    def test_token_counts_stored_and_backfilled(self, temp_db):
+        """Test context entry token counts are stored at insert and backfilled for older rows."""
+        backend = SQLiteBackend(temp_db)
+        row_id = backend.store({"agent": "builder", "prompt": "Explain JWT", "response": "Signed tokens " * 40})
+        stored = backend.get_by_id(row_id)
+        expected = entry_token_counts(stored["prompt"], stored["snippet_300"], stored["snippet_200"])
+        assert tuple(stored[column] for column in TOKEN_COLUMNS) == expected
+
+        conn = backend._get_connection()
+        conn.execute("UPDATE conversations SET tokens_context = NULL, tokens_session = NULL, tokens_knowledge = NULL")
+        conn.commit()
+        conn.close()
+        assert backend.backfill_token_counts(batch_size=1) == 1
+        assert tuple(backend.get_by_id(row_id)[column] for column in TOKEN_COLUMNS) == expected
+        assert backend.backfill_token_counts() == 0
+
     def test_delete_conversation(self, temp_db):
         """Test deleting a conversation."""
         backend = SQLiteBackend(temp_db)
@@ -706,3 +836,149 @@ class TestMemoryEngine:
 
         # Results should be identical
         assert context1 == context2, "Context retrieval should be deterministic"
+
+    def test_keywords_precomputed_and_filled_for_old_rows(self, temp_db):
+        """Test stored conversations carry keywords and older rows get them on first scoring."""
+        engine = MemoryEngine()
+        conv_id = engine.store_conversation(
+            prompt="Kubernetes deployment", response="Use helm charts", agent="builder", model="test", provider="test"
+        )
+        stored = engine.backend.get_scoring_rows([conv_id])[conv_id]
+        assert decode_keywords(stored["keywords"]) == {"kubernetes", "deployment", "use", "helm", "charts"}
+
+        conn = engine.backend._get_connection()
+        conn.execute("UPDATE conversations SET keywords = NULL")
+        conn.commit()
+        conn.close()
+
+        context = engine.get_context_for_prompt("helm charts", min_relevance=0.0)
+        assert "Kubernetes deployment" in context and "Use helm charts" in context
+        assert engine.backend.get_scoring_rows([conv_id])[conv_id]["keywords"] == stored["keywords"]
+
+    def test_keyword_index_scores_full_corpus_with_idf(self, temp_db):
+        """Test the keywords strategy weights rare terms higher and reaches past the newest 500 rows."""
+        engine = MemoryEngine()
+        rare = engine.store_conversation(
+            prompt="Kubernetes ingress setup", response="nginx", agent="builder", model="test", provider="test"
+        )
+        engine.store_conversations(
+            [
+                {"prompt": f"Python script {i}", "response": "done", "agent": "builder", "model": "test", "provider": "test"}
+                for i in range(600)
+            ],
+            generate_embedding=False,
+        )
+
+        context = engine.get_context_for_prompt("kubernetes python", min_relevance=0.5, time_decay_hours=0)
+        # "kubernetes" is rare, so it carries almost all of the weight; "python" alone scores ~0
+        assert context.count("[Past conversation") == 1
+        assert "Kubernetes ingress setup" in context
+
+        weights = engine._keyword_weights({"kubernetes", "python"})
+        assert weights["kubernetes"] > 10 * weights["python"]
+        assert engine._score_record(engine.backend.get_scoring_rows([rare])[rare], weights, time_decay_hours=0) == (
+            pytest.approx(weights["kubernetes"] / sum(weights.values()))
+        )
+
+    def test_index_missing_keywords(self, temp_db):
+        """Test rows stored without keywords are added to the inverted index."""
+        engine = MemoryEngine()
+        engine.backend.store({"agent": "builder", "prompt": "Terraform modules", "response": "Use workspaces"})
+
+        assert engine.backend.query_keyword_matches({"terraform": 1.0}) == []
+        assert engine.index_missing_keywords() == 1
+        assert len(engine.backend.query_keyword_matches({"terraform": 1.0})) == 1
+        assert engine.index_missing_keywords() == 0
+
+    def test_keyword_query_indexes_one_batch(self, temp_db):
+        """Test a keyword query indexes one bounded batch and scans while rows are still missing."""
+        engine = MemoryEngine()
+        for i in range(5):
+            engine.backend.store({"agent": "builder", "prompt": f"Terraform module {i}", "response": "Use workspaces"})
+        engine.keyword_config["query_batch"] = 2
+        update_keywords = engine.backend.update_keywords
+        batches = []
+        try:
+            with patch.object(engine.backend, "update_keywords",
+                              side_effect=lambda counts: batches.append(len(counts)) or update_keywords(counts)):
+                context = engine.get_context_for_prompt("terraform", strategy="keywords", min_relevance=0.1,
+                                                        time_decay_hours=0)
+            assert batches[0] == 2
+            assert engine._keywords_pending
+            assert context.count("Terraform module") == 5  # Recency scan covers the unindexed rows
+
+            assert engine.index_missing_keywords() == 0  # The scan stored the rest
+            assert not engine._keywords_pending
+        finally:
+            engine.keyword_config.pop("query_batch", None)
+
+    def test_budget_selection_uses_stored_token_counts(self, temp_db):
+        """Test budget selection reads tokens_context, and counts rows stored without it."""
+        engine = MemoryEngine()
+        big = engine.store_conversation(
+            prompt="Python packaging", response="Use pyproject", agent="builder", model="test", provider="test"
+        )
+        small = engine.store_conversation(
+            prompt="Python typing", response="Use mypy", agent="builder", model="test", provider="test"
+        )
+
+        conn = engine.backend._get_connection()
+        conn.execute("UPDATE conversations SET tokens_context = 1000 WHERE id = ?", (big,))
+        conn.execute("UPDATE conversations SET tokens_context = NULL WHERE id = ?", (small,))
+        conn.commit()
+        conn.close()
+
+        context = engine.get_context_for_prompt("python", max_tokens=200, min_relevance=0.0)
+        assert "Python typing" in context and "Python packaging" not in context
+
+    def test_vectorized_keyword_scores_match_per_record_scoring(self, temp_db):
+        """Test _score_keywords gives _score_record's scores (including future timestamps)."""
+        engine = MemoryEngine()
+        rng = random.Random(0)
+        vocabulary = ["python", "kubernetes", "helm", "redis", "cache", "login", "jwt", "chart"]
+        now = datetime.now(timezone.utc)
+        records = [
+            {
+                "id": i,
+                "timestamp": (now - timedelta(hours=rng.uniform(-5, 500))).isoformat(),
+                "keywords": encode_keywords(rng.sample(vocabulary, rng.randint(0, 5))),
+            }
+            for i in range(200)
+        ]
+        weights = {"python": 0.4, "helm": 2.5, "jwt": 1.2, "missing": 3.0}
+
+        for decay in (0, 96):
+            scored = engine._score_keywords(records, weights, decay, now.timestamp())
+            expected = [engine._score_record(rec, weights, time_decay_hours=decay) for rec in records]
+            np.testing.assert_allclose(scored.scores, expected, rtol=1e-6, atol=1e-12)
+
+    def test_budget_selection_matches_full_ranking(self, temp_db):
+        """Test argpartition top-k selection picks what ranking every candidate would."""
+        engine = MemoryEngine()
+        rng = np.random.default_rng(0)
+        n = 2000
+        records = [
+            {"id": i, "timestamp": f"2026-01-{1 + i % 28:02d}T00:00:00+00:00", "tokens_context": int(t)}
+            for i, t in enumerate(rng.integers(20, 400, n))
+        ]
+        scores = np.round(rng.random(n), 2)  # Plenty of ties, broken by timestamp
+
+        for max_tokens in (100, 600, 5000, 200_000):
+            picked = engine._select_within_budget(
+                ScoredCandidates(records, scores, record_epochs(records)), 0.3, max_tokens
+            )
+
+            ranked = sorted(
+                (i for i in range(n) if scores[i] >= 0.3),
+                key=lambda i: (-scores[i], -record_epochs([records[i]])[0], i),
+            )
+            expected, budget = [], max_tokens
+            for i in ranked:
+                if records[i]["tokens_context"] <= budget:
+                    expected.append(i)
+                    budget -= records[i]["tokens_context"]
+            # Same records; equal (score, timestamp) pairs may come in either order
+            assert sorted(r["id"] for r in picked) == sorted(expected)
+            assert [(r["_score"], r["timestamp"]) for r in picked] == [
+                (scores[i], records[i]["timestamp"]) for i in expected
+            ]
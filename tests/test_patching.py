@@ -0,0 +1,161 @@
+"""Test patch-based builder refinement."""
+
+from unittest.mock import patch
+
+import pytest
+
+from core.agent_runtime import AgentRuntime, RunResult
+from core.patching import EditBlock, PatchError, apply_edit_blocks, parse_edit_blocks
+
+PREVIOUS = "## API\n\ndef login(user, password):\n    return db.query(f\"SELECT * FROM users WHERE name='{user}'\")\n\n## Notes\nNo rate limiting.\n"
+
+EDITS = """Here are the fixes:
+
+<<<<<<< SEARCH
+    return db.query(f"SELECT * FROM users WHERE name='{user}'")
+=======
+    return db.query("SELECT * FROM users WHERE name = ?", (user,))
+>>>>>>> REPLACE
+
+<<<<<<< SEARCH
+No rate limiting.
+=======
+Rate limited to 5 attempts per minute.
+>>>>>>> REPLACE
+"""
+
+
+def test_parse_and_apply_edit_blocks():
+    """Test blocks are parsed in order and applied to the previous text."""
+    blocks = parse_edit_blocks(EDITS)
+    assert len(blocks) == 2
+
+    patched = apply_edit_blocks(PREVIOUS, blocks)
+    assert 'name = ?", (user,))' in patched
+    assert "Rate limited to 5 attempts per minute.\n" in patched
+    assert "No rate limiting" not in patched
+    assert patched.startswith("## API\n\ndef login(user, password):\n")
+
+
+def test_apply_tolerates_trailing_whitespace_and_appends():
+    """Test loose line matching and empty SEARCH (append)."""
+    original = "a = 1   \nb = 2\nc = 3"
+    blocks = [EditBlock("a = 1\nb = 2\n", "a = 10\nb = 20\n"), EditBlock("", "## Tests\nadded\n")]
+    assert apply_edit_blocks(original, blocks) == "a = 10\nb = 20\nc = 3\n\n## Tests\nadded\n"
+
+
+def test_apply_rejects_missing_ambiguous_and_empty():
+    """Test unusable edits raise PatchError."""
+    with pytest.raises(PatchError):
+        apply_edit_blocks("x\ny\n", [EditBlock("z\n", "w\n")])
+    with pytest.raises(PatchError):
+        apply_edit_blocks("x\nx\n", [EditBlock("x\n", "w\n")])
+    with pytest.raises(PatchError):
+        apply_edit_blocks("x\n", [])
+
+
+def _result(agent, response, completion_tokens):
+    return RunResult(agent=agent, model="m", provider="p", prompt="", response=response, duration_ms=1.0,
+                     prompt_tokens=10, completion_tokens=completion_tokens,
+                     total_tokens=10 + completion_tokens, timestamp="t", log_file="x.json")
+
+
+def _chain_with_builder_edits(edits):
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["enabled"] = False
+    runtime.config["refinement"]["mode"] = "patch"
+    prompts = []
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None, persist=True):
+        prompts.append((agent, prompt))
+        if agent == "builder":
+            if "CRITICAL ISSUES" not in prompt:
+                return _result(agent, PREVIOUS, 400)
+            if "<<<<<<< SEARCH" in prompt:
+                return _result(agent, edits, 60)
+            return _result(agent, PREVIOUS.replace("No rate limiting.", "Rate limited."), 400)
+        if "iteration 2" in prompt:
+            return _result(agent, "Looks good now.", 20)
+        return _result(agent, "CRITICAL: SQL injection in login", 20)
+
+    with patch.object(runtime, "run", side_effect=mock_run):
+        results = runtime.chain("Build login", stages=["builder", "critic"])
+    return results, prompts
+
+
+def test_chain_refinement_applies_builder_edits():
+    """Test the refined builder result holds the patched full text and the savings."""
+    results, prompts = _chain_with_builder_edits(EDITS)
+
+    refined = results[2]
+    assert refined.agent == "builder"
+    assert refined.response == apply_edit_blocks(PREVIOUS, parse_edit_blocks(EDITS))
+    assert PREVIOUS in prompts[2][1]  # Previous solution is sent for the edits to refer to
+    info = refined.metadata["refinement"]
+    assert info["mode"] == "patch"
+    assert info["edits"] == 2
+    assert info["saved_completion_tokens"] == info["estimated_full_completion_tokens"] - 60 > 0
+
+
+def test_chain_refinement_falls_back_to_full_regeneration():
+    """Test edits that don't apply trigger one full regeneration call."""
+    bad_edits = "<<<<<<< SEARCH\nnot in the solution\n=======\nx\n>>>>>>> REPLACE\n"
+    results, prompts = _chain_with_builder_edits(bad_edits)
+
+    builder_prompts = [prompt for agent, prompt in prompts if agent == "builder"]
+    assert len(builder_prompts) == 3
+    assert "Provide a complete, refined solution." in builder_prompts[-1]
+    assert results[2].response.endswith("Rate limited.\n")
+    assert results[2].metadata["refinement"]["mode"] == "full"
+    assert results[2].metadata["refinement"]["patch_completion_tokens"] == 60
+
+
+def test_patch_turn_stores_patched_solution():
+    """Test memory gets the patched solution, not the SEARCH/REPLACE response."""
+    runtime = AgentRuntime()
+    runtime.config["refinement"]["mode"] = "patch"
+    previous = _result("builder", PREVIOUS, 400)
+    persisted = []
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None, persist=True):
+        persisted.append(persist)
+        result = _result(agent, EDITS, 60)
+        result.memory_record = {"prompt": prompt, "response": EDITS, "agent": agent, "session_id": session_id}
+        return result
+
+    with patch.object(runtime, "run", side_effect=mock_run), \
+            patch.object(runtime, "_store_memory") as store:
+        refined, calls = runtime._refine_builder("Build login", "CRITICAL: SQL injection", 1,
+                                                 previous=previous, session_id="s1")
+
+    assert persisted == [False]
+    stored = store.call_args.args[0]
+    assert stored["response"] == refined.response == apply_edit_blocks(PREVIOUS, parse_edit_blocks(EDITS))
+    assert "<<<<<<< SEARCH" not in stored["prompt"]
+    assert stored["session_id"] == "s1"
+    assert store.call_count == 1
+
+
+def test_failed_critic_stops_refinement(capsys):
+    """Test a failed critic-v2 call ends refinement instead of counting as no issues."""
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["enabled"] = False
+    calls = []
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None, persist=True):
+        calls.append((agent, mock_mode))
+        if agent == "critic" and "iteration 2" in prompt:
+            result = _result(agent, "All API providers failed", 0)
+            result.error = "All API providers failed"
+            return result
+        return _result(agent, "CRITICAL: SQL injection" if agent == "critic" else PREVIOUS, 20)
+
+    with patch.object(runtime, "run", side_effect=mock_run):
+        results = runtime.chain("Build login", stages=["builder", "critic"], mock_mode=True)
+
+    assert [r.agent for r in results] == ["builder", "critic", "builder", "critic"]
+    assert results[-1].error
+    assert all(mock_mode is True for _, mock_mode in calls)
+    output = capsys.readouterr().out
+    assert "critic-v2 failed" in output
+    assert "refinement successful" not in output
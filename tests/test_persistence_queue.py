@@ -0,0 +1,197 @@
+"""Test write-behind persistence queue."""
+
+import json
+import threading
+from unittest.mock import patch
+
+from config.settings import CONVERSATIONS_DIR
+from core.agent_runtime import AgentRuntime
+from core.llm_connector import LLMResponse
+from core.memory_backend import SQLiteBackend
+from core.persistence_queue import PersistenceQueue
+
+
+class RecordingMemory:
+    """Collects store_conversations() batches; optionally blocks until released."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def store_conversations(self, items, generate_embedding=True):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(items))
+        return list(range(len(items)))
+
+
+def _item(i, session_id=None):
+    return {"prompt": f"p{i}", "response": "r", "agent": "builder", "model": "m",
+            "provider": "p", "metadata": {}, "session_id": session_id}
+
+
+def test_memory_rows_are_batched_and_logs_written(tmp_path):
+    """Test queued rows are stored in one batch and logs are masked and written."""
+    memory = RecordingMemory()
+    pq = PersistenceQueue(memory_factory=lambda: memory, spill_dir=tmp_path / "spill")
+
+    for i in range(5):
+        pq.submit_memory(_item(i))
+    log_path = tmp_path / "log.json"
+    pq.submit_log({"agent": "builder", "prompt": "key sk-abcdefghijkl", "response": "ok"}, log_path)
+
+    assert pq.flush(5)
+    assert [len(b) for b in memory.batches] == [5]
+    assert "MASKED" in json.loads(log_path.read_text(encoding="utf-8"))["prompt"]
+    assert pq.stats()["memory_rows_stored"] == 5
+    pq.close()
+
+
+def test_overflow_spills_to_disk_and_replays(tmp_path):
+    """Test a full queue spills to disk and spilled rows are persisted on flush."""
+    gate = threading.Event()
+    memory = RecordingMemory(gate)
+    pq = PersistenceQueue(memory_factory=lambda: memory, max_size=1, batch_size=1,
+                          flush_interval=0, spill_dir=tmp_path / "spill")
+
+    pq.submit_memory(_item(0))  # Taken by the worker, blocks in store
+    for _ in range(50):
+        if pq.stats()["queued"] == 0:
+            break
+        threading.Event().wait(0.01)
+    pq.submit_memory(_item(1))  # Fills the queue
+    pq.submit_memory(_item(2))  # Spilled
+
+    assert pq.stats()["spilled"] == 1
+    assert pq.spill_path.exists()
+
+    gate.set()
+    assert pq.flush(5)
+    stored = [item["prompt"] for batch in memory.batches for item in batch]
+    assert sorted(stored) == ["p0", "p1", "p2"]
+    assert not pq.spill_path.exists()
+    pq.close()
+
+
+def _wait_until_dequeued(pq):
+    for _ in range(100):
+        if pq.stats()["queued"] == 0:
+            return
+        threading.Event().wait(0.01)
+
+
+def test_spilled_rows_keep_submission_order(tmp_path):
+    """Test rows submitted after a spill are persisted after the spilled ones."""
+    gates = [threading.Event(), threading.Event()]
+    memory = RecordingMemory()
+    calls = []
+
+    def store_conversations(items, generate_embedding=True):
+        calls.append(None)
+        if len(calls) <= len(gates):
+            gates[len(calls) - 1].wait(5)
+        memory.batches.append(list(items))
+
+    memory.store_conversations = store_conversations
+    pq = PersistenceQueue(memory_factory=lambda: memory, max_size=1, batch_size=1,
+                          flush_interval=0, spill_dir=tmp_path / "spill")
+
+    pq.submit_memory(_item(0))  # Taken by the worker, blocks in store
+    _wait_until_dequeued(pq)
+    pq.submit_memory(_item(1))  # Fills the queue
+    pq.submit_memory(_item(2))  # Spilled
+    gates[0].set()  # Worker stores p0, then takes p1 and blocks again
+    _wait_until_dequeued(pq)
+    pq.submit_memory(_item(3))  # Room in the queue, but p2 is still on disk
+
+    gates[1].set()
+    assert pq.flush(5)
+    assert [item["prompt"] for batch in memory.batches for item in batch] == ["p0", "p1", "p2", "p3"]
+    assert pq.stats()["spilled"] == 2
+    assert not pq.spill_path.exists()
+
+    pq.submit_memory(_item(4))  # Spill replayed: back to the queue
+    assert pq.flush(5)
+    assert pq.stats()["spilled"] == 2
+    pq.close()
+
+
+def test_interrupted_replay_is_recovered_first(tmp_path):
+    """Test rows left in .processing by a crash mid-replay are replayed before newer spills."""
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+
+    def write(path, indexes):
+        with open(path, "w", encoding="utf-8") as f:
+            for i in indexes:
+                f.write(json.dumps({"kind": "memory", "item": _item(i)}) + "\n")
+
+    write(spill_dir / "persistence.processing", [0, 1])  # Replay cut short by a crash
+    write(spill_dir / "persistence.jsonl", [2])  # Spilled after the restart
+
+    memory = RecordingMemory()
+    pq = PersistenceQueue(memory_factory=lambda: memory, spill_dir=spill_dir)
+    assert pq.stats()["spill_pending"]
+    pq.submit_memory(_item(3))  # Queued behind both files
+
+    assert pq.flush(5)
+    assert [item["prompt"] for batch in memory.batches for item in batch] == ["p0", "p1", "p2", "p3"]
+    assert not pq.processing_path.exists()
+    assert not pq.spill_path.exists()
+    pq.close()
+
+
+def test_wait_for_session_blocks_until_stored(tmp_path):
+    """Test session reads wait for that session's queued rows."""
+    gate = threading.Event()
+    pq = PersistenceQueue(memory_factory=lambda: RecordingMemory(gate), spill_dir=tmp_path / "spill")
+
+    pq.submit_memory(_item(0, session_id="s1"))
+    assert pq.wait_for_session("s1", timeout=0.05) is False
+    assert pq.wait_for_session("other", timeout=0.05) is True
+
+    gate.set()
+    assert pq.wait_for_session("s1", timeout=5) is True
+    pq.close()
+
+
+def test_submit_after_close_persists_inline(tmp_path):
+    """Test late submissions (e.g. during shutdown) are not lost."""
+    memory = RecordingMemory()
+    pq = PersistenceQueue(memory_factory=lambda: memory, spill_dir=tmp_path / "spill")
+    pq.close()
+
+    pq.submit_memory(_item(0))
+    assert len(memory.batches) == 1
+
+
+def test_runtime_run_uses_queue(tmp_path):
+    """Test run() returns before persistence and the log appears after flush."""
+    runtime = AgentRuntime()
+    memory = RecordingMemory()
+    runtime.persistence = PersistenceQueue(memory_factory=lambda: memory, spill_dir=tmp_path / "spill")
+    response = LLMResponse(text="done", model="openai/gpt-4o-mini", provider="openai",
+                           prompt_tokens=10, completion_tokens=5, total_tokens=15, duration_ms=50.0)
+
+    with patch.object(runtime.connector, "call", return_value=response), \
+            patch.object(runtime.context_aggregator, "get_full_context", return_value=("", {})):
+        result = runtime.run("builder", "build it", session_id="sess-1")
+
+    assert runtime.persistence.flush(5)
+    log_path = CONVERSATIONS_DIR / result.log_file
+    assert json.loads(log_path.read_text(encoding="utf-8"))["response"] == "done"
+    assert memory.batches[0][0]["session_id"] == "sess-1"
+    runtime.persistence.close()
+
+
+def test_backend_store_many_persists_embeddings(tmp_path):
+    """Test batch inserts keep order and store the embedding blob."""
+    backend = SQLiteBackend(tmp_path / "memory.db")
+    ids = backend.store_many([
+        {"agent": "builder", "model": "m", "provider": "p", "prompt": "a", "response": "r", "embedding": b"\x01"},
+        {"agent": "critic", "model": "m", "provider": "p", "prompt": "b", "response": "r"},
+    ])
+
+    assert len(ids) == 2
+    assert backend.get_by_id(ids[0])["embedding"] == b"\x01"
+    assert backend.get_by_id(ids[1])["agent"] == "critic"
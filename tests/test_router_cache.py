@@ -0,0 +1,127 @@
+"""Test routing decision cache."""
+
+import os
+from unittest.mock import patch
+
+import numpy as np
+
+from core.agent_runtime import AgentRuntime
+from core.llm_connector import LLMResponse
+from core.router_cache import RouterCache, normalize_prompt, prompt_key
+
+
+def _router_response(text="critic", error=None):
+    return LLMResponse(
+        text=text,
+        model="gemini/gemini-2.5-flash",
+        provider="google",
+        prompt_tokens=10,
+        completion_tokens=1,
+        total_tokens=11,
+        duration_ms=100.0,
+        error=error,
+    )
+
+
+class VectorEngine:
+    """Maps known prompts to fixed vectors for similarity lookups."""
+
+    model_name = "vector-test"
+    vectors = {
+        "review my code": [1.0, 0.0, 0.0],
+        "review my code please": [0.99, 0.1, 0.0],
+        "write a parser": [0.0, 1.0, 0.0],
+    }
+
+    def encode(self, text):
+        return np.array(self.vectors.get(text, [0.0, 0.0, 1.0]), dtype=np.float32)
+
+
+def test_normalized_prompts_share_key():
+    """Test case, whitespace and trailing punctuation do not change the key."""
+    assert normalize_prompt("  Review   THIS code?! ") == "review this code"
+    assert prompt_key("Review this code") == prompt_key("review  this code.")
+    assert prompt_key("Review this code") != prompt_key("Review that code")
+
+
+def test_lru_and_ttl_eviction():
+    """Test least recently used entries and expired entries are evicted."""
+    cache = RouterCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "builder", "llm")
+    cache.put("b", "critic", "llm")
+    assert cache.get("a")["agent"] == "builder"  # "a" becomes most recent
+    cache.put("c", "closer", "llm")  # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.get("c")["agent"] == "closer"
+
+    with patch("core.router_cache.time.time", return_value=1e12):
+        assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 2
+
+
+def test_similarity_lookup():
+    """Test near-identical prompts reuse a decision above the threshold."""
+    cache = RouterCache(similarity_threshold=0.95, embedding_engine=VectorEngine())
+    cache.put("review my code", "critic", "llm")
+
+    assert cache.get("Review my code please") == {"agent": "critic", "source": "llm"}
+    assert cache.get("write a parser") is None
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_fingerprint_change_invalidates():
+    """Test a new router config fingerprint clears cached decisions."""
+    cache = RouterCache()
+    assert cache.check_fingerprint("v1") is False
+    cache.put("a", "builder", "llm")
+    assert cache.check_fingerprint("v1") is False
+    assert cache.check_fingerprint("v2") is True
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_route_uses_cache_and_skips_failed_decisions():
+    """Test repeated prompts skip the router call, failed routing is not cached."""
+    runtime = AgentRuntime()
+    runtime._local_router = False
+
+    with patch.object(runtime.connector, "call", return_value=_router_response("critic")) as mock_call:
+        assert runtime._route_with_source("Review this code") == ("critic", "llm")
+        assert runtime._route_with_source("review this code.") == ("critic", "cache")
+        assert mock_call.call_count == 1
+
+    with patch.object(runtime.connector, "call", return_value=_router_response("", error="down")) as mock_call:
+        assert runtime._route_with_source("Write a parser") == ("builder", "default")
+        assert runtime._route_with_source("Write a parser") == ("builder", "default")
+        assert mock_call.call_count == 2
+
+    stats = runtime.router_stats()
+    assert stats["decisions"] == {"llm": 1, "cache": 1, "default": 2}
+    assert stats["cache"]["hits"] == 1
+
+
+def test_agents_yaml_change_invalidates_cache(tmp_path):
+    """Test editing the router section of agents.yaml clears the cache."""
+    runtime = AgentRuntime()
+    runtime._local_router = False
+    config_file = tmp_path / "agents.yaml"
+    config_file.write_text("x", encoding="utf-8")
+
+    with patch("core.agent_runtime.AGENTS_CONFIG_PATH", config_file), \
+            patch.object(runtime.connector, "call", return_value=_router_response("critic")) as mock_call:
+        runtime._route_with_source("Review this code")
+
+        changed = {**runtime.config, "agents": {**runtime.config["agents"], "router": {
+            **runtime.config["agents"]["router"], "temperature": 0.0}}}
+        os.utime(config_file, (1, 1))
+        with patch("core.agent_runtime.load_agents_config", return_value=changed):
+            assert runtime._route_with_source("Review this code") == ("critic", "llm")
+
+        assert mock_call.call_count == 2
+        assert runtime.config["agents"]["router"]["temperature"] == 0.0
+        assert runtime.router_cache.stats()["invalidations"] == 1
@@ -13,6 +13,7 @@ from core.llm_connector import LLMResponse
 def test_router_returns_valid_agent():
     """Test that router returns builder, critic, or closer."""
     runtime = AgentRuntime()
+    runtime._local_router = False  # Exercise the LLM router path
 
     # Mock LLM response
     mock_response = LLMResponse(
@@ -33,6 +34,7 @@ def test_router_returns_valid_agent():
 def test_router_defaults_to_builder_on_invalid():
     """Test that router defaults to builder on invalid response."""
     runtime = AgentRuntime()
+    runtime._local_router = False  # Exercise the LLM router path
 
     # Mock invalid response
     mock_response = LLMResponse(
@@ -513,6 +515,203 @@ def test_run_multi_critic_with_mock():
         runtime.config["dynamic_selection"]["enabled"] = original_dynamic_enabled
 
 
+def _critic_runtime(delays, quorum, errors=()):
+    """Runtime whose critics answer after per-critic delays (None = hang until released)."""
+    import threading
+    import time
+
+    from core.agent_runtime import RunResult
+
+    runtime = AgentRuntime()
+    runtime.config["dynamic_selection"]["enabled"] = False
+    runtime.config["multi_critic"]["quorum"] = {"enabled": True, **quorum}
+    release = threading.Event()
+    calls = []
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None):
+        calls.append((agent, mock_mode, session_id))
+        if delays[agent] is None:
+            release.wait(5)
+        else:
+            time.sleep(delays[agent])
+        error = "All API providers failed" if agent in errors else None
+        return RunResult(agent=agent, model="m", provider="p", prompt=prompt,
+                         response=error or f"{agent} feedback", duration_ms=1.0, prompt_tokens=1,
+                         completion_tokens=1, total_tokens=2, timestamp="t", log_file="x.json", error=error)
+
+    return runtime, mock_run, release, calls
+
+
+def test_multi_critic_quorum_is_weight_aware():
+    """Test consensus waits for enough weight, then detaches the straggler."""
+    import time
+
+    # code-quality (0.8) alone is below half of the total weight 3.3; with security (1.5) it isn't
+    runtime, mock_run, release, calls = _critic_runtime(
+        {"code-quality-critic": 0.0, "security-critic": 0.2, "performance-critic": None},
+        {"min_critics": 1, "min_weight_fraction": 0.5, "grace_seconds": 0.05, "deadline_seconds": None},
+    )
+    report = {}
+    start = time.monotonic()
+    try:
+        with patch.object(runtime, "run", side_effect=mock_run):
+            consensus, results = runtime._run_multi_critic(
+                "out", "prompt", mock_mode=True, session_id="s1", report=report
+            )
+    finally:
+        release.set()
+
+    assert time.monotonic() - start < 2
+    assert sorted(r.agent for r in results) == ["code-quality-critic", "security-critic"]
+    assert report["missing"] == ["performance-critic"]
+    assert report["reason"] == "quorum"
+    assert "Missing critics (not waited for): performance-critic" in consensus
+    assert all(mock_mode is True and session_id == "s1" for _, mock_mode, session_id in calls)
+
+
+def test_multi_critic_quorum_counts_successes_only():
+    """Test a failed critic neither counts toward the quorum nor enters the consensus."""
+    runtime, mock_run, release, _ = _critic_runtime(
+        {"code-quality-critic": 0.0, "security-critic": 0.0, "performance-critic": 0.2},
+        {"min_critics": 2, "min_weight_fraction": 0.0, "grace_seconds": 0.05, "deadline_seconds": None},
+        errors={"code-quality-critic"},
+    )
+    report = {}
+    with patch.object(runtime, "run", side_effect=mock_run):
+        consensus, results = runtime._run_multi_critic("out", "prompt", report=report)
+
+    assert sorted(report["completed"]) == ["performance-critic", "security-critic"]
+    assert report["failed"] == ["code-quality-critic"]
+    assert report["missing"] == []
+    assert "All API providers failed" not in consensus
+    assert len(results) == 3  # Failed call kept for usage accounting
+
+
+def test_multi_critic_below_quorum_falls_back():
+    """Test failures that leave the quorum unmet produce no consensus (single-critic fallback)."""
+    runtime, mock_run, release, _ = _critic_runtime(
+        {"code-quality-critic": 0.0, "security-critic": 0.0, "performance-critic": 0.0,
+         "builder": 0.0, "critic": 0.0},
+        {"min_critics": 2, "min_weight_fraction": 0.0, "grace_seconds": 0.05, "deadline_seconds": None},
+        errors={"code-quality-critic", "performance-critic"},
+    )
+    report = {}
+    with patch.object(runtime, "run", side_effect=mock_run):
+        consensus, _ = runtime._run_multi_critic("out", "prompt", report=report)
+        results = runtime.chain("Build login", stages=["builder", "critic"], enable_refinement=False)
+
+    assert consensus == ""
+    assert report["reason"] == "failed"
+    assert results[-1].agent == "critic"
+    assert not results[-1].error
+
+
+def test_multi_critic_deadline():
+    """Test the critic deadline returns whatever finished."""
+    runtime, mock_run, release, _ = _critic_runtime(
+        {"code-quality-critic": 0.0, "security-critic": None, "performance-critic": None},
+        {"min_critics": 3, "grace_seconds": 0.05, "deadline_seconds": 0.2},
+    )
+    report = {}
+    try:
+        with patch.object(runtime, "run", side_effect=mock_run):
+            _, results = runtime._run_multi_critic("out", "prompt", report=report)
+    finally:
+        release.set()
+
+    assert [r.agent for r in results] == ["code-quality-critic"]
+    assert sorted(report["missing"]) == ["performance-critic", "security-critic"]
+    assert report["reason"] == "deadline"
+
+
+def _speculative_chain(reviews, stages=("builder", "critic"), stored=None):
+    """Run a speculative chain whose critic reviews depend on the candidate temperature."""
+    import threading
+
+    from core.agent_runtime import RunResult
+
+    runtime = AgentRuntime()
+    runtime.config["multi_critic"]["enabled"] = False
+    runtime.config["coalescing"] = {"enabled": False}
+    runtime.config["speculative"] = {"temperatures": [0.2, 0.5, 0.8], "use_fallback_models": False,
+                                     "max_refinement_passes": 1}
+    calls = []
+    lock = threading.Lock()
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None, temperature=None,
+                 persist=True):
+        with lock:
+            calls.append((agent, temperature))
+        if agent == "builder":
+            response = "refined" if "CRITICAL ISSUES" in prompt else f"solution t={temperature}"
+        else:
+            response = next((r for t, r in reviews.items() if f"t={t}" in prompt), "Looks good.")
+        record = {"agent": agent, "response": response, "session_id": session_id}
+        if stored is not None and persist:
+            stored.append(record)
+        return RunResult(agent=agent, model="m", provider="p", prompt=prompt, response=response,
+                         duration_ms=10.0, prompt_tokens=5, completion_tokens=5, total_tokens=10,
+                         timestamp="t", log_file="x.json", memory_record=None if persist else record)
+
+    with patch.object(runtime, "run", side_effect=mock_run), \
+            patch.object(runtime, "_store_memory", side_effect=None if stored is None else stored.append):
+        results = runtime.chain("Build login", stages=list(stages), speculative=3)
+    return results, calls
+
+
+def test_speculative_builder_picks_best_candidate():
+    """Test candidates are built and reviewed in parallel and the least-criticized one proceeds."""
+    results, calls = _speculative_chain({
+        0.2: "CRITICAL: SQL injection\nCRITICAL: no auth",
+        0.5: "Looks good.",
+        0.8: "CRITICAL: missing tests",
+    }, stages=("builder", "critic", "closer"))
+
+    assert [r.agent for r in results] == ["builder", "critic", "closer"]
+    assert results[0].response == "solution t=0.5"
+    assert results[1].response == "Looks good."
+    assert sorted(t for agent, t in calls if agent == "builder") == [0.2, 0.5, 0.8]
+    assert sum(1 for agent, _ in calls if agent == "critic") == 3  # Critic stage not run again
+
+    info = results[0].metadata["speculative"]
+    assert [c["issues"] for c in info["candidates"]] == [2, 0, 1]
+    assert [c["chosen"] for c in info["candidates"]] == [False, True, False]
+    assert info["total_tokens"] == 60
+    assert info["iterative_estimate"] == {"rounds": 2, "wall_clock_ms": 40.0, "total_tokens": 40}
+
+
+def test_speculative_builder_refines_once_at_most():
+    """Test the winner gets at most max_refinement_passes refinements."""
+    results, calls = _speculative_chain({t: "CRITICAL: SQL injection" for t in (0.2, 0.5, 0.8)})
+
+    assert [r.agent for r in results] == ["builder", "critic", "builder", "critic"]
+    assert results[0].response == "solution t=0.2"  # Tie: earliest candidate
+    assert results[2].response == "refined"
+    assert sum(1 for agent, _ in calls if agent == "builder") == 4
+
+
+def test_speculative_builder_stores_winner_only():
+    """Test losing candidates and their reviews are never stored to memory."""
+    stored = []
+    results, _ = _speculative_chain({
+        0.2: "CRITICAL: SQL injection",
+        0.5: "Looks good.",
+        0.8: "CRITICAL: missing tests",
+    }, stored=stored)
+
+    assert [r.agent for r in results] == ["builder", "critic"]
+    assert [(s["agent"], s["response"]) for s in stored] == [("builder", "solution t=0.5"), ("critic", "Looks good.")]
+    assert all(r.memory_record is None for r in results)
+
+
+def test_count_critical_issues_non_ascii():
+    """Test flagged lines stay aligned when uppercasing lengthens the text."""
+    runtime = AgentRuntime()
+    review = "Straße ßßßßßßßßßßßß\nThe handler is BROKEN\nlooks fine\nIssue 1: naming\nok"
+    assert runtime._count_critical_issues(review) == 2
+    assert runtime._count_critical_issues("ßßßßßßßßßßßß\nlooks fine\nall good") == 0
+
+
 def test_dynamic_selection_config_loaded():
     """Test that dynamic selection configuration is properly loaded."""
     runtime = AgentRuntime()
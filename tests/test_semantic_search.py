@@ -4,10 +4,12 @@ Smoke tests for semantic search functionality.
 These are minimal tests for regression protection, not comprehensive coverage.
 Run with: pytest tests/test_semantic_search.py -v
 """
+import pickle
 import pytest
 import tempfile
+import numpy as np
 from pathlib import Path
-from core.embedding_engine import get_embedding_engine, EmbeddingEngine
+from core.embedding_engine import get_embedding_engine, is_legacy_embedding, EmbeddingEngine
 from core.memory_engine import MemoryEngine
 from core.memory_backend import SQLiteBackend
 
@@ -78,6 +80,60 @@ def test_embedding_serialization():
     assert (deserialized == original).all()
 
 
+def test_raw_embedding_format():
+    """Verify the raw float32/float16 layout: header size, zero-copy decode, round trip."""
+    original = np.linspace(-1, 1, 384).astype(np.float32)
+
+    blob = EmbeddingEngine.serialize_embedding(original)
+    assert len(blob) == 8 + 384 * 4
+    decoded = EmbeddingEngine.deserialize_embedding(blob)
+    assert decoded.dtype == np.float32 and not decoded.flags.writeable  # View of the BLOB
+    assert (decoded == original).all()
+
+    half = EmbeddingEngine.serialize_embedding(original, "float16")
+    assert len(half) == 8 + 384 * 2
+    np.testing.assert_allclose(EmbeddingEngine.deserialize_embedding(half), original, atol=1e-3)
+
+    with pytest.raises(ValueError):
+        EmbeddingEngine.deserialize_embedding(blob[:-4])
+
+
+def test_legacy_pickled_embeddings_still_readable():
+    """Verify pre-v1.1.0 pickled BLOBs load, but only numpy globals are resolved."""
+    original = np.random.default_rng(0).standard_normal(384)
+    assert is_legacy_embedding(pickle.dumps(original))
+    assert (EmbeddingEngine.deserialize_embedding(pickle.dumps(original)) == original).all()
+
+    with pytest.raises(pickle.UnpicklingError):
+        EmbeddingEngine.deserialize_embedding(pickle.dumps(Path("/etc/passwd")))
+
+
+def test_protocol5_pickled_embeddings_migrate(tmp_path):
+    """Verify protocol-5 pickles (numeric._frombuffer) load and are converted by the migration."""
+    from unittest.mock import patch
+
+    from core.memory_backend import SQLiteBackend
+    from scripts.migrate_embeddings_format import migrate
+
+    original = np.random.default_rng(1).standard_normal(384).astype(np.float32)
+    blob = pickle.dumps(original, protocol=5)
+    assert b"_frombuffer" in blob
+    assert (EmbeddingEngine.deserialize_embedding(blob) == original).all()
+
+    db_path = tmp_path / "memory.db"
+    backend = SQLiteBackend(db_path)
+    conversation_id = backend.store({"agent": "builder", "model": "m", "provider": "p",
+                                     "prompt": "a", "response": "r", "embedding": blob})
+
+    with patch("scripts.migrate_embeddings_format.load_memory_config",
+               return_value={"memory": {"db_path": str(db_path)}}):
+        migrate("float32", batch_size=10, backup=False, vacuum=False)
+
+    stored = backend.get_by_id(conversation_id)["embedding"]
+    assert not is_legacy_embedding(stored)
+    assert (EmbeddingEngine.deserialize_embedding(stored) == original).all()
+
+
 def test_semantic_search_basic(temp_memory):
     """
     Smoke test for semantic search integration.
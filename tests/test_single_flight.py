@@ -0,0 +1,94 @@
+"""Test chain request coalescing."""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from core.agent_runtime import AgentRuntime, RunResult
+from core.single_flight import SingleFlight, chain_request_key
+
+
+def test_concurrent_duplicates_share_one_execution():
+    """Test duplicates arriving while the leader runs wait for its result."""
+    flight = SingleFlight(ttl_seconds=0)
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(flight.do("k", work))) for _ in range(4)]
+    threads[0].start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(outcomes) == [("result", "executed")] + [("result", "in_flight")] * 3
+    assert flight.stats()["cached"] == 0
+
+
+def test_completed_results_cached_for_ttl():
+    """Test recent results serve duplicates until the TTL expires."""
+    flight = SingleFlight(ttl_seconds=0.1)
+    assert flight.do("k", lambda: 1) == (1, "executed")
+    assert flight.do("k", lambda: 2) == (1, "cache")
+    time.sleep(0.15)
+    assert flight.do("k", lambda: 3) == (3, "executed")
+    assert flight.do("other", lambda: 4, cacheable=lambda value: False) == (4, "executed")
+    assert flight.do("other", lambda: 5) == (5, "executed")
+
+
+def test_errors_are_not_cached():
+    """Test a failing execution raises and the next request runs again."""
+    flight = SingleFlight(ttl_seconds=10)
+
+    def fail():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: "ok") == ("ok", "executed")
+
+
+def test_request_key_canonicalizes_whitespace_only():
+    """Test whitespace differences coalesce but case and settings don't."""
+    key = chain_request_key("Design  an API\n", ["builder"], None, True, None)
+    assert key == chain_request_key("Design an API", ["builder"], None, True, None)
+    assert key != chain_request_key("design an API", ["builder"], None, True, None)
+    assert key != chain_request_key("Design an API", ["builder", "critic"], None, True, None)
+    assert key != chain_request_key("Design an API", ["builder"], None, True, {"max_tokens": 10})
+
+
+def test_runtime_chain_serves_duplicates():
+    """Test session-less duplicate chains reuse results; session chains always run."""
+    runtime = AgentRuntime()
+    runtime.config["coalescing"] = {"enabled": True, "result_ttl_seconds": 30}
+    calls = []
+
+    def mock_run(agent, prompt, override_model=None, mock_mode=None, session_id=None):
+        calls.append(agent)
+        return RunResult(agent=agent, model="m", provider="p", prompt=prompt, response="done",
+                         duration_ms=1.0, prompt_tokens=1, completion_tokens=1, total_tokens=2,
+                         timestamp="t", log_file="x.json")
+
+    with patch.object(runtime, "run", side_effect=mock_run):
+        first = runtime.chain("Design an API", stages=["builder"])
+        second = runtime.chain("Design an API", stages=["builder"])
+        runtime.chain("Design an API", stages=["builder"], session_id="s1")
+
+    assert calls == ["builder", "builder"]
+    assert second[0].response == first[0].response
+    assert second[0] is not first[0]
+    assert second[-1].metadata["coalesced"]["source"] == "cache"
+    assert runtime.chain_coalescer.stats()["cache_hits"] == 1
@@ -0,0 +1,119 @@
+"""Test compiled keyword matcher against the per-keyword scans it replaces."""
+
+import random
+import re
+
+from core.agent_runtime import AgentRuntime
+from core.text_classifier import KeywordMatcher, issue_header_lines, uppercase_keyword_lines
+
+OVERLAPPING = ["auth", "oauth", "authentication", "test", "testability", "aa", "aaa", "n+1", "api key", "ab", "ba"]
+
+
+def _random_text(rng, length):
+    pieces = OVERLAPPING + ["a", "b", " ", "\n", "x", "ISSUE 2:", "  problem 7:", "Ü", "ß"]
+    return "".join(rng.choice(pieces) for _ in range(length))
+
+
+def test_counts_match_str_count():
+    """Test counts equal str.count for overlapping and nested keywords."""
+    rng = random.Random(7)
+    matcher = KeywordMatcher(OVERLAPPING)
+    for _ in range(200):
+        text = _random_text(rng, rng.randint(0, 80))
+        assert matcher.count(text) == {k: text.count(k) for k in OVERLAPPING}
+
+
+def test_matching_lines_match_per_line_scan():
+    """Test line hits equal `any(k in line)` for every line."""
+    rng = random.Random(11)
+    keywords = ["CRITICAL", "BUG", "BUGGY", "AUTH", "OAUTH", "A\nB"]
+    matcher = KeywordMatcher(keywords)
+    for _ in range(200):
+        text = _random_text(rng, rng.randint(0, 60)).upper()
+        expected = {i for i, line in enumerate(text.split("\n")) if any(k in line for k in keywords)}
+        assert matcher.matching_lines(text) == expected
+
+
+def test_issue_header_lines_match_per_line_regex():
+    """Test issue headers equal the per-line re.match they replace."""
+    rng = random.Random(3)
+    for _ in range(200):
+        text = _random_text(rng, rng.randint(0, 40))
+        expected = {
+            i for i, line in enumerate(text.split("\n"))
+            if re.match(r"^\s*(?:Issue|Problem)\s+\d+:", line, re.IGNORECASE)
+        }
+        assert issue_header_lines(text) == expected
+
+
+def test_uppercase_keyword_lines_with_expanding_case():
+    """Test line hits stay aligned when uppercasing lengthens the text (ß -> SS, ﬁ -> FI)."""
+    rng = random.Random(5)
+    keywords = ["BROKEN", "SS", "FIX", "BUG"]
+    pieces = ["ß", "ﬁ", "ŉ", "x", "broken", "bug", "ix", " ", "\n", "\n"]
+    for _ in range(300):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 60)))
+        expected = {i for i, line in enumerate(text.split("\n")) if any(k in line.upper() for k in keywords)}
+        assert uppercase_keyword_lines(text, keywords) == expected
+
+
+def _reference_extract(critique_text, critical_keywords):
+    """Per-line scan used before the compiled matcher."""
+    lines = critique_text.split("\n")
+    issue_blocks, current_block, in_critical_section = [], [], False
+    for line in lines:
+        line_upper = line.upper()
+        has_critical = any(keyword in line_upper for keyword in critical_keywords)
+        issue_pattern = re.match(r"^\s*(?:Issue|Problem)\s+\d+:", line, re.IGNORECASE)
+        if has_critical or issue_pattern:
+            in_critical_section = True
+            current_block = [line]
+        elif in_critical_section:
+            if line.strip() and not line.startswith("**"):
+                current_block.append(line)
+            else:
+                if current_block:
+                    issue_blocks.append("\n".join(current_block))
+                    current_block = []
+                in_critical_section = False
+    if current_block:
+        issue_blocks.append("\n".join(current_block))
+    if not issue_blocks:
+        critical_lines = [l.strip() for l in lines if any(k in l.upper() for k in critical_keywords)]
+        return "\n".join(critical_lines) if critical_lines else None
+    formatted = "CRITICAL ISSUES REQUIRING FIXES:\n\n"
+    for i, block in enumerate(issue_blocks, 1):
+        formatted += f"{i}. {block}\n\n"
+    return formatted.strip()
+
+
+def test_runtime_extraction_unchanged():
+    """Test issue extraction matches the old per-line scan."""
+    runtime = AgentRuntime()
+    critical_keywords = runtime.config["refinement"]["critical_keywords"]
+    review = (
+        "**Summary**\nLooks fine overall.\n"
+        "Issue 1: Missing input validation on /login\n  attackers can send huge payloads\n\n"
+        "  problem 2: N+1 query in the orders endpoint\n"
+        "**Note** the SECURITY headers are broken\nminor: naming\n"
+    )
+
+    for text in (review, review * 20, "no issues here", "", "wrong\n**x**\nbug"):
+        assert runtime._extract_critical_issues(text) == _reference_extract(text, critical_keywords)
+
+
+def test_runtime_extraction_non_ascii():
+    """Test issue extraction flags the right lines when uppercasing lengthens the text."""
+    runtime = AgentRuntime()
+    critical_keywords = runtime.config["refinement"]["critical_keywords"]
+    text = "Straße ßßßßßßßßßßßß\nThe handler is BROKEN\nlooks fine\n**Next**\nok"
+
+    extracted = runtime._extract_critical_issues(text)
+    assert extracted == _reference_extract(text, critical_keywords)
+    assert extracted == "CRITICAL ISSUES REQUIRING FIXES:\n\n1. The handler is BROKEN\nlooks fine"
+
+    rng = random.Random(13)
+    pieces = ["ß", "ﬁ", "Straße ", "broken", "bug", "fine", "Issue 1: ", " ", "\n", "\n", "**"]
+    for _ in range(200):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 50)))
+        assert runtime._extract_critical_issues(text) == _reference_extract(text, critical_keywords)
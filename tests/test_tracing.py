@@ -0,0 +1,79 @@
+"""Test tracing spans and Chrome trace export."""
+
+import json
+import threading
+from unittest.mock import patch
+
+from core.agent_runtime import AgentRuntime
+from core.tracing import NOOP_SPAN, Trace, bind_context, current_trace, span, traced
+
+
+@traced("work")
+def _work(x):
+    with span("inner", x=x):
+        return x * 2
+
+
+def test_disabled_tracing_is_noop():
+    """Test spans outside a trace are the shared no-op and record nothing."""
+    assert current_trace() is None
+    assert span("anything") is NOOP_SPAN
+    with span("anything") as s:
+        s.set(ignored=True)
+    assert _work(2) == 4
+
+
+def test_spans_nest_across_threads():
+    """Test parent/child links and thread ids, including pool threads via bind_context."""
+    with Trace("test") as trace:
+        with span("root") as root:
+            thread = threading.Thread(target=bind_context(_work), args=(3,), name="worker-1")
+            thread.start()
+            thread.join()
+            _work(1)
+
+    spans = {(s.name, s.thread_name): s for s in trace.spans}
+    worker_span = spans[("work", "worker-1")]
+    assert worker_span.parent_id == root.span_id
+    assert spans[("inner", "worker-1")].parent_id == worker_span.span_id
+    assert worker_span.thread_id != root.thread_id
+    assert current_trace() is None
+
+    summary = trace.summary()
+    assert summary["spans"] == 5
+    assert summary["threads"] == 2
+    assert summary["by_name"]["work"]["count"] == 2
+
+
+def test_chrome_trace_export(tmp_path):
+    """Test export writes complete events plus thread names."""
+    with Trace("test") as trace:
+        with span("llm.call", label="call gpt", model="m"):
+            pass
+
+    path = trace.export(tmp_path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    complete = [e for e in data["traceEvents"] if e["ph"] == "X"]
+    assert complete[0]["name"] == "call gpt"
+    assert complete[0]["cat"] == "llm"
+    assert complete[0]["args"]["model"] == "m"
+    assert any(e["ph"] == "M" and e["name"] == "thread_name" for e in data["traceEvents"])
+    assert trace.summary()["file"] == str(path)
+
+
+def test_chain_attaches_trace_summary(tmp_path):
+    """Test a traced chain exports its trace and reports it on the last result."""
+    runtime = AgentRuntime()
+    runtime.config["tracing"] = {"enabled": False, "export": True, "export_dir": str(tmp_path)}
+
+    with patch.object(runtime.context_aggregator, "_get_knowledge_conversations", return_value=[]), \
+            patch.object(runtime.memory, "store_conversation", return_value=1):
+        results = runtime.chain("Design an API", stages=["builder", "closer"], mock_mode=True, trace=True)
+        untraced = runtime.chain("Design an API", stages=["builder"], mock_mode=True)
+
+    summary = results[-1].metadata["trace"]
+    assert {"chain", "agent.run", "llm.call", "context.aggregate"} <= set(summary["by_name"])
+    assert summary["by_name"]["agent.run"]["count"] == 2
+    events = json.loads((tmp_path / f"{summary['trace_id']}.json").read_text(encoding="utf-8"))["traceEvents"]
+    assert "run builder" in {e["name"] for e in events}
+    assert "trace" not in (untraced[-1].metadata or {})
@@ -0,0 +1,198 @@
+"""Test the in-memory vector index and indexed semantic retrieval."""
+
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core.embedding_engine import EmbeddingEngine
+from core.memory_backend import SQLiteBackend
+from core.memory_engine import MemoryEngine
+from core.vector_index import VectorIndex, parse_epoch
+
+NOW = datetime(2026, 1, 10, tzinfo=timezone.utc)
+
+
+def iso(hours_ago):
+    return (NOW - timedelta(hours=hours_ago)).isoformat()
+
+
+def test_search_matches_cosine_with_decay():
+    """Test scores equal clamped cosine similarity times exp(-age/decay)."""
+    index = VectorIndex(initial_capacity=2)
+    index.add(1, [1.0, 0.0, 0.0], iso(0), "builder")
+    index.add(2, [3.0, 4.0, 0.0], iso(24), "critic")
+    index.add(3, [-1.0, 0.0, 0.0], iso(0), "builder")  # Negative cosine clamps to 0
+    index.add(4, [0.0, 0.0, 0.0], iso(0), "builder")  # Zero vector scores 0
+
+    ids, scores = index.search(np.array([2.0, 0.0, 0.0]), time_decay_hours=24, now=NOW.timestamp())
+    assert ids.tolist()[:2] == [1, 2]
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[1] == pytest.approx(0.6 * np.exp(-1))
+    assert scores[2:].tolist() == [0.0, 0.0]
+
+
+def test_search_filters_and_tombstones():
+    """Test agent/session filters, min_score, top_k and deletes."""
+    index = VectorIndex()
+    for i in range(10):
+        index.add(i, [1.0, i / 10], iso(i), "builder" if i % 2 else "critic", f"s{i % 3}")
+
+    ids, _ = index.search([1.0, 0.0], agent="critic")
+    assert sorted(ids.tolist()) == [0, 2, 4, 6, 8]
+    ids, _ = index.search([1.0, 0.0], exclude_session_id="s0")
+    assert not set(ids.tolist()) & {0, 3, 6, 9}
+    assert index.search([1.0, 0.0], agent="closer")[0].size == 0
+
+    ids, scores = index.search([1.0, 0.0], top_k=3)
+    assert ids.tolist() == [0, 1, 2]
+    assert list(scores) == sorted(scores, reverse=True)
+
+    assert index.remove(0) and not index.remove(0)
+    assert 0 not in index.search([1.0, 0.0])[0].tolist()
+    assert len(index) == 9
+
+
+def test_parse_epoch_treats_naive_timestamps_as_utc():
+    """Test SQLite CURRENT_TIMESTAMP values parse like UTC ISO timestamps."""
+    assert parse_epoch("2026-01-10 00:00:00") == NOW.timestamp()
+    assert parse_epoch("2026-01-10T00:00:00Z") == NOW.timestamp()
+
+
+class FakeEmbeddingEngine(EmbeddingEngine):
+    """Deterministic bag-of-words embeddings (no model download)."""
+
+    VOCAB = ["helm", "kubernetes", "redis", "login", "jwt", "cache"]
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        words = text.lower().split()
+        return np.array([float(sum(w.startswith(v) for w in words)) for v in self.VOCAB])
+
+    def encode_batch(self, texts):
+        return np.array([self.encode(t) for t in texts])
+
+
+@pytest.fixture
+def engine():
+    """MemoryEngine on a temporary database with fake embeddings."""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = Path(f.name)
+    MemoryEngine._instance = None
+    MemoryEngine._initialized = False
+    memory = MemoryEngine()
+    memory.backend = SQLiteBackend(db_path)
+    memory._embedding_engine = FakeEmbeddingEngine()
+    yield memory
+    MemoryEngine._instance = None
+    MemoryEngine._initialized = False
+    for suffix in (".db", ".vec", ".vec.ids"):  # Database and shared embedding store
+        db_path.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def store(memory, prompt, agent="builder", **kwargs):
+    return memory.store_conversation(
+        prompt=prompt, response="answer", agent=agent, model="m", provider="p", **kwargs
+    )
+
+
+def test_indexed_scores_match_per_record_scoring(engine):
+    """Test the index gives the same semantic scores as the per-record path."""
+    store(engine, "Helm chart for kubernetes")
+    store(engine, "Redis cache layer")
+    store(engine, "JWT login flow")
+
+    index = engine._sync_vector_index()
+    indexed = engine._score_indexed(
+        "kubernetes helm redis", index, strategy="semantic", query_weights={}, agent=None,
+        exclude_session_id=None, time_decay_hours=0, min_relevance=0.0,
+    )
+    per_record = engine._score_semantic("kubernetes helm redis", engine.backend.query_candidates(), 0)
+
+    assert {r["id"]: pytest.approx(score, abs=1e-6) for r, score in zip(per_record.records, per_record.scores)} == {
+        r["id"]: score for r, score in zip(indexed.records, indexed.scores)
+    }
+
+
+def test_vectorized_semantic_scores_match_per_record_formula(engine):
+    """Test _score_semantic equals cosine_similarity * exp(-age/decay) record by record."""
+    for prompt in ("Helm chart for kubernetes", "Redis cache layer", "JWT login flow", "unrelated words"):
+        store(engine, prompt)
+    candidates = engine.backend.query_scoring_rows(with_keywords=False, with_embedding=True)
+    now = datetime.now(timezone.utc).timestamp()
+
+    scored = engine._score_semantic("kubernetes redis cache", candidates, 24, now)
+    query = engine.embedding_engine.encode("kubernetes redis cache")
+    expected = [
+        engine.embedding_engine.cosine_similarity(query, EmbeddingEngine.deserialize_embedding(rec["embedding"]))
+        * np.exp(-(now - parse_epoch(rec["timestamp"])) / 3600 / 24)
+        for rec in scored.records
+    ]
+    assert len(scored.records) == 4
+    np.testing.assert_allclose(scored.scores, expected, rtol=1e-6, atol=1e-9)
+
+
+def test_index_follows_stores_deletes_and_other_writers(engine):
+    """Test appends on store, tombstones on delete, and sync of rows written elsewhere."""
+    first = store(engine, "Helm chart for kubernetes")
+    assert len(engine._sync_vector_index()) == 1
+
+    second = store(engine, "kubernetes helm upgrade")
+    assert second in engine._vector_index  # Appended without a reload
+
+    # Row stored without an embedding (e.g. another process): embedded on sync
+    other = engine.backend.store({"agent": "builder", "prompt": "helm rollback", "response": "done"})
+    assert len(engine._sync_vector_index()) == 3
+    assert engine.backend.get_by_id(other)["embedding"] is not None
+
+    engine.delete_conversation(first)
+    context = engine.get_context_for_prompt("helm kubernetes", strategy="semantic", min_relevance=0.1)
+    assert "kubernetes helm upgrade" in context
+    assert "Helm chart for kubernetes" not in context
+
+
+def test_semantic_context_searches_beyond_newest_candidates(engine):
+    """Test an old match is found even when newer rows exceed the old candidate limit."""
+    store(engine, "Redis cache eviction")
+    engine.backend.store_many([
+        {"agent": "builder", "prompt": f"login page {i}", "response": "html", "embedding":
+            EmbeddingEngine.serialize_embedding(np.array([0, 0, 0, 1.0, 0, 0]))}
+        for i in range(600)
+    ])
+
+    context = engine.get_context_for_prompt("redis cache", strategy="semantic", min_relevance=0.5, time_decay_hours=0)
+    assert "Redis cache eviction" in context
+
+
+def test_ann_index_built_and_saved_above_min_rows(engine):
+    """Test the IVF index is trained once the corpus reaches ann.min_rows and persisted."""
+    engine.vector_config = {"ann": {"min_rows": 5, "n_lists": 2, "n_probe": 2, "background": False}}
+    for prompt in ["helm chart", "kubernetes pods", "redis cache", "jwt login", "login page", "cache ttl"]:
+        store(engine, prompt)
+
+    index = engine._sync_vector_index()
+    assert index.ann is not None and index.ann.trained
+    assert engine._ann_path().exists()
+
+    context = engine.get_context_for_prompt("redis cache", strategy="semantic", min_relevance=0.5, time_decay_hours=0)
+    assert "redis cache" in context
+    engine._ann_path().unlink()
+
+
+def test_rebuild_embedding_store_drops_deleted_conversations(engine):
+    """Test the store rebuild keeps live conversations only and the index reloads from it."""
+    keep = store(engine, "redis cache")
+    gone = store(engine, "helm chart")
+    engine._sync_vector_index()
+    engine.delete_conversation(gone)
+
+    assert engine.rebuild_embedding_store() == 1
+    index = engine._sync_vector_index()
+    assert index.store.ids[:index.store.count].tolist() == [keep]
+    assert keep in index and gone not in index